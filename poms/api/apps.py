@@ -5,3 +5,9 @@ from django.utils.translation import gettext_lazy
 class ApiConfig(AppConfig):
     name = "poms.api"
     verbose_name = gettext_lazy("Rest API")
+
+    def ready(self):
+        from poms.api.coverage import fx_coverage, price_coverage
+
+        price_coverage.connect()
+        fx_coverage.connect()
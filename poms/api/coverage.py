@@ -0,0 +1,115 @@
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+
+from poms.common.db import get_current_schema
+from poms.currencies.models import CurrencyHistory
+from poms.instruments.models import PriceHistory
+
+_l = logging.getLogger("poms.api")
+
+
+class HistoryCoverage:
+    """
+    Number of history records per (object, pricing policy) since date_from and
+    the last record date per object, computed with one GROUP BY for all objects.
+
+    The result is cached per schema and invalidated by a version stamp that is bumped
+    on every save/delete of the history model. Bulk writes do not send signals,
+    for them STATS_COVERAGE_CACHE_TTL limits how stale the numbers can be.
+    """
+
+    def __init__(self, model, object_field):
+        self.model = model
+        self.object_field = object_field
+
+    @property
+    def name(self):
+        return self.model._meta.model_name
+
+    def get_version_key(self, schema_name):
+        return f"{schema_name}_stats_coverage_{self.name}_version"
+
+    def get_cache_key(self, schema_name, date_from):
+        version = cache.get(self.get_version_key(schema_name), 0)
+        return f"{schema_name}_stats_coverage_{self.name}_{version}_{date_from}"
+
+    def invalidate(self, schema_name=None):
+        schema_name = schema_name or get_current_schema()
+        key = self.get_version_key(schema_name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    def _fetch(self, date_from):
+        opts = self.model._meta
+        object_column = opts.get_field(self.object_field).column
+
+        # language=PostgreSQL
+        query = f"""
+            select
+                {object_column} as object_id,
+                pricing_policy_id,
+                count(*) as total,
+                max(max(date)) over (partition by {object_column}) as last_date
+            from {opts.db_table}
+            where date >= %s
+            group by {object_column}, pricing_policy_id
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, [date_from])
+            return cursor.fetchall()
+
+    def get(self, date_from) -> tuple[dict, dict]:
+        """
+        :return: ({(object_id, pricing_policy_id): count}, {object_id: last date})
+        """
+        schema_name = get_current_schema()
+        cache_key = self.get_cache_key(schema_name, date_from)
+
+        rows = cache.get(cache_key)
+        if rows is None:
+            st = time.perf_counter()
+            rows = self._fetch(date_from)
+            cache.set(cache_key, rows, settings.STATS_COVERAGE_CACHE_TTL)
+            _l.debug(f"HistoryCoverage.get {self.name}: {len(rows)} rows done: {time.perf_counter() - st:3.3f}")
+
+        counts = {}
+        last_dates = {}
+        for object_id, pricing_policy_id, total, last_date in rows:
+            counts[(object_id, pricing_policy_id)] = total
+            last_dates[object_id] = last_date
+
+        return counts, last_dates
+
+    @staticmethod
+    def sum_by_pricing_policy(counts, objects_ids) -> dict:
+        """
+        :return: {pricing_policy_id: count of records of the objects}
+        """
+        objects_ids = set(objects_ids)
+        result = defaultdict(int)
+        for (object_id, pricing_policy_id), total in counts.items():
+            if object_id in objects_ids:
+                result[pricing_policy_id] += total
+
+        return result
+
+    def _on_change(self, sender, **kwargs):
+        self.invalidate()
+
+    def connect(self):
+        dispatch_uid = f"stats_coverage_{self.name}"
+        post_save.connect(self._on_change, sender=self.model, dispatch_uid=dispatch_uid)
+        post_delete.connect(self._on_change, sender=self.model, dispatch_uid=dispatch_uid)
+
+
+price_coverage = HistoryCoverage(PriceHistory, "instrument")
+fx_coverage = HistoryCoverage(CurrencyHistory, "currency")
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+
+from django.test import override_settings
+
+from poms.api.coverage import HistoryCoverage, price_coverage
+from poms.common.common_base_test import BaseTestCase
+from poms.instruments.models import Instrument, PriceHistory
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HistoryCoverageTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.instrument = Instrument.objects.first()
+        self.pricing_policy = self.create_pricing_policy()
+        self.date_from = date(2024, 1, 1)
+
+    def create_price(self, day):
+        return PriceHistory.objects.create(
+            instrument=self.instrument,
+            pricing_policy=self.pricing_policy,
+            date=day,
+            principal_price=1,
+            accrued_price=0,
+        )
+
+    def test__counts_and_last_date(self):
+        self.create_price(self.date_from - timedelta(days=1))
+        self.create_price(self.date_from)
+        self.create_price(self.date_from + timedelta(days=1))
+
+        counts, last_dates = price_coverage.get(self.date_from)
+
+        self.assertEqual(counts[(self.instrument.id, self.pricing_policy.id)], 2)
+        self.assertEqual(last_dates[self.instrument.id], self.date_from + timedelta(days=1))
+
+    def test__saved_price_invalidates_cache(self):
+        self.create_price(self.date_from)
+        counts, _ = price_coverage.get(self.date_from)
+        self.assertEqual(counts[(self.instrument.id, self.pricing_policy.id)], 1)
+
+        self.create_price(self.date_from + timedelta(days=3))
+
+        counts, last_dates = price_coverage.get(self.date_from)
+        self.assertEqual(counts[(self.instrument.id, self.pricing_policy.id)], 2)
+        self.assertEqual(last_dates[self.instrument.id], self.date_from + timedelta(days=3))
+
+    def test__sum_by_pricing_policy(self):
+        counts = {(1, 10): 3, (2, 10): 4, (2, 20): 5, (3, 10): 7}
+
+        self.assertEqual(
+            HistoryCoverage.sum_by_pricing_policy(counts, [1, 2]),
+            {10: 7, 20: 5},
+        )
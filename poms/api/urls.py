@@ -264,6 +264,11 @@ router.register(
     common.DebugLogViewSet,
     "debug_log",
 )
+router.register(
+    "debug/profiling",
+    common.ProfilingViewSet,
+    "debug_profiling",
+)
 router.register("credentials/credentials", credentials.CredentialsViewSet, "Credentials")
 router.register(
     "integrations/data-provider",
@@ -23,6 +23,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from poms.api.coverage import HistoryCoverage, fx_coverage, price_coverage
 from poms.api.serializers import (
     CalcPeriodDateSerializer,
     EmailSerializer,
@@ -49,7 +50,7 @@ from poms.common.utils import (
 )
 from poms.common.views import AbstractViewSet
 from poms.currencies.models import Currency
-from poms.instruments.models import Instrument, PriceHistory, PricingPolicy
+from poms.instruments.models import Instrument, PricingPolicy
 from poms.integrations.tasks import send_mail
 from poms.schedules.models import ScheduleInstance
 from poms.vault.vault import FinmarsVault
@@ -162,37 +163,36 @@ class StatsViewSet(AbstractViewSet):
 
         return result
 
-    def get_price_history_section(self, portfolio, portfolio_stats, instruments_ids):
-        from poms.instruments.models import Instrument
+    def get_history_coverage_section(self, portfolio_stats, objects, counts, last_dates, names):
+        """
+        Expected vs. present history records of the objects for every pricing policy
+
+        :param objects: list of dicts with id, user_code, name
+        :param counts: {(object_id, pricing_policy_id): count} from HistoryCoverage
+        :param last_dates: {object_id: last date} from HistoryCoverage
+        :param names: keys of the result, they differ for prices and fx rates
+        """
+        days_count = len(self.days_from_first_transaction)
+        bdays_count = len(self.bdays_from_first_transaction)
+        objects_count = len(objects)
 
-        total_pricing_policies = PricingPolicy.objects.count()  # noqa: F841
+        by_pricing_policy = HistoryCoverage.sum_by_pricing_policy(counts, [obj["id"] for obj in objects])
 
         result = {"filled_items": 0, "items_to_fill": 0}
 
         pricing_policies = []
 
-        instruments_count = Instrument.objects.filter(id__in=instruments_ids).count()
+        for pricing_policy in self.pricing_policies:
+            histories_count = by_pricing_policy.get(pricing_policy.id, 0)
 
-        for pricing_policy in PricingPolicy.objects.all():
             pricing_policy_result = {
-                "expecting_histories": len(self.days_from_first_transaction) * instruments_count,
-                "expecting_bdays_histories": len(self.bdays_from_first_transaction) * instruments_count,
-                "price_histories": PriceHistory.objects.filter(
-                    date__gte=self.date_from,
-                    pricing_policy=pricing_policy,
-                    instrument_id__in=instruments_ids,
-                ).count(),
+                "expecting_histories": days_count * objects_count,
+                "expecting_bdays_histories": bdays_count * objects_count,
+                names["histories"]: histories_count,
             }
 
             try:
-                pricing_policy_result["filled_percent"] = round(
-                    PriceHistory.objects.filter(
-                        date__gte=self.date_from,
-                        pricing_policy=pricing_policy,
-                        instrument_id__in=instruments_ids,
-                    ).count()
-                    / (len(self.bdays_from_first_transaction) * instruments_count / 100)
-                )
+                pricing_policy_result["filled_percent"] = round(histories_count / (bdays_count * objects_count / 100))
             except Exception:
                 pricing_policy_result["filled_percent"] = 0
 
@@ -202,52 +202,22 @@ class StatsViewSet(AbstractViewSet):
                 "user_code": pricing_policy.user_code,
             }
 
-            instruments = []
-
-            for instrument in Instrument.objects.filter(id__in=instruments_ids):
-                instrument_result = {}
-
-                instrument_result["instrument"] = {
-                    "id": instrument.id,
-                    "user_code": instrument.user_code,
-                    "name": instrument.name,
+            pricing_policy_result[names["objects"]] = [
+                {
+                    names["object"]: obj,
+                    names["expecting"]: days_count,
+                    names["expecting_bdays"]: bdays_count,
+                    names["values"]: counts.get((obj["id"], pricing_policy.id), 0),
+                    names["last_date"]: last_dates.get(obj["id"]),
                 }
-                instrument_result["expecting_prices"] = len(self.days_from_first_transaction)
-                instrument_result["expecting_bdays_prices"] = len(self.bdays_from_first_transaction)
-                instrument_result["prices"] = PriceHistory.objects.filter(
-                    instrument=instrument,
-                    date__gte=self.date_from,
-                    pricing_policy=pricing_policy,
-                ).count()
-
-                try:
-                    instrument_result["last_price_date"] = (
-                        PriceHistory.objects.filter(instrument=instrument, date__gte=self.date_from)
-                        .order_by("-date")[0]
-                        .date
-                    )
-                except Exception:
-                    instrument_result["last_price_date"] = None
-
-                instruments.append(instrument_result)
-
-            pricing_policy_result["instruments"] = instruments
-
-            # Price History stats
-
-            result["filled_items"] = result["filled_items"] + pricing_policy_result["price_histories"]
-            result["items_to_fill"] = result["items_to_fill"] + (
-                len(self.bdays_from_first_transaction) * instruments_count
-            )
+                for obj in objects
+            ]
 
-            # Portfolio stats
+            result["filled_items"] = result["filled_items"] + histories_count
+            result["items_to_fill"] = result["items_to_fill"] + bdays_count * objects_count
 
-            portfolio_stats["filled_items"] = (
-                portfolio_stats["filled_items"] + pricing_policy_result["price_histories"]
-            )
-            portfolio_stats["items_to_fill"] = portfolio_stats["items_to_fill"] + (
-                len(self.bdays_from_first_transaction) * instruments_count
-            )
+            portfolio_stats["filled_items"] = portfolio_stats["filled_items"] + histories_count
+            portfolio_stats["items_to_fill"] = portfolio_stats["items_to_fill"] + bdays_count * objects_count
 
             pricing_policies.append(pricing_policy_result)
 
@@ -259,102 +229,41 @@ class StatsViewSet(AbstractViewSet):
 
         return result
 
-    def get_currency_history_section(self, portfolio, portfolio_stats, currencies_ids):
-        from poms.currencies.models import Currency, CurrencyHistory
-
-        total_pricing_policies = PricingPolicy.objects.count()  # noqa: F841
-
-        result = {"filled_items": 0, "items_to_fill": 0}
-
-        pricing_policies = []
-
-        for pricing_policy in PricingPolicy.objects.all():
-            currencies_count = Currency.objects.filter(id__in=currencies_ids).count()
-
-            pricing_policy_result = {
-                "expecting_histories": len(self.days_from_first_transaction) * currencies_count,
-                "expecting_bdays_histories": len(self.bdays_from_first_transaction) * currencies_count,
-                "currency_histories": CurrencyHistory.objects.filter(
-                    date__gte=self.date_from,
-                    pricing_policy=pricing_policy,
-                    currency_id__in=currencies_ids,
-                ).count(),
-            }
-
-            try:
-                pricing_policy_result["filled_percent"] = round(
-                    CurrencyHistory.objects.filter(
-                        date__gte=self.date_from,
-                        pricing_policy=pricing_policy,
-                        currency_id__in=currencies_ids,
-                    ).count()
-                    / (len(self.bdays_from_first_transaction) * currencies_count / 100)
-                )
-            except Exception:
-                pricing_policy_result["filled_percent"] = 0
-
-            pricing_policy_result["pricing_policy"] = {
-                "id": pricing_policy.id,
-                "name": pricing_policy.name,
-                "user_code": pricing_policy.user_code,
-            }
-
-            currencies = []
-
-            for currency in Currency.objects.filter(id__in=currencies_ids):
-                currency_result = {}
-
-                currency_result["currency"] = {
-                    "id": currency.id,
-                    "user_code": currency.user_code,
-                    "name": currency.name,
-                }
-                currency_result["expecting_fxrates"] = len(self.days_from_first_transaction)
-                currency_result["expecting_bdays_fxrates"] = len(self.bdays_from_first_transaction)
-                currency_result["fxrates"] = CurrencyHistory.objects.filter(
-                    currency=currency,
-                    date__gte=self.date_from,
-                    pricing_policy=pricing_policy,
-                ).count()
-
-                try:
-                    currency_result["last_fxrate_date"] = (
-                        CurrencyHistory.objects.filter(currency=currency, date__gte=self.date_from)
-                        .order_by("-date")[0]
-                        .date
-                    )
-                except Exception:
-                    currency_result["last_fxrate_date"] = None
-
-                currencies.append(currency_result)
-
-            pricing_policy_result["currencies"] = currencies
-
-            # Currency history stat
-
-            result["filled_items"] = result["filled_items"] + pricing_policy_result["currency_histories"]
-            result["items_to_fill"] = result["items_to_fill"] + (
-                len(self.bdays_from_first_transaction) * currencies_count
-            )
-
-            # Portfolio stat
-
-            portfolio_stats["filled_items"] = (
-                portfolio_stats["filled_items"] + pricing_policy_result["currency_histories"]
-            )
-            portfolio_stats["items_to_fill"] = portfolio_stats["items_to_fill"] + (
-                len(self.bdays_from_first_transaction) * currencies_count
-            )
-
-            pricing_policies.append(pricing_policy_result)
-
-        result["pricing_policies"] = pricing_policies
-        try:
-            result["filled_percent"] = round(result["filled_items"] / (result["items_to_fill"] / 100))
-        except Exception:
-            result["filled_percent"] = 0
+    def get_price_history_section(self, portfolio, portfolio_stats, instruments_ids):
+        instruments = list(Instrument.objects.filter(id__in=instruments_ids).values("id", "user_code", "name"))
+
+        return self.get_history_coverage_section(
+            portfolio_stats,
+            instruments,
+            *self.price_coverage,
+            names={
+                "histories": "price_histories",
+                "objects": "instruments",
+                "object": "instrument",
+                "expecting": "expecting_prices",
+                "expecting_bdays": "expecting_bdays_prices",
+                "values": "prices",
+                "last_date": "last_price_date",
+            },
+        )
 
-        return result
+    def get_currency_history_section(self, portfolio, portfolio_stats, currencies_ids):
+        currencies = list(Currency.objects.filter(id__in=currencies_ids).values("id", "user_code", "name"))
+
+        return self.get_history_coverage_section(
+            portfolio_stats,
+            currencies,
+            *self.fx_coverage,
+            names={
+                "histories": "currency_histories",
+                "objects": "currencies",
+                "object": "currency",
+                "expecting": "expecting_fxrates",
+                "expecting_bdays": "expecting_bdays_fxrates",
+                "values": "fxrates",
+                "last_date": "last_fxrate_date",
+            },
+        )
 
     def get_nav_history_section(self, portfolio, portfolio_stats):
         from poms.widgets.models import BalanceReportHistory
@@ -462,6 +371,9 @@ class StatsViewSet(AbstractViewSet):
             self.bdays_from_first_transaction = get_list_of_business_days_between_two_dates(
                 self.date_from, self.date_to
             )
+            self.pricing_policies = list(PricingPolicy.objects.all())
+            self.price_coverage = price_coverage.get(self.date_from)
+            self.fx_coverage = fx_coverage.get(self.date_from)
 
             from poms.portfolios.models import Portfolio
             from poms.transactions.models import Transaction
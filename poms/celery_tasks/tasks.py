@@ -2,6 +2,7 @@ import contextlib
 import logging
 import traceback
 from datetime import UTC, datetime, timedelta
+from itertools import groupby
 
 from celery.utils.log import get_task_logger
 from django.contrib.contenttypes.models import ContentType
@@ -237,50 +238,110 @@ def bulk_restore(self, task_id, *args, **kwargs):
         celery_task.save()
 
 
-def import_item(item, context):
-    from poms.common.utils import get_content_type_by_name, get_serializer
-    from poms.transactions.handlers import TransactionTypeProcess
+def get_complex_transaction_booking(item):
+    """
+    TransactionTypeProcess kwargs of the complex transaction item
+    """
+    from poms.common.utils import get_content_type_by_name
+
+    values = {}
+
+    for input in item["inputs"]:
+        if input["value_type"] == 10:
+            values[input["transaction_type_input"]] = input["value_string"]
+
+        elif input["value_type"] == 20:
+            values[input["transaction_type_input"]] = input["value_float"]
+
+        elif input["value_type"] == 40:
+            values[input["transaction_type_input"]] = input["value_date"]
+
+        elif input["value_type"] == 110:
+            values[input["transaction_type_input"]] = input["value_string"]
+
+        elif input["value_type"] == 100:
+            content_type_key = input["content_type"]
+
+            content_type = get_content_type_by_name(content_type_key)
+            with contextlib.suppress(Exception):
+                values[input["transaction_type_input"]] = content_type.model_class().objects.get(
+                    user_code=input["value_relation"]
+                )
+
+    return {"default_values": values, "source": item["source"]}
+
+
+def import_complex_transactions(items, context) -> list:
+    """
+    Books complex transaction items of one transaction type together,
+    returns the exception of every failed item, None for booked ones
+    """
+    from poms.transactions.handlers import TransactionTypeBulkProcess
     from poms.transactions.models import TransactionType
 
-    meta = item.get("meta", None)
+    try:
+        transaction_type = TransactionType.objects.get(user_code=items[0]["transaction_type"])
+    except Exception as e:
+        return [e] * len(items)
 
-    if not meta:
-        raise ValueError("Meta is not found. Could not process JSON")
+    errors = [None] * len(items)
+    bookings = []
+    booked_indexes = []
 
-    if meta["content_type"] == "transactions.complextransaction":
-        transaction_type = TransactionType.objects.get(user_code=item["transaction_type"])
+    for index, item in enumerate(items):
+        try:
+            bookings.append(get_complex_transaction_booking(item))
+            booked_indexes.append(index)
+        except Exception as e:
+            errors[index] = e
+
+    results = TransactionTypeBulkProcess(
+        transaction_type,
+        bookings,
+        context=context,
+        member=context["member"],
+        linked_import_task=context.get("task"),
+    ).process()
+
+    for index, result in zip(booked_indexes, results, strict=True):
+        if isinstance(result, Exception):
+            errors[index] = result
 
-        values = {}
+    return errors
 
-        for input in item["inputs"]:
-            if input["value_type"] == 10:
-                values[input["transaction_type_input"]] = input["value_string"]
 
-            elif input["value_type"] == 20:
-                values[input["transaction_type_input"]] = input["value_float"]
+def get_import_group(indexed_item):
+    """
+    Consecutive complex transactions of the same transaction type are imported together
+    """
+    _, item = indexed_item
+    meta = item.get("meta", None)
 
-            elif input["value_type"] == 40:
-                values[input["transaction_type_input"]] = input["value_date"]
+    if meta and meta.get("content_type") == "transactions.complextransaction":
+        return item.get("transaction_type")
 
-            elif input["value_type"] == 110:
-                values[input["transaction_type_input"]] = input["value_string"]
+    return None
 
-            elif input["value_type"] == 100:
-                content_type_key = input["content_type"]
 
-                content_type = get_content_type_by_name(content_type_key)
-                with contextlib.suppress(Exception):
-                    values[input["transaction_type_input"]] = content_type.model_class().objects.get(
-                        user_code=input["value_relation"]
-                    )
+def import_item(item, context):
+    from poms.common.utils import get_serializer
+    from poms.transactions.handlers import TransactionTypeProcess
+    from poms.transactions.models import TransactionType
+
+    meta = item.get("meta", None)
+
+    if not meta:
+        raise ValueError("Meta is not found. Could not process JSON")
+
+    if meta["content_type"] == "transactions.complextransaction":
+        transaction_type = TransactionType.objects.get(user_code=item["transaction_type"])
 
         process_instance = TransactionTypeProcess(
             transaction_type=transaction_type,
-            default_values=values,
             context=context,
             member=context["member"],
-            source=item["source"],
             linked_import_task=context.get("task"),
+            **get_complex_transaction_booking(item),
         )
         process_instance.process()
 
@@ -320,14 +381,27 @@ def universal_input(self, task_id, *args, **kwargs):
         if isinstance(data, dict):
             data = [data]
 
-        for i, item in enumerate(data, start=1):
-            try:
-                import_item(item, context)
-                result[str(i)] = {"status": "success"}
-
-            except Exception as e:
-                result[str(i)] = {"status": "error", "error_message": str(e)}
+        for transaction_type, grouped in groupby(enumerate(data, start=1), key=get_import_group):
+            group = list(grouped)
 
+            if transaction_type:
+                errors = import_complex_transactions([item for _, item in group], context)
+            else:
+                errors = []
+                for _, item in group:
+                    try:
+                        import_item(item, context)
+                        errors.append(None)
+                    except Exception as e:
+                        errors.append(e)
+
+            for (i, _), error in zip(group, errors, strict=True):
+                if error is None:
+                    result[str(i)] = {"status": "success"}
+                else:
+                    result[str(i)] = {"status": "error", "error_message": str(error)}
+
+            i = group[-1][0]
             celery_task.update_progress(
                 {
                     "current": i,
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.celery_tasks.tasks import get_import_group, import_complex_transactions
+from poms.transactions.models import TransactionType
+
+COMPLEX_TRANSACTION = {"content_type": "transactions.complextransaction"}
+
+
+def get_item(amount, transaction_type="buy"):
+    return {
+        "meta": COMPLEX_TRANSACTION,
+        "transaction_type": transaction_type,
+        "source": {"row": amount},
+        "inputs": [{"transaction_type_input": "amount", "value_type": 20, "value_float": amount}],
+    }
+
+
+class ImportComplexTransactionsTest(SimpleTestCase):
+    def test__group_by_transaction_type(self):
+        self.assertEqual(get_import_group((1, get_item(1))), "buy")
+        self.assertIsNone(get_import_group((2, {"meta": {"content_type": "portfolios.portfolio"}})))
+        self.assertIsNone(get_import_group((3, {})))
+
+    def test__items_are_booked_together(self):
+        error = ValueError("negative amount")
+        broken = {"meta": COMPLEX_TRANSACTION, "transaction_type": "buy", "source": {}}
+        context = {"member": mock.Mock(), "task": mock.Mock()}
+
+        with (
+            mock.patch.object(TransactionType.objects, "get") as get_transaction_type,
+            mock.patch("poms.transactions.handlers.TransactionTypeBulkProcess") as bulk_process,
+        ):
+            bulk_process.return_value.process.return_value = [mock.Mock(), error]
+            errors = import_complex_transactions([get_item(1), broken, get_item(-1)], context)
+
+        get_transaction_type.assert_called_once_with(user_code="buy")
+        transaction_type, bookings = bulk_process.call_args.args
+        self.assertEqual(
+            bookings,
+            [
+                {"default_values": {"amount": 1}, "source": {"row": 1}},
+                {"default_values": {"amount": -1}, "source": {"row": -1}},
+            ],
+        )
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], KeyError)
+        self.assertIs(errors[2], error)
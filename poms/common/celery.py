@@ -3,9 +3,10 @@ from threading import local
 
 from celery.signals import task_postrun, task_prerun
 from django.db import DatabaseError, InterfaceError, connection
-from django_celery_beat.schedulers import DatabaseScheduler
+from django_celery_beat.schedulers import DatabaseScheduler, ModelEntry
 
-from poms.common.db import get_all_tenant_schemas
+from poms.common import profiling  # noqa: F401, connects profiling of tasks
+from poms.common.db import get_current_schema, set_search_path, tenant_schema_registry
 
 celery_state = local()
 
@@ -69,26 +70,12 @@ def cancel_existing_procedures(celery_app):
     _l.info(f"Canceled {len(procedures)} procedures ")
 
 
-def schema_exists(schema_name):
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT schema_name
-            FROM information_schema.schemata
-            WHERE schema_name = %s;
-        """,
-            [schema_name],
-        )
-        return cursor.fetchone() is not None
-
-
 def set_schema_from_context(context):
     if context:
         if context.get("space_code"):
-            if schema_exists(space_code := context.get("space_code")):
+            if tenant_schema_registry.exists(space_code := context.get("space_code")):
                 # space_code = context.get('space_code')
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {space_code};")
+                set_search_path(space_code)
 
             else:
                 raise Exception("No space_code in database schemas")
@@ -113,10 +100,9 @@ def set_task_context(task_id, task, kwargs=None, **unused):
         if context.get("space_code"):
             space_code = context.get("space_code")
 
-            if schema_exists(space_code):
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {space_code};")
-                    _l.info(f"task_prerun.context {space_code}")
+            if tenant_schema_registry.exists(space_code):
+                set_search_path(space_code)
+                _l.info(f"task_prerun.context {space_code}")
             else:
                 raise Exception("No scheme in database")
         else:
@@ -142,43 +128,149 @@ def cleanup(task_id, **kwargs):
     #     cursor.execute("SET search_path TO public;")
 
 
+BEAT_CHANGES_TABLE = "django_celery_beat_periodictasks"
+
+
+def get_beat_schemas():
+    """
+    Returns tenant schemas that have periodic tasks tables
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT table_schema
+            FROM information_schema.tables
+            WHERE table_name = %s
+            AND table_schema <> 'public'
+            """,
+            [BEAT_CHANGES_TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_last_changes(schemas):
+    """
+    Returns last change of periodic tasks of every schema, all schemas are checked in one query
+    """
+    if not schemas:
+        return {}
+
+    quote_name = connection.ops.quote_name
+    sql = " UNION ALL ".join(
+        f"SELECT %s, MAX(last_update) FROM {quote_name(schema)}.{BEAT_CHANGES_TABLE}" for schema in schemas
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(schemas))
+        return dict(cursor.fetchall())
+
+
+class SpaceModelEntry(ModelEntry):
+    """
+    Periodic task of a space, the task is read and saved in the schema of that space
+    """
+
+    def __init__(self, model, app=None, space_code=None):
+        self.space_code = space_code or get_current_schema()
+        # entry may disable and save the model right in __init__
+        set_search_path(self.space_code)
+        super().__init__(model, app=app)
+        # the same name can be used by periodic tasks of different spaces
+        self.name = f"{self.space_code}:{model.name}"
+
+    def is_due(self):
+        set_search_path(self.space_code)
+        return super().is_due()
+
+    def __next__(self):
+        self.model.last_run_at = self._default_now()
+        self.model.total_run_count += 1
+        self.model.no_changes = True
+        return self.__class__(self.model, app=self.app, space_code=self.space_code)
+
+    next = __next__
+
+    def save(self):
+        set_search_path(self.space_code)
+        super().save()
+
+
 class PerSpaceDatabaseScheduler(DatabaseScheduler):
-    def all_as_schedule(self):
-        _l.debug("DatabaseScheduler: Fetching database schedule")
-        schemas = get_all_tenant_schemas()
+    """
+    Beat scheduler over periodic tasks of all spaces.
+
+    Changes of all spaces are checked with one query on every tick,
+    only spaces with changed periodic tasks are read again.
+    """
+
+    Entry = SpaceModelEntry
+
+    _last_changes = None
+    _changed_schemas = None
+
+    def get_space_schedule(self, space_code):
+        set_search_path(space_code)
         s = {}
-        for schema in schemas:
-            set_schema_from_context({"space_code": schema})
-            for model in self.Model.objects.enabled():
-                try:  # noqa: SIM105
-                    s[model.name] = self.Entry(model, app=self.app)
-                except ValueError:
-                    pass
+        for model in self.Model.objects.enabled():
+            try:
+                entry = self.Entry(model, app=self.app, space_code=space_code)
+            except ValueError:
+                continue
+            s[entry.name] = entry
         return s
 
-    def schedule_changed(self):
-        last = self._last_timestamp
-        ts = None
+    def all_as_schedule(self):
+        changed_schemas, self._changed_schemas = self._changed_schemas, None
+
+        if changed_schemas is None:
+            _l.debug("DatabaseScheduler: Fetching database schedule")
+            self._last_changes = get_last_changes(get_beat_schemas())
+            schemas = list(self._last_changes)
+            s = {}
+        else:
+            _l.debug("DatabaseScheduler: Fetching database schedule of %s", sorted(changed_schemas))
+            schemas = [schema for schema in changed_schemas if schema in self._last_changes]
+            s = {
+                name: entry
+                for name, entry in (self._schedule or {}).items()
+                if getattr(entry, "space_code", None) not in changed_schemas
+            }
 
-        schemas = get_all_tenant_schemas()
         for schema in schemas:
-            set_schema_from_context({"space_code": schema})
-            try:
-                last_change_in_schema = self.Changes.last_change()
-                if last_change_in_schema:
-                    if ts:
-                        ts = max(ts, last_change_in_schema)
-                    else:
-                        ts = last_change_in_schema
-            except DatabaseError as exc:
-                _l.exception("Database gave error: %r", exc)
-                return False
-            except InterfaceError:
-                _l.warning("DatabaseScheduler: InterfaceError in schedule_changed(), waiting to retry in next call...")
-                return False
+            s.update(self.get_space_schedule(schema))
+        return s
+
+    def schedule_changed(self):
         try:
-            if ts and ts > (last if last else ts):
-                return True
-        finally:
-            self._last_timestamp = ts
-        return False
+            changes = get_last_changes(get_beat_schemas())
+        except DatabaseError as exc:
+            _l.exception("Database gave error: %r", exc)
+            return False
+        except InterfaceError:
+            _l.warning("DatabaseScheduler: InterfaceError in schedule_changed(), waiting to retry in next call...")
+            return False
+
+        last, self._last_changes = self._last_changes, changes
+        if last is None:
+            return False
+
+        # new, removed and updated schemas
+        changed_schemas = {schema for schema, _ in changes.items() ^ last.items()}
+        if not changed_schemas:
+            return False
+
+        _l.info("DatabaseScheduler: schedule changed in %s", sorted(changed_schemas))
+        self._changed_schemas = changed_schemas
+        return True
+
+    def update_from_dict(self, mapping):
+        # entries are kept by the name with space_code, not by the name of the mapping
+        s = {}
+        for name, entry_fields in mapping.items():
+            try:
+                entry = self.Entry.from_entry(name, app=self.app, **entry_fields)
+                if entry.model.enabled:
+                    s[entry.name] = entry
+            except Exception as exc:
+                _l.exception("Couldn't add entry %r to database schedule: %r. Contents: %r", name, exc, entry_fields)
+        self.schedule.update(s)
@@ -0,0 +1,236 @@
+"""
+Chunked AES-GCM format (version 2) of files in the storage:
+
+    header: magic "FMENC", version, plaintext chunk size, 7 bytes random nonce prefix
+    chunks: AES-GCM(chunk) + 16 bytes tag, one per chunk_size bytes of plaintext
+
+Chunk nonce is nonce prefix + chunk number + final flag, header is the associated data
+of every chunk. So chunks can't be reordered or mixed between files, and the final
+flag of the last chunk detects truncation. Empty file is one empty final chunk.
+
+Legacy format (version 1) is a single AES-GCM message: 12 bytes nonce + ciphertext + tag.
+"""
+
+import io
+import math
+import os
+import struct
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+MAGIC = b"FMENC"
+VERSION = 2
+HEADER = struct.Struct(">5sBI7s")
+NONCE_SUFFIX = struct.Struct(">I?")
+NONCE_PREFIX_SIZE = 7
+LEGACY_NONCE_SIZE = 12
+TAG_SIZE = 16
+MAX_CHUNKS = 2**32
+
+
+def read_exactly(file, size: int) -> bytes:
+    """
+    Reads size bytes, less only at the end of file
+    """
+    parts = []
+    while size > 0:
+        data = file.read(size)
+        if not data:
+            break
+        parts.append(data)
+        size -= len(data)
+
+    return b"".join(parts)
+
+
+def get_encrypted_size(size: int, chunk_size: int) -> int:
+    """
+    Size of the encrypted content of size bytes: header and a tag per chunk
+    """
+    chunks = max(math.ceil(size / chunk_size), 1)
+    return HEADER.size + size + chunks * TAG_SIZE
+
+
+def get_nonce(nonce_prefix: bytes, counter: int, final: bool) -> bytes:
+    if counter >= MAX_CHUNKS:
+        raise ValueError("file is too large for the chunk size")
+
+    return nonce_prefix + NONCE_SUFFIX.pack(counter, final)
+
+
+class AESGCMStreamBase(io.RawIOBase):
+    def __init__(self, source, key: bytes):
+        super().__init__()
+        self.source = source
+        self.aesgcm = AESGCM(key)
+        self._reset()
+
+    def _reset(self):
+        self._buffer = b""
+        self._position = 0
+        self._started = False
+        self._finished = False
+
+    def _next_block(self) -> bytes:
+        raise NotImplementedError
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        source_seekable = getattr(self.source, "seekable", None)
+        return bool(source_seekable and source_seekable())
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._finished:
+            self._buffer = self._next_block()
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        self._position += size
+        return size
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        """
+        Only rewinding to the start is supported, backends call seek(0) before upload
+        """
+        if whence != io.SEEK_SET or offset != 0:
+            raise io.UnsupportedOperation("only seek(0) is supported")
+
+        if self._position or self._started:
+            if not self.seekable():
+                raise io.UnsupportedOperation("source stream is not seekable")
+            self.source.seek(0)
+            self._reset()
+
+        return 0
+
+
+class EncryptingReader(AESGCMStreamBase):
+    """
+    Readable stream of the encrypted content of the source file
+    """
+
+    def __init__(self, source, key: bytes, chunk_size: int):
+        self.chunk_size = chunk_size
+        self._size = None
+        super().__init__(source, key)
+
+    def __len__(self) -> int:
+        """
+        Size of the encrypted content, backends use it as the upload content length
+        (e.g. Azure can't upload a seekable stream of unknown length)
+        """
+        if self._size is None:
+            self._size = get_encrypted_size(self._get_source_size(), self.chunk_size)
+
+        return self._size
+
+    def __bool__(self):
+        # __len__ must not be used for truth testing, it reads the size of the source
+        return True
+
+    def _get_source_size(self) -> int:
+        size = getattr(self.source, "size", None)
+        if size is not None:
+            return size
+
+        if not self.seekable():
+            raise TypeError("size of the source stream is unknown")
+
+        position = self.source.tell()
+        size = self.source.seek(0, io.SEEK_END)
+        self.source.seek(position)
+        return size
+
+    def _reset(self):
+        super()._reset()
+        self._header = None
+        self._counter = 0
+        self._next_chunk = b""
+
+    def _next_block(self) -> bytes:
+        if not self._started:
+            self._started = True
+            nonce_prefix = os.urandom(NONCE_PREFIX_SIZE)
+            self._header = HEADER.pack(MAGIC, VERSION, self.chunk_size, nonce_prefix)
+            self._next_chunk = read_exactly(self.source, self.chunk_size)
+            return self._header
+
+        # one chunk is read ahead to know if the current one is the last
+        chunk = self._next_chunk
+        self._next_chunk = read_exactly(self.source, self.chunk_size) if len(chunk) == self.chunk_size else b""
+        final = not self._next_chunk
+
+        nonce = get_nonce(self._header[-NONCE_PREFIX_SIZE:], self._counter, final)
+        self._counter += 1
+        self._finished = final
+
+        return self.aesgcm.encrypt(nonce, chunk, self._header)
+
+
+class DecryptingReader(AESGCMStreamBase):
+    """
+    Readable stream of the decrypted content of the source file, reads both
+    chunked and legacy formats. Raises cryptography.exceptions.InvalidTag
+    if the content was modified or truncated.
+    """
+
+    def _reset(self):
+        super()._reset()
+        self.is_legacy = False
+        self._header = None
+        self._block_size = None
+        self._counter = 0
+        self._next_block_data = b""
+
+    def _start(self) -> bytes:
+        self._started = True
+        header = read_exactly(self.source, HEADER.size)
+        magic, version, chunk_size, nonce_prefix = (
+            HEADER.unpack(header) if len(header) == HEADER.size else (None, None, None, None)
+        )
+
+        if magic != MAGIC or version != VERSION:
+            self.is_legacy = True
+            self._finished = True
+            encrypted_data = header + self.source.read()
+            nonce = encrypted_data[:LEGACY_NONCE_SIZE]
+            return self.aesgcm.decrypt(nonce, encrypted_data[LEGACY_NONCE_SIZE:], None)
+
+        self._header = header
+        self._block_size = chunk_size + TAG_SIZE
+        self._next_block_data = read_exactly(self.source, self._block_size)
+        return b""
+
+    def _next_block(self) -> bytes:
+        if not self._started:
+            return self._start()
+
+        block = self._next_block_data
+        self._next_block_data = read_exactly(self.source, self._block_size) if len(block) == self._block_size else b""
+        final = not self._next_block_data
+
+        nonce = get_nonce(self._header[-NONCE_PREFIX_SIZE:], self._counter, final)
+        self._counter += 1
+        self._finished = final
+
+        return self.aesgcm.decrypt(nonce, block, self._header)
+
+    def get_size(self, encrypted_size: int) -> int:
+        """
+        Plaintext size calculated from the size of the encrypted file
+        """
+        if not self._started:
+            self._buffer = self._start()
+
+        if self.is_legacy:
+            return encrypted_size - LEGACY_NONCE_SIZE - TAG_SIZE
+
+        content_size = encrypted_size - HEADER.size
+        chunks = max(math.ceil(content_size / self._block_size), 1)
+        return content_size - chunks * TAG_SIZE
@@ -1,5 +1,14 @@
+import logging
+import time
+from threading import RLock, local
+
+from django.conf import settings
 from django.db import connection
 
+_l = logging.getLogger("poms.common")
+
+PUBLIC_SCHEMA = "public"
+
 
 def get_all_tenant_schemas():
     # List to hold tenant schemas
@@ -20,3 +29,184 @@ def get_all_tenant_schemas():
         tenant_schemas = [row[0] for row in cursor.fetchall()]
 
     return tenant_schemas
+
+
+def schema_exists(schema_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT schema_name
+            FROM information_schema.schemata
+            WHERE schema_name = %s;
+            """,
+            [schema_name],
+        )
+        return cursor.fetchone() is not None
+
+
+class TenantSchemaRegistry:
+    """
+    Process-local set of existing tenant schemas.
+
+    The full list is loaded with one query and kept for TENANT_SCHEMA_CACHE_TTL seconds.
+    A schema that is not in the list is checked in the database, so a freshly
+    created space is visible at once, even before invalidate() is called.
+    Only existing schemas are remembered, missing ones are always re-checked.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._schemas = set()
+        self._loaded_at = None
+        self._lock = RLock()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "TENANT_SCHEMA_CACHE_TTL", 300)
+
+    def _is_expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self):
+        self._schemas = set(get_all_tenant_schemas())
+        self._loaded_at = time.monotonic()
+
+    def exists(self, schema_name):
+        if not schema_name:
+            return False
+
+        with self._lock:
+            if self._is_expired():
+                self._load()
+
+            if schema_name in self._schemas:
+                return True
+
+            if schema_exists(schema_name):
+                self._schemas.add(schema_name)
+                return True
+
+        return False
+
+    def add(self, schema_name):
+        with self._lock:
+            self._schemas.add(schema_name)
+
+    def invalidate(self, schema_name=None):
+        """
+        Forget the schema list (or a single schema), next exists() goes to the database
+        """
+        with self._lock:
+            if schema_name is None:
+                self._schemas = set()
+                self._loaded_at = None
+            else:
+                self._schemas.discard(schema_name)
+
+
+tenant_schema_registry = TenantSchemaRegistry()
+
+
+class SchemaPartitionedCache:
+    """
+    Replacement for ContentTypeManager._cache that keeps a separate cache per schema.
+
+    Every schema has its own django_content_type table, so ids cached for one
+    space must never be returned for another one. The active partition is
+    thread-local and follows set_search_path().
+    """
+
+    def __init__(self):
+        self._partitions = {}
+        self._local = local()
+
+    @property
+    def schema(self):
+        return getattr(self._local, "schema", PUBLIC_SCHEMA)
+
+    @schema.setter
+    def schema(self, schema_name):
+        self._local.schema = schema_name
+
+    def _current(self):
+        return self._partitions.setdefault(self.schema, {})
+
+    def __getitem__(self, key):
+        return self._current()[key]
+
+    def __setitem__(self, key, value):
+        self._current()[key] = value
+
+    def __contains__(self, key):
+        return key in self._current()
+
+    def get(self, key, default=None):
+        return self._current().get(key, default)
+
+    def setdefault(self, key, default=None):
+        return self._current().setdefault(key, default)
+
+    def clear(self):
+        # clear_cache() is called on migrate and test flush, drop every schema
+        self._partitions.clear()
+
+
+def activate_content_type_cache(schema_name):
+    from django.contrib.contenttypes.models import ContentType
+
+    manager = ContentType.objects
+    if not isinstance(manager._cache, SchemaPartitionedCache):
+        manager._cache = SchemaPartitionedCache()
+
+    manager._cache.schema = schema_name
+
+
+def get_search_path():
+    """
+    Returns search_path that was set on the current DB connection by set_search_path(),
+    None if it is unknown (e.g. connection was reopened)
+    """
+    state = getattr(connection, "_finmars_search_path", None)
+    if state is None:
+        return None
+
+    raw_connection, schema_name = state
+    if raw_connection is None or raw_connection is not connection.connection:
+        return None
+
+    return schema_name
+
+
+def set_search_path(schema_name, force=False):
+    """
+    Switches current connection to the schema and activates ContentType cache of that schema.
+    SET search_path is skipped if the connection is already on the schema.
+    """
+    activate_content_type_cache(schema_name)
+
+    if not force and get_search_path() == schema_name:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {schema_name};")
+
+    if connection.in_atomic_block:
+        # SET is rolled back together with the transaction, do not trust it later
+        connection._finmars_search_path = None
+    else:
+        connection._finmars_search_path = (connection.connection, schema_name)
+
+
+def get_current_schema():
+    """
+    Returns schema of the current connection, without a query if it was set by set_search_path()
+    """
+    schema_name = get_search_path()
+    if schema_name is not None:
+        return schema_name
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT current_schema();")
+        return cursor.fetchone()[0]
@@ -24,14 +24,35 @@ class HttpClient:
         self,
         max_timeout=settings.FINMARS_DATABASE_TIMEOUT,
         max_retries=settings.FINMARS_DATABASE_RETRIES,
+        backoff_factor=settings.FINMARS_DATABASE_SLEEP,
+        pool_maxsize=10,
+        retry_statuses=None,
     ):
+        """
+        :param pool_maxsize: number of kept-alive connections, set it to the number
+            of threads that share the client
+        :param retry_statuses: response codes that are retried for any method, use only codes
+            meaning the request was not processed (e.g. 503). Read errors are not retried then,
+            the server may have processed a POST. By default only connection errors are retried
+        """
         self.max_timeout = max_timeout
+        retry_kwargs = {}
+        if retry_statuses:
+            retry_kwargs = {
+                "status_forcelist": retry_statuses,
+                "allowed_methods": None,
+                "read": 0,
+                "raise_on_status": False,
+            }
         self.retries = Retry(
             total=max_retries,
-            backoff_factor=settings.FINMARS_DATABASE_SLEEP,
+            backoff_factor=backoff_factor,
+            **retry_kwargs,
         )
+        adapter = HTTPAdapter(max_retries=self.retries, pool_maxsize=pool_maxsize)
         self.session = requests.Session()
-        self.session.mount("https://", HTTPAdapter(max_retries=self.retries))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def _fetch_response(self, method, url, **kwargs) -> dict:
         if not url:
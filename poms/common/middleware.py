@@ -9,7 +9,6 @@ from threading import local
 
 from django.conf import settings
 from django.contrib.gis.geoip2 import GeoIP2
-from django.db import connection
 from django.http.response import JsonResponse
 from django.utils.cache import add_never_cache_headers, get_max_age, patch_cache_control
 from django.utils.deprecation import MiddlewareMixin
@@ -25,6 +24,8 @@ from rest_framework.exceptions import (
     PermissionDenied,
 )
 
+from . import profiling
+from .db import PUBLIC_SCHEMA, set_search_path, tenant_schema_registry
 from .keycloak import KeycloakConnect
 
 _l = logging.getLogger("poms.common")
@@ -314,6 +315,33 @@ class MemoryMiddleware:
         return response
 
 
+class ProfilingMiddleware:
+    """
+    Profiles sampled requests, see poms.common.profiling.
+    Must be placed after RealmAndSpaceMiddleware in MIDDLEWARE list.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = profiling.start("request", f"{request.method} {request.path_info}", request.space_code)
+        if profile is None:
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+        finally:
+            resolver_match = getattr(request, "resolver_match", None)
+            if resolver_match is not None:
+                # the route groups requests to the same view, path has ids in it
+                profile.name = f"{request.method} {resolver_match.route}"
+            profiling.finish(profile)
+
+        response["X-Query-Count"] = profile.query_count
+        return response
+
+
 class ResponseTimeMiddleware(MiddlewareMixin):
     def process_request(self, request):
         request.start_time = time.time()
@@ -330,19 +358,6 @@ class ResponseTimeMiddleware(MiddlewareMixin):
         return response
 
 
-def schema_exists(schema_name):
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT schema_name
-            FROM information_schema.schemata
-            WHERE schema_name = %s;
-            """,
-            [schema_name],
-        )
-        return cursor.fetchone() is not None
-
-
 # Very Important Middleware
 # It sets the PostgreSQL search path to the tenant's schema
 # Do not modify this code
@@ -352,8 +367,6 @@ class RealmAndSpaceMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        from django.contrib.contenttypes.models import ContentType
-
         # Example URL pattern: /realm0abcd/space0xyzv/
 
         request.realm_code = None
@@ -365,30 +378,25 @@ class RealmAndSpaceMiddleware:
             request.realm_code = path_parts[1]
             request.space_code = path_parts[2]
 
-            if not schema_exists(request.space_code):
+            if not tenant_schema_registry.exists(request.space_code):
                 # Uncomment in 1.9.0 when there is no more legacy Spaces
                 # Handle the error (e.g., log it, return a 400 Bad Request, etc.)
                 # For demonstration, returning a simple HttpResponseBadRequest
                 # return HttpResponseBadRequest("Invalid space code.")
 
-                with connection.cursor() as cursor:
-                    cursor.execute("SET search_path TO public;")
+                set_search_path(PUBLIC_SCHEMA)
 
             else:  # REMOVE IN 1.9.0, PROBABLY SECURITY ISSUE
                 # Setting the PostgreSQL search path to the tenant's schema
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {request.space_code};")
-
-            # fix PLAT-1001: cache might return data from another schema, clear it
-            ContentType.objects.clear_cache()
+                # fix PLAT-1001: ContentType cache is partitioned per schema by set_search_path
+                set_search_path(request.space_code)
 
         else:
             # If we do not have realm_code, we suppose its legacy Space which do not need scheme changing
             request.space_code = path_parts[1]
 
             # Remain in public scheme
-            with connection.cursor() as cursor:
-                cursor.execute("SET search_path TO public;")
+            set_search_path(PUBLIC_SCHEMA)
 
         response = self.get_response(request)
 
@@ -397,10 +405,9 @@ class RealmAndSpaceMiddleware:
             if "location" in response:
                 response["location"] = response["location"].replace("spacexxxxx", request.space_code)
 
-        # Optionally, reset the search path to default after the request is processed
-        # This can be important in preventing "leakage" of the schema setting across requests
-        with connection.cursor() as cursor:
-            cursor.execute("SET search_path TO public;")
+        # search_path is not reset to public after the request anymore:
+        # every request passes this middleware and sets its own schema first,
+        # so pooled connection keeps the schema and the next request to the same space skips SET
 
         return response
 
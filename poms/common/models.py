@@ -1,9 +1,18 @@
+import copy
 import logging
+import time
+from collections import OrderedDict
+from functools import partial
+from threading import Lock, local
 
+from celery.signals import task_prerun
+from django.conf import settings
 from django.core.cache import cache
-from django.db import models
+from django.core.signals import request_started
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy
 
+from poms.common.db import get_current_schema
 from poms.common.middleware import get_request
 from poms.currencies.constants import DASH
 from poms.expressions_engine import formula
@@ -458,12 +467,88 @@ class ObjectStateModel(models.Model):
 
 
 # ^_^ Cache ^_^ #
+class LocalCache:
+    """
+    Per-process LRU cache of instances, every entry is stored with the version of its model
+    and expires after CACHE_L1_TIMEOUT seconds.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            obj, entry_version, expires_at = entry
+            if entry_version != version or expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return obj
+
+    def set(self, key, obj, version):
+        with self._lock:
+            self._entries[key] = (obj, version, time.monotonic() + settings.CACHE_L1_TIMEOUT)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > settings.CACHE_L1_MAX_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache()
+
+# versions read from redis as {key: (version, read_at)}, kept until the end of the current
+# request or task and at most CACHE_VERSION_TIMEOUT seconds
+_versions_scope = local()
+
+
+def get_initial_version() -> int:
+    return time.time_ns() // 1000
+
+
+def reset_cache_versions(**kwargs):
+    _versions_scope.versions = {}
+
+
+request_started.connect(reset_cache_versions, dispatch_uid="reset_cache_versions_on_request")
+task_prerun.connect(reset_cache_versions, dispatch_uid="reset_cache_versions_on_task")
+
+
+def copy_instance(obj):
+    """
+    Copy of the cached instance for one thread, with its own _state and fields_cache,
+    copy.copy shares them, so related objects set in one thread would appear in others
+    """
+    result = copy.copy(obj)
+    result._state = copy.copy(obj._state)
+    result._state.fields_cache = dict(obj._state.fields_cache)
+    return result
+
+
 class BaseCacheManager(models.Manager):
     """
     Base cache manager for processing the logic of caching model instances by ID.
     Override `_get_identifier_from_obj` and `_get_obj_from_db` for custom behavior.
     This manager should be used in the `CacheModel`.
-    Attention! Global responsibility, not linked to space_code.
+
+    Instances are cached in redis and in the per-process `local_cache`. Keys are scoped
+    by the schema and the version of the model in that schema, the version is bumped
+    on every save or delete, so other processes never read a stale instance. The version
+    is read from redis once per request or task and again after CACHE_VERSION_TIMEOUT
+    seconds, other reads are dict lookups.
     """
 
     def _get_identifier_from_obj(cls, obj):
@@ -478,14 +563,67 @@ class BaseCacheManager(models.Manager):
         """
         return self.model.objects.get(pk=pk)
 
+    def get_version_key(self):
+        app_label = self.model._meta.app_label
+        model_name = self.model._meta.model_name
+
+        return f"{get_current_schema()}_{app_label}_{model_name}_version"
+
+    def get_version(self) -> int | None:
+        """
+        Version of the model in the current schema, None if redis is not available
+        """
+        key = self.get_version_key()
+
+        versions = getattr(_versions_scope, "versions", None)
+        if versions is None:
+            versions = _versions_scope.versions = {}
+
+        now = time.monotonic()
+        version, read_at = versions.get(key, (None, None))
+        if version is None or now - read_at > settings.CACHE_VERSION_TIMEOUT:
+            try:
+                version = cache.get_or_set(key, get_initial_version, timeout=None)
+            except Exception:
+                _l.exception("cache version of %s is not available", key)
+                return None
+
+            versions[key] = (version, now)
+
+        return version
+
+    def bump_version(self):
+        key = self.get_version_key()
+
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            # no version yet or it was evicted, a new one never repeats the previous ones
+            cache.add(key, get_initial_version(), timeout=None)
+            version = cache.get(key)
+        except Exception:
+            _l.exception("cache version of %s is not bumped", key)
+            return
+
+        versions = getattr(_versions_scope, "versions", None)
+        if versions is not None:
+            versions[key] = (version, time.monotonic())
+
     def get_cache_key(self, pk):
         app_label = self.model._meta.app_label
         model_name = self.model._meta.model_name
 
-        return f"{app_label}_{model_name}_{pk}"
+        return f"{get_current_schema()}_{app_label}_{model_name}_{pk}_v{self.get_version()}"
 
     def get_cache(self, pk):
         key = self.get_cache_key(pk)
+        version = self.get_version()
+
+        obj = local_cache.get(key, version) if version is not None else None
+        if obj is not None:
+            # instances are shared by the threads of the process
+            return copy_instance(obj)
+
         try:
             obj = cache.get(key)
             if obj is None:  # Cache miss
@@ -494,6 +632,9 @@ class BaseCacheManager(models.Manager):
             # Log the error if needed
             obj = self._get_obj_from_db(pk)  # Fetch from DB
             self.set_cache(obj)  # Store in cache again
+        else:
+            if version is not None:
+                local_cache.set(key, copy_instance(obj), version)
         return obj
 
     def set_cache(self, obj):
@@ -501,10 +642,16 @@ class BaseCacheManager(models.Manager):
         key = self.get_cache_key(identifier)
         cache.set(key, obj, timeout=obj.cache_timeout)
 
+        version = self.get_version()
+        if version is not None:
+            local_cache.set(key, copy_instance(obj), version)
+
     def delete_cache(self, obj):
         identifier = self._get_identifier_from_obj(obj)
         key = self.get_cache_key(identifier)
         cache.delete(key)
+        local_cache.delete(key)
+        self.bump_version()
 
 
 class CacheByMasterUserManager(BaseCacheManager):
@@ -552,10 +699,13 @@ class CacheModel(models.Model):
     def save(self, *args, **kwargs):
         self.__class__.cache.delete_cache(self)
         super().save(*args, **kwargs)
+        # instances read by other processes before the commit are cached with the old version
+        transaction.on_commit(partial(self.__class__.cache.delete_cache, self))
 
     def delete(self, *args, **kwargs):
         self.__class__.cache.delete_cache(self)
         super().delete(*args, **kwargs)
+        transaction.on_commit(self.__class__.cache.bump_version)
 
 
 # These models need to create custom context, that could be passed to serializers
@@ -4,7 +4,8 @@ import time
 
 from django.core.paginator import InvalidPage
 from rest_framework.exceptions import NotFound
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
 
 _l = logging.getLogger("poms.common")
 
@@ -76,6 +77,42 @@ class PageNumberPaginationExt(PageNumberPagination):
         return res
 
 
+class KeysetPagination(BasePagination):
+    """
+    Pages of the queryset by id, newest first. The next page is requested with ?before=<next_before>,
+    it is an index range scan of the primary key, there is no count and offset.
+    """
+
+    page_size = 40
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            page_size = _positive_int(
+                request.query_params.get("page_size", self.page_size),
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except ValueError:
+            page_size = self.page_size
+
+        before = request.query_params.get("before")
+        if before and before.isdigit():
+            queryset = queryset.filter(id__lt=int(before))
+
+        page = list(queryset.order_by("-id")[: page_size + 1])
+        self.next_before = page[page_size - 1].id if len(page) > page_size else None
+        return page[:page_size]
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next_before": self.next_before,
+                "results": data,
+            }
+        )
+
+
 class BigPagination(PageNumberPagination):
     page_size_query_param = "page_size"
     max_page_size = sys.maxsize
@@ -0,0 +1,283 @@
+"""
+Sampled profiling of requests and celery tasks.
+
+A profile counts the SQL queries of the request/task through an execute wrapper
+of the connection, groups them by normalized fingerprint (slowest statements and
+repeated ones, usually N+1), and sums time of the sections wrapped in track(),
+e.g. expressions and serialization. Finished profiles are logged as one JSON line
+to "poms.profiling" and optionally kept in a per-space ring buffer in the cache.
+
+Profiling is off unless PROFILING_ENABLED, then every space is sampled with
+PROFILING_SAMPLE_RATE, the rate and the ring buffer are set per space by
+set_space_config() (debug/profiling endpoint).
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from threading import local
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.timezone import now
+
+_l = logging.getLogger("poms.profiling")
+
+_state = local()
+
+CONFIG_KEY = "profiling:config:{space_code}"
+PROFILES_KEY = "profiling:profiles:{space_code}"
+PROFILES_TIMEOUT = 24 * 60 * 60
+
+# config of the space is read from the cache at most once per CONFIG_TTL seconds in a process
+CONFIG_TTL = 30
+_configs = {}
+
+SQL_MAX_LENGTH = 2000
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s|\$\d+")
+LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+ARRAY_RE = re.compile(r"ARRAY\[\s*\?(?:\s*,\s*\?)*\s*\]", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """
+    Query with literals and placeholders replaced by ?, lists of values collapsed,
+    so the same statement with other values has the same text
+    """
+    sql = STRING_RE.sub("?", sql)
+    sql = PLACEHOLDER_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql)
+    sql = LIST_RE.sub("(...)", sql)
+    sql = ARRAY_RE.sub("ARRAY[...]", sql)
+    return WHITESPACE_RE.sub(" ", sql).strip()
+
+
+@functools.lru_cache(maxsize=2048)
+def get_fingerprint(sql: str) -> str:
+    return hashlib.md5(normalize_sql(sql).encode(), usedforsecurity=False).hexdigest()[:12]
+
+
+class Profile:
+    def __init__(self, kind: str, name: str, space_code: str | None):
+        self.kind = kind
+        self.name = name
+        self.space_code = space_code
+        self.started_at = now()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.query_count = 0
+        self.db_time = 0.0
+        self.statements = {}
+        self.sections = defaultdict(float)
+        self.depth = defaultdict(int)
+        self.exit_stack = ExitStack()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add_query(sql, time.perf_counter() - start)
+
+    def add_query(self, sql: str, duration: float):
+        self.query_count += 1
+        self.db_time += duration
+
+        fingerprint = get_fingerprint(sql)
+        stats = self.statements.get(fingerprint)
+        if stats is None:
+            stats = self.statements[fingerprint] = {
+                "fingerprint": fingerprint,
+                "sql": normalize_sql(sql)[:SQL_MAX_LENGTH],
+                "count": 0,
+                "time": 0.0,
+                "max_time": 0.0,
+            }
+
+        stats["count"] += 1
+        stats["time"] += duration
+        stats["max_time"] = max(stats["max_time"], duration)
+
+    def get_slowest(self) -> list[dict]:
+        statements = sorted(self.statements.values(), key=lambda s: s["max_time"], reverse=True)
+        return [format_statement(s) for s in statements[: settings.PROFILING_SLOWEST_QUERIES]]
+
+    def get_duplicates(self) -> list[dict]:
+        statements = [s for s in self.statements.values() if s["count"] >= settings.PROFILING_DUPLICATE_THRESHOLD]
+        statements.sort(key=lambda s: s["count"], reverse=True)
+        return [format_statement(s) for s in statements]
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "space_code": self.space_code,
+            "started_at": self.started_at.isoformat(),
+            "duration": round_ms(self.duration),
+            "query_count": self.query_count,
+            "db_time": round_ms(self.db_time),
+            "sections": {section: round_ms(value) for section, value in self.sections.items()},
+            "slowest": self.get_slowest(),
+            "duplicates": self.get_duplicates(),
+        }
+
+
+def round_ms(value: float | None) -> float | None:
+    """
+    Seconds to milliseconds
+    """
+    return None if value is None else round(value * 1000, 3)
+
+
+def format_statement(stats: dict) -> dict:
+    return {
+        **stats,
+        "time": round_ms(stats["time"]),
+        "max_time": round_ms(stats["max_time"]),
+    }
+
+
+def get_default_config() -> dict:
+    return {
+        "enabled": True,
+        "sample_rate": settings.PROFILING_SAMPLE_RATE,
+        "ring_buffer": False,
+    }
+
+
+def get_space_config(space_code: str | None) -> dict:
+    cached = _configs.get(space_code)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    config = get_default_config()
+    try:
+        config.update(cache.get(CONFIG_KEY.format(space_code=space_code)) or {})
+    except Exception as e:
+        # profiling must not break the request
+        _l.warning("get_space_config: cache is not available %s", repr(e))
+
+    _configs[space_code] = (time.monotonic() + CONFIG_TTL, config)
+    return config
+
+
+def set_space_config(space_code: str, **config) -> dict:
+    config = {**get_space_config(space_code), **config}
+    cache.set(CONFIG_KEY.format(space_code=space_code), config, timeout=None)
+    _configs.pop(space_code, None)
+    return config
+
+
+def should_profile(space_code: str | None) -> bool:
+    if not settings.PROFILING_ENABLED:
+        return False
+
+    config = get_space_config(space_code)
+    return config["enabled"] and random.random() < config["sample_rate"]
+
+
+def get_active_profile() -> Profile | None:
+    return getattr(_state, "profile", None)
+
+
+def start(kind: str, name: str, space_code: str | None) -> Profile | None:
+    """
+    Starts the profile of the current thread if the space is sampled
+    """
+    if get_active_profile() is not None or not should_profile(space_code):
+        return None
+
+    profile = Profile(kind, name, space_code)
+    profile.exit_stack.enter_context(connection.execute_wrapper(profile.execute_wrapper))
+    _state.profile = profile
+    return profile
+
+
+def finish(profile: Profile) -> dict:
+    profile.duration = time.perf_counter() - profile.start
+    profile.exit_stack.close()
+    _state.profile = None
+
+    data = profile.to_dict()
+    _l.info("profile %s", json.dumps(data, default=str))
+
+    try:
+        if get_space_config(profile.space_code)["ring_buffer"]:
+            add_to_ring_buffer(profile.space_code, data)
+    except Exception as e:
+        _l.warning("finish: profile is not saved %s", repr(e))
+
+    return data
+
+
+@contextmanager
+def track(section: str):
+    """
+    Adds time of the block to the section of the active profile,
+    nested blocks of the same section are counted once
+    """
+    profile = get_active_profile()
+    if profile is None or profile.depth[section]:
+        yield
+        return
+
+    profile.depth[section] += 1
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[section] += time.perf_counter() - start_time
+        profile.depth[section] -= 1
+
+
+def tracked(section: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(section):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_to_ring_buffer(space_code: str | None, data: dict):
+    key = PROFILES_KEY.format(space_code=space_code)
+    profiles = cache.get(key) or []
+    profiles.append(data)
+    cache.set(key, profiles[-settings.PROFILING_RING_BUFFER_SIZE :], timeout=PROFILES_TIMEOUT)
+
+
+def get_ring_buffer(space_code: str | None) -> list[dict]:
+    return cache.get(PROFILES_KEY.format(space_code=space_code)) or []
+
+
+def clear_ring_buffer(space_code: str | None):
+    cache.delete(PROFILES_KEY.format(space_code=space_code))
+
+
+@task_prerun.connect
+def start_task_profile(task_id, task, kwargs=None, **unused):
+    context = (kwargs or {}).get("context") or {}
+    start("task", task.name, context.get("space_code"))
+
+
+@task_postrun.connect
+def finish_task_profile(task_id, task, **unused):
+    profile = get_active_profile()
+    if profile is not None and profile.kind == "task":
+        finish(profile)
@@ -8,6 +8,8 @@ from json.encoder import (
 from rest_framework.renderers import JSONRenderer
 from rest_framework.utils.encoders import JSONEncoder
 
+from poms.common import profiling
+
 
 class CustomJSONEncoder(JSONEncoder):
     def iterencode(self, o, _one_shot=False):
@@ -84,3 +86,7 @@ class CustomJSONEncoder(JSONEncoder):
 
 class FinmarsJSONRenderer(JSONRenderer):
     encoder_class = CustomJSONEncoder
+
+    @profiling.tracked("serialization")
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context)
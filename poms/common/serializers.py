@@ -182,6 +182,12 @@ class RealmMigrateSchemeSerializer(serializers.Serializer):
     space_code = serializers.CharField(required=True)
 
 
+class ProfilingConfigSerializer(serializers.Serializer):
+    enabled = serializers.BooleanField(required=False)
+    sample_rate = serializers.FloatField(required=False, min_value=0, max_value=1)
+    ring_buffer = serializers.BooleanField(required=False)
+
+
 class ModelWithObjectStateSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
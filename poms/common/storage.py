@@ -1,4 +1,5 @@
 import contextlib
+import io
 import logging
 import math
 import os
@@ -9,13 +10,15 @@ from io import BytesIO
 from typing import Any
 from zipfile import ZipFile
 
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from django.core.files.base import ContentFile, File
+from django.core.files.base import File
 from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
 from storages.backends.azure_storage import AzureStorage
 from storages.backends.s3boto3 import S3Boto3Storage
 from storages.backends.sftpstorage import SFTPStorage
+from storages.utils import clean_name, is_seekable
 
+from poms.common.crypto.AESGCMStream import DecryptingReader, EncryptingReader
 from poms_app import settings
 
 _l = logging.getLogger("poms.common")
@@ -59,6 +62,34 @@ class NamedBytesIO(BytesIO):
         self.name = name
 
 
+class DecryptedFile(File):
+    def __init__(self, decrypted_stream, encrypted_file):
+        self.decrypted_stream = decrypted_stream
+        self.encrypted_file = encrypted_file
+        super().__init__(io.BufferedReader(decrypted_stream), name=encrypted_file.name)
+
+    @cached_property
+    def size(self):
+        return self.decrypted_stream.get_size(self.encrypted_file.size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # random access (e.g. ZipFile) needs the whole content, it is spooled to a temporary file
+        if isinstance(self.file, io.BufferedReader) and (offset, whence) != (0, io.SEEK_SET):
+            position = self.file.tell()
+            self.file.seek(0)
+            spooled_file = tempfile.SpooledTemporaryFile(max_size=settings.STORAGE_ENCRYPTION_CHUNK_SIZE * 8)  # noqa: SIM115
+            shutil.copyfileobj(self.file, spooled_file)
+            self.file.close()
+            self.file = spooled_file
+            self.file.seek(position)
+
+        return self.file.seek(offset, whence)
+
+    def close(self):
+        super().close()
+        self.encrypted_file.close()
+
+
 class EncryptedStorageMixin:
     def get_symmetric_key(self):
         if settings.ENCRYPTION_KEY:
@@ -81,45 +112,23 @@ class EncryptedStorageMixin:
         pass
 
     def _encrypt_file(self, file):
-        # Encrypt the file content using the symmetric key
-        file_content = file.read()
-
-        # Generate a random nonce
-        # You can generate a random nonce using os.urandom(12) for AES-256-GCM.
-        # The recommended length for the nonce in AES-GCM is 12 bytes (96 bits).
-        # Ensure that you securely store and associate the nonce with the encrypted data
-        # so that you can use the same nonce during decryption.
-        nonce = os.urandom(12)
-
-        aesgcm = AESGCM(self.symmetric_key)
-        encrypted_content = aesgcm.encrypt(nonce, file_content, None)
+        """
+        Returns stream of the encrypted content, the file is read chunk by chunk
+        while the backend uploads it (see poms.common.crypto.AESGCMStream)
+        """
+        if is_seekable(file):
+            file.seek(0)
 
-        encrypted_data = nonce + encrypted_content
+        encrypted_stream = EncryptingReader(file, self.symmetric_key, settings.STORAGE_ENCRYPTION_CHUNK_SIZE)
 
-        return ContentFile(encrypted_data)
+        return File(encrypted_stream, name=getattr(file, "name", None))
 
     def _decrypt_file(self, file):
-        # Decrypt the file content using the symmetric key
-
-        encrypted_data = file.read()
-
-        # Generate a random nonce
-        # You can generate a random nonce using os.urandom(12) for AES-256-GCM.
-        # The recommended length for the nonce in AES-GCM is 12 bytes (96 bits).
-        # Ensure that you securely store and associate the nonce with the encrypted data
-        # so that you can use the same nonce during decryption.
-        # Extract the nonce from the encrypted data
-        nonce = encrypted_data[:12]
-
-        ciphertext = encrypted_data[12:]
-
-        aesgcm = AESGCM(self.symmetric_key)
-        decrypted_content = aesgcm.decrypt(nonce, ciphertext, None)
-
-        # Create a ContentFile with the decrypted content
-        decrypted_file = ContentFile(decrypted_content)
-
-        return File(decrypted_file, name=file.name)
+        """
+        Returns file which decrypts content of the stored file while it is read,
+        files encrypted as a single block (legacy format) are decrypted at once
+        """
+        return DecryptedFile(DecryptingReader(file, self.symmetric_key), encrypted_file=file)
 
     def open_skip_decrypt(self, name, mode="rb"):
         return super()._open(name, mode)
@@ -145,6 +154,9 @@ class FinmarsStorageMixin(EncryptedStorageMixin):
     To ensure that storage overwrite passed filepath instead of appending a number to it
     """
 
+    # listdir_with_sizes can be called from several threads on one instance
+    concurrent_listing = True
+
     def save(self, name, content, max_length=None):
         """
         Save new content to the file specified by name. The content should be
@@ -172,6 +184,14 @@ class FinmarsStorageMixin(EncryptedStorageMixin):
     def convert_size(size_bytes: int) -> str:
         return pretty_size(size_bytes)
 
+    def listdir_with_sizes(self, path: str) -> tuple[list[str], dict[str, int]]:
+        """
+        Like listdir, but returns files as {name: size}. Backends that get sizes
+        from the listing itself override it, here size() is called per file.
+        """
+        directories, files = self.listdir(path)
+        return directories, {name: self.size(os.path.join(path, name)) for name in files}
+
     def folder_exists_and_has_files(self, folder_path):
         # Ensure the folder path ends with a '/'
         if not folder_path.endswith("/"):
@@ -322,6 +342,9 @@ class FinmarsStorageFileObjMixin(FinmarsStorageMixin):
 
 
 class FinmarsSFTPStorage(FinmarsStorageFileObjMixin, SFTPStorage):
+    # all calls go through one paramiko SFTP client, which is not thread-safe
+    concurrent_listing = False
+
     def delete_directory(self, directory_path):
         for root, _, files in self.sftp_client.walk(directory_path):
             for file in files:
@@ -411,6 +434,22 @@ class FinmarsS3Storage(FinmarsStorageFileObjMixin, S3Boto3Storage):
     def get_created_time(self, path):
         return self.get_modified_time(path)
 
+    def listdir_with_sizes(self, path: str) -> tuple[list[str], dict[str, int]]:
+        prefix = self._normalize_name(clean_name(path))
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+
+        directories, files = [], {}
+        # connection is thread-local, so the method can be called from worker threads
+        paginator = self.connection.meta.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Delimiter="/", Prefix=prefix):
+            directories += [entry["Prefix"][len(prefix) :].rstrip("/") for entry in page.get("CommonPrefixes", ())]
+            for entry in page.get("Contents", ()):
+                if entry["Key"] != prefix:
+                    files[entry["Key"][len(prefix) :]] = entry["Size"]
+
+        return directories, files
+
     def delete_directory(self, directory_path):
         objects_to_delete = [{"Key": obj.key} for obj in self.bucket.objects.filter(Prefix=directory_path)]
 
@@ -522,6 +561,16 @@ class FinmarsLocalFileSystemStorage(FinmarsStorageFileObjMixin, FileSystemStorag
                     files.append(entry.name)
         return directories, files
 
+    def listdir_with_sizes(self, path: str) -> tuple[list[str], dict[str, int]]:
+        directories, files = [], {}
+        with os.scandir(self.path(path)) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.append(entry.name)
+                else:
+                    files[entry.name] = entry.stat().st_size
+        return directories, files
+
     def delete_directory(self, directory_path):
         shutil.rmtree(os.path.join(settings.MEDIA_ROOT, directory_path))
 
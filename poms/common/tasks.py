@@ -3,15 +3,17 @@ from io import StringIO
 
 from celery import shared_task
 from django.core.management import call_command
-from django.db import connection
+
+from poms.common.db import set_search_path, tenant_schema_registry
 
 _l = logging.getLogger("poms.common")
 
 
 @shared_task(bind=True)
 def apply_migration_to_space(self, realm_code, space_code):
-    with connection.cursor() as cursor:
-        cursor.execute(f"SET search_path TO {space_code};")
+    # new space, its schema may not be known to this process yet
+    tenant_schema_registry.invalidate()
+    set_search_path(space_code, force=True)
 
     # Create StringIO buffers to capture the output
     out_buffer = StringIO()
@@ -0,0 +1,84 @@
+from datetime import UTC, datetime
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.common import celery as poms_celery
+from poms.common.celery import PerSpaceDatabaseScheduler, get_last_changes
+
+T1 = datetime(2024, 1, 1, tzinfo=UTC)
+T2 = datetime(2024, 1, 2, tzinfo=UTC)
+
+
+class GetLastChangesTest(SimpleTestCase):
+    def test__one_query_for_all_schemas(self):
+        with mock.patch.object(poms_celery, "connection") as connection:
+            connection.ops.quote_name = lambda name: f'"{name}"'
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = [("space00000", T1), ("space11111", None)]
+
+            changes = get_last_changes(["space00000", "space11111"])
+
+        cursor.execute.assert_called_once()
+        sql, params = cursor.execute.call_args.args
+        self.assertEqual(sql.count("UNION ALL"), 1)
+        self.assertIn('"space11111".django_celery_beat_periodictasks', sql)
+        self.assertEqual(params, ["space00000", "space11111"])
+        self.assertEqual(changes, {"space00000": T1, "space11111": None})
+
+    def test__no_schemas(self):
+        with mock.patch.object(poms_celery, "connection") as connection:
+            self.assertEqual(get_last_changes([]), {})
+
+        connection.cursor.assert_not_called()
+
+
+class PerSpaceDatabaseSchedulerTest(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = PerSpaceDatabaseScheduler.__new__(PerSpaceDatabaseScheduler)
+        self.scheduler._schedule = None
+
+        patcher = mock.patch.object(poms_celery, "get_beat_schemas", return_value=["space00000", "space11111"])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.loaded = []
+        patcher = mock.patch.object(PerSpaceDatabaseScheduler, "get_space_schedule", side_effect=self.get_schedule)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_schedule(self, space_code):
+        self.loaded.append(space_code)
+        return {f"{space_code}:task": mock.Mock(space_code=space_code, version=len(self.loaded))}
+
+    def set_changes(self, changes):
+        patcher = mock.patch.object(poms_celery, "get_last_changes", return_value=changes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test__only_changed_schemas_are_reloaded(self):
+        self.set_changes({"space00000": T1, "space11111": T1})
+        self.scheduler._schedule = self.scheduler.all_as_schedule()
+        self.assertEqual(self.loaded, ["space00000", "space11111"])
+
+        self.assertFalse(self.scheduler.schedule_changed())
+
+        self.set_changes({"space00000": T1, "space11111": T2})
+        self.assertTrue(self.scheduler.schedule_changed())
+        schedule = self.scheduler.all_as_schedule()
+
+        self.assertEqual(self.loaded, ["space00000", "space11111", "space11111"])
+        self.assertEqual(set(schedule), {"space00000:task", "space11111:task"})
+        self.assertEqual(schedule["space00000:task"].version, 1)
+        self.assertEqual(schedule["space11111:task"].version, 3)
+
+    def test__removed_schema_entries_are_dropped(self):
+        self.set_changes({"space00000": T1, "space11111": None})
+        self.scheduler._schedule = self.scheduler.all_as_schedule()
+
+        self.set_changes({"space00000": T1})
+        self.assertTrue(self.scheduler.schedule_changed())
+        schedule = self.scheduler.all_as_schedule()
+
+        self.assertEqual(list(schedule), ["space00000:task"])
+        self.assertEqual(self.loaded, ["space00000", "space11111"])
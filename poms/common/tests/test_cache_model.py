@@ -0,0 +1,126 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from poms.common import models as common_models
+from poms.common.models import LocalCache, reset_cache_versions
+from poms.users.models import EcosystemDefault, MasterUser
+
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "cache-model-tests",
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheManagerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        common_models.local_cache.clear()
+        reset_cache_versions()
+
+        patcher = mock.patch.object(common_models, "get_current_schema", return_value="space00000")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.ed = EcosystemDefault(id=1, master_user=MasterUser(id=7))
+        self.manager = EcosystemDefault.cache
+
+    def get_cache(self):
+        with (
+            mock.patch.object(type(self.manager), "_get_obj_from_db", return_value=self.ed) as from_db,
+            mock.patch.object(common_models.cache, "get", wraps=cache.get) as redis_get,
+        ):
+            obj = self.manager.get_cache(master_user_pk=7)
+
+        return obj, from_db.call_count, redis_get.call_count
+
+    def test__repeated_reads_are_local(self):
+        obj, from_db, _ = self.get_cache()
+        self.assertEqual(obj, self.ed)
+        self.assertEqual(from_db, 1)
+
+        obj, from_db, redis_get = self.get_cache()
+        self.assertEqual(obj, self.ed)
+        self.assertIsNot(obj, self.ed)
+        self.assertEqual((from_db, redis_get), (0, 0))
+
+    def test__version_bumped_by_other_process(self):
+        self.get_cache()
+
+        # save in another process, the version is read again in the next request
+        cache.incr(self.manager.get_version_key())
+        reset_cache_versions()
+
+        _, from_db, _ = self.get_cache()
+        self.assertEqual(from_db, 1)
+
+    def test__version_is_read_again_after_timeout(self):
+        self.get_cache()
+
+        # long task, the version bumped by another process is seen without a new request
+        cache.incr(self.manager.get_version_key())
+        _, from_db, _ = self.get_cache()
+        self.assertEqual(from_db, 0)
+
+        with override_settings(CACHE_VERSION_TIMEOUT=0):
+            _, from_db, _ = self.get_cache()
+        self.assertEqual(from_db, 1)
+
+    def test__copies_do_not_share_related_objects(self):
+        first, _, _ = self.get_cache()
+        second, _, _ = self.get_cache()
+
+        first.master_user = MasterUser(id=8)
+
+        self.assertIsNot(first._state.fields_cache, second._state.fields_cache)
+        self.assertEqual(second.master_user.id, 7)
+        third, _, _ = self.get_cache()
+        self.assertEqual(third.master_user.id, 7)
+
+    def test__delete_cache_bumps_version(self):
+        self.get_cache()
+        version = self.manager.get_version()
+
+        self.manager.delete_cache(self.ed)
+
+        self.assertGreater(self.manager.get_version(), version)
+        self.assertIsNone(cache.get(self.manager.get_cache_key(master_user_pk=7)))
+        _, from_db, _ = self.get_cache()
+        self.assertEqual(from_db, 1)
+
+    def test__keys_are_scoped_by_schema(self):
+        key = self.manager.get_cache_key(master_user_pk=7)
+
+        with mock.patch.object(common_models, "get_current_schema", return_value="space00001"):
+            self.assertNotEqual(self.manager.get_cache_key(master_user_pk=7), key)
+
+
+class LocalCacheTest(SimpleTestCase):
+    def test__size_is_bounded(self):
+        local_cache = LocalCache()
+
+        with override_settings(CACHE_L1_MAX_SIZE=2):
+            for key in ("a", "b", "c"):
+                local_cache.set(key, key.upper(), 1)
+
+        self.assertIsNone(local_cache.get("a", 1))
+        self.assertEqual(local_cache.get("c", 1), "C")
+
+    def test__entries_expire(self):
+        local_cache = LocalCache()
+
+        with override_settings(CACHE_L1_TIMEOUT=0):
+            local_cache.set("a", "A", 1)
+
+        self.assertIsNone(local_cache.get("a", 1))
+
+    def test__other_version_is_a_miss(self):
+        local_cache = LocalCache()
+        local_cache.set("a", "A", 1)
+
+        self.assertIsNone(local_cache.get("a", 2))
+        self.assertIsNone(local_cache.get("a", 1))
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+from zipfile import ZipFile
+
+from azure.storage.blob._shared.request_handlers import get_length
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from poms.common.crypto.AESGCMStream import HEADER, TAG_SIZE, DecryptingReader, EncryptingReader
+from poms.common.storage import FinmarsAzureStorage, FinmarsLocalFileSystemStorage
+
+KEY = bytes(range(32))
+CHUNK_SIZE = 64
+
+
+def encrypt(content: bytes, chunk_size: int = CHUNK_SIZE) -> bytes:
+    return EncryptingReader(BytesIO(content), KEY, chunk_size).read()
+
+
+def decrypt(encrypted: bytes) -> bytes:
+    return DecryptingReader(BytesIO(encrypted), KEY).read()
+
+
+class AESGCMStreamTest(SimpleTestCase):
+    def test__roundtrip(self):
+        for size in (0, 1, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1, 3 * CHUNK_SIZE, 5 * CHUNK_SIZE + 7):
+            with self.subTest(size=size):
+                content = os.urandom(size)
+                encrypted = encrypt(content)
+
+                chunks = max((size + CHUNK_SIZE - 1) // CHUNK_SIZE, 1)
+                self.assertEqual(len(encrypted), HEADER.size + size + chunks * TAG_SIZE)
+                self.assertEqual(decrypt(encrypted), content)
+
+                reader = DecryptingReader(BytesIO(encrypted), KEY)
+                self.assertEqual(reader.get_size(len(encrypted)), size)
+
+    def test__small_reads(self):
+        content = os.urandom(3 * CHUNK_SIZE + 5)
+        reader = DecryptingReader(BytesIO(encrypt(content)), KEY)
+
+        parts = []
+        while part := reader.read(7):
+            parts.append(part)
+
+        self.assertEqual(b"".join(parts), content)
+
+    def test__legacy_format(self):
+        content = os.urandom(100)
+        nonce = os.urandom(12)
+        legacy = nonce + AESGCM(KEY).encrypt(nonce, content, None)
+
+        reader = DecryptingReader(BytesIO(legacy), KEY)
+
+        self.assertEqual(reader.read(), content)
+        self.assertTrue(reader.is_legacy)
+        self.assertEqual(reader.get_size(len(legacy)), len(content))
+
+    def test__modified_content_is_detected(self):
+        encrypted = bytearray(encrypt(os.urandom(2 * CHUNK_SIZE)))
+        encrypted[HEADER.size + CHUNK_SIZE + TAG_SIZE + 3] ^= 1
+
+        with self.assertRaises(InvalidTag):
+            decrypt(bytes(encrypted))
+
+    def test__truncation_is_detected(self):
+        encrypted = encrypt(os.urandom(3 * CHUNK_SIZE))
+
+        with self.assertRaises(InvalidTag):
+            decrypt(encrypted[: HEADER.size + 2 * (CHUNK_SIZE + TAG_SIZE)])
+
+    def test__rewind(self):
+        content = os.urandom(2 * CHUNK_SIZE)
+        reader = EncryptingReader(BytesIO(content), KEY, CHUNK_SIZE)
+        reader.read(10)
+
+        reader.seek(0)
+
+        self.assertEqual(decrypt(reader.read()), content)
+
+    def test__len(self):
+        for size in (0, CHUNK_SIZE, 3 * CHUNK_SIZE + 5):
+            with self.subTest(size=size):
+                reader = EncryptingReader(BytesIO(os.urandom(size)), KEY, CHUNK_SIZE)
+
+                self.assertEqual(len(reader), len(reader.read()))
+
+
+class EncryptedLocalStorageTest(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(mock.patch("poms.common.storage.settings.MEDIA_ROOT", media_root))
+        self.enterContext(mock.patch("poms.common.storage.settings.SERVER_TYPE", "development"))
+        self.enterContext(mock.patch("poms.common.storage.settings.STORAGE_ENCRYPTION_CHUNK_SIZE", CHUNK_SIZE))
+        self.storage = FinmarsLocalFileSystemStorage(location=media_root)
+        self.storage.symmetric_key = KEY
+        self.name = "space00000/file.bin"
+
+    def test__file_is_stored_encrypted(self):
+        content = os.urandom(4 * CHUNK_SIZE + 1)
+
+        self.storage.save(self.name, ContentFile(content))
+
+        with self.storage.open_skip_decrypt(self.name) as raw_file:
+            self.assertNotEqual(raw_file.read(), content)
+
+        with self.storage.open(self.name) as file:
+            self.assertEqual(file.size, len(content))
+            self.assertEqual(file.read(), content)
+
+    def test__random_access(self):
+        zip_buffer = BytesIO()
+        with ZipFile(zip_buffer, "w") as zip_file:
+            zip_file.writestr("a.txt", os.urandom(3 * CHUNK_SIZE))
+            zip_file.writestr("b.txt", b"content")
+
+        self.storage.save(self.name, ContentFile(zip_buffer.getvalue()))
+
+        with self.storage.open(self.name) as file, ZipFile(file) as zip_file:
+            self.assertEqual(zip_file.read("b.txt"), b"content")
+
+
+class EncryptedAzureStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(mock.patch("poms.common.storage.settings.SERVER_TYPE", "development"))
+        self.enterContext(mock.patch("poms.common.storage.settings.STORAGE_ENCRYPTION_CHUNK_SIZE", CHUNK_SIZE))
+        self.client = mock.Mock()
+        self.client.upload_blob.side_effect = self.upload_blob
+        self.enterContext(mock.patch.object(FinmarsAzureStorage, "client", self.client))
+        self.storage = FinmarsAzureStorage(azure_container="test", account_name="test")
+        self.storage.symmetric_key = KEY
+        self.uploaded = {}
+
+    def upload_blob(self, name, data, **kwargs):
+        # the SDK can upload a seekable stream only if its length is known
+        length = get_length(data)
+        content = data.read()
+        self.assertEqual(length, len(content))
+        self.uploaded[name] = content
+
+    def test__encrypted_content_is_uploaded(self):
+        content = os.urandom(4 * CHUNK_SIZE + 1)
+
+        self.storage._save("space00000/file.bin", ContentFile(content))
+
+        self.assertEqual(decrypt(self.uploaded["space00000/file.bin"]), content)
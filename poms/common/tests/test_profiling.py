@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from poms.common import profiling
+
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "profiling-tests",
+    },
+}
+
+
+class NormalizeSqlTest(SimpleTestCase):
+    def test__literals_are_replaced(self):
+        self.assertEqual(
+            profiling.normalize_sql("SELECT * FROM t1 WHERE name = 'O''Neil' AND id = 15 AND x > -1.5"),
+            "SELECT * FROM t1 WHERE name = ? AND id = ? AND x > ?",
+        )
+
+    def test__lists_are_collapsed(self):
+        short = 'SELECT "id" FROM "instrument" WHERE "id" IN (%s, %s)'
+        long = 'SELECT "id" FROM "instrument" WHERE "id" IN (%s, %s, %s,\n %s)'
+
+        self.assertEqual(profiling.normalize_sql(long), 'SELECT "id" FROM "instrument" WHERE "id" IN (...)')
+        self.assertEqual(profiling.get_fingerprint(short), profiling.get_fingerprint(long))
+        self.assertEqual(profiling.normalize_sql("select ARRAY[1, 2, 3]::integer[]"), "select ARRAY[...]::integer[]")
+
+    def test__other_statements_have_other_fingerprints(self):
+        self.assertNotEqual(
+            profiling.get_fingerprint("SELECT * FROM a WHERE id = 1"),
+            profiling.get_fingerprint("SELECT * FROM b WHERE id = 1"),
+        )
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    PROFILING_ENABLED=True,
+    PROFILING_SAMPLE_RATE=1.0,
+    PROFILING_DUPLICATE_THRESHOLD=3,
+    PROFILING_SLOWEST_QUERIES=2,
+    PROFILING_RING_BUFFER_SIZE=2,
+)
+class ProfileTest(SimpleTestCase):
+    def setUp(self):
+        profiling._configs.clear()
+        self.addCleanup(profiling._configs.clear)
+
+    def execute_queries(self, profile, queries):
+        execute = mock.Mock(return_value=None)
+        for sql in queries:
+            profile.execute_wrapper(execute, sql, None, False, {})
+        return execute
+
+    def test__queries_are_counted_and_grouped(self):
+        profile = profiling.start("request", "GET /api/v1/instruments/", "space00000")
+
+        queries = [f"SELECT * FROM instrument WHERE id = {i}" for i in range(4)] + ["SELECT 1 FROM currency"]
+        execute = self.execute_queries(profile, queries)
+        data = profiling.finish(profile)
+
+        self.assertEqual(execute.call_count, 5)
+        self.assertEqual(data["query_count"], 5)
+        self.assertEqual(len(data["slowest"]), 2)
+        self.assertEqual(len(data["duplicates"]), 1)
+        self.assertEqual(data["duplicates"][0]["count"], 4)
+        self.assertEqual(data["duplicates"][0]["sql"], "SELECT * FROM instrument WHERE id = ?")
+        self.assertIsNone(profiling.get_active_profile())
+
+    def test__nested_sections_are_counted_once(self):
+        profile = profiling.start("task", "some_task", "space00000")
+
+        with mock.patch("poms.common.profiling.time.perf_counter", side_effect=[10.0, 11.0, 12.0, 14.0, 15.0]):
+            with profiling.track("expressions"):
+                with profiling.track("expressions"):
+                    pass
+                with profiling.track("serialization"):
+                    pass
+
+            self.assertEqual(dict(profile.sections), {"expressions": 4.0, "serialization": 1.0})
+            profiling.finish(profile)
+
+    def test__track_without_profile(self):
+        @profiling.tracked("expressions")
+        def evaluate():
+            return 1
+
+        self.assertIsNone(profiling.get_active_profile())
+        self.assertEqual(evaluate(), 1)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test__disabled(self):
+        self.assertIsNone(profiling.start("request", "GET /", "space00000"))
+
+    def test__sampling_and_space_config(self):
+        with mock.patch("poms.common.profiling.random.random", return_value=0.5):
+            self.assertTrue(profiling.should_profile("space00000"))
+
+            profiling.set_space_config("space00000", sample_rate=0.1)
+            self.assertFalse(profiling.should_profile("space00000"))
+
+            profiling.set_space_config("space00000", sample_rate=1.0, enabled=False)
+            self.assertFalse(profiling.should_profile("space00000"))
+
+            # other spaces keep defaults
+            self.assertTrue(profiling.should_profile("space00001"))
+
+    def test__ring_buffer(self):
+        profiling.set_space_config("space00000", ring_buffer=True)
+
+        for name in ("first", "second", "third"):
+            profiling.finish(profiling.start("task", name, "space00000"))
+        profiling.finish(profiling.start("task", "other", "space00001"))
+
+        self.assertEqual([p["name"] for p in profiling.get_ring_buffer("space00000")], ["second", "third"])
+        self.assertEqual(profiling.get_ring_buffer("space00001"), [])
+
+        profiling.clear_ring_buffer("space00000")
+        self.assertEqual(profiling.get_ring_buffer("space00000"), [])
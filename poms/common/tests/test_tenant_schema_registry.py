@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.common.db import SchemaPartitionedCache, TenantSchemaRegistry
+
+
+class TestTenantSchemaRegistry(SimpleTestCase):
+    @mock.patch("poms.common.db.schema_exists", return_value=False)
+    @mock.patch("poms.common.db.get_all_tenant_schemas", return_value=["space00000", "space11111"])
+    def test_known_schemas_loaded_once(self, all_schemas, exists):
+        registry = TenantSchemaRegistry(ttl=300)
+
+        self.assertTrue(registry.exists("space00000"))
+        self.assertTrue(registry.exists("space11111"))
+        self.assertTrue(registry.exists("space00000"))
+
+        all_schemas.assert_called_once()
+        exists.assert_not_called()
+
+    @mock.patch("poms.common.db.schema_exists", return_value=True)
+    @mock.patch("poms.common.db.get_all_tenant_schemas", return_value=[])
+    def test_new_schema_checked_and_remembered(self, all_schemas, exists):
+        registry = TenantSchemaRegistry(ttl=300)
+
+        self.assertTrue(registry.exists("space22222"))
+        self.assertTrue(registry.exists("space22222"))
+
+        exists.assert_called_once_with("space22222")
+
+    @mock.patch("poms.common.db.schema_exists", return_value=False)
+    @mock.patch("poms.common.db.get_all_tenant_schemas", return_value=[])
+    def test_missing_schema_is_not_cached(self, all_schemas, exists):
+        registry = TenantSchemaRegistry(ttl=300)
+
+        self.assertFalse(registry.exists("space33333"))
+        self.assertFalse(registry.exists("space33333"))
+
+        self.assertEqual(exists.call_count, 2)
+
+    @mock.patch("poms.common.db.schema_exists", return_value=False)
+    @mock.patch("poms.common.db.get_all_tenant_schemas", return_value=["space00000"])
+    def test_invalidate_and_ttl(self, all_schemas, exists):
+        registry = TenantSchemaRegistry(ttl=300)
+        registry.exists("space00000")
+
+        registry.invalidate()
+        registry.exists("space00000")
+        self.assertEqual(all_schemas.call_count, 2)
+
+        registry = TenantSchemaRegistry(ttl=-1)
+        registry.exists("space00000")
+        registry.exists("space00000")
+        self.assertEqual(all_schemas.call_count, 4)
+
+
+class TestSchemaPartitionedCache(SimpleTestCase):
+    def test_partitions_are_isolated(self):
+        cache = SchemaPartitionedCache()
+
+        cache.schema = "space00000"
+        cache.setdefault("default", {})[("auth", "user")] = 1
+
+        cache.schema = "space11111"
+        self.assertNotIn("default", cache)
+        cache.setdefault("default", {})[("auth", "user")] = 2
+
+        cache.schema = "space00000"
+        self.assertEqual(cache["default"][("auth", "user")], 1)
+
+        cache.clear()
+        self.assertNotIn("default", cache)
+        cache.schema = "space11111"
+        self.assertNotIn("default", cache)
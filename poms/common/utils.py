@@ -9,10 +9,11 @@ import pandas as pd
 # from django.conf import settings
 from django.contrib.admin.utils import NestedObjects
 from django.contrib.contenttypes.models import ContentType
-from django.db import connection, router
+from django.db import router
 from django.utils.timezone import now
 from django.views.generic.dates import timezone_today
 
+from poms.common.db import set_search_path
 from poms_app import settings
 
 _l = logging.getLogger("poms.common")
@@ -927,14 +928,7 @@ def attr_is_relation(content_type_key: str, attribute_key: str) -> bool:
 
 
 def set_schema(space_code):
-    with connection.cursor() as cursor:
-        cursor.execute(f"SET search_path TO {space_code};")
-
-
-def get_current_schema():
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT current_schema();")
-        return cursor.fetchone()[0]
+    set_search_path(space_code)
 
 
 class FinmarsNestedObjects(NestedObjects):
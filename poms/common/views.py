@@ -7,6 +7,7 @@ from os.path import getsize
 
 from celery.result import AsyncResult
 from django.apps import apps
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import FieldDoesNotExist
 from django.core.signing import TimestampSigner
@@ -21,6 +22,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet, ViewSet
 
+from poms.common import profiling
 from poms.common.filtering_handlers import handle_filters, handle_global_table_search
 from poms.common.filters import (
     ByIdFilterBackend,
@@ -39,11 +41,12 @@ from poms.common.mixins import (
     ListLightModelMixin,
     UpdateModelMixinExt,
 )
-from poms.common.serializers import RealmMigrateSchemeSerializer
+from poms.common.serializers import ProfilingConfigSerializer, RealmMigrateSchemeSerializer
 from poms.common.sorting import sort_by_dynamic_attrs
 from poms.common.tasks import apply_migration_to_space
 from poms.iam.views import AbstractFinmarsAccessPolicyViewSet
 from poms.obj_attrs.models import GenericAttribute, GenericAttributeType
+from poms.users.permissions import SuperUserOnly
 from poms.users.utils import get_master_user_and_member
 
 _l = logging.getLogger("poms.common")
@@ -760,6 +763,40 @@ class DebugLogViewSet(AbstractViewSet):
         return HttpResponse(self.iter_json(context), content_type="application/json")
 
 
+class ProfilingViewSet(AbstractViewSet):
+    """
+    Profiles of the space kept in the ring buffer and profiling config of the space
+    """
+
+    serializer_class = ProfilingConfigSerializer
+    permission_classes = AbstractViewSet.permission_classes + [
+        SuperUserOnly,
+    ]
+
+    def list(self, request, *args, **kwargs):
+        return Response(
+            {
+                "enabled": settings.PROFILING_ENABLED,
+                "config": profiling.get_space_config(request.space_code),
+                "results": profiling.get_ring_buffer(request.space_code),
+            }
+        )
+
+    @action(detail=False, methods=["get", "put"], url_path="config")
+    def config(self, request, *args, **kwargs):
+        if request.method == "PUT":
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            return Response(profiling.set_space_config(request.space_code, **serializer.validated_data))
+
+        return Response(profiling.get_space_config(request.space_code))
+
+    @action(detail=False, methods=["post"], url_path="clear")
+    def clear(self, request, *args, **kwargs):
+        profiling.clear_ring_buffer(request.space_code)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class RealmMigrateSchemeView(APIView):
     throttle_classes = []
     permission_classes = []
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from poms.configuration.utils import WorkflowDispatcher, WorkflowRun
+
+
+class StubWorkflowHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests.append((self.path, self.headers["Authorization"], data))
+            fail_status = server.fail_once.pop(data["user_code"], None)
+
+        time.sleep(server.delays.get(data["user_code"], 0.05))
+
+        with server.lock:
+            server.in_flight -= 1
+
+        if fail_status:
+            self.send_response(fail_status)
+            self.end_headers()
+            return
+
+        body = json.dumps({"id": len(server.requests), "user_code": data["user_code"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class WorkflowDispatcherTest(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubWorkflowHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.fail_once = {}
+        self.server.delays = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.master_task = SimpleNamespace(id=7, master_user=None)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/workflow"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_dispatcher(self, **kwargs):
+        return WorkflowDispatcher(
+            self.master_task,
+            base_url=self.base_url,
+            headers={"Authorization": "Bearer token"},
+            **kwargs,
+        )
+
+    def test__run_many_is_concurrent_and_bounded(self):
+        runs = [WorkflowRun(user_code=f"w{i}:run_pricing", payload={"reference": i}) for i in range(12)]
+        done = []
+
+        result = self.create_dispatcher(concurrency=3).run_many(runs, on_done=lambda count, run: done.append(count))
+
+        self.assertIs(result, runs)
+        self.assertEqual(len(self.server.requests), 12)
+        self.assertEqual(self.server.max_in_flight, 3)
+        self.assertEqual(done, list(range(1, 13)))
+        for i, run in enumerate(runs):
+            self.assertIsNone(run.error)
+            self.assertEqual(run.response["user_code"], f"w{i}:run_pricing")
+
+        path, authorization, data = self.server.requests[0]
+        self.assertEqual(path, "/workflow/api/workflow/run-workflow/")
+        self.assertEqual(authorization, "Bearer token")
+        self.assertEqual(data["platform_task_id"], 7)
+
+    def test__unavailable_service_is_retried(self):
+        self.server.fail_once["flaky"] = 503
+
+        runs = self.create_dispatcher(retries=2).run_many([WorkflowRun(user_code="flaky", payload={})])
+
+        self.assertIsNone(runs[0].error)
+        self.assertEqual(runs[0].response["user_code"], "flaky")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test__possibly_processed_request_is_not_retried(self):
+        self.server.fail_once["gateway"] = 502
+        self.server.delays["slow"] = 0.5
+
+        runs = self.create_dispatcher(retries=2, timeout=0.2).run_many(
+            [WorkflowRun(user_code="gateway", payload={}), WorkflowRun(user_code="slow", payload={})]
+        )
+
+        self.assertIsNotNone(runs[0].error)
+        self.assertIsNotNone(runs[1].error)
+        self.assertEqual(sorted(data["user_code"] for _, _, data in self.server.requests), ["gateway", "slow"])
+
+    def test__error_is_stored_in_run(self):
+        self.server.fail_once["broken"] = 503
+
+        runs = self.create_dispatcher(retries=0).run_many(
+            [WorkflowRun(user_code="broken", payload={}), WorkflowRun(user_code="ok", payload={})]
+        )
+
+        self.assertIsNotNone(runs[0].error)
+        self.assertIsNone(runs[1].error)
@@ -5,6 +5,8 @@ import os
 import re
 import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from typing import Any
 from urllib.parse import unquote
 
@@ -393,24 +395,30 @@ def get_headers_with_token(token: str):
     }
 
 
-def run_workflow(user_code, payload, master_task):
-    from django.contrib.auth import get_user_model
-
+def get_workflow_base_url(master_user) -> str:
     from poms_app import settings
 
+    return f"https://{settings.DOMAIN_NAME}/{master_user.realm_code}/{master_user.space_code}/workflow"
+
+
+def get_bot_headers(master_user) -> dict:
+    from django.contrib.auth import get_user_model
+
     User = get_user_model()
 
     bot = User.objects.get(username="finmars_bot")
 
-    refresh = get_refresh_token(bot, master_task.master_user)
+    refresh = get_refresh_token(bot, master_user)
 
-    # _l.info('refresh %s' % refresh.access_token)
+    return get_headers_with_token(refresh.access_token)
 
-    headers = get_headers_with_token(refresh.access_token)
 
-    realm_code = master_task.master_user.realm_code
-    space_code = master_task.master_user.space_code
-    url = f"https://{settings.DOMAIN_NAME}/{realm_code}/{space_code}/workflow/api/workflow/run-workflow/"
+def run_workflow(user_code, payload, master_task):
+    from poms_app import settings
+
+    headers = get_bot_headers(master_task.master_user)
+
+    url = f"{get_workflow_base_url(master_task.master_user)}/api/workflow/run-workflow/"
 
     data = {
         "user_code": user_code,
@@ -423,24 +431,99 @@ def run_workflow(user_code, payload, master_task):
     return response.json()
 
 
-def get_workflow(workflow_id: int, master_task):
-    from django.contrib.auth import get_user_model
+@dataclass
+class WorkflowRun:
+    user_code: str
+    payload: dict
+    context: Any = None
+    response: dict | None = None
+    error: Exception | None = None
 
-    from poms_app import settings
 
-    User = get_user_model()
+class WorkflowDispatcher:
+    """
+    Sends many run-workflow requests of one task.
 
-    bot = User.objects.get(username="finmars_bot")
+    All requests share one bot token and one pooled HTTP session, at most
+    `concurrency` of them are in flight. run-workflow is not idempotent, only
+    connection errors and 503 responses (the request was not processed) are
+    retried with exponential backoff. Timeouts, 502 and 504 are not retried,
+    the workflow may have been started.
+    """
 
-    refresh = get_refresh_token(bot, master_task.master_user)
+    RETRY_STATUSES = (503,)
 
-    # _l.info('refresh %s' % refresh.access_token)
+    def __init__(self, master_task, concurrency=None, base_url=None, headers=None, retries=None, timeout=None):
+        from poms_app import settings
 
-    headers = get_headers_with_token(refresh.access_token)
+        self.master_task = master_task
+        self.concurrency = max(concurrency or settings.WORKFLOW_DISPATCH_CONCURRENCY, 1)
+        self.base_url = base_url or get_workflow_base_url(master_task.master_user)
+        self._headers = headers
+        self.http_client = HttpClient(
+            max_timeout=timeout or settings.WORKFLOW_DISPATCH_TIMEOUT,
+            max_retries=settings.WORKFLOW_DISPATCH_RETRIES if retries is None else retries,
+            pool_maxsize=self.concurrency,
+            retry_statuses=self.RETRY_STATUSES,
+        )
+
+    @property
+    def headers(self) -> dict:
+        # token is created once, in the calling thread, as it needs the database
+        if self._headers is None:
+            self._headers = get_bot_headers(self.master_task.master_user)
+
+        return self._headers
+
+    def run(self, user_code, payload) -> dict:
+        data = {
+            "user_code": user_code,
+            "payload": payload,
+            "platform_task_id": self.master_task.id,
+        }
+        return self.http_client.post(
+            f"{self.base_url}/api/workflow/run-workflow/",
+            headers=self.headers,
+            json=data,
+        )
+
+    def _send(self, run: WorkflowRun) -> WorkflowRun:
+        try:
+            run.response = self.run(run.user_code, run.payload)
+        except Exception as e:
+            run.error = e
+
+        return run
+
+    def run_many(self, runs, on_done=None) -> list[WorkflowRun]:
+        """
+        Sends all runs concurrently, errors are stored in WorkflowRun.error
+
+        :param runs: list of WorkflowRun
+        :param on_done: called as on_done(done_count, run) in the calling thread
+            after each finished run
+        :return: runs in the same order
+        """
+        if not runs:
+            return runs
+
+        _ = self.headers
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._send, run) for run in runs]
+            for count, future in enumerate(as_completed(futures), start=1):
+                if on_done:
+                    on_done(count, future.result())
+
+        return runs
+
+
+def get_workflow(workflow_id: int, master_task):
+    from poms_app import settings
+
+    headers = get_bot_headers(master_task.master_user)
 
-    realm_code = master_task.master_user.realm_code
-    space_code = master_task.master_user.space_code
-    url = f"https://{settings.DOMAIN_NAME}/{realm_code}/{space_code}/workflow/api/workflow/{workflow_id}/"
+    url = f"{get_workflow_base_url(master_task.master_user)}/api/workflow/{workflow_id}/"
 
     response = requests.get(url, headers=headers, verify=settings.VERIFY_SSL)
 
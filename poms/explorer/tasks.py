@@ -8,9 +8,6 @@ from poms.explorer.models import StorageObject
 from poms.explorer.utils import (
     copy_dir,
     copy_file,
-    count_files,
-    delete_all_file_objects,
-    is_system_path,
     last_dir_name,
     make_dir_path,
     move_dir,
@@ -18,7 +15,6 @@ from poms.explorer.utils import (
     path_is_file,
     rename_dir,
     rename_file,
-    sync_file,
     sync_storage_objects,
     unzip_file,
     update_or_create_file_and_parents,
@@ -137,49 +133,25 @@ def sync_storage_with_database(self, *args, **kwargs):
     celery_task.status = CeleryTask.STATUS_PENDING
     celery_task.save()
 
-    delete_all_file_objects()  # this action in future could be removed !
-
     space_code = kwargs["context"]["space_code"]
     storage_root = f"{space_code}/"
 
-    total_files = count_files(storage, storage_root)
-    _l.info(f"sync_files_with_database: there are total {total_files} files")
-
     celery_task.update_progress(
         {
             "current": 0,
-            "total": total_files,
+            "total": 0,
             "percent": 0,
             "description": f"{task_name} starting ...",
         }
     )
 
-    dirs, files = storage.listdir(storage_root)
-
     root_obj, _ = StorageObject.objects.get_or_create(
         path=make_dir_path(storage_root),
         parent=None,
     )
 
-    _l.info(f"sync_files_with_database: storage_root {storage_root} has {dirs} dirs, {len(files)}/{total_files} files")
-
     try:
-        for directory in dirs:
-            if is_system_path(directory):
-                continue
-
-            directory_path = os.path.join(storage_root, directory)
-            directory_obj, _ = StorageObject.objects.get_or_create(
-                path=make_dir_path(directory_path),
-                parent=root_obj,
-            )
-            sync_storage_objects(storage, directory_obj)
-
-        for file_name in files:
-            if is_system_path(file_name):
-                continue
-            file_path = os.path.join(storage_root, file_name)
-            sync_file(storage, file_path, root_obj)
+        total_files = sync_storage_objects(storage, root_obj)
 
     except Exception as e:
         celery_task.status = CeleryTask.STATUS_ERROR
@@ -188,6 +160,8 @@ def sync_storage_with_database(self, *args, **kwargs):
         _l.error(f"sync_files_with_database: failed due to {repr(e)}")
         return
 
+    _l.info(f"sync_files_with_database: synced total {total_files} files")
+
     celery_task.update_progress(
         {
             "current": total_files,
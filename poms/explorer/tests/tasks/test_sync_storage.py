@@ -1,9 +1,16 @@
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
 from unittest import mock
 
+from django.test import SimpleTestCase, override_settings
+
 from poms.common.common_base_test import BaseTestCase
-from poms.common.storage import FinmarsS3Storage
+from poms.common.storage import FinmarsLocalFileSystemStorage, FinmarsS3Storage, FinmarsSFTPStorage
 from poms.explorer.models import StorageObject
-from poms.explorer.utils import sync_file, sync_storage_objects
+from poms.explorer.utils import list_storage_tree, sync_file, sync_storage_objects
 
 
 class SyncFileInDatabaseTest(BaseTestCase):
@@ -72,26 +79,132 @@ class SyncFilesTest(BaseTestCase):
         filepath_1 = f"{self.directory.path}/{f1}"
         filepath_2 = f"{self.directory.path}/{f2}"
         size = self.random_int(10000, 100000000)
-        self.storage.listdir.return_value = ([], [filepath_1, filepath_2])
-        self.storage.size.return_value = size
+        self.storage.listdir_with_sizes.return_value = ([], {f1: size, f2: size})
 
-        sync_storage_objects(self.storage, self.directory)
+        count = sync_storage_objects(self.storage, self.directory)
 
         files = StorageObject.objects.filter(is_file=True).all()
 
+        self.assertEqual(count, 2)
         self.assertEqual(files.count(), 2)
+        self.assertEqual({file.size for file in files}, {size})
+        self.assertEqual({file.path for file in files}, {filepath_1, filepath_2})
+        self.storage.size.assert_not_called()
 
     def test__directories_created(self):
         # Mock the listdir return values
-        dirpath_1 = f"{self.directory.path}/dir1"
-        dirpath_2 = f"{self.directory.path}/dir2"
-        self.storage.listdir.side_effect = [
-            ([dirpath_1, dirpath_2], []),
-            ([], []),
-            ([], []),
+        self.storage.listdir_with_sizes.side_effect = [
+            (["dir1", "dir2"], {}),
+            ([], {}),
+            ([], {}),
         ]
         sync_storage_objects(self.storage, self.directory)
 
         directories = StorageObject.objects.all()
 
         self.assertEqual(directories.count(), 3)
+
+
+@override_settings(EXPLORER_SYNC_WORKERS=4)
+class ListStorageTreeTest(SimpleTestCase):
+    def listdir_with_sizes(self, path):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+
+        if path == "root":
+            return ["d1", "d2", "d3"], {"a.txt": 1}
+        return [], {"b.txt": 2}
+
+    def list_tree(self, storage_class):
+        self.lock = threading.Lock()
+        self.active = self.max_active = 0
+        storage = mock.Mock(spec=storage_class)
+        storage.concurrent_listing = storage_class.concurrent_listing
+        storage.listdir_with_sizes.side_effect = self.listdir_with_sizes
+        return list_storage_tree(storage, "root")
+
+    def test__sftp_is_listed_serially(self):
+        directories, files = self.list_tree(FinmarsSFTPStorage)
+
+        self.assertEqual(self.max_active, 1)
+        self.assertEqual(sorted(directories), ["root/d1/", "root/d2/", "root/d3/"])
+        self.assertEqual(files["root/a.txt"], 1)
+        self.assertEqual(files["root/d2/b.txt"], 2)
+
+    def test__s3_is_listed_concurrently(self):
+        directories, files = self.list_tree(FinmarsS3Storage)
+
+        self.assertGreater(self.max_active, 1)
+        self.assertEqual(len(directories), 3)
+        self.assertEqual(len(files), 4)
+
+
+class SyncLocalStorageTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_root_patch = mock.patch("poms.common.storage.settings.MEDIA_ROOT", media_root)
+        media_root_patch.start()
+        self.addCleanup(media_root_patch.stop)
+        self.media_root = Path(media_root)
+        self.storage = FinmarsLocalFileSystemStorage(location=media_root)
+        self.root = StorageObject.objects.create(path="space00000/")
+
+    def write(self, path: str, content: bytes = b"data"):
+        file_path = self.media_root / path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+
+    def paths(self) -> dict:
+        return {obj.path: obj for obj in StorageObject.objects.all()}
+
+    def test__tree_is_synced(self):
+        self.write("space00000/a.txt", b"12345")
+        self.write("space00000/d1/b.txt")
+        self.write("space00000/d1/d2/c.txt")
+        self.write("space00000/.system/hidden.txt")
+
+        count = sync_storage_objects(self.storage, self.root)
+
+        self.assertEqual(count, 3)
+        objects = self.paths()
+        self.assertEqual(
+            set(objects),
+            {
+                "space00000/",
+                "space00000/a.txt",
+                "space00000/d1/",
+                "space00000/d1/b.txt",
+                "space00000/d1/d2/",
+                "space00000/d1/d2/c.txt",
+            },
+        )
+        self.assertEqual(objects["space00000/a.txt"].size, 5)
+        self.assertEqual(objects["space00000/d1/d2/c.txt"].parent_id, objects["space00000/d1/d2/"].id)
+        self.assertEqual(objects["space00000/d1/"].parent_id, self.root.id)
+
+        # tree fields are rebuilt
+        root = StorageObject.objects.get(id=self.root.id)
+        self.assertEqual(root.get_descendant_count(), 5)
+
+    def test__changes_are_applied(self):
+        self.write("space00000/d1/b.txt")
+        self.write("space00000/d1/c.txt")
+        sync_storage_objects(self.storage, self.root)
+
+        self.write("space00000/d1/b.txt", b"longer content")
+        (self.media_root / "space00000/d1/c.txt").unlink()
+        self.write("space00000/d3/e.txt")
+
+        sync_storage_objects(self.storage, self.root)
+
+        objects = self.paths()
+        self.assertEqual(objects["space00000/d1/b.txt"].size, len(b"longer content"))
+        self.assertNotIn("space00000/d1/c.txt", objects)
+        self.assertIn("space00000/d3/e.txt", objects)
@@ -2,13 +2,17 @@ import json
 import logging
 import os
 import zipfile
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import transaction
 from django.http import HttpResponse
 
 from poms.celery_tasks.models import CeleryTask
-from poms.common.storage import FinmarsLocalFileSystemStorage, FinmarsS3Storage
+from poms.common.storage import FinmarsLocalFileSystemStorage, FinmarsS3Storage, by_chunk
 from poms.explorer.models import StorageObject
 
 _l = logging.getLogger("poms.explorer")
@@ -33,6 +37,7 @@ CONTENT_TYPES = {
     ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
 }
 SYSTEM_PATHS = {".hello-world", ".system", ".init"}
+SYNC_BATCH_SIZE = 1000
 TRUTHY_VALUES = {"true", "1", "yes"}
 
 
@@ -274,45 +279,140 @@ def unzip_file(
         celery_task.update_progress(progress_dict)
 
 
+def list_storage_tree(storage: FinmarsS3Storage, directory_path: str) -> tuple[list[str], dict[str, int]]:
+    """
+    Lists all directories and files below the directory, subdirectories are listed
+    concurrently by at most EXPLORER_SYNC_WORKERS threads, or one by one if the storage
+    does not support concurrent listing. System paths are skipped.
+    Args:
+        storage: The storage instance to use.
+        directory_path: The directory to list.
+    Returns:
+        Directory paths (ending with DIR_SUFFIX) in top-down order, and {file path: size}.
+    """
+    directories = []
+    files = {}
+
+    workers = settings.EXPLORER_SYNC_WORKERS if storage.concurrent_listing else 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(storage.listdir_with_sizes, directory_path): directory_path}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                dir_names, file_sizes = future.result()
+
+                for name, size in file_sizes.items():
+                    if not is_system_path(name):
+                        files[os.path.join(path, name)] = size
+
+                for name in dir_names:
+                    if is_system_path(name):
+                        continue
+
+                    sub_path = os.path.join(path, name)
+                    directories.append(make_dir_path(sub_path))
+                    pending[executor.submit(storage.listdir_with_sizes, sub_path)] = sub_path
+
+    return directories, files
+
+
 def sync_storage_objects(storage: FinmarsS3Storage, start_directory) -> int:
     """
-    Recursively syncs files/directories in the root directory and
-    all its subdirectories with database file/directory objects.
+    Syncs files/directories in the start directory and all its subdirectories
+    with database file/directory objects: the storage is listed first, then
+    the difference with existing objects is applied with bulk inserts, updates
+    and deletes, and the tree is rebuilt once.
     Args:
         storage: The storage instance to use.
         start_directory: The directory from which to start syncing.
     Returns:
         The total number of files in the start directory and all its subdirectories.
     """
+    directory_path = start_directory.path.removesuffix("*")
 
-    def sync_files_helper(directory) -> int:
-        from poms.explorer.models import StorageObject
+    dir_paths, file_sizes = list_storage_tree(storage, directory_path)
 
-        directory_path = directory.path.removesuffix("*")
+    _l.info(
+        f"sync_storage_objects: directory_path {directory_path} has {len(dir_paths)} dirs, {len(file_sizes)} files"
+    )
 
-        dir_names, file_names = storage.listdir(directory_path)
+    existing = {
+        path: (obj_id, parent_id, size, is_file)
+        for path, obj_id, parent_id, size, is_file in StorageObject.objects.filter(
+            path__startswith=make_dir_path(directory_path),
+        )
+        .exclude(id=start_directory.id)
+        .values_list("path", "id", "parent_id", "size", "is_file")
+    }
+    tree_fields = {"lft": 0, "rght": 0, "tree_id": 0, "mptt_level": 0}
+
+    def get_parent_path(path: str) -> str:
+        parent_path = make_dir_path(os.path.dirname(path.rstrip("/")))
+        return start_directory.path if parent_path == make_dir_path(directory_path) else parent_path
+
+    ids = {start_directory.path: start_directory.id}
+    for path, (obj_id, _, _, is_file) in existing.items():
+        if not is_file:
+            ids[path] = obj_id
+
+    with transaction.atomic():
+        with StorageObject.objects.disable_mptt_updates():
+            # directories are in top-down order, so each level gets parent ids from the previous one
+            new_dirs = [path for path in dir_paths if path not in existing]
+            for level_paths in by_depth(new_dirs):
+                created = StorageObject.objects.bulk_create(
+                    [
+                        StorageObject(path=path, parent_id=ids[get_parent_path(path)], **tree_fields)
+                        for path in level_paths
+                    ],
+                    batch_size=SYNC_BATCH_SIZE,
+                )
+                ids.update({obj.path: obj.id for obj in created})
+
+            to_create = []
+            to_update = []
+            for path, size in file_sizes.items():
+                parent_id = ids[get_parent_path(path)]
+                if path not in existing:
+                    to_create.append(
+                        StorageObject(path=path, parent_id=parent_id, size=size, is_file=True, **tree_fields)
+                    )
+                    continue
+
+                obj_id, old_parent_id, old_size, is_file = existing[path]
+                if (old_parent_id, old_size, is_file) != (parent_id, size, True):
+                    to_update.append(StorageObject(id=obj_id, path=path, parent_id=parent_id, size=size, is_file=True))
+
+            StorageObject.objects.bulk_create(to_create, batch_size=SYNC_BATCH_SIZE)
+            StorageObject.objects.bulk_update(
+                to_update,
+                ["parent", "size", "is_file"],
+                batch_size=SYNC_BATCH_SIZE,
+            )
 
-        _l.info(f"sync_files: directory_path {directory.path} try to sync {len(file_names)} files")
+            present = set(dir_paths) | set(file_sizes)
+            to_delete = [obj_id for path, (obj_id, *_) in existing.items() if path not in present]
+            for chunk in by_chunk(to_delete, SYNC_BATCH_SIZE):
+                StorageObject.objects.filter(id__in=chunk).delete()
 
-        count = len(file_names)
-        for file in file_names:
-            if is_system_path(file):
-                continue
+        StorageObject.objects.rebuild()
 
-            sync_file(storage, str(os.path.join(directory_path, file)), directory)
+    _l.info(
+        f"sync_storage_objects: created {len(new_dirs)} dirs, {len(to_create)} files, "
+        f"updated {len(to_update)}, deleted {len(to_delete)} objects"
+    )
 
-        for subdir in dir_names:
-            if is_system_path(subdir):
-                continue
+    return len(file_sizes)
 
-            sub_directory, created = StorageObject.objects.get_or_create(
-                path=os.path.join(directory_path, subdir), parent=directory
-            )
-            count += sync_files_helper(sub_directory)
 
-        return count
+def by_depth(paths: list[str]) -> list[list[str]]:
+    levels = defaultdict(list)
+    for path in paths:
+        levels[path.rstrip("/").count("/")].append(path)
 
-    return sync_files_helper(start_directory)
+    return [levels[depth] for depth in sorted(levels)]
 
 
 def sync_file(storage: FinmarsS3Storage, filepath: str, directory):
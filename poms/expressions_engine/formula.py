@@ -1,5 +1,6 @@
 import ast
 import datetime
+import functools
 import logging
 import time
 import types
@@ -9,6 +10,7 @@ from dateutil import relativedelta
 from django.conf import settings
 from django.utils.functional import Promise, SimpleLazyObject
 
+from poms.common import profiling
 from poms.expressions_engine.exceptions import (
     AttributeDoesNotExist,
     ExpressionEvalError,
@@ -163,6 +165,14 @@ SAFE_TYPES = (
 )
 
 
+@functools.lru_cache(maxsize=1024)
+def _parse(expr):
+    """
+    Parsed expressions are shared, the evaluator does not modify the tree
+    """
+    return ast.parse(expr)
+
+
 class SimpleEval2:
     def __init__(
         self,
@@ -214,7 +224,7 @@ class SimpleEval2:
         if not expr:
             raise InvalidExpression("Empty expression")
         try:
-            return ast.parse(expr)
+            return _parse(expr)
         except SyntaxError as e:
             raise ExpressionSyntaxError(e) from e
         except Exception as e:
@@ -594,7 +604,8 @@ def safe_eval(
         now=now,
         context=context,
     )
-    result = e.eval(s)
+    with profiling.track("expressions"):
+        result = e.eval(s)
 
     # _l.debug('safe_eval done %s : %s' % (s, "{:3.3f}".format(time.perf_counter() - st)))
 
@@ -0,0 +1,213 @@
+"""
+Per-request loaders for the relations of the GraphQL types
+
+Instances of the same list are kept together, a relation requested for one
+of them is loaded for all of them in one IN query, loaded instances are
+cached by primary key (and user_code) until the end of the request.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+import strawberry
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from strawberry.django.context import StrawberryDjangoContext
+from strawberry.extensions.field_extension import FieldExtension
+
+_l = logging.getLogger("poms.graphql")
+
+
+def get_relation_key(relation: models.Field) -> str:
+    target = relation.target_field
+    return "pk" if target.primary_key else target.attname
+
+
+class ModelLoader:
+    """
+    Loads instances of one model by a key field, all queued keys are fetched together
+    """
+
+    def __init__(self, registry: LoaderRegistry, model: type[models.Model], key: str = "pk"):
+        self.registry = registry
+        self.model = model
+        self.key = key
+        self.cache = {}
+        self.pending = set()
+
+    def get_key(self, instance: models.Model):
+        return instance.pk if self.key == "pk" else getattr(instance, self.key)
+
+    def prime(self, instance: models.Model):
+        key = self.get_key(instance)
+        self.cache[key] = instance
+        self.pending.discard(key)
+
+    def queue(self, keys: Iterable):
+        self.pending.update(key for key in keys if key is not None and key not in self.cache)
+
+    def fetch(self):
+        keys, self.pending = self.pending, set()
+
+        instances = list(self.model._base_manager.filter(**{f"{self.key}__in": keys}))
+        _l.debug("ModelLoader.fetch: %s %s of %s keys", self.model.__name__, len(instances), len(keys))
+
+        self.registry.add(instances)
+        for key in keys:
+            # missing objects are not requested again
+            self.cache.setdefault(key, None)
+
+    def load(self, key):
+        if key is None:
+            return None
+
+        if key not in self.cache:
+            self.pending.add(key)
+            self.fetch()
+
+        return self.cache[key]
+
+    def load_many(self, keys: Iterable) -> dict:
+        keys = list(keys)
+
+        self.queue(keys)
+        if self.pending:
+            self.fetch()
+
+        return {key: self.cache[key] for key in keys if self.cache.get(key) is not None}
+
+
+class LoaderRegistry:
+    """
+    Loaders of the request, one per model and key field
+    """
+
+    def __init__(self):
+        self.loaders = {}
+        self.siblings = {}
+
+    def loader(self, model: type[models.Model], key: str = "pk") -> ModelLoader:
+        model = model._meta.concrete_model
+
+        if (model, key) not in self.loaders:
+            self.loaders[model, key] = ModelLoader(self, model, key)
+
+        return self.loaders[model, key]
+
+    def add(self, instances: list[models.Model]):
+        """
+        Caches loaded instances and keeps them together for loading of their relations
+        """
+        for instance in instances:
+            self.siblings[id(instance)] = instances
+
+            model = instance._meta.concrete_model
+            self.loader(model).prime(instance)
+            if (model, "user_code") in self.loaders:
+                self.loaders[model, "user_code"].prime(instance)
+
+    def load_relation(self, instance: models.Model, name: str):
+        """
+        Loads forward relation of the instance and of all instances loaded together with it
+        """
+        relation = instance._meta.get_field(name)
+        if relation.is_cached(instance):
+            return
+
+        siblings = [obj for obj in self.siblings.get(id(instance), [instance]) if not relation.is_cached(obj)]
+        loader = self.loader(relation.related_model, get_relation_key(relation))
+
+        related = loader.load_many(getattr(obj, relation.attname) for obj in siblings)
+        for obj in siblings:
+            relation.set_cached_value(obj, related.get(getattr(obj, relation.attname)))
+
+
+@dataclass
+class GraphQLContext(StrawberryDjangoContext):
+    loaders: LoaderRegistry = field(default_factory=LoaderRegistry)
+
+
+def get_loaders(info) -> LoaderRegistry:
+    loaders = getattr(info.context, "loaders", None)
+
+    if loaders is None:
+        loaders = LoaderRegistry()
+        info.context.loaders = loaders
+
+    return loaders
+
+
+class RelationLoaderExtension(FieldExtension):
+    """
+    Resolves forward relation of a model type through the loaders of the request
+    """
+
+    def apply(self, field):
+        self.name = field.django_name or field.python_name
+
+    def resolve(self, next_, source, info, **kwargs):
+        if isinstance(source, models.Model):
+            get_loaders(info).load_relation(source, self.name)
+
+        return next_(source, info, **kwargs)
+
+
+class LoadedListExtension(FieldExtension):
+    """
+    Registers instances of a list field, so their relations are loaded together
+    """
+
+    def resolve(self, next_, source, info, **kwargs):
+        result = next_(source, info, **kwargs)
+
+        if isinstance(result, models.QuerySet):
+            result = list(result)
+        get_loaders(info).add([obj for obj in result if isinstance(obj, models.Model)])
+
+        return result
+
+
+def add_relation_loaders(type_):
+    """
+    Adds RelationLoaderExtension to all forward relations of a strawberry_django type
+    """
+    definition = type_.__strawberry_definition__
+    model = type_.__strawberry_django_definition__.model
+
+    for type_field in definition.fields:
+        if not getattr(type_field, "is_relation", False):
+            continue
+
+        try:
+            model_field = model._meta.get_field(type_field.django_name or type_field.python_name)
+        except FieldDoesNotExist:
+            continue
+
+        if model_field.concrete and (model_field.many_to_one or model_field.one_to_one):
+            type_field.extensions.append(RelationLoaderExtension())
+
+    return type_
+
+
+def queue_relations(info, rows: list[dict], relations: dict[str, type[models.Model]]):
+    """
+    Queues related ids of report rows, relations of all rows are loaded with the first one requested
+    """
+    loaders = get_loaders(info)
+
+    for key, model in relations.items():
+        loaders.loader(model).queue(row.get(key) for row in rows)
+
+
+def related_object(model: type[models.Model], key: str):
+    """
+    Field of a related object of a report item, resolved by the id in the key field
+    """
+
+    def resolver(root, info):
+        return get_loaders(info).loader(model).load(getattr(root, key))
+
+    return strawberry.field(resolver=resolver)
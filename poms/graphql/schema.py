@@ -34,6 +34,12 @@ from poms.graphql.filters import (
     Strategy3Filter,
     TransactionFilter,
 )
+from poms.graphql.loaders import (
+    LoadedListExtension,
+    add_relation_loaders,
+    queue_relations,
+    related_object,
+)
 from poms.graphql.orderings import (
     AccountOrdering,
     AccountTypeOrdering,
@@ -117,16 +123,19 @@ def from_dict(cls: type[T], data: dict[str, Any]) -> T:
 # --- Types (minimal, no duplication) ---
 
 
+@add_relation_loaders
 @strawberry_django.type(MemberModel, fields="__all__")
 class Member:
     pass
 
 
+@add_relation_loaders
 @strawberry_django.type(CountryModel, fields="__all__")
 class Country:
     pass
 
 
+@add_relation_loaders
 @strawberry_django.type(TransactionClassModel)
 class TransactionClass:
     id: int
@@ -136,28 +145,33 @@ class TransactionClass:
     description: str
 
 
+@add_relation_loaders
 @strawberry_django.type(AccountTypeModel, fields="__all__")
 class AccountType:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(AccountModel, fields="__all__")
 class Account:
     owner: Member | None
     type: AccountType | None
 
 
+@add_relation_loaders
 @strawberry_django.type(PricingPolicyModel, fields="__all__")
 class PricingPolicy:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(CurrencyModel, fields="__all__")
 class Currency:
     owner: Member | None
     country: Country | None
 
 
+@add_relation_loaders
 @strawberry_django.type(CurrencyHistoryModel, fields="__all__")
 class CurrencyHistory:
     owner: Member | None
@@ -165,11 +179,13 @@ class CurrencyHistory:
     pricing_policy: PricingPolicy | None
 
 
+@add_relation_loaders
 @strawberry_django.type(PortfolioModel, fields="__all__")
 class Portfolio:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(PortfolioHistoryModel, fields="__all__")
 class PortfolioHistory:
     owner: Member | None
@@ -178,11 +194,13 @@ class PortfolioHistory:
     pricing_policy: PricingPolicy | None
 
 
+@add_relation_loaders
 @strawberry_django.type(InstrumentTypeModel, fields="__all__")
 class InstrumentType:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(InstrumentModel, fields="__all__")
 class Instrument:
     owner: Member | None
@@ -192,6 +210,7 @@ class Instrument:
     country: Country | None
 
 
+@add_relation_loaders
 @strawberry_django.type(PriceHistoryModel, fields="__all__")
 class PriceHistory:
     owner: Member | None
@@ -199,36 +218,43 @@ class PriceHistory:
     pricing_policy: PricingPolicy | None
 
 
+@add_relation_loaders
 @strawberry_django.type(ResponsibleModel, fields="__all__")
 class Responsible:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(CounterpartyModel, fields="__all__")
 class Counterparty:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(Strategy1Model, fields="__all__")
 class Strategy1:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(Strategy2Model, fields="__all__")
 class Strategy2:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(Strategy3Model, fields="__all__")
 class Strategy3:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(ComplexTransactionModel, fields="__all__")
 class ComplexTransaction:
     owner: Member | None
 
 
+@add_relation_loaders
 @strawberry_django.type(TransactionModel, fields="__all__")
 class Transaction:
     owner: Member | None
@@ -263,6 +289,36 @@ class Transaction:
     transaction_class: TransactionClass | None
 
 
+# relations of report items, see related_object fields of the items
+POSITION_ITEM_RELATIONS = {
+    "portfolio": PortfolioModel,
+    "instrument": InstrumentModel,
+    "currency": CurrencyModel,
+    "pricing_currency": CurrencyModel,
+    "exposure_currency": CurrencyModel,
+    "allocation": InstrumentModel,
+    "account": AccountModel,
+    "strategy1": Strategy1Model,
+    "strategy2": Strategy2Model,
+    "strategy3": Strategy3Model,
+}
+
+TRANSACTION_ITEM_RELATIONS = {
+    "portfolio": PortfolioModel,
+    "instrument": InstrumentModel,
+    "linked_instrument": InstrumentModel,
+    "allocation_balance": InstrumentModel,
+    "allocation_pl": InstrumentModel,
+    "transaction_currency": CurrencyModel,
+    "settlement_currency": CurrencyModel,
+    "account_cash": AccountModel,
+    "account_position": AccountModel,
+    "account_interim": AccountModel,
+    "counterparty": CounterpartyModel,
+    "responsible": ResponsibleModel,
+}
+
+
 # BALANCE REPORT STARTS
 
 
@@ -374,6 +430,18 @@ class BalanceReportItem:
     overheads_fixed_loc: float
     total_fixed_loc: float
 
+    # related objects, loaded for all items of the report at once
+    portfolio_object: Portfolio | None = related_object(PortfolioModel, "portfolio")
+    instrument_object: Instrument | None = related_object(InstrumentModel, "instrument")
+    currency_object: Currency | None = related_object(CurrencyModel, "currency")
+    pricing_currency_object: Currency | None = related_object(CurrencyModel, "pricing_currency")
+    exposure_currency_object: Currency | None = related_object(CurrencyModel, "exposure_currency")
+    allocation_object: Instrument | None = related_object(InstrumentModel, "allocation")
+    account_object: Account | None = related_object(AccountModel, "account")
+    strategy1_object: Strategy1 | None = related_object(Strategy1Model, "strategy1")
+    strategy2_object: Strategy2 | None = related_object(Strategy2Model, "strategy2")
+    strategy3_object: Strategy3 | None = related_object(Strategy3Model, "strategy3")
+
 
 @strawberry.type
 class BalanceReport:
@@ -478,6 +546,8 @@ def balance_report(
     for item in report.items:
         items.append(serialize_balance_report_item(item))
 
+    queue_relations(info, items, POSITION_ITEM_RELATIONS)
+
     # _l.info('report.items %s' % items[0])
 
     # 3) map result to GraphQL types
@@ -605,6 +675,18 @@ class PLReportItem:
     overheads_fixed_loc: float | None = None
     total_fixed_loc: float | None = None
 
+    # related objects, loaded for all items of the report at once
+    portfolio_object: Portfolio | None = related_object(PortfolioModel, "portfolio")
+    instrument_object: Instrument | None = related_object(InstrumentModel, "instrument")
+    currency_object: Currency | None = related_object(CurrencyModel, "currency")
+    pricing_currency_object: Currency | None = related_object(CurrencyModel, "pricing_currency")
+    exposure_currency_object: Currency | None = related_object(CurrencyModel, "exposure_currency")
+    allocation_object: Instrument | None = related_object(InstrumentModel, "allocation")
+    account_object: Account | None = related_object(AccountModel, "account")
+    strategy1_object: Strategy1 | None = related_object(Strategy1Model, "strategy1")
+    strategy2_object: Strategy2 | None = related_object(Strategy2Model, "strategy2")
+    strategy3_object: Strategy3 | None = related_object(Strategy3Model, "strategy3")
+
 
 @strawberry.type
 class PLReport:
@@ -711,6 +793,8 @@ def pl_report(
     for item in report.items:
         items.append(serialize_pl_report_item(item))
 
+    queue_relations(info, items, POSITION_ITEM_RELATIONS)
+
     # _l.info('report.items %s' % items[0])
 
     # 3) map result to GraphQL types
@@ -902,6 +986,20 @@ class TransactionReportItem:
     user_date_2: date | None = None
     user_date_3: date | None = None
 
+    # related objects, loaded for all items of the report at once
+    portfolio_object: Portfolio | None = related_object(PortfolioModel, "portfolio")
+    instrument_object: Instrument | None = related_object(InstrumentModel, "instrument")
+    linked_instrument_object: Instrument | None = related_object(InstrumentModel, "linked_instrument")
+    allocation_balance_object: Instrument | None = related_object(InstrumentModel, "allocation_balance")
+    allocation_pl_object: Instrument | None = related_object(InstrumentModel, "allocation_pl")
+    transaction_currency_object: Currency | None = related_object(CurrencyModel, "transaction_currency")
+    settlement_currency_object: Currency | None = related_object(CurrencyModel, "settlement_currency")
+    account_cash_object: Account | None = related_object(AccountModel, "account_cash")
+    account_position_object: Account | None = related_object(AccountModel, "account_position")
+    account_interim_object: Account | None = related_object(AccountModel, "account_interim")
+    counterparty_object: Counterparty | None = related_object(CounterpartyModel, "counterparty")
+    responsible_object: Responsible | None = related_object(ResponsibleModel, "responsible")
+
 
 @strawberry.type
 class TransactionReport:
@@ -966,6 +1064,8 @@ def transaction_report(
     for item in instance.items:
         items.append(serialize_transaction_report_item(item))
 
+    queue_relations(info, items, TRANSACTION_ITEM_RELATIONS)
+
     # _l.info('report.items %s' % items[0])
 
     # 3) map result to GraphQL types
@@ -1138,101 +1238,118 @@ class Query:
         filters=AccountFilter,
         order=AccountOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
     account_type: list[AccountType] = strawberry_django.field(
         filters=AccountTypeFilter,
         order=AccountTypeOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     currency: list[Currency] = strawberry_django.field(
         filters=CurrencyFilter,
         order=CurrencyOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     currency_history: list[CurrencyHistory] = strawberry_django.field(
         filters=CurrencyHistoryFilter,
         order=CurrencyHistoryOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     portfolio: list[Portfolio] = strawberry_django.field(
         filters=PortfolioFilter,
         order=PortfolioOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     portfolio_history: list[PortfolioHistory] = strawberry_django.field(
         filters=PortfolioHistoryFilter,
         order=PortfolioHistoryOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     instrument_type: list[InstrumentType] = strawberry_django.field(
         filters=InstrumentTypeFilter,
         order=InstrumentTypeOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     instrument: list[Instrument] = strawberry_django.field(
         filters=InstrumentFilter,
         order=InstrumentOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     pricing_policy: list[PricingPolicy] = strawberry_django.field(
         filters=PricingPolicyFilter,
         order=PricingPolicyOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     price_history: list[PriceHistory] = strawberry_django.field(
         filters=PriceHistoryFilter,
         order=PriceHistoryOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     responsible: list[Responsible] = strawberry_django.field(
         filters=ResponsibleFilter,
         order=ResponsibleOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     counterparty: list[Counterparty] = strawberry_django.field(
         filters=CounterpartyFilter,
         order=CounterpartyOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     strategy1: list[Strategy1] = strawberry_django.field(
         filters=Strategy1Filter,
         order=Strategy1Ordering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     strategy2: list[Strategy2] = strawberry_django.field(
         filters=Strategy2Filter,
         order=Strategy2Ordering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     strategy3: list[Strategy3] = strawberry_django.field(
         filters=Strategy3Filter,
         order=Strategy3Ordering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     complex_transaction: list[ComplexTransaction] = strawberry_django.field(
         filters=ComplexTransactionFilter,
         order=ComplexTransactionOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     transaction: list[Transaction] = strawberry_django.field(
         filters=TransactionFilter,
         order=TransactionOrdering,
         pagination=True,
+        extensions=[LoadedListExtension()],
     )
 
     balance_report: BalanceReport = balance_report
@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from poms.common.common_base_test import BaseTestCase
+from poms.currencies.models import Currency
+from poms.graphql.loaders import GraphQLContext, LoaderRegistry
+from poms.graphql.schema import schema
+from poms.instruments.models import Instrument
+
+
+class LoaderRegistryTest(SimpleTestCase):
+    def setUp(self):
+        self.registry = LoaderRegistry()
+        self.currencies = [Currency(id=i, user_code=f"C{i}") for i in (1, 2, 3)]
+
+    def patch_manager(self, model, instances):
+        manager = mock.patch.object(model._meta, "base_manager")
+        base_manager = manager.start()
+        self.addCleanup(manager.stop)
+        base_manager.filter.return_value = instances
+        return base_manager
+
+    def test__relation_is_loaded_for_all_siblings_at_once(self):
+        manager = self.patch_manager(Currency, self.currencies[:2])
+        instruments = [Instrument(id=i, pricing_currency_id=i % 2 + 1) for i in range(10)]
+        self.registry.add(instruments)
+
+        for instrument in instruments:
+            self.registry.load_relation(instrument, "pricing_currency")
+
+        manager.filter.assert_called_once()
+        self.assertEqual(manager.filter.call_args.kwargs["pk__in"], {1, 2})
+        self.assertEqual([i.pricing_currency.id for i in instruments[:3]], [1, 2, 1])
+
+    def test__loaded_instances_are_cached(self):
+        manager = self.patch_manager(Currency, self.currencies)
+        loader = self.registry.loader(Currency)
+
+        loader.queue([1, 2, 3, None])
+        self.assertIs(loader.load(2), self.currencies[1])
+        self.assertIs(loader.load(3), self.currencies[2])
+        self.assertIsNone(loader.load(None))
+
+        manager.filter.assert_called_once()
+
+    def test__missing_keys_are_not_requested_again(self):
+        manager = self.patch_manager(Currency, [])
+        loader = self.registry.loader(Currency)
+
+        self.assertIsNone(loader.load(42))
+        self.assertIsNone(loader.load(42))
+
+        manager.filter.assert_called_once()
+
+    def test__user_code_loader_is_primed_by_pk_loads(self):
+        manager = self.patch_manager(Currency, self.currencies)
+        by_user_code = self.registry.loader(Currency, "user_code")
+
+        self.registry.loader(Currency).load_many([1, 2, 3])
+
+        self.assertIs(by_user_code.load("C3"), self.currencies[2])
+        manager.filter.assert_called_once()
+
+
+class RelationQueriesTest(BaseTestCase):
+    query = """
+        {
+            instrument(pagination: {limit: 100}) {
+                id
+                owner { id }
+                instrument_type { id owner { id } }
+                pricing_currency { id }
+                accrued_currency { id }
+                country { id }
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+
+    def count_queries(self) -> int:
+        context = GraphQLContext(request=mock.Mock(), response=mock.Mock())
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute_sync(self.query, context_value=context)
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data["instrument"]), Instrument.objects.count())
+        return len(queries)
+
+    def test__queries_do_not_grow_with_list_size(self):
+        self.create_instrument()
+        queries = self.count_queries()
+
+        for _ in range(5):
+            self.create_instrument(currency_code="USD")
+
+        self.assertEqual(self.count_queries(), queries)
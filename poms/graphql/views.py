@@ -3,6 +3,7 @@ from django.http import JsonResponse
 from strawberry.django.views import GraphQLView
 
 from poms.common.authentication import JWTAuthentication, KeycloakAuthentication
+from poms.graphql.loaders import GraphQLContext
 from poms.users.utils import get_master_user_and_member
 
 AUTHENTICATORS = (
@@ -23,6 +24,10 @@ class AuthGraphQLView(GraphQLView):
                 return user
         return getattr(request, "user", None)
 
+    def get_context(self, request, response):
+        # loaders live for one request only
+        return GraphQLContext(request=request, response=response)
+
     def dispatch(self, request, *args, **kwargs):
         user = self._authenticate(request)
 
@@ -92,6 +92,9 @@ excluded_to_track_history_models = [
     "reports.performancereportinstance",
 ]
 
+# models with history listeners, see add_history_listeners
+tracked_history_models = set()
+
 
 class HistoricalRecord(TimeStampedModel):
     ACTION_CREATE = "create"
@@ -581,6 +584,47 @@ def post_delete_action(sender, instance):
     )
 
 
+def post_bulk_create(sender, instances):
+    """
+    History of objects inserted with bulk_create, which does not send post_save.
+    Every object gets a create record, the records are inserted together.
+    """
+    from poms.users.models import MasterUser
+
+    if sender not in tracked_history_models or not instances:
+        return
+
+    master_user = MasterUser.objects.all().first()
+
+    if master_user.journal_status != MasterUser.JOURNAL_STATUS_DISABLED:
+        try:
+            post_bulk_create_action(sender, instances)
+        except Exception as e:
+            _l.error(f"Could not save history records exception {repr(e)} traceback {traceback.format_exc()} ")
+
+
+def post_bulk_create_action(sender, instances):
+    record_context = get_record_context()
+
+    content_type = ContentType.objects.get_for_model(sender)
+    content_type_key = get_model_content_type_as_text(sender)
+
+    records = []
+    for instance in instances:
+        record = HistoricalRecord(
+            master_user=record_context["master_user"],
+            member=record_context["member"],
+            context_url=record_context["context_url"],
+            action=HistoricalRecord.ACTION_CREATE,
+            user_code=get_user_code_from_instance(instance, content_type_key),
+            content_type=content_type,
+        )
+        record.data = get_serialized_data(sender, instance)
+        records.append(record)
+
+    HistoricalRecord.objects.bulk_create(records)
+
+
 def add_history_listeners(sender, **kwargs):
     try:
         # _l.debug("History listener registered Entity %s" % sender)
@@ -593,6 +637,7 @@ def add_history_listeners(sender, **kwargs):
         if content_type_key not in excluded_to_track_history_models:
             models.signals.post_save.connect(post_save, sender=sender, weak=False)
             models.signals.post_delete.connect(post_delete, sender=sender, weak=False)
+            tracked_history_models.add(sender)
 
     except Exception as e:
         # TODO figure out what to do when live migrate happens (on space create in realm)
@@ -1,14 +1,17 @@
 import json
 import logging
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 from datetime import datetime, timedelta
-from io import BytesIO, StringIO
+from io import TextIOWrapper
 from pathlib import Path
+from tempfile import TemporaryFile
+from typing import IO
 from zipfile import ZIP_DEFLATED, ZipFile
 
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.core.serializers import serialize
 from django.db import transaction
+from django.db.models import QuerySet
 from django.utils.timezone import now
 
 from poms.celery_tasks import finmars_task
@@ -33,25 +36,67 @@ CHUNK_SIZE = 5000
 DAYS_30 = 30
 
 
-def zip_records_to_buffer(filename: str, records: Iterable) -> bytes:
-    dict_list = [record.as_dict for record in records]
+class RecordsCounter:
+    """
+    Passes records through, counting them and remembering the max id
+    """
+
+    def __init__(self, records: Iterable):
+        self.records = records
+        self.count = 0
+        self.max_id = None
+
+    def __iter__(self):
+        for record in self.records:
+            self.count += 1
+            if self.max_id is None or record.id > self.max_id:
+                self.max_id = record.id
+            yield record
+
+
+def iterate_records(records: QuerySet) -> Iterator[HistoricalRecord]:
+    # server-side cursor, only CHUNK_SIZE rows are in memory at once
+    return records.select_related("master_user", "member", "content_type").order_by("id").iterator(CHUNK_SIZE)
+
 
-    str_buffer = StringIO()
-    json.dump(dict_list, str_buffer, ensure_ascii=False)
+def write_records_to_zip(file: IO[bytes], filename: str, records: QuerySet) -> RecordsCounter:
+    """
+    Streams records into the zip archive as a JSON list of record dicts
+    """
+    counter = RecordsCounter(iterate_records(records))
+
+    with (
+        ZipFile(file, "w", compression=ZIP_DEFLATED) as zip_file,
+        zip_file.open(f"{filename}.json", "w", force_zip64=True) as entry,
+    ):
+        entry.write(b"[")
+        for record in counter:
+            if counter.count > 1:
+                entry.write(b", ")
+            entry.write(json.dumps(record.as_dict, ensure_ascii=False).encode("utf-8"))
+        entry.write(b"]")
+
+    return counter
 
-    zip_buffer = BytesIO()
-    with ZipFile(zip_buffer, "w", compression=ZIP_DEFLATED) as zip_file:
-        zip_file.writestr(f"{filename}.json", str_buffer.getvalue())
 
-    return zip_buffer.getvalue()
+def delete_records(records: QuerySet, max_id: int) -> int:
+    """
+    Deletes exported records (id <= max_id) in batches of CHUNK_SIZE,
+    so neither the ids nor the lock set grow with the number of records
+    """
+    deleted = 0
+    if max_id is None:
+        return deleted
+
+    records = records.filter(id__lte=max_id).order_by("id")
 
+    while ids := list(records.values_list("id", flat=True)[:CHUNK_SIZE]):
+        with transaction.atomic():
+            HistoricalRecord.objects.filter(id__in=ids).delete()
 
-def delete_selected_records(records_to_delete: Iterable):
-    ids = [record.id for record in records_to_delete]
+        deleted += len(ids)
 
-    with transaction.atomic():
-        records = HistoricalRecord.objects.filter(id__in=ids).select_for_update()
-        records.delete()
+    return deleted
 
 
 @finmars_task(name="history_tasks.clear_old_journal_records")
@@ -71,59 +116,42 @@ def clear_old_journal_records(*args, **kwargs):
     delete_time = now() - timedelta(days=ttl)
     date_from = delete_time.strftime(DATE_FORMAT)
 
-    old_records = HistoricalRecord.objects.filter(
-        created_at__lt=delete_time,
-    ).order_by(
-        "created_at",
-    )
+    old_records = HistoricalRecord.objects.filter(created_at__lt=delete_time)
 
-    total_count = old_records.count()
-
-    _l.info(f"{log} {total_count} records to be deleted")
-    if not old_records:
+    if not old_records.exists():
         _l.info(f"{log} aborted, nothing to delete")
         return
 
-    start = 0
-    chunk_no = 1
-    while start < total_count:
-        end = start + CHUNK_SIZE
-
-        chunk = old_records[start:end]
+    filename = f"deleted_records_from_{date_from}"
 
-        filename = f"deleted_records_from_{date_from}_chunk_{chunk_no}"
-
-        buffer = zip_records_to_buffer(filename, chunk)
-        _l.info(f"{log} created buffer of {len(buffer)} size")
+    with TemporaryFile() as tmp_file:
+        counter = write_records_to_zip(tmp_file, filename, old_records)
+        _l.info(f"{log} {counter.count} records written to file of {tmp_file.tell()} size")
 
         try:
             storage = get_storage()
             if storage:
                 remote_path = get_storage_path(filename, master.space_code)
-                save_to_remote_storage(storage, remote_path, buffer)
+                save_to_remote_storage(storage, remote_path, tmp_file)
                 _l.info(f"{log} deleted records saved to remote storage {remote_path}")
             else:
                 local_path = get_local_path(filename)
-                save_to_local_file(local_path, buffer)
+                save_to_local_file(local_path, tmp_file)
                 _l.info(f"{log} deleted records saved to local file {local_path}")
 
         except Exception as e:
             _l.error(f"{log} unable to save deleted records into file {filename} due to error: {repr(e)}")
             return
 
-        try:
-            delete_selected_records(old_records)
-            vacuum_table(table=HistoricalRecord)
-
-        except Exception as e:
-            _l.error(f"{log} unable to delete records and vacuum the table: {repr(e)}")
-            return
+    try:
+        deleted = delete_records(old_records, counter.max_id)
+        vacuum_table(table=HistoricalRecord)
 
-        else:
-            _l.info(f"{log} {total_count} records successfully deleted from history")
+    except Exception as e:
+        _l.error(f"{log} unable to delete records and vacuum the table: {repr(e)}")
 
-        chunk_no += 1
-        start = end
+    else:
+        _l.info(f"{log} {deleted} records successfully deleted from history")
 
 
 # Generate days range
@@ -133,26 +161,35 @@ def daterange(start_date, end_date):
 
 
 def main_export_journal_to_storage(space_code: str, single_date: datetime, storage) -> int:
+    """
+    Streams records of the day into the JSON file in the storage, then deletes them
+    """
     _l.info("single_date %s", single_date)
     year, month, day = single_date.year, single_date.month, single_date.day
 
     records = HistoricalRecord.objects.filter(created_at__date=single_date)
 
-    _l.info("records count %s", records.count())
+    if not records.exists():
+        return None
+
+    with TemporaryFile() as tmp_file:
+        counter = RecordsCounter(iterate_records(records))
+        stream = TextIOWrapper(tmp_file, encoding="utf-8")
+        serialize("json", counter, stream=stream)
+        # flushes the text stream and leaves tmp_file open
+        stream.detach()
+
+        _l.info("records count %s", counter.count)
 
-    if records.exists():
-        data = serialize("json", records)
-        json_file = ContentFile(data.encode("utf-8"))
         path = space_code + "/.system/journal"
         file_name = f"{path}/{year}/{month}/{day}.json"
 
-        storage.save(file_name, json_file)
-
-        records.delete()
+        tmp_file.seek(0)
+        storage.save(file_name, File(tmp_file))
 
-        return records.count()
+    delete_records(records, counter.max_id)
 
-    return None
+    return counter.count
 
 
 @finmars_task(name="history.export_journal_to_storage", bind=True)
@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.common.common_base_test import BIG, BaseTestCase
+from poms.history import models as history
+from poms.history.models import HistoricalRecord
+from poms.transactions.models import Transaction
+from poms.users.models import MasterUser
+
+
+class PostBulkCreateTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        portfolio = self.db_data.portfolios[BIG]
+        self.transactions = [self.db_data.cash_in_transaction(portfolio, amount)[1] for amount in (100, 200)]
+
+        self.enterContext(mock.patch.object(history, "tracked_history_models", {Transaction}))
+        self.enterContext(
+            mock.patch.object(
+                history,
+                "get_record_context",
+                return_value={"master_user": self.master_user, "member": self.member, "context_url": "import"},
+            )
+        )
+
+    def test__create_records_are_written(self):
+        history.post_bulk_create(Transaction, self.transactions)
+
+        records = HistoricalRecord.objects.order_by("id")
+        self.assertEqual(
+            [(record.action, record.user_code, record.context_url) for record in records],
+            [(HistoricalRecord.ACTION_CREATE, str(trn), "import") for trn in self.transactions],
+        )
+        self.assertTrue(all(record.json_data for record in records))
+
+    def test__disabled_journal(self):
+        MasterUser.objects.update(journal_status=MasterUser.JOURNAL_STATUS_DISABLED)
+
+        history.post_bulk_create(Transaction, self.transactions)
+
+        self.assertFalse(HistoricalRecord.objects.exists())
+
+
+class PostBulkCreateUntrackedTest(SimpleTestCase):
+    def test__untracked_model_is_skipped(self):
+        with (
+            mock.patch.object(history, "tracked_history_models", set()),
+            mock.patch.object(history, "post_bulk_create_action") as action,
+        ):
+            history.post_bulk_create(Transaction, [Transaction()])
+
+        action.assert_not_called()
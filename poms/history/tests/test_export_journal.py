@@ -0,0 +1,77 @@
+import json
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+from zipfile import ZipFile
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils.timezone import now
+
+from poms.common.common_base_test import BaseTestCase, change_created_time
+from poms.history.models import HistoricalRecord
+from poms.history.tasks import main_export_journal_to_storage, write_records_to_zip
+from poms.transactions.models import Transaction
+from poms.users.models import MasterUser
+
+TEST_AMOUNT = 7
+
+
+class ExportJournalTestCase(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.saved = {}
+        self.storage = mock.Mock()
+        self.storage.save.side_effect = self.save_to_storage
+        self.day_time = now() - timedelta(days=3)
+        for _ in range(TEST_AMOUNT):
+            record = HistoricalRecord.objects.create(
+                master_user=MasterUser.objects.first(),
+                user_code=self.random_string(),
+                action=HistoricalRecord.ACTION_CREATE,
+                content_type=ContentType.objects.get_for_model(Transaction),
+            )
+            change_created_time(record, self.day_time)
+
+    def save_to_storage(self, name, file):
+        self.saved[name] = file.read()
+
+    @mock.patch("poms.history.tasks.CHUNK_SIZE", 3)
+    def test__day_is_exported_and_deleted(self):
+        other = HistoricalRecord.objects.create(
+            master_user=MasterUser.objects.first(),
+            user_code=self.random_string(),
+            action=HistoricalRecord.ACTION_CREATE,
+            content_type=ContentType.objects.get_for_model(Transaction),
+        )
+
+        count = main_export_journal_to_storage("space00000", self.day_time.date(), self.storage)
+
+        self.assertEqual(count, TEST_AMOUNT)
+        (name, content), *_ = self.saved.items()
+        self.assertTrue(name.endswith(f"/{self.day_time.day}.json"))
+        data = json.loads(content.decode("utf-8"))
+        self.assertEqual(len(data), TEST_AMOUNT)
+        self.assertEqual(data[0]["model"], "history.historicalrecord")
+
+        self.assertEqual(list(HistoricalRecord.objects.values_list("id", flat=True)), [other.id])
+
+    def test__empty_day(self):
+        day = (self.day_time - timedelta(days=1)).date()
+
+        self.assertIsNone(main_export_journal_to_storage("space00000", day, self.storage))
+        self.storage.save.assert_not_called()
+
+    def test__write_records_to_zip(self):
+        buffer = BytesIO()
+
+        counter = write_records_to_zip(buffer, "journal", HistoricalRecord.objects.all())
+
+        self.assertEqual(counter.count, TEST_AMOUNT)
+        self.assertEqual(counter.max_id, HistoricalRecord.objects.order_by("-id").first().id)
+        with ZipFile(buffer) as zip_file:
+            data = json.loads(zip_file.read("journal.json").decode("utf-8"))
+        self.assertEqual(len(data), TEST_AMOUNT)
+        self.assertIn("user_code", data[0])
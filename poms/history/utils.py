@@ -1,5 +1,7 @@
-from tempfile import NamedTemporaryFile
+import shutil
+from typing import IO
 
+from django.core.files import File
 from django.db.models import Model
 
 
@@ -15,12 +17,12 @@ def get_storage_path(filename: str, space_code: str) -> str:
     return f"{space_code}/.system/history_files/{filename}.zip"
 
 
-def save_to_local_file(file_path: str, buffer: bytes):
+def save_to_local_file(file_path: str, file: IO[bytes]):
+    file.seek(0)
     with open(file_path, "wb") as output_file:
-        output_file.write(buffer)
+        shutil.copyfileobj(file, output_file)
 
 
-def save_to_remote_storage(storage, storage_path: str, buffer: bytes):
-    with NamedTemporaryFile() as tmp_file:
-        tmp_file.write(buffer)
-        storage.save(storage_path, tmp_file)
+def save_to_remote_storage(storage, storage_path: str, file: IO[bytes]):
+    file.seek(0)
+    storage.save(storage_path, File(file))
@@ -3228,20 +3228,99 @@ class EventSchedule(models.Model):
 
         return dates
 
+    def _get_regular_date(self, edate, n, i):
+        try:
+            return edate + self.periodicity.to_timedelta(n=n, i=i, same_date=edate)
+        except (OverflowError, ValueError):  # year is out of range
+            return None
+
+    def _find_first_index(self, predicate, hi):
+        """
+        Smallest i in [0, hi] with predicate(i), the predicate is monotonic and true at hi
+        """
+        lo = 0
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if predicate(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def get_dates(self, begin, end):
+        """
+        Same (effective date, notification date) pairs as all_dates, but only those with
+        the effective or the notification date in [begin, end]. Dates of a regular schedule are
+        non-decreasing in the index, so the first and the last indexes are found by binary search
+        and only the dates of the window are expanded.
+        """
+        from poms.transactions.models import EventClass
+
+        notify_in_n_days = timedelta(days=self.notify_in_n_days)
+
+        def in_window(edate):
+            return begin <= edate <= end or begin <= edate - notify_in_n_days <= end
+
+        if self.event_class_id != EventClass.REGULAR:
+            return [(edate, ndate) for edate, ndate in self.all_dates if in_window(edate)]
+
+        edate = datetime.date(datetime.strptime(self.effective_date, DATE_FORMAT))
+        fdate = datetime.date(datetime.strptime(self.final_date, DATE_FORMAT))
+        n = int(self.periodicity_n)
+        if n < 0:
+            # dates go backwards, nothing to search
+            return [(edate, ndate) for edate, ndate in self.all_dates if in_window(edate)]
+
+        limit = 3652058
+
+        def get_date(i):
+            return self._get_regular_date(edate, n, i)
+
+        def is_last(i):
+            if i >= limit:
+                return True
+            date = get_date(i)
+            return date is None or date >= fdate
+
+        # the first index at or after the final date (or out of range), dates before it are all < fdate
+        hi = 1
+        while not is_last(hi):
+            hi = min(hi * 2, limit)
+        last = self._find_first_index(is_last, hi)
+        last_date = get_date(last) if last < limit else None
+        if last_date is not None and self.accrual_calculation_schedule_id is not None:
+            last_date = fdate - timedelta(days=1)
+        if last_date is None:
+            last -= 1
+
+        def get_date_at(i):
+            return last_date if i == last else get_date(i)
+
+        start = self._find_first_index(lambda i: i > last or get_date_at(i) >= begin, last + 1)
+
+        dates = []
+        for i in range(start, last + 1):
+            date = get_date_at(i)
+            if date > end + notify_in_n_days:
+                break
+            if in_window(date):
+                dates.append((date, date - notify_in_n_days))
+        return dates
+
     def check_date(self, now):
-        for edate, ndate in self.all_dates:
+        for edate, ndate in self.get_dates(now, now):
             if now in (edate, ndate):
                 return True, edate, ndate
         return False, None, None
 
     def check_effective_date(self, now):
-        for edate, ndate in self.all_dates:
+        for edate, ndate in self.get_dates(now, now):
             if edate == now:
                 return True, edate, ndate
         return False, None, None
 
     def check_notification_date(self, now):
-        for edate, ndate in self.all_dates:
+        for edate, ndate in self.get_dates(now, now):
             if ndate == now:
                 return True, edate, ndate
         return False, None, None
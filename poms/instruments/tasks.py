@@ -3,7 +3,6 @@ import logging
 import traceback
 from collections import defaultdict
 from datetime import date, datetime, timedelta
-from math import isclose
 from typing import Any
 
 from django.db import transaction
@@ -14,8 +13,7 @@ from poms import notifications
 from poms.celery_tasks import finmars_task
 from poms.common.utils import date_now
 from poms.instruments.models import EventSchedule, GeneratedEvent, Instrument, PriceHistory
-from poms.reports.common import Report, ReportItem
-from poms.reports.sql_builders.balance import BalanceReportBuilderSql
+from poms.reports.sql_builders.positions import PositionsBuilderSql
 from poms.system_messages.handlers import send_system_message
 from poms.transactions.models import NotificationClass
 from poms.users.models import MasterUser, Member
@@ -103,6 +101,116 @@ def fill_parameters_from_instrument(event_schedule, instrument):
     return result
 
 
+def get_generated_event_key(event_schedule_id, effective_date, item) -> tuple:
+    return (
+        event_schedule_id,
+        effective_date,
+        item["instrument_id"],
+        item["portfolio_id"],
+        item["account_position_id"],
+        item["strategy1_position_id"],
+        item["strategy2_position_id"],
+        item["strategy3_position_id"],
+        item["position_size"],
+    )
+
+
+def create_generated_events(master_user, opened_instrument_items, event_schedules, begin, end) -> list:
+    """
+    Creates the events of the schedules due in [begin, end] for the open positions.
+    Dates of every schedule are expanded once, already generated events are loaded in one query
+    and new ones are inserted with bulk_create.
+    """
+    due_dates = {}
+    event_schedules_cache = defaultdict(list)
+    for event_schedule in event_schedules:
+        dates = event_schedule.get_dates(begin, end)
+        if dates:
+            due_dates[event_schedule.id] = dates
+            event_schedules_cache[event_schedule.instrument_id].append(event_schedule)
+
+    _l.info(
+        "create_generated_events: %s schedules due in [%s, %s], %s open positions",
+        len(due_dates),
+        begin,
+        end,
+        len(opened_instrument_items),
+    )
+    if not due_dates:
+        return []
+
+    existing = set(
+        GeneratedEvent.objects.filter(
+            master_user=master_user,
+            event_schedule__in=due_dates.keys(),
+            effective_date__in={edate for dates in due_dates.values() for edate, _ in dates},
+        ).values_list(
+            "event_schedule_id",
+            "effective_date",
+            "instrument_id",
+            "portfolio_id",
+            "account_id",
+            "strategy1_id",
+            "strategy2_id",
+            "strategy3_id",
+            "position",
+        )
+    )
+
+    parameters_cache = {}
+    status_modified = timezone.now()
+    generated_events = []
+    for item in opened_instrument_items:
+        for event_schedule in event_schedules_cache.get(item["instrument_id"], []):
+            for effective_date, notification_date in due_dates[event_schedule.id]:
+                key = get_generated_event_key(event_schedule.id, effective_date, item)
+                if key in existing:
+                    _l.debug("generated event already exist %s", key)
+                    continue
+                existing.add(key)
+
+                if event_schedule.id not in parameters_cache:
+                    parameters_cache[event_schedule.id] = fill_parameters_from_instrument(
+                        event_schedule, event_schedule.instrument
+                    )
+
+                generated_event = GeneratedEvent(
+                    master_user=master_user,
+                    event_schedule=event_schedule,
+                    status=GeneratedEvent.NEW,
+                    status_modified=status_modified,
+                    effective_date=effective_date,
+                    notification_date=notification_date,
+                    instrument=event_schedule.instrument,
+                    portfolio_id=item["portfolio_id"],
+                    account_id=item["account_position_id"],
+                    strategy1_id=item["strategy1_position_id"],
+                    strategy2_id=item["strategy2_position_id"],
+                    strategy3_id=item["strategy3_position_id"],
+                    position=item["position_size"],
+                )
+                generated_event.data = {"actions_parameters": parameters_cache[event_schedule.id]}
+                generated_events.append(generated_event)
+
+    generated_events = GeneratedEvent.objects.bulk_create(generated_events, batch_size=1000)
+
+    # bulk_create does not call save(), which informs about new events
+    for generated_event in generated_events:
+        try:
+            send_system_message(
+                master_user=master_user,
+                title="Event",
+                description=generated_event.event_schedule.description,
+                type="info",
+                section="events",
+                linked_event=generated_event,
+            )
+        except Exception as e:
+            _l.error(f"Could not send system message on generating event {repr(e)}")
+
+    return generated_events
+
+
 @finmars_task(name="instruments.only_generate_events_at_date", bind=True)
 def only_generate_events_at_date(self, master_user_id, date, *args, **kwargs):  # noqa: PLR0915
     try:
@@ -110,20 +218,8 @@ def only_generate_events_at_date(self, master_user_id, date, *args, **kwargs):
 
         _l.info("generate_events0: master_user=%s", master_user.id)
 
-        instance = Report(
-            master_user=master_user,
-            allocation_mode=Report.MODE_IGNORE,
-            report_date=date,
-        )
-
-        builder = BalanceReportBuilderSql(instance=instance)
-        instance = builder.build_balance()
-
-        opened_instrument_items = [
-            item
-            for item in instance.items
-            if item["item_type"] == ReportItem.TYPE_INSTRUMENT and not isclose(item["position_size"], 0.0)
-        ]
+        builder = PositionsBuilderSql(master_user=master_user)
+        opened_instrument_items = builder.build(date)
         if not opened_instrument_items:
             return
 
@@ -253,24 +349,8 @@ def only_generate_events_at_date_for_single_instrument(self, master_user_id, dat
             (master_user.id, instrument),
         )
 
-        instance = Report(
-            master_user=master_user,
-            allocation_mode=Report.MODE_IGNORE,
-            report_date=date,
-        )
-
-        builder = BalanceReportBuilderSql(instance=instance)
-        instance = builder.build_balance()
-
-        opened_instrument_items = [
-            item
-            for item in instance.items
-            if (
-                item["item_type"] == ReportItem.TYPE_INSTRUMENT
-                and not isclose(item["position_size"], 0.0)
-                and item["instrument_id"] == instrument.id
-            )
-        ]
+        builder = PositionsBuilderSql(master_user=master_user, instruments=[instrument])
+        opened_instrument_items = builder.build(date)
         _l.info(f"opened_instrument_items len {len(opened_instrument_items)}")
 
         if not opened_instrument_items:
@@ -419,16 +499,8 @@ def generate_events(self, task_id, *args, **kwargs):  # noqa: PLR0915
 
         now = date_now()
 
-        instance = Report(master_user=master_user, allocation_mode=Report.MODE_IGNORE, report_date=now)
-
-        builder = BalanceReportBuilderSql(instance=instance)
-        instance = builder.build_balance()
-
-        opened_instrument_items = [
-            item
-            for item in instance.items
-            if item["item_type"] == ReportItem.TYPE_INSTRUMENT and not isclose(item["position_size"], 0.0)
-        ]
+        builder = PositionsBuilderSql(master_user=master_user)
+        opened_instrument_items = builder.build(now)
         if not opened_instrument_items:
             return
 
@@ -447,8 +519,6 @@ def generate_events(self, task_id, *args, **kwargs):  # noqa: PLR0915
         result = []
         result_object = {"events": []}
 
-        generated_events_count = 0
-
         for event_schedule in event_schedule_qs:
             final_date = datetime.date(datetime.strptime(event_schedule.final_date, "%Y-%m-%d"))
             effective_date = datetime.date(datetime.strptime(event_schedule.effective_date, "%Y-%m-%d"))
@@ -464,107 +534,25 @@ def generate_events(self, task_id, *args, **kwargs):  # noqa: PLR0915
             _l.debug("event schedules not found")
             return
 
-        event_schedules_cache = defaultdict(list)
-        for event_schedule in result:
-            event_schedules_cache[event_schedule.instrument_id].append(event_schedule)
-
-        for item in opened_instrument_items:
-            portfolio = item["portfolio_id"]
-            account = item["account_position_id"]
-            strategy1 = item["strategy1_position_id"]
-            strategy2 = item["strategy2_position_id"]
-            strategy3 = item["strategy3_position_id"]
-            instrument = item["instrument_id"]
-            position = item["position_size"]
+        generated_events = create_generated_events(master_user, opened_instrument_items, result, now, now)
 
-            event_schedules = event_schedules_cache.get(instrument, None)
-            _l.info(
-                "opened instrument: portfolio=%s, account=%s, strategy1=%s, strategy2=%s, strategy3=%s, "
-                "instrument=%s, position=%s, event_schedules=%s",
-                portfolio,
-                account,
-                strategy1,
-                strategy2,
-                strategy3,
-                instrument,
-                position,
-                [e.id for e in event_schedules] if event_schedules else [],
+        for generated_event in generated_events:
+            result_object["events"].append(
+                {
+                    "id": generated_event.id,
+                    "effective_date": str(generated_event.effective_date),
+                    "notification_date": str(generated_event.notification_date),
+                    "instrument": {
+                        "id": generated_event.instrument.id,
+                        "user_code": generated_event.instrument.user_code,
+                        "name": generated_event.instrument.name,
+                    },
+                    "status": generated_event.status,
+                    "position": generated_event.position,
+                }
             )
 
-            if not event_schedules:
-                continue
-
-            for event_schedule in event_schedules:
-                _l.debug(
-                    "event_schedule=%s, event_class=%s, notification_class=%s, periodicity=%s, n=%s",
-                    event_schedule.id,
-                    event_schedule.event_class,
-                    event_schedule.notification_class,
-                    event_schedule.periodicity,
-                    event_schedule.periodicity_n,
-                )
-
-                (
-                    is_complies,
-                    effective_date,
-                    notification_date,
-                ) = event_schedule.check_date(now)
-
-                _l.debug("is_complies=%s", is_complies)
-                if is_complies:
-                    ge_dup_qs = GeneratedEvent.objects.filter(
-                        master_user=master_user,
-                        event_schedule=event_schedule,
-                        effective_date=effective_date,
-                        instrument=instrument,
-                        portfolio=portfolio,
-                        account=account,
-                        strategy1=strategy1,
-                        strategy2=strategy2,
-                        strategy3=strategy3,
-                        position=position,
-                    )
-                    if ge_dup_qs.exists():
-                        _l.debug("generated event already exist")
-                        continue
-
-                    print(f"event_schedule {event_schedule}")
-
-                    parameters = fill_parameters_from_instrument(event_schedule, instrument)
-
-                    generated_event = GeneratedEvent()
-                    generated_event.master_user = master_user
-                    generated_event.event_schedule = event_schedule
-                    generated_event.status = GeneratedEvent.NEW
-                    generated_event.status_modified = timezone.now()
-                    generated_event.effective_date = effective_date
-                    generated_event.notification_date = notification_date
-                    generated_event.instrument_id = instrument
-                    generated_event.portfolio_id = portfolio
-                    generated_event.account_id = account
-                    generated_event.strategy1_id = strategy1
-                    generated_event.strategy2_id = strategy2
-                    generated_event.strategy3_id = strategy3
-                    generated_event.position = position
-                    generated_event.data = {"parameters": parameters}
-                    generated_event = generated_event.save()
-
-                    result_object["events"].append(
-                        {
-                            "id": generated_event.id,
-                            "effective_date": str(generated_event.effective_date),
-                            "notification_date": str(generated_event.notification_date),
-                            "instrument": {
-                                "id": generated_event.instrument.id,
-                                "user_code": generated_event.instrument.user_code,
-                                "name": generated_event.instrument.name,
-                            },
-                            "status": generated_event.status,
-                            "position": generated_event.position,
-                        }
-                    )
-
-                    generated_events_count = generated_events_count + 1
+        generated_events_count = len(generated_events)
 
         celery_task.result_object = result_object
         celery_task.verbose_result = f"Events generated: {generated_events_count}"
@@ -600,16 +588,8 @@ def generate_events_do_not_inform_apply_default(self, *args, **kwargs):  # noqa:
 
         now = date_now()
 
-        instance = Report(master_user=master_user, allocation_mode=Report.MODE_IGNORE, report_date=now)
-
-        builder = BalanceReportBuilderSql(instance=instance)
-        instance = builder.build_balance()
-
-        opened_instrument_items = [
-            item
-            for item in instance.items
-            if item["item_type"] == ReportItem.TYPE_INSTRUMENT and not isclose(item["position_size"], 0.0)
-        ]
+        builder = PositionsBuilderSql(master_user=master_user)
+        opened_instrument_items = builder.build(now)
         _l.info(f"opened_instrument_items len {len(opened_instrument_items)}")
 
         if not opened_instrument_items:
@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+
+from django.test import SimpleTestCase
+
+from poms.instruments.models import DATE_FORMAT, EventSchedule, Periodicity
+from poms.transactions.models import EventClass
+
+PERIODICITIES = (
+    Periodicity.N_DAY,
+    Periodicity.N_WEEK_EOBW,
+    Periodicity.N_MONTH_EOM,
+    Periodicity.N_MONTH_SAME_DAY,
+    Periodicity.N_YEAR_EOY,
+    Periodicity.N_YEAR_SAME_DAY,
+    Periodicity.WEEKLY,
+    Periodicity.MONTHLY,
+    Periodicity.QUARTERLY,
+    Periodicity.ANNUALLY,
+)
+
+
+def make_schedule(periodicity_id, n=1, notify_in_n_days=3, accrual=False, event_class_id=EventClass.REGULAR):
+    return EventSchedule(
+        event_class_id=event_class_id,
+        effective_date=date(2023, 1, 31).strftime(DATE_FORMAT),
+        final_date=date(2025, 6, 15).strftime(DATE_FORMAT),
+        notify_in_n_days=notify_in_n_days,
+        periodicity=Periodicity(id=periodicity_id),
+        periodicity_n=str(n),
+        accrual_calculation_schedule_id=1 if accrual else None,
+    )
+
+
+def filter_all_dates(schedule, begin, end):
+    return [(e, n) for e, n in schedule.all_dates if begin <= e <= end or begin <= n <= end]
+
+
+class EventScheduleDatesTest(SimpleTestCase):
+    windows = (
+        (date(2022, 1, 1), date(2022, 12, 31)),
+        (date(2023, 1, 28), date(2023, 1, 28)),
+        (date(2023, 3, 1), date(2023, 4, 30)),
+        (date(2024, 2, 26), date(2024, 3, 3)),
+        (date(2025, 6, 10), date(2025, 6, 20)),
+        (date(2026, 1, 1), date(2026, 12, 31)),
+    )
+
+    def test__get_dates_equal_to_all_dates(self):
+        for periodicity_id in PERIODICITIES:
+            for n in (1, 2, 5):
+                for accrual in (False, True):
+                    schedule = make_schedule(periodicity_id, n=n, accrual=accrual)
+                    for begin, end in self.windows:
+                        with self.subTest(periodicity=periodicity_id, n=n, accrual=accrual, begin=begin, end=end):
+                            self.assertEqual(schedule.get_dates(begin, end), filter_all_dates(schedule, begin, end))
+
+    def test__check_date_equal_to_all_dates(self):
+        schedule = make_schedule(Periodicity.N_DAY, n=7, notify_in_n_days=10)
+        day = date(2023, 1, 1)
+        while day < date(2025, 7, 1):
+            expected = next(((True, e, n) for e, n in schedule.all_dates if day in (e, n)), (False, None, None))
+            self.assertEqual(schedule.check_date(day), expected, day)
+            day += timedelta(days=1)
+
+    def test__zero_n(self):
+        schedule = make_schedule(Periodicity.N_DAY, n=0)
+
+        self.assertEqual(schedule.all_dates, [])
+        self.assertEqual(schedule.get_dates(date(2000, 1, 1), date(2100, 1, 1)), [])
+
+    def test__one_off(self):
+        schedule = make_schedule(Periodicity.N_DAY, event_class_id=EventClass.ONE_OFF)
+
+        self.assertEqual(
+            schedule.get_dates(date(2023, 1, 28), date(2023, 1, 28)), [(date(2023, 1, 31), date(2023, 1, 28))]
+        )
+        self.assertEqual(schedule.get_dates(date(2023, 2, 1), date(2023, 3, 1)), [])
@@ -21,6 +21,7 @@ from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ViewSet
 
 from poms.celery_tasks.models import CeleryTask
+from poms.common.db import get_current_schema
 from poms.common.filters import (
     AttributeFilter,
     CharExactFilter,
@@ -35,7 +36,7 @@ from poms.common.mixins import (
     UpdateModelMixinExt,
 )
 from poms.common.storage import get_storage
-from poms.common.utils import datetime_now, get_current_schema
+from poms.common.utils import datetime_now
 from poms.common.views import (
     AbstractApiView,
     AbstractAsyncViewSet,
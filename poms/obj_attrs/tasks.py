@@ -1,146 +1,245 @@
+import datetime
+import re
+from collections import defaultdict
+from decimal import Decimal
 from logging import getLogger
 
 from poms.celery_tasks import finmars_task
 from poms.celery_tasks.models import CeleryTask
-from poms.common.utils import datetime_now
-from poms.expressions_engine.formula import ExpressionEvalError, safe_eval
-from poms.obj_attrs.models import GenericAttribute, GenericAttributeType
+from poms.common import profiling
+from poms.expressions_engine.formula import SimpleEval2
+from poms.obj_attrs.models import GenericAttribute, GenericAttributeType, GenericClassifier
 
 _l = getLogger("poms.obj_attrs")
 
+INVALID_EXPRESSION = "Invalid Expression"
+
+# attributes recalculated and written per batch, progress of the task is saved after every batch
+RECALCULATION_BATCH_SIZE = 1000
+
+# fields of the related objects in the projection, as in this.<relation>_object of serializer data
+NESTED_OBJECT_FIELDS = ("id", "user_code", "name", "short_name")
+NESTED_OBJECT_ATTRIBUTE_RE = re.compile(r"_object\.(\w+)")
+
+
+def get_attribute_value(attribute: dict):
+    value_type = attribute["attribute_type__value_type"]
+
+    if value_type == GenericAttributeType.STRING:
+        return attribute["value_string"]
+    if value_type == GenericAttributeType.NUMBER:
+        return attribute["value_float"]
+    if value_type == GenericAttributeType.CLASSIFIER:
+        return attribute["classifier__name"]
+    if value_type == GenericAttributeType.DATE:
+        return attribute["value_date"]
+    return None
 
-def get_attributes_as_obj(instance, target_model_content_type):
-    result = {}
 
-    attributes = GenericAttribute.objects.filter(object_id=instance.id, content_type=target_model_content_type)
+def get_attributes_as_objs(object_ids, target_model_content_type) -> dict[int, dict]:
+    """
+    Attributes of the objects in one query, as {object_id: {user_code: value}}
+    """
+    result = defaultdict(dict)
 
+    attributes = GenericAttribute.objects.filter(
+        object_id__in=object_ids,
+        content_type=target_model_content_type,
+    ).values(
+        "object_id",
+        "attribute_type__user_code",
+        "attribute_type__value_type",
+        "value_string",
+        "value_float",
+        "value_date",
+        "classifier__name",
+    )
     for attribute in attributes:
-        attribute_type = attribute.attribute_type
+        result[attribute["object_id"]][attribute["attribute_type__user_code"]] = get_attribute_value(attribute)
 
-        if attribute_type.value_type == 10:
-            result[attribute_type.user_code] = attribute.value_string
+    return result
 
-        if attribute_type.value_type == 20:
-            result[attribute_type.user_code] = attribute.value_float
 
-        if attribute_type.value_type == 30:
-            if attribute.classifier:
-                result[attribute_type.user_code] = attribute.classifier.name
-            else:
-                result[attribute_type.user_code] = None
+def to_representation(value):
+    """
+    Values of the projection the same way as in serializer data
+    """
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
 
-        if attribute_type.value_type == 40:
-            result[attribute_type.user_code] = attribute.value_date
+
+def get_nested_object_fields(target_model) -> dict[str, list[str]]:
+    """
+    {relation name: fields of NESTED_OBJECT_FIELDS the related model has} for the forward relations
+    """
+    result = {}
+    for field in target_model._meta.concrete_fields:
+        if field.is_relation:
+            related_fields = {f.name for f in field.related_model._meta.concrete_fields}
+            result[field.name] = [name for name in NESTED_OBJECT_FIELDS[1:] if name in related_fields]
 
     return result
 
 
-def get_json_objs(
-    target_model,
-    target_model_serializer,
-    target_model_content_type,
-    master_user,
-    context,
-):
+def needs_serializer(expr) -> bool:
+    """
+    Expression uses fields of the related objects which are not in the projection
+    """
+    return bool(set(NESTED_OBJECT_ATTRIBUTE_RE.findall(expr or "")) - set(NESTED_OBJECT_FIELDS))
+
+
+def get_json_objs(target_model, target_model_content_type, master_user, object_ids) -> dict[int, dict]:
+    """
+    Lightweight projection of the instances for the expressions, concrete fields of the model
+    (relations as ids, like in serializer data), <relation>_object with NESTED_OBJECT_FIELDS
+    of the related objects and their attributes, without serializers
+    """
+    fields = {field.name: field.attname for field in target_model._meta.concrete_fields}
+    nested_fields = get_nested_object_fields(target_model)
+
+    lookups = [
+        *fields.values(),
+        *(f"{relation}__{name}" for relation, names in nested_fields.items() for name in names),
+    ]
+    instances = target_model.objects.filter(master_user=master_user, id__in=object_ids).values(*lookups)
+    attributes = get_attributes_as_objs(object_ids, target_model_content_type)
+
     result = {}
+    for values in instances:
+        data = {name: to_representation(values[attname]) for name, attname in fields.items()}
+
+        for relation, names in nested_fields.items():
+            related_id = data[relation]
+            data[f"{relation}_object"] = (
+                {
+                    "id": related_id,
+                    **{name: to_representation(values[f"{relation}__{name}"]) for name in names},
+                }
+                if related_id is not None
+                else None
+            )
+
+        data["attributes"] = attributes.get(data["id"], {})
+        result[data["id"]] = data
 
-    instances = target_model.objects.filter(master_user=master_user)
+    return result
 
-    for instance in instances:
-        serializer = target_model_serializer(instance=instance, context=context)
 
-        result[instance.id] = serializer.data
+def get_serialized_objs(instance, object_ids, context) -> dict[int, dict]:
+    """
+    Full serializer data of the instances, for expressions which need more than the projection
+    """
+    objects = instance.target_model.objects.filter(master_user=instance.master_user, id__in=object_ids)
+    attributes = get_attributes_as_objs(object_ids, instance.target_model_content_type)
 
-        result[instance.id]["attributes"] = get_attributes_as_obj(instance, target_model_content_type)
+    result = {}
+    for obj in objects:
+        data = instance.target_model_serializer(instance=obj, context=context).data
+        data["attributes"] = attributes.get(obj.id, {})
+        result[obj.id] = data
 
     return result
 
 
+def set_attribute_value(attr, attribute_type, value, classifiers):
+    value_attr = attribute_type.get_value_atr()
+
+    if value == INVALID_EXPRESSION:
+        value = None
+    elif attribute_type.value_type == GenericAttributeType.CLASSIFIER:
+        value = classifiers.get(value)
+
+    setattr(attr, value_attr, value)
+
+
 @finmars_task(name="obj_attrs.recalculate_attributes", bind=True)
 def recalculate_attributes(self, instance, *args, **kwargs):
-    _l.debug("recalculate_attributes: instance", instance)
-    # _l.debug('recalculate_attributes: context', context)
+    _l.debug("recalculate_attributes: instance %s", instance)
 
     attribute_type = GenericAttributeType.objects.get(id=instance.attribute_type_id, master_user=instance.master_user)
 
     attributes = GenericAttribute.objects.filter(
         attribute_type=attribute_type, content_type=instance.target_model_content_type
-    )
+    ).order_by("id")
 
-    _l.debug("recalculate_attributes: attributes len %s", len(attributes))
     _l.debug("recalculate_attributes: attribute_type.expr %s", attribute_type.expr)
 
-    _l.debug("self task id %s", self.request.id)
-
     celery_task = CeleryTask.objects.create(
         master_user=instance.master_user,
         member=instance.member,
-        started_at=datetime_now(),
-        task_status="P",
+        status=CeleryTask.STATUS_PENDING,
         verbose_name="User Attributes Recalculation",
-        task_type="attribute_recalculation",
+        type="attribute_recalculation",
         celery_task_id=self.request.id,
     )
 
-    celery_task.save()
-
     context = {"master_user": instance.master_user, "member": instance.member}
 
-    json_objs = get_json_objs(
-        instance.target_model,
-        instance.target_model_serializer,
-        instance.target_model_content_type,
-        instance.master_user,
-        context,
-    )
-
-    total = len(attributes)
-    current = 0
-
-    for attr in attributes:
-        data = json_objs[attr.object_id]
-
-        # _l.debug('data %s' % data)
-
-        try:
-            executed_expression = safe_eval(attribute_type.expr, names={"this": data}, context=context)
-        except (ExpressionEvalError, TypeError, Exception, KeyError):
-            executed_expression = "Invalid Expression"
-
-        # print('executed_expression %s' % executed_expression)
-
-        if attr.attribute_type.value_type == GenericAttributeType.STRING:
-            if executed_expression == "Invalid Expression":
-                attr.value_string = None
-            else:
-                attr.value_string = executed_expression
-
-        if attr.attribute_type.value_type == GenericAttributeType.NUMBER:
-            if executed_expression == "Invalid Expression":
-                attr.value_float = None
-            else:
-                attr.value_float = executed_expression
-
-        if attr.attribute_type.value_type == GenericAttributeType.DATE:
-            if executed_expression == "Invalid Expression":
-                attr.value_date = None
-            else:
-                attr.value_date = executed_expression
-
-        if attr.attribute_type.value_type == GenericAttributeType.CLASSIFIER:
-            if executed_expression == "Invalid Expression":
-                attr.classifier = None
-            else:
-                attr.classifier = executed_expression
-
-        attr.save()
-
-        current = current + 1
-
-        celery_task.data = {"total_rows": total, "processed_rows": current}
-
-        celery_task.save()
+    classifiers = {}
+    if attribute_type.value_type == GenericAttributeType.CLASSIFIER:
+        classifiers = {c.name: c for c in GenericClassifier.objects.filter(attribute_type=attribute_type)}
+
+    value_attr = attribute_type.get_value_atr()
+    evaluator = SimpleEval2(allow_assign=True, context=context)
+
+    total = attributes.count()
+    progress = {"current": 0, "total": total, "percent": 0, "description": "Recalculation in progress"}
+    celery_task.update_progress(progress)
+
+    _l.info("recalculate_attributes: %s attributes of %s", total, attribute_type.user_code)
+
+    attrs_iter = attributes.only("id", "object_id", value_attr).iterator(chunk_size=RECALCULATION_BATCH_SIZE)
+    batch = []
+    for attr in attrs_iter:
+        batch.append(attr)
+        if len(batch) >= RECALCULATION_BATCH_SIZE:
+            recalculate_batch(batch, instance, attribute_type, evaluator, classifiers)
+            progress["current"] += len(batch)
+            progress["percent"] = int(progress["current"] / total * 100)
+            celery_task.update_progress(progress)
+            batch = []
+
+    if batch:
+        recalculate_batch(batch, instance, attribute_type, evaluator, classifiers)
+        progress["current"] += len(batch)
+
+    progress.update({"percent": 100, "description": "Recalculation finished"})
+    celery_task.progress_object = progress
+    celery_task.result_object = {"total_rows": total, "processed_rows": progress["current"]}
+    celery_task.status = CeleryTask.STATUS_DONE
+    celery_task.mark_task_as_finished()
+    celery_task.save()
 
-    celery_task.task_status = "D"
 
-    celery_task.save()
+def recalculate_batch(batch, instance, attribute_type, evaluator, classifiers):
+    object_ids = [attr.object_id for attr in batch]
+    if needs_serializer(attribute_type.expr):
+        json_objs = get_serialized_objs(instance, object_ids, evaluator.context)
+    else:
+        json_objs = get_json_objs(
+            instance.target_model,
+            instance.target_model_content_type,
+            instance.master_user,
+            object_ids,
+        )
+
+    updated = []
+    with profiling.track("expressions"):
+        for attr in batch:
+            data = json_objs.get(attr.object_id)
+            if data is None:
+                # object of other master user or already deleted
+                continue
+
+            try:
+                executed_expression = evaluator.eval(attribute_type.expr, names={"this": data})
+            except Exception:
+                executed_expression = INVALID_EXPRESSION
+
+            set_attribute_value(attr, attribute_type, executed_expression, classifiers)
+            updated.append(attr)
+
+    GenericAttribute.objects.bulk_update(updated, [attribute_type.get_value_atr()])
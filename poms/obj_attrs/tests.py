@@ -1 +1,103 @@
-# Create your tests here.
+from datetime import date
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.expressions_engine.formula import SimpleEval2
+from poms.instruments.models import Instrument
+from poms.obj_attrs import tasks
+from poms.obj_attrs.models import GenericAttribute, GenericAttributeType
+from poms.obj_attrs.tasks import get_json_objs, needs_serializer, recalculate_batch, to_representation
+
+
+class RecalculateBatchTest(SimpleTestCase):
+    def setUp(self):
+        self.instance = mock.Mock()
+        self.evaluator = SimpleEval2(allow_assign=True, context={})
+
+    def recalculate(self, attribute_type, json_objs, batch, classifiers=None):
+        with (
+            mock.patch("poms.obj_attrs.tasks.get_json_objs", return_value=json_objs) as get_json_objs,
+            mock.patch.object(GenericAttribute.objects, "bulk_update") as bulk_update,
+        ):
+            recalculate_batch(batch, self.instance, attribute_type, self.evaluator, classifiers or {})
+
+        get_json_objs.assert_called_once()
+        return bulk_update
+
+    def test__number(self):
+        attribute_type = GenericAttributeType(value_type=GenericAttributeType.NUMBER, expr="this.price * 2")
+        batch = [GenericAttribute(id=i, object_id=i) for i in (1, 2, 3)]
+        json_objs = {1: {"price": 1.5}, 2: {"name": "no price"}}
+
+        bulk_update = self.recalculate(attribute_type, json_objs, batch)
+
+        updated, fields = bulk_update.call_args.args
+        self.assertEqual(fields, ["value_float"])
+        self.assertEqual([(a.object_id, a.value_float) for a in updated], [(1, 3.0), (2, None)])
+
+    def test__string_from_attributes(self):
+        attribute_type = GenericAttributeType(
+            value_type=GenericAttributeType.STRING,
+            expr="this.user_code + '_' + this.attributes.country",
+        )
+        batch = [GenericAttribute(id=1, object_id=7)]
+        json_objs = {7: {"user_code": "bond", "attributes": {"country": "CH"}}}
+
+        bulk_update = self.recalculate(attribute_type, json_objs, batch)
+
+        updated, fields = bulk_update.call_args.args
+        self.assertEqual(fields, ["value_string"])
+        self.assertEqual(updated[0].value_string, "bond_CH")
+
+    def test__assignment(self):
+        attribute_type = GenericAttributeType(value_type=GenericAttributeType.NUMBER, expr="x = this.price\nx * 2")
+        batch = [GenericAttribute(id=1, object_id=1)]
+
+        bulk_update = self.recalculate(attribute_type, {1: {"price": 2}}, batch)
+
+        updated, _ = bulk_update.call_args.args
+        self.assertEqual(updated[0].value_float, 4)
+
+
+class GetJsonObjsTest(SimpleTestCase):
+    def test__nested_objects(self):
+        values = {field.attname: None for field in Instrument._meta.concrete_fields}
+        values.update(
+            {
+                "id": 7,
+                "user_code": "bond",
+                "instrument_type_id": 3,
+                "instrument_type__user_code": "com.finmars:bond",
+                "instrument_type__name": "Bond",
+                "instrument_type__short_name": "Bond",
+            }
+        )
+
+        with (
+            mock.patch.object(Instrument, "objects") as objects,
+            mock.patch.object(tasks, "get_attributes_as_objs", return_value={}),
+        ):
+            objects.filter.return_value.values.return_value = [values]
+            data = get_json_objs(Instrument, None, None, [7])[7]
+
+        evaluator = SimpleEval2(context={})
+        self.assertEqual(
+            evaluator.eval("this.instrument_type_object.user_code", names={"this": data}),
+            "com.finmars:bond",
+        )
+        self.assertEqual(data["instrument_type"], 3)
+        self.assertEqual(data["instrument_type_object"]["id"], 3)
+        self.assertIsNone(data["pricing_currency_object"])
+
+    def test__needs_serializer(self):
+        self.assertFalse(needs_serializer("this.instrument_type_object.user_code + this.name"))
+        self.assertTrue(needs_serializer("this.instrument_type_object.instrument_class"))
+        self.assertFalse(needs_serializer(None))
+
+
+class ToRepresentationTest(SimpleTestCase):
+    def test__dates_as_serializer(self):
+        self.assertEqual(to_representation(date(2024, 1, 31)), "2024-01-31")
+        self.assertEqual(to_representation(1.5), 1.5)
+        self.assertIsNone(to_representation(None))
@@ -25,7 +25,7 @@ from poms.file_reports.models import FileReport
 from poms.instruments.models import CostMethod, Instrument, PricingPolicy
 from poms.obj_attrs.models import GenericAttribute
 from poms.provenance.models import ProvenanceModel
-from poms.users.models import EcosystemDefault, MasterUser
+from poms.users.models import MasterUser
 from poms_app import settings
 
 _l = getLogger("poms.portfolios")
@@ -1129,7 +1129,11 @@ class PortfolioReconcileHistory(NamedModel, TimeStampedModel, ComputedModel, Obj
             if portfolio_id == reference_portfolio["portfolio"]:
                 continue
 
-            for user_code, position_size in portfolio["items"].items():
+            items = portfolio["items"]
+            # positions of the reference portfolio missing in the portfolio are compared with 0
+            user_codes = [*items, *(user_code for user_code in reference_items if user_code not in items)]
+            for user_code in user_codes:
+                position_size = items.get(user_code, 0)
                 # Initialize with reference position size; default to 0 if not found
                 reference_size = reference_items.get(user_code, 0)
 
@@ -1180,9 +1184,14 @@ class PortfolioReconcileHistory(NamedModel, TimeStampedModel, ComputedModel, Obj
         self.error_message = err_msg
         self.save()
 
-    def calculate(self):
-        from poms.reports.common import Report
-        from poms.reports.sql_builders.balance import BalanceReportBuilderSql
+    def calculate(self, positions: list[dict] | None = None):
+        """
+        Reconcile portfolios of the group at self.date
+
+        :param positions: precalculated PositionsBuilderSql items (with cash) at self.date,
+            used by bulk calculation to get positions for all dates in one query
+        """
+        from poms.reports.sql_builders.positions import PositionsBuilderSql
 
         portfolio_map = {}
         position_portfolio_id = None
@@ -1194,61 +1203,43 @@ class PortfolioReconcileHistory(NamedModel, TimeStampedModel, ComputedModel, Obj
             err_msg = f"No Position portfolio in PortfolioReconcileGroup {self.portfolio_reconcile_group.user_code}"
             return self._finish_as_error(err_msg)
 
-        ecosystem_defaults = EcosystemDefault.objects.filter(master_user=self.master_user).first()
-        report = Report(master_user=self.master_user)
-        report.master_user = self.master_user
-        report.member = self.owner
-        report.report_date = self.date
-        report.pricing_policy = ecosystem_defaults.pricing_policy
-        report.report_currency = ecosystem_defaults.currency
-        report.portfolios = self.portfolio_reconcile_group.portfolios.all()
-
-        builder_instance = BalanceReportBuilderSql(instance=report)
-        builder = builder_instance.build_balance_sync()
+        if positions is None:
+            builder = PositionsBuilderSql(
+                master_user=self.master_user,
+                portfolios=list(portfolio_map.keys()),
+                include_cash=True,
+            )
+            positions = builder.build(self.date)
 
-        _l.info(f"calculate: builder.items[0] {builder.items[0]}")
+        # every portfolio of the group is reconciled, also without positions and cash
+        grouped_positions = PositionsBuilderSql.group_by_portfolio(positions)
 
         reconcile_result = {}
-        for item in builder.items:
-            if "portfolio_id" not in item:
-                _l.warning(f"calculate: missing 'portfolio_id' key in builder item {item}")
-                continue
-
-            pid = item["portfolio_id"]
-            if pid not in reconcile_result:
-                portfolio = portfolio_map[pid]
-                reconcile_result[pid] = {
-                    "portfolio": pid,
-                    "portfolio_object": {
-                        "name": portfolio.name,
-                        "user_code": portfolio.user_code,
-                        "portfolio_type": portfolio.portfolio_type_id,
-                        "portfolio_type_object": {
-                            "name": portfolio.portfolio_type.name,
-                            "user_code": portfolio.portfolio_type.user_code,
-                            "portfolio_class": portfolio.portfolio_type.portfolio_class_id,
-                            "portfolio_class_object": {
-                                "id": portfolio.portfolio_type.portfolio_class.id,
-                                "name": portfolio.portfolio_type.portfolio_class.name,
-                                "user_code": portfolio.portfolio_type.portfolio_class.user_code,
-                            },
+        for pid, portfolio in portfolio_map.items():
+            items = grouped_positions.get(pid, {})
+            reconcile_result[pid] = {
+                "portfolio": pid,
+                "portfolio_object": {
+                    "name": portfolio.name,
+                    "user_code": portfolio.user_code,
+                    "portfolio_type": portfolio.portfolio_type_id,
+                    "portfolio_type_object": {
+                        "name": portfolio.portfolio_type.name,
+                        "user_code": portfolio.portfolio_type.user_code,
+                        "portfolio_class": portfolio.portfolio_type.portfolio_class_id,
+                        "portfolio_class_object": {
+                            "id": portfolio.portfolio_type.portfolio_class.id,
+                            "name": portfolio.portfolio_type.portfolio_class.name,
+                            "user_code": portfolio.portfolio_type.portfolio_class.user_code,
                         },
                     },
-                    "position_size": 0,
-                    "items": {},
-                }
-
-            reconcile_result[pid]["items"][item["user_code"]] = item["position_size"]
-            reconcile_result[pid]["position_size"] += item["position_size"]
+                },
+                "position_size": sum(items.values()),
+                "items": items,
+            }
 
         _l.info(f"calculate: reconcile_result {reconcile_result}")
 
-        missing_keys = set(portfolio_map.keys()) - set(reconcile_result.keys())
-        if missing_keys:
-            missing_codes = [portfolio_map[key].user_code for key in missing_keys]
-            err_msg = f"No reconcile results, portfolios: {missing_codes} date: {self.date}, no report created"
-            return self._finish_as_error(err_msg)
-
         reference_portfolio = reconcile_result[position_portfolio_id]
         params = self.portfolio_reconcile_group.params
 
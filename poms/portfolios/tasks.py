@@ -32,6 +32,7 @@ from poms.portfolios.models import (
 from poms.portfolios.utils import get_price_calculation_type, update_price_histories
 from poms.reports.common import Report
 from poms.reports.sql_builders.balance import BalanceReportBuilderSql
+from poms.reports.sql_builders.positions import PositionsBuilderSql
 from poms.system_messages.handlers import send_system_message
 from poms.transactions.models import Transaction, TransactionClass
 from poms.users.models import EcosystemDefault, Member
@@ -907,7 +908,26 @@ def _finish_task_as_error(task: CeleryTask, err_msg: str):
     _send_err_message(task, err_msg)
 
 
-def _calculate_group_reconcile_history(day: str, reconcile_group: PortfolioReconcileGroup, task: CeleryTask):
+def _get_group_positions(reconcile_group: PortfolioReconcileGroup, dates: list[str]) -> dict[str, list[dict]]:
+    """
+    Positions and cash of the group portfolios for all dates, calculated with one query for each
+    """
+    builder = PositionsBuilderSql(
+        master_user=reconcile_group.master_user,
+        portfolios=list(reconcile_group.portfolios.all()),
+        include_cash=True,
+    )
+    positions = builder.build_for_dates(dates)
+
+    return {day: positions[builder.to_date(day)] for day in dates}
+
+
+def _calculate_group_reconcile_history(
+    day: str,
+    reconcile_group: PortfolioReconcileGroup,
+    task: CeleryTask,
+    positions: list[dict] | None = None,
+):
     history_user_code = f"portfolio_reconcile_history_{reconcile_group.user_code}_{day}"
     (
         portfolio_reconcile_history,
@@ -927,7 +947,7 @@ def _calculate_group_reconcile_history(day: str, reconcile_group: PortfolioRecon
 
     portfolio_reconcile_history.linked_task = task
     portfolio_reconcile_history.save(update_fields=["linked_task"])
-    portfolio_reconcile_history.calculate()
+    portfolio_reconcile_history.calculate(positions=positions)
 
     if portfolio_reconcile_history.status == PortfolioReconcileHistory.STATUS_OK:
         reconcile_group.last_calculated_at = datetime.now(UTC)
@@ -980,6 +1000,13 @@ def calculate_portfolio_reconcile_history(self, task_id: int, *args, **kwargs):
 
     dates = task.options_object["dates"]
     days_number = len(dates)
+
+    try:
+        group_positions = _get_group_positions(reconcile_group, dates)
+    except Exception as e:
+        _finish_task_as_error(task, repr(e))
+        return
+
     for count, day in enumerate(dates, start=1):
         task.update_progress(
             {
@@ -991,7 +1018,12 @@ def calculate_portfolio_reconcile_history(self, task_id: int, *args, **kwargs):
         )
 
         try:
-            err_msg = _calculate_group_reconcile_history(day=day, reconcile_group=reconcile_group, task=task)
+            err_msg = _calculate_group_reconcile_history(
+                day=day,
+                reconcile_group=reconcile_group,
+                task=task,
+                positions=group_positions[day],
+            )
             if err_msg:
                 _finish_task_as_error(task, err_msg)
                 return
@@ -1056,9 +1088,22 @@ def bulk_calculate_reconcile_history(self, task_id: int, *args, **kwargs):
             error_messages.append(err_msg)
             continue
 
+        try:
+            group_positions = _get_group_positions(reconcile_group, dates)
+        except Exception as e:
+            err_msg = f"group: {group_user_code} err: {repr(e)}"
+            _send_err_message(task, err_msg)
+            error_messages.append(err_msg)
+            continue
+
         for day in dates:
             try:
-                err_msg = _calculate_group_reconcile_history(day=day, reconcile_group=reconcile_group, task=task)
+                err_msg = _calculate_group_reconcile_history(
+                    day=day,
+                    reconcile_group=reconcile_group,
+                    task=task,
+                    positions=group_positions[day],
+                )
                 if err_msg:
                     _send_err_message(task, err_msg)
                     error_messages.append(err_msg)
@@ -62,34 +62,25 @@ class PortfolioReconcileHistoryTest(BaseTestCase):
 
     @patch("poms.portfolios.models.PortfolioReconcileHistory.generate_json_report")
     @patch("poms.portfolios.models.PortfolioReconcileHistory.compare_portfolios")
-    @patch("poms.reports.sql_builders.balance.BalanceReportBuilderSql")
-    @patch("poms.reports.common.Report")
-    @patch("poms.portfolios.models.EcosystemDefault.objects")
+    @patch("poms.reports.sql_builders.positions.PositionsBuilderSql.build")
     def test_calculate_history_only_errors(
         self,
-        mock_ecosystem_defaults,
-        mock_report_class,
-        mock_balance_builder,
+        mock_positions_build,
         mock_compare_portfolios,
         mock_generate_json_report,
     ):
-        mock_ecosystem_defaults.filter.return_value.first.return_value = MagicMock()
-        mock_report = MagicMock()
-        mock_report_class.return_value = mock_report
-        mock_balance_builder.return_value.build_balance_sync.return_value = MagicMock(
-            items=[
-                {
-                    "portfolio_id": self.portfolio_1.id,
-                    "user_code": self.portfolio_1.user_code,
-                    "position_size": 10,
-                },
-                {
-                    "portfolio_id": self.portfolio_2.id,
-                    "user_code": self.portfolio_2.user_code,
-                    "position_size": 10,
-                },
-            ]
-        )
+        mock_positions_build.return_value = [
+            {
+                "portfolio_id": self.portfolio_1.id,
+                "user_code": self.portfolio_1.user_code,
+                "position_size": 10,
+            },
+            {
+                "portfolio_id": self.portfolio_2.id,
+                "user_code": self.portfolio_2.user_code,
+                "position_size": 10,
+            },
+        ]
         mock_compare_portfolios.return_value = ([], False)
         mock_generate_json_report.return_value = self.create_file_report()
 
@@ -111,34 +102,25 @@ class PortfolioReconcileHistoryTest(BaseTestCase):
 
     @patch("poms.portfolios.models.PortfolioReconcileHistory.generate_json_report")
     @patch("poms.portfolios.models.PortfolioReconcileHistory.compare_portfolios")
-    @patch("poms.reports.sql_builders.balance.BalanceReportBuilderSql")
-    @patch("poms.reports.common.Report")
-    @patch("poms.portfolios.models.EcosystemDefault.objects")
+    @patch("poms.reports.sql_builders.positions.PositionsBuilderSql.build")
     def test_calculate_history_default(
         self,
-        mock_ecosystem_defaults,
-        mock_report_class,
-        mock_balance_builder,
+        mock_positions_build,
         mock_compare_portfolios,
         mock_generate_json_report,
     ):
-        mock_ecosystem_defaults.filter.return_value.first.return_value = MagicMock()
-        mock_report = MagicMock()
-        mock_report_class.return_value = mock_report
-        mock_balance_builder.return_value.build_balance_sync.return_value = MagicMock(
-            items=[
-                {
-                    "portfolio_id": self.portfolio_1.id,
-                    "user_code": self.portfolio_1.user_code,
-                    "position_size": 10,
-                },
-                {
-                    "portfolio_id": self.portfolio_2.id,
-                    "user_code": self.portfolio_2.user_code,
-                    "position_size": 10,
-                },
-            ]
-        )
+        mock_positions_build.return_value = [
+            {
+                "portfolio_id": self.portfolio_1.id,
+                "user_code": self.portfolio_1.user_code,
+                "position_size": 10,
+            },
+            {
+                "portfolio_id": self.portfolio_2.id,
+                "user_code": self.portfolio_2.user_code,
+                "position_size": 10,
+            },
+        ]
         mock_compare_portfolios.return_value = (["good report"], False)
         mock_generate_json_report.return_value = self.create_file_report()
 
@@ -165,6 +147,85 @@ class PortfolioReconcileHistoryTest(BaseTestCase):
 
         mock_finish_as_error.assert_called_once()
 
+    @patch("poms.portfolios.models.PortfolioReconcileHistory.generate_json_report")
+    @patch("poms.portfolios.models.PortfolioReconcileHistory.compare_portfolios")
+    @patch("poms.reports.sql_builders.positions.PositionsBuilderSql.build")
+    def test_calculate_with_precalculated_positions(
+        self,
+        mock_positions_build,
+        mock_compare_portfolios,
+        mock_generate_json_report,
+    ):
+        mock_compare_portfolios.return_value = ([], False)
+        mock_generate_json_report.return_value = self.create_file_report()
+        positions = [
+            {
+                "portfolio_id": self.portfolio_1.id,
+                "user_code": "instrument_1",
+                "position_size": 4,
+            },
+            {
+                "portfolio_id": self.portfolio_1.id,
+                "user_code": "instrument_1",
+                "position_size": 6,
+            },
+            {
+                "portfolio_id": self.portfolio_2.id,
+                "user_code": "instrument_1",
+                "position_size": 10,
+            },
+        ]
+
+        group = self.create_reconcile_group()
+        group.portfolios.set([self.portfolio_1, self.portfolio_2])
+
+        history = self.create_reconcile_history(group)
+        history.calculate(positions=positions)
+
+        mock_positions_build.assert_not_called()
+        self.assertEqual(history.status, PortfolioReconcileHistory.STATUS_OK)
+
+        reference_portfolio, portfolios, _ = mock_compare_portfolios.call_args.args
+        self.assertEqual(reference_portfolio["portfolio"], self.portfolio_2.id)
+        self.assertEqual(portfolios[self.portfolio_1.id]["items"], {"instrument_1": 10})
+        self.assertEqual(portfolios[self.portfolio_1.id]["position_size"], 10)
+
+    @patch("poms.portfolios.models.PortfolioReconcileHistory.generate_json_report")
+    @patch("poms.portfolios.models.PortfolioReconcileHistory.compare_portfolios")
+    def test_calculate_cash_only_and_empty_portfolios(self, mock_compare_portfolios, mock_generate_json_report):
+        mock_compare_portfolios.return_value = ([], False)
+        mock_generate_json_report.return_value = self.create_file_report()
+        positions = [
+            {"portfolio_id": self.portfolio_2.id, "currency_id": 1, "user_code": "USD", "position_size": 10},
+        ]
+
+        group = self.create_reconcile_group()
+        group.portfolios.set([self.portfolio_1, self.portfolio_2])
+
+        history = self.create_reconcile_history(group)
+        history.calculate(positions=positions)
+
+        self.assertEqual(history.status, PortfolioReconcileHistory.STATUS_OK)
+        reference_portfolio, portfolios, _ = mock_compare_portfolios.call_args.args
+        self.assertEqual(reference_portfolio["items"], {"USD": 10})
+        self.assertEqual(portfolios[self.portfolio_1.id]["items"], {})
+        self.assertEqual(portfolios[self.portfolio_1.id]["position_size"], 0)
+
+    def test_compare_portfolios_missing_positions(self):
+        reference = {"portfolio": 2, "portfolio_object": {"user_code": "position"}, "items": {"USD": 10}}
+        portfolios = {
+            1: {"portfolio": 1, "portfolio_object": {"user_code": "general"}, "items": {}},
+            2: reference,
+        }
+
+        report, has_reconcile_error = PortfolioReconcileHistory.compare_portfolios(reference, portfolios, {})
+
+        self.assertTrue(has_reconcile_error)
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]["user_code"], "USD")
+        self.assertEqual(report[0]["general"], 0)
+        self.assertEqual(report[0]["message"], "general is missing 10 units")
+
     @patch("poms.portfolios.models.now")
     @patch("poms.portfolios.models.FileReport")
     def test_generate_json_report_full(self, mock_file_report, mock_now):
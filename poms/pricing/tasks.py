@@ -1,54 +1,98 @@
+import json
 import logging
 
+from django.db.models import Prefetch
+
 from poms.celery_tasks import finmars_task
 from poms.celery_tasks.models import CeleryTask
-from poms.configuration.utils import run_workflow
+from poms.configuration.utils import WorkflowDispatcher, WorkflowRun
 from poms.currencies.models import Currency
 from poms.instruments.models import Instrument
 
 _l = logging.getLogger("poms.pricing")
 
 
-def _run_pricing(task, reference_type, objects):
-    last_exception = None
+def _get_pricing_runs(task, reference_type, objects) -> list[WorkflowRun]:
+    """
+    One run per object and pricing policy, or, if references_per_workflow option is set,
+    one run per group of objects having the same pricing schema, policy and options
+    """
     options = task.options_object
-    for count, obj in enumerate(objects):
-        pricing_policies = obj.pricing_policies.all()
-        if options.get("pricing_policies"):
-            pricing_policies = pricing_policies.filter(pricing_policy__user_code__in=options["pricing_policies"])
-        for schema in pricing_policies:
+    references_per_workflow = max(int(options.get("references_per_workflow") or 1), 1)
+
+    policies = objects.model._meta.get_field("pricing_policies").related_model.objects.select_related("pricing_policy")
+    if options.get("pricing_policies"):
+        policies = policies.filter(pricing_policy__user_code__in=options["pricing_policies"])
+    objects = objects.prefetch_related(Prefetch("pricing_policies", queryset=policies))
+
+    groups = {}
+    for obj in objects:
+        for schema in obj.pricing_policies.all():
+            key = (
+                schema.target_pricing_schema_user_code,
+                schema.pricing_policy.user_code,
+                json.dumps(schema.options, sort_keys=True, default=str),
+            )
+            groups.setdefault(key, (schema, []))[1].append(obj.user_code)
+
+    runs = []
+    for schema, references in groups.values():
+        for i in range(0, len(references), references_per_workflow):
+            chunk = references[i : i + references_per_workflow]
+
             payload = schema.options.copy()
             payload["date_from"] = options["date_from"]
             payload["date_to"] = options["date_to"]
             payload["reference_type"] = reference_type
-            payload["reference"] = obj.user_code
+            if references_per_workflow == 1:
+                payload["reference"] = chunk[0]
+            else:
+                payload["references"] = chunk
             payload["pricing_policy"] = schema.pricing_policy.user_code
             # TODO, when instrument whill have reference_dict we can fetch different reference base on provider
 
-            try:
-                workflow = schema.target_pricing_schema_user_code + ":run_pricing"
-                _l.info(f"run_pricing.going to execute workflow {workflow}")
+            runs.append(
+                WorkflowRun(
+                    user_code=schema.target_pricing_schema_user_code + ":run_pricing",
+                    payload=payload,
+                    context=chunk,
+                )
+            )
 
-                response_data = run_workflow(workflow, payload, task)
-                # response_data = wait_workflow_until_end(response_data["id"], task)
+    return runs
 
-                _l.info(f"run_pricing.workflow finished {response_data}")
-            except Exception as e:
-                last_exception = e
-                _l.exception(
-                    f"Could not execute run_pricing.workflow for instrument {obj.user_code}"
-                    f" and pricing policy {schema.pricing_policy.user_code}"
-                )
 
-            task.status = CeleryTask.STATUS_REQUEST_SENT
-            task.update_progress(
-                {
-                    "current": count,
-                    "total": len(objects),
-                    "percent": round(count / (len(objects) / 100)),
-                    "description": f"Instance {obj.id} pricing scheduled",
-                }
+def _run_pricing(task, reference_type, objects):
+    last_exception = None
+
+    runs = _get_pricing_runs(task, reference_type, objects)
+    total = len(runs)
+    _l.info(f"run_pricing.going to execute {total} workflows for {reference_type}")
+
+    def on_done(count, run):
+        nonlocal last_exception
+
+        if run.error:
+            last_exception = run.error
+            _l.error(
+                f"Could not execute run_pricing.workflow {run.user_code} for {reference_type} "
+                f"{', '.join(run.context)} and pricing policy {run.payload['pricing_policy']}: {repr(run.error)}"
             )
+        else:
+            _l.info(f"run_pricing.workflow finished {run.response}")
+
+        task.status = CeleryTask.STATUS_REQUEST_SENT
+        task.update_progress(
+            {
+                "current": count,
+                "total": total,
+                "percent": round(count / (total / 100)),
+                "description": f"Pricing of {', '.join(run.context)} scheduled",
+            }
+        )
+
+    WorkflowDispatcher(task).run_many(runs, on_done=on_done)
+
     return last_exception
 
 
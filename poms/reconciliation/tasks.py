@@ -4,9 +4,11 @@ import logging
 # from poms.integrations.storage import import_file_storage
 from tempfile import NamedTemporaryFile
 
+from django.db.models import Q
 from django.utils.translation import gettext_lazy
 
 from poms.celery_tasks import finmars_task
+from poms.celery_tasks.models import CeleryTask
 from poms.common.storage import get_storage
 from poms.common.utils import date_now
 from poms.expressions_engine import formula
@@ -24,6 +26,37 @@ _l = logging.getLogger("poms.reconciliation")
 
 storage = get_storage()
 
+# rows of the bank file processed between the lookups of existing fields and the writes
+RECONCILE_BATCH_SIZE = 500
+
+
+def get_bank_file_field_key(source_id, reference_name) -> tuple:
+    return None if source_id is None else str(source_id), reference_name
+
+
+def get_existing_bank_file_fields(master_user, import_scheme_name, new_bank_file_fields) -> dict:
+    """
+    Existing fields of the bank file fields by (source_id, reference_name), in one query
+    """
+    keys = {get_bank_file_field_key(f.source_id, f.reference_name) for f in new_bank_file_fields}
+    source_ids = {source_id for source_id, _ in keys if source_id is not None}
+    reference_names = {reference_name for _, reference_name in keys}
+
+    source_id_q = Q(source_id__in=source_ids)
+    if any(source_id is None for source_id, _ in keys):
+        source_id_q |= Q(source_id__isnull=True)
+
+    existing = {}
+    for field in ReconciliationBankFileField.objects.filter(
+        source_id_q,
+        master_user=master_user,
+        reference_name__in=reference_names,
+        import_scheme_name=import_scheme_name,
+    ).order_by("id"):
+        existing.setdefault(get_bank_file_field_key(field.source_id, field.reference_name), field)
+
+    return existing
+
 
 @finmars_task(name="reconciliation.process_bank_file_for_reconcile", bind=True)
 def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: PLR0915
@@ -34,11 +67,67 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
     scheme = instance.scheme
     scheme_inputs = list(scheme.inputs.all())
 
-    recon_scenarios = list(scheme.recon_scenarios.all())
+    recon_scenarios = list(scheme.recon_scenarios.prefetch_related("selector_values", "fields"))
+    scenarios_selector_values = {
+        scheme_recon.id: [item.value for item in scheme_recon.selector_values.all()]
+        for scheme_recon in recon_scenarios
+    }
+    scenarios_fields = {scheme_recon.id: list(scheme_recon.fields.all()) for scheme_recon in recon_scenarios}
 
     _now = date_now()
 
-    def _process_csv_file(file):  # noqa: PLR0912, PLR0915
+    # one evaluator for all rows, the names of a row are passed to eval()
+    evaluator = formula.SimpleEval2(allow_assign=True)
+
+    # (result row, bank file field) of the rows processed since the last flush
+    pending_fields = []
+
+    def _flush():
+        new_bank_file_fields = [field for _, field in pending_fields]
+        existing = get_existing_bank_file_fields(
+            instance.master_user, instance.scheme.scheme_name, new_bank_file_fields
+        )
+
+        results = []
+        to_create = []
+        for result_row, new_bank_file_field in pending_fields:
+            existed_bank_file_field = existing.get(
+                get_bank_file_field_key(new_bank_file_field.source_id, new_bank_file_field.reference_name)
+            )
+            if existed_bank_file_field is None:
+                to_create.append(new_bank_file_field)
+            results.append((result_row, existed_bank_file_field, new_bank_file_field))
+
+        ReconciliationNewBankFileField.objects.bulk_create(to_create)
+
+        for result_row, existed_bank_file_field, new_bank_file_field in results:
+            if existed_bank_file_field is not None:
+                serializer = ReconciliationBankFileFieldSerializer(existed_bank_file_field)
+            else:
+                serializer = ReconciliationNewBankFileFieldSerializer(new_bank_file_field)
+            result_row["fields"].append(serializer.data)
+
+        pending_fields.clear()
+
+        self.update_state(
+            task_id=instance.task_id,
+            state=CeleryTask.STATUS_PENDING,
+            meta={
+                "processed_rows": instance.processed_rows,
+                "total_rows": instance.total_rows,
+                "scheme_name": instance.scheme.scheme_name,
+                "file_name": instance.filename,
+            },
+        )
+
+    def _process_csv_file(file):
+        try:
+            _process_csv_rows(file)
+        finally:
+            if pending_fields:
+                _flush()
+
+    def _process_csv_rows(file):  # noqa: PLR0912, PLR0915
         instance.processed_rows = 0
 
         delimiter = instance.delimiter.encode("utf-8").decode("unicode_escape")
@@ -54,6 +143,9 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
         instance.results = []
 
         for row_index, row in enumerate(reader):
+            if row_index and row_index % RECONCILE_BATCH_SIZE == 0:
+                _flush()
+
             _l.debug("process row: %s -> %s", row_index, row)
             if (row_index == 0 and instance.skip_first_line) or not row:
                 _l.debug("skip first row")
@@ -122,7 +214,7 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
                 )
 
                 try:
-                    inputs[i.name] = formula.safe_eval(i.name_expr, names=inputs_raw)
+                    inputs[i.name] = evaluator.eval(i.name_expr, names=inputs_raw)
                     error_rows["error_data"]["data"]["converted_imported_columns"].append(row[i.column - 1])
                 except Exception:
                     _l.debug(
@@ -159,7 +251,7 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
                     continue
 
             try:
-                selector_value = formula.safe_eval(scheme.rule_expr, names=inputs)
+                selector_value = evaluator.eval(scheme.rule_expr, names=inputs)
             except Exception:
                 error_rows["level"] = "error"
 
@@ -180,13 +272,7 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
             processed_scenarios = 0
 
             for scheme_recon in recon_scenarios:
-                matched_selector = False
-
-                selector_values = scheme_recon.selector_values.all()
-
-                for item in selector_values:
-                    if item.value == selector_value:
-                        matched_selector = True
+                matched_selector = selector_value in scenarios_selector_values[scheme_recon.id]
 
                 if matched_selector:
                     processed_scenarios = processed_scenarios + 1
@@ -198,9 +284,7 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
 
                     result_row["fields"] = []
 
-                    fields = {}  # noqa: F841
-                    fields_error = []  # noqa: F841
-                    for field in scheme_recon.fields.all():
+                    for field in scenarios_fields[scheme_recon.id]:
                         new_bank_file_field = ReconciliationNewBankFileField(master_user=instance.master_user)
 
                         new_bank_file_field.reference_name = field.reference_name
@@ -209,14 +293,14 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
                         new_bank_file_field.import_scheme_name = instance.scheme.scheme_name
 
                         try:
-                            new_bank_file_field.source_id = formula.safe_eval(
+                            new_bank_file_field.source_id = evaluator.eval(
                                 scheme_recon.line_reference_id, names=inputs
                             )
                         except formula.InvalidExpression:
                             new_bank_file_field.value_string = "<InvalidExpression>"
 
                         try:
-                            new_bank_file_field.reference_date = formula.safe_eval(
+                            new_bank_file_field.reference_date = evaluator.eval(
                                 scheme_recon.reference_date, names=inputs
                             )
                         except formula.InvalidExpression:
@@ -224,58 +308,31 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
 
                         if field.value_string:
                             try:
-                                new_bank_file_field.value_string = formula.safe_eval(field.value_string, names=inputs)
+                                new_bank_file_field.value_string = evaluator.eval(field.value_string, names=inputs)
                             except formula.InvalidExpression:
                                 new_bank_file_field.value_string = "<InvalidExpression>"
                         if field.value_float:
                             try:  # noqa: SIM105
-                                new_bank_file_field.value_float = formula.safe_eval(field.value_float, names=inputs)
+                                new_bank_file_field.value_float = evaluator.eval(field.value_float, names=inputs)
                             except formula.InvalidExpression:
                                 pass
 
                         if field.value_date:
                             try:  # noqa: SIM105
-                                new_bank_file_field.value_date = formula.safe_eval(field.value_date, names=inputs)
+                                new_bank_file_field.value_date = evaluator.eval(field.value_date, names=inputs)
                             except formula.InvalidExpression:
                                 pass
 
-                        try:
-                            existed_bank_file_field = ReconciliationBankFileField.objects.get(
-                                master_user=instance.master_user,
-                                source_id=new_bank_file_field.source_id,
-                                reference_name=new_bank_file_field.reference_name,
-                                import_scheme_name=new_bank_file_field.import_scheme_name,
-                            )
-
-                            serializer = ReconciliationBankFileFieldSerializer(existed_bank_file_field)
-
-                        except ReconciliationBankFileField.DoesNotExist:
-                            new_bank_file_field.save()
-
-                            print(f"id {new_bank_file_field.id}")
-
-                            serializer = ReconciliationNewBankFileFieldSerializer(new_bank_file_field)
-
-                        result_row["fields"].append(serializer.data)
+                        # serialized data of the existing or the created field is added to the row on flush
+                        pending_fields.append((result_row, new_bank_file_field))
 
                         try:
-                            result_row["source_id"] = formula.safe_eval(scheme_recon.line_reference_id, names=inputs)
+                            result_row["source_id"] = evaluator.eval(scheme_recon.line_reference_id, names=inputs)
                         except formula.InvalidExpression:
                             result_row["source_id"] = "<InvalidExpression>"
 
                     instance.processed_rows = instance.processed_rows + 1
 
-                    self.update_state(
-                        task_id=instance.task_id,
-                        state=Task.STATUS_PENDING,  # noqa: F821
-                        meta={
-                            "processed_rows": instance.processed_rows,
-                            "total_rows": instance.total_rows,
-                            "scheme_name": instance.scheme.scheme_name,
-                            "file_name": instance.filename,
-                        },
-                    )
-
                     instance.results.append(result_row)
 
             if processed_scenarios == 0:
@@ -321,7 +378,7 @@ def process_bank_file_for_reconcile(self, instance, *args, **kwargs):  # noqa: P
                 instance.total_rows = _row_count(cfr)
                 self.update_state(
                     task_id=instance.task_id,
-                    state=Task.STATUS_PENDING,  # noqa: F821
+                    state=CeleryTask.STATUS_PENDING,
                     meta={
                         "total_rows": instance.total_rows,
                         "scheme_name": instance.scheme.scheme_name,
@@ -0,0 +1,25 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.reconciliation.models import ReconciliationBankFileField, ReconciliationNewBankFileField
+from poms.reconciliation.tasks import get_existing_bank_file_fields
+
+
+class GetExistingBankFileFieldsTest(SimpleTestCase):
+    def test__fields_by_source_id_and_reference_name(self):
+        first = ReconciliationBankFileField(id=1, source_id="101", reference_name="amount")
+        duplicate = ReconciliationBankFileField(id=2, source_id="101", reference_name="amount")
+        without_source = ReconciliationBankFileField(id=3, source_id=None, reference_name="amount")
+        new_fields = [
+            ReconciliationNewBankFileField(source_id=101, reference_name="amount"),
+            ReconciliationNewBankFileField(source_id=None, reference_name="amount"),
+        ]
+
+        with mock.patch.object(ReconciliationBankFileField.objects, "filter") as filter_:
+            filter_.return_value.order_by.return_value = [first, duplicate, without_source]
+            existing = get_existing_bank_file_fields(mock.Mock(), "scheme", new_fields)
+
+        filter_.assert_called_once()
+        self.assertEqual(filter_.call_args.kwargs["reference_name__in"], {"amount"})
+        self.assertEqual(existing, {("101", "amount"): first, (None, "amount"): without_source})
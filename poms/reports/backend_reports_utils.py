@@ -1,5 +1,6 @@
 import itertools
 import logging
+from collections.abc import Iterator
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
@@ -304,14 +305,7 @@ class BackendReportHelperService:
 
         return flattened_item
 
-    def convert_report_items_to_full_items(self, data):
-        original_items = []  # probably we're missing user attributes
-
-        # to_representation_st = time.perf_counter()
-        # def log_with_time(message):
-        #     elapsed_time = time.perf_counter() - to_representation_st
-        #     _l.debug(f"{message} | Elapsed time: {elapsed_time:.3f} seconds")
-
+    def get_helper_dicts(self, data) -> dict:
         helper_dicts = {
             "accrued_currency": self.convert_helper_dict(data["item_currencies"]),
             "pricing_currency": self.convert_helper_dict(data["item_currencies"]),
@@ -341,8 +335,6 @@ class BackendReportHelperService:
             "strategy3_cash": self.convert_helper_dict(data["item_strategies3"]),
         }
 
-        # log_with_time("helper dicts are created")
-
         if "item_countries" in data:
             helper_dicts["country"] = self.convert_helper_dict(data["item_countries"])
 
@@ -355,25 +347,35 @@ class BackendReportHelperService:
         if "item_transaction_classes" in data:
             helper_dicts["transaction_class"] = self.convert_helper_dict(data["item_transaction_classes"])
 
+        return helper_dicts
+
+    def get_instrument_attribute_types(self) -> list:
         content_type = ContentType.objects.get(app_label="instruments", model="instrument")
-        instrument_attribute_types = GenericAttributeType.objects.filter(content_type=content_type)
+        return list(GenericAttributeType.objects.filter(content_type=content_type))
 
-        # log_with_time("data prepared to be flattened")
+    def iter_full_items(self, data, items=None) -> Iterator[dict]:
+        """
+        Flattens items one by one, items default to data["items"].
+        Helper dicts are prepared before the first item is requested.
+        """
+        helper_dicts = self.get_helper_dicts(data)
+        instrument_attribute_types = self.get_instrument_attribute_types()
 
-        # _l.debug('data helper_dicts %s' %  helper_dicts)
-        # _l.debug('data items %s' % data['items'][0])
-        for item in data["items"]:
-            original_item = self.flatten_and_convert_item(item, helper_dicts, instrument_attribute_types)
+        def flatten(items):
+            for item in items:
+                full_item = self.flatten_and_convert_item(item, helper_dicts, instrument_attribute_types)
 
-            if "custom_fields" in item:
-                for custom_field in item["custom_fields"]:
-                    original_item["custom_fields." + custom_field["user_code"]] = custom_field["value"]
+                if "custom_fields" in item:
+                    for custom_field in item["custom_fields"]:
+                        full_item["custom_fields." + custom_field["user_code"]] = custom_field["value"]
 
-            original_items.append(original_item)
+                yield full_item
 
-        # log_with_time("data flattening")
+        return flatten(data["items"] if items is None else items)
 
-        return original_items
+    def convert_report_items_to_full_items(self, data):
+        # probably we're missing user attributes
+        return list(self.iter_full_items(data))
 
     def get_filter_match(self, item, key, value):
         item_value = item.get(key)
@@ -0,0 +1,222 @@
+import gc
+import json
+import logging
+import time
+import tracemalloc
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+
+from poms.celery_tasks.models import CeleryTask
+from poms.common.profiling import Profile
+from poms.csv_import.handlers import SimpleImportProcess
+from poms.csv_import.models import CsvImportScheme
+from poms.reports.benchmarks.synthetic import SyntheticSpace
+from poms.reports.common import PerformanceReport, Report, TransactionReport
+from poms.reports.performance_report import PerformanceReportBuilder
+from poms.reports.sql_builders.balance import BalanceReportBuilderSql
+from poms.reports.sql_builders.pl import PLReportBuilderSql
+from poms.reports.sql_builders.transaction import TransactionReportBuilderSql
+
+_l = logging.getLogger("poms.reports")
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# metrics compared with the baseline, a result is a regression if it exceeds the baseline by the tolerance
+METRICS = ("wall_time", "query_count", "peak_memory")
+
+PRICE_HISTORY_SCHEME = "com.finmars.standard-import-from-file:instruments.pricehistory:price_from_file"
+
+
+class BenchmarkSkipped(Exception):
+    pass
+
+
+def build_balance_report(space: SyntheticSpace) -> int:
+    report = Report(
+        master_user=space.master_user,
+        member=space.member,
+        report_date=space.end_date,
+        portfolios=space.portfolios,
+    )
+    return len(BalanceReportBuilderSql(report).build_balance_sync().items)
+
+
+def build_pl_report(space: SyntheticSpace) -> int:
+    report = Report(
+        master_user=space.master_user,
+        member=space.member,
+        report_type=Report.TYPE_PL,
+        pl_first_date=space.begin_date,
+        report_date=space.end_date,
+        portfolios=space.portfolios,
+    )
+    return len(PLReportBuilderSql(report).build_pl_sync().items)
+
+
+def build_transaction_report(space: SyntheticSpace) -> int:
+    report = TransactionReport(
+        master_user=space.master_user,
+        member=space.member,
+        begin_date=space.begin_date,
+        end_date=space.end_date,
+        portfolios=space.portfolios,
+    )
+    return len(TransactionReportBuilderSql(instance=report).build_transaction().items)
+
+
+def build_performance_report(space: SyntheticSpace) -> int:
+    report = PerformanceReport(
+        master_user=space.master_user,
+        member=space.member,
+        begin_date=space.begin_date,
+        end_date=space.end_date,
+        calculation_type=PerformanceReport.CALCULATION_TYPE_MODIFIED_DIETZ,
+        segmentation_type=PerformanceReport.SEGMENTATION_TYPE_MONTHS,
+        registers=space.registers,
+    )
+    return len(PerformanceReportBuilder(instance=report).build_report().items)
+
+
+def prepare_simple_import(space: SyntheticSpace):
+    """
+    Task of the price history import of the synthetic instruments, the items are passed in the task options
+    """
+
+    scheme = CsvImportScheme.objects.filter(
+        user_code=PRICE_HISTORY_SCHEME,
+        content_type=ContentType.objects.get(app_label="instruments", model="pricehistory"),
+    ).first()
+    if scheme is None:
+        raise BenchmarkSkipped(f"import scheme {PRICE_HISTORY_SCHEME} is not installed in the space")
+
+    instrument_user_codes = [instrument.user_code for instrument in space.instruments]
+    items = list(islice(space.data.iter_import_rows(instrument_user_codes), space.scale.import_rows))
+    task = CeleryTask.objects.create(
+        master_user=space.master_user,
+        member=space.member,
+        verbose_name="Simple Import",
+        type="simple_import",
+        options_object={
+            "file_path": "benchmark.json",
+            "filename": "benchmark.json",
+            "scheme_id": scheme.id,
+            "execution_context": None,
+            "items": items,
+        },
+    )
+
+    def run_simple_import() -> int:
+        process = SimpleImportProcess(task_id=task.id)
+        process.fill_with_file_items()
+        process.fill_with_raw_items()
+        process.apply_conversion_to_raw_items()
+        process.preprocess()
+        process.process()
+        return len(process.items)
+
+    return run_simple_import
+
+
+# name: build(space) -> number of items, or prepare(space) -> build() for cases with a setup not to be measured
+CASES = {
+    "balance": build_balance_report,
+    "pl": build_pl_report,
+    "transaction": build_transaction_report,
+    "performance": build_performance_report,
+}
+PREPARED_CASES = {
+    "simple_import": prepare_simple_import,
+}
+
+
+def measure(space: SyntheticSpace, name: str, func) -> dict:
+    """
+    Wall time, queries of the connection and peak of python allocations (tracemalloc) of the call.
+    tracemalloc slows the call down evenly, compare results measured the same way only.
+    """
+    profile = Profile("benchmark", name, space.master_user.space_code)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(profile.execute_wrapper):
+            start = time.perf_counter()
+            items = func()
+            wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_time": round(wall_time, 3),
+        "query_count": profile.query_count,
+        "db_time": round(profile.db_time, 3),
+        "peak_memory": peak_memory,
+        "items": items,
+        "duplicates": len(profile.get_duplicates()),
+    }
+
+
+def get_key(scale_name: str, case: str) -> str:
+    return f"{scale_name}:{case}"
+
+
+def run_benchmarks(space: SyntheticSpace, cases: list[str]) -> dict[str, dict]:
+    results = {}
+    for case in cases:
+        key = get_key(space.scale.name, case)
+        try:
+            if case in PREPARED_CASES:
+                build = PREPARED_CASES[case](space)
+                results[key] = measure(space, key, build)
+            else:
+                results[key] = measure(space, key, lambda case=case: CASES[case](space))
+        except BenchmarkSkipped as e:
+            _l.warning("run_benchmarks: %s skipped, %s", key, e)
+            continue
+
+        _l.info("run_benchmarks: %s %s", key, results[key])
+
+    return results
+
+
+def load_baseline(path: Path) -> dict[str, dict]:
+    if not path.exists():
+        return {}
+
+    with path.open() as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, results: dict[str, dict]):
+    baseline = {**load_baseline(path), **results}
+    with path.open("w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare_with_baseline(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[dict]:
+    """
+    Metrics exceeding the baseline by more than the tolerance (0.2 is 20%)
+    """
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if not expected:
+            continue
+
+        for metric in METRICS:
+            if expected.get(metric) and result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append(
+                    {
+                        "key": key,
+                        "metric": metric,
+                        "baseline": expected[metric],
+                        "result": result[metric],
+                        "change": round(result[metric] / expected[metric] - 1, 3),
+                    }
+                )
+
+    return regressions
@@ -0,0 +1,470 @@
+import logging
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import islice
+
+from django.db import connection
+
+from poms.accounts.models import Account
+from poms.celery_tasks.models import CeleryTask
+from poms.currencies.models import Currency, CurrencyHistory
+from poms.instruments.models import Instrument, PriceHistory
+from poms.portfolios.models import Portfolio, PortfolioBundle, PortfolioRegister, PortfolioRegisterRecord
+from poms.transactions.models import ComplexTransaction, Transaction, TransactionClass
+from poms.users.models import EcosystemDefault, FakeSequence
+
+_l = logging.getLogger("poms.reports")
+
+PREFIX = "bench"
+
+# data ends at a fixed date, the same seed gives the same rows on every run
+END_DATE = date(2024, 12, 31)
+
+BATCH_SIZE = 5000
+
+# complex transaction codes are spaced as by FakeSequence.next_value(..., d=100)
+CODE_STEP = 100
+
+
+@dataclass(frozen=True)
+class Scale:
+    name: str
+    portfolios: int
+    instruments: int
+    currencies: int
+    transactions: int
+    days: int
+    import_rows: int
+
+
+SCALES = {
+    "small": Scale(
+        "small",
+        portfolios=5,
+        instruments=50,
+        currencies=5,
+        transactions=5_000,
+        days=90,
+        import_rows=1_000,
+    ),
+    "medium": Scale(
+        "medium",
+        portfolios=20,
+        instruments=500,
+        currencies=15,
+        transactions=50_000,
+        days=365,
+        import_rows=10_000,
+    ),
+    "large": Scale(
+        "large",
+        portfolios=50,
+        instruments=2_000,
+        currencies=30,
+        transactions=500_000,
+        days=3 * 365,
+        import_rows=100_000,
+    ),
+}
+
+
+def batched(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class SyntheticData:
+    """
+    Seeded plan of the synthetic space, independent of the DB.
+
+    Prices and FX rates are random walks, transactions are trades of instruments
+    in their pricing currency at the price of the day and cash flows of portfolios.
+    Every portfolio starts with a deposit on the first day.
+    """
+
+    def __init__(self, scale: Scale, seed: int = 0):
+        self.scale = scale
+        self.seed = seed
+        self.random = random.Random(f"{seed}:{scale.name}")
+
+        self.begin_date = END_DATE - timedelta(days=scale.days - 1)
+        self.dates = [self.begin_date + timedelta(days=day) for day in range(scale.days)]
+
+        # currency of every instrument, by index
+        self.instrument_currencies = [self.random.randrange(scale.currencies) for _ in range(scale.instruments)]
+        self.fx_rates = [self.get_random_walk(self.random.uniform(0.5, 2.0)) for _ in range(scale.currencies)]
+        self.prices = [self.get_random_walk(self.random.uniform(5, 500)) for _ in range(scale.instruments)]
+
+    def get_random_walk(self, start: float) -> list[float]:
+        values = []
+        value = start
+        for _ in range(self.scale.days):
+            values.append(round(value, 6))
+            value *= 1 + self.random.gauss(0, 0.01)
+        return values
+
+    def iter_transactions(self):
+        """
+        Yields (portfolio, instrument, transaction_class_id, day, position_size, cash) with indexes of
+        portfolios, instruments and dates, instrument is None for cash flows.
+        Every call yields the same rows.
+        """
+        scale = self.scale
+        rng = random.Random(f"{self.seed}:{scale.name}:transactions")
+
+        for portfolio in range(scale.portfolios):
+            yield portfolio, None, TransactionClass.CASH_INFLOW, 0, 0.0, 1_000_000.0
+
+        for _ in range(scale.transactions - scale.portfolios):
+            portfolio = rng.randrange(scale.portfolios)
+            day = rng.randrange(scale.days)
+
+            if rng.random() < 0.05:
+                cash = round(rng.uniform(1_000, 100_000), 2)
+                if rng.random() < 0.5:
+                    yield portfolio, None, TransactionClass.CASH_INFLOW, day, 0.0, cash
+                else:
+                    yield portfolio, None, TransactionClass.CASH_OUTFLOW, day, 0.0, -cash
+                continue
+
+            instrument = rng.randrange(scale.instruments)
+            size = float(rng.randint(1, 1000))
+            if rng.random() < 0.3:
+                size = -size
+            transaction_class_id = TransactionClass.BUY if size > 0 else TransactionClass.SELL
+
+            yield (
+                portfolio,
+                instrument,
+                transaction_class_id,
+                day,
+                size,
+                round(-size * self.prices[instrument][day], 2),
+            )
+
+    def iter_import_rows(self, instrument_user_codes: list[str]):
+        """
+        Rows of the price history import, prices of the days after the end of the data
+        """
+        rng = random.Random(f"{self.seed}:{self.scale.name}:import")
+        days = -(-self.scale.import_rows // self.scale.instruments)
+        for day in range(1, days + 1):
+            for index, user_code in enumerate(instrument_user_codes):
+                price = round(self.prices[index][-1] * (1 + rng.gauss(0, 0.01)), 6)
+                yield {
+                    "Date": str(END_DATE + timedelta(days=day)),
+                    "Instrument": user_code,
+                    "Principal Price": price,
+                    "Accrued Price": 0,
+                    "Factor": 1,
+                    "YTM": 0,
+                    "Short Delta": 0,
+                    "Modified Duration": 0,
+                    "Is Temporary Price": 0,
+                    "Long Delta": 0,
+                }
+
+
+class SyntheticSpace:
+    """
+    Synthetic portfolios, instruments, currencies, transactions and price/FX history of the scale
+    in the current schema. All objects have user codes starting with "bench_<scale>_",
+    delete() removes them, create() recreates them from the seed.
+    """
+
+    def __init__(self, master_user, member, scale: Scale, seed: int = 0):
+        self.master_user = master_user
+        self.member = member
+        self.scale = scale
+        self.seed = seed
+        self.prefix = f"{PREFIX}_{scale.name}_"
+        self.ecosystem_default = EcosystemDefault.cache.get_cache(master_user_pk=master_user.pk)
+        self.data = SyntheticData(scale, seed)
+
+        self.currencies = []
+        self.instruments = []
+        self.portfolios = []
+        self.registers = []
+
+    @property
+    def begin_date(self) -> date:
+        return self.data.begin_date
+
+    @property
+    def end_date(self) -> date:
+        return END_DATE
+
+    def get_user_code(self, kind: str, index: int) -> str:
+        return f"{self.prefix}{kind}_{index:05d}"
+
+    def get_named(self, model, kind: str, index: int, **kwargs):
+        user_code = self.get_user_code(kind, index)
+        return model(
+            master_user=self.master_user,
+            owner=self.member,
+            user_code=user_code,
+            name=user_code,
+            short_name=user_code,
+            **kwargs,
+        )
+
+    def load(self) -> "SyntheticSpace":
+        """
+        Objects of an already generated space
+        """
+        self.currencies = list(Currency.objects.filter(user_code__startswith=self.prefix).order_by("user_code"))
+        self.instruments = list(Instrument.objects.filter(user_code__startswith=self.prefix).order_by("user_code"))
+        self.portfolios = list(Portfolio.objects.filter(user_code__startswith=self.prefix).order_by("user_code"))
+        self.registers = list(
+            PortfolioRegister.objects.filter(user_code__startswith=self.prefix).order_by("user_code")
+        )
+        return self
+
+    def exists(self) -> bool:
+        return Portfolio.objects.filter(user_code__startswith=self.prefix).exists()
+
+    def create(self) -> "SyntheticSpace":
+        self.delete()
+
+        _l.info("SyntheticSpace.create: %s seed %s", self.scale, self.seed)
+
+        self.create_currencies()
+        self.create_instruments()
+        self.create_portfolios()
+        self.create_history()
+        self.create_transactions()
+
+        for portfolio in self.portfolios:
+            # first transaction dates of the portfolio
+            portfolio.save()
+
+        self.calculate_register_records()
+
+        return self.load()
+
+    def create_currencies(self):
+        currencies = [
+            self.get_named(Currency, "currency", index, default_fx_rate=self.data.fx_rates[index][0])
+            for index in range(self.scale.currencies)
+        ]
+        self.currencies = Currency.objects.bulk_create(currencies, batch_size=BATCH_SIZE)
+
+    def create_instruments(self):
+        instruments = []
+        for index, currency_index in enumerate(self.data.instrument_currencies):
+            currency = self.currencies[currency_index]
+            instruments.append(
+                self.get_named(
+                    Instrument,
+                    "instrument",
+                    index,
+                    instrument_type=self.ecosystem_default.instrument_type,
+                    pricing_currency=currency,
+                    accrued_currency=currency,
+                    maturity_date=END_DATE + timedelta(days=10 * 365),
+                )
+            )
+        self.instruments = Instrument.objects.bulk_create(instruments, batch_size=BATCH_SIZE)
+
+    def create_portfolios(self):
+        accounts = Account.objects.bulk_create(
+            [self.get_named(Account, "portfolio", index) for index in range(self.scale.portfolios)]
+        )
+        self.portfolios = Portfolio.objects.bulk_create(
+            [self.get_named(Portfolio, "portfolio", index) for index in range(self.scale.portfolios)]
+        )
+        Portfolio.accounts.through.objects.bulk_create(
+            [
+                Portfolio.accounts.through(portfolio_id=portfolio.id, account_id=account.id)
+                for portfolio, account in zip(self.portfolios, accounts, strict=True)
+            ]
+        )
+
+        self.registers = PortfolioRegister.objects.bulk_create(
+            [
+                self.get_named(
+                    PortfolioRegister,
+                    "portfolio",
+                    index,
+                    portfolio=portfolio,
+                    linked_instrument=self.ecosystem_default.instrument,
+                    valuation_currency=self.ecosystem_default.currency,
+                    valuation_pricing_policy=self.ecosystem_default.pricing_policy,
+                )
+                for index, portfolio in enumerate(self.portfolios)
+            ]
+        )
+        for register in self.registers:
+            bundle = PortfolioBundle.objects.create(
+                master_user=self.master_user,
+                owner=self.member,
+                user_code=register.user_code,
+                name=register.user_code,
+            )
+            bundle.registers.set([register])
+
+    def create_history(self):
+        pricing_policy = self.ecosystem_default.pricing_policy
+
+        def iter_fx_history():
+            for currency, rates in zip(self.currencies, self.data.fx_rates, strict=True):
+                for day, rate in zip(self.data.dates, rates, strict=True):
+                    yield CurrencyHistory(currency=currency, pricing_policy=pricing_policy, date=day, fx_rate=rate)
+
+        def iter_price_history():
+            for instrument, prices in zip(self.instruments, self.data.prices, strict=True):
+                for day, price in zip(self.data.dates, prices, strict=True):
+                    yield PriceHistory(
+                        instrument=instrument,
+                        pricing_policy=pricing_policy,
+                        date=day,
+                        principal_price=price,
+                    )
+
+        for batch in batched(iter_fx_history()):
+            CurrencyHistory.objects.bulk_create(batch)
+        for batch in batched(iter_price_history()):
+            PriceHistory.objects.bulk_create(batch)
+
+    def reserve_codes(self, count: int) -> int:
+        """
+        First of count complex transaction codes, the sequence is moved past the last one
+        """
+        first = FakeSequence.next_value(self.master_user, "complex_transaction", d=CODE_STEP)
+        FakeSequence.objects.filter(master_user=self.master_user, name="complex_transaction").update(
+            value=first + (count - 1) * CODE_STEP
+        )
+        return first
+
+    def create_transactions(self):
+        ecosystem_default = self.ecosystem_default
+        accounts = {
+            portfolio_id: account_id
+            for portfolio_id, account_id in Portfolio.accounts.through.objects.filter(
+                portfolio__in=self.portfolios
+            ).values_list("portfolio_id", "account_id")
+        }
+        first_code = self.reserve_codes(self.scale.transactions)
+
+        for batch_index, batch in enumerate(batched(self.data.iter_transactions())):
+            offset = batch_index * BATCH_SIZE
+            complex_transactions = ComplexTransaction.objects.bulk_create(
+                [
+                    ComplexTransaction(
+                        master_user=self.master_user,
+                        owner=self.member,
+                        transaction_type=ecosystem_default.transaction_type,
+                        date=self.data.dates[day],
+                        code=first_code + (offset + index) * CODE_STEP,
+                        transaction_unique_code=f"{self.prefix}{offset + index}",
+                    )
+                    for index, (_, _, _, day, _, _) in enumerate(batch)
+                ]
+            )
+
+            transactions = []
+            for complex_transaction, row in zip(complex_transactions, batch, strict=True):
+                portfolio_index, instrument_index, transaction_class_id, day, size, cash = row
+                portfolio = self.portfolios[portfolio_index]
+                account_id = accounts[portfolio.id]
+                if instrument_index is None:
+                    instrument = ecosystem_default.instrument
+                    currency = ecosystem_default.currency
+                    price = 0.0
+                else:
+                    instrument = self.instruments[instrument_index]
+                    currency = instrument.pricing_currency
+                    price = self.data.prices[instrument_index][day]
+
+                transactions.append(
+                    Transaction(
+                        master_user=self.master_user,
+                        owner=self.member,
+                        complex_transaction=complex_transaction,
+                        transaction_code=complex_transaction.code,
+                        transaction_class_id=transaction_class_id,
+                        portfolio=portfolio,
+                        account_position_id=account_id,
+                        account_cash_id=account_id,
+                        account_interim_id=account_id,
+                        instrument=instrument,
+                        linked_instrument=instrument,
+                        allocation_balance=instrument,
+                        allocation_pl=instrument,
+                        transaction_currency=currency,
+                        settlement_currency=currency,
+                        position_size_with_sign=size,
+                        principal_with_sign=cash if instrument_index is not None else 0.0,
+                        cash_consideration=cash,
+                        trade_price=price,
+                        factor=1,
+                        reference_fx_rate=1,
+                        transaction_date=complex_transaction.date,
+                        accounting_date=complex_transaction.date,
+                        cash_date=complex_transaction.date,
+                        strategy1_position=ecosystem_default.strategy1,
+                        strategy1_cash=ecosystem_default.strategy1,
+                        strategy2_position=ecosystem_default.strategy2,
+                        strategy2_cash=ecosystem_default.strategy2,
+                        strategy3_position=ecosystem_default.strategy3,
+                        strategy3_cash=ecosystem_default.strategy3,
+                        counterparty=ecosystem_default.counterparty,
+                        responsible=ecosystem_default.responsible,
+                    )
+                )
+
+            Transaction.objects.bulk_create(transactions)
+            _l.info("SyntheticSpace.create_transactions: %s created", offset + len(batch))
+
+    def calculate_register_records(self):
+        """
+        Register records of the cash flows, the performance report is built from them
+        """
+        from poms.portfolios.tasks import calculate_portfolio_register_record
+
+        task = CeleryTask.objects.create(
+            master_user=self.master_user,
+            member=self.member,
+            verbose_name="Calculate Portfolio Register Records",
+            type="calculate_portfolio_register_record",
+            status=CeleryTask.STATUS_PENDING,
+            options_object={
+                "portfolio_registers": [register.user_code for register in self.registers],
+                "date_from": str(self.begin_date),
+                "date_to": str(self.end_date),
+            },
+        )
+        calculate_portfolio_register_record.apply(
+            kwargs={
+                "task_id": task.id,
+                "context": {
+                    "space_code": self.master_user.space_code,
+                    "realm_code": self.master_user.realm_code,
+                },
+            },
+        )
+
+    def delete(self):
+        prefix = self.prefix
+
+        PortfolioRegisterRecord.objects.filter(portfolio__user_code__startswith=prefix).delete()
+        with connection.cursor() as cursor:
+            # transactions are deleted by SQL, post_delete of every row would mark snapshots dirty one by one
+            cursor.execute(
+                "delete from transactions_transaction where complex_transaction_id in "
+                "(select id from transactions_complextransaction where transaction_unique_code like %s)",
+                [f"{prefix}%"],
+            )
+        ComplexTransaction.objects.filter(transaction_unique_code__startswith=prefix).delete()
+
+        PortfolioBundle.objects.filter(user_code__startswith=prefix).delete()
+        PortfolioRegister.objects.filter(user_code__startswith=prefix).delete()
+        Portfolio.objects.filter(user_code__startswith=prefix).delete()
+        Account.objects.filter(user_code__startswith=prefix).delete()
+
+        PriceHistory.objects.filter(instrument__user_code__startswith=prefix).delete()
+        Instrument.objects.filter(user_code__startswith=prefix).delete()
+        CurrencyHistory.objects.filter(currency__user_code__startswith=prefix).delete()
+        Currency.objects.filter(user_code__startswith=prefix).delete()
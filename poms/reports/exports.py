@@ -0,0 +1,462 @@
+import csv
+import io
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from tempfile import SpooledTemporaryFile, TemporaryFile
+from typing import IO
+
+import pyarrow
+import pyarrow.parquet
+from django.conf import settings
+from django.core.files import File
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from poms.common.exceptions import FinmarsBaseException
+from poms.reports.backend_reports_utils import BackendReportHelperService
+
+_l = logging.getLogger("poms.reports")
+
+# xlsx and parquet files are kept in memory up to this size, then spooled to disk
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+def get_export_columns(options: dict) -> list[dict]:
+    """
+    Exported columns in the order of the layout, [{"key": ..., "name": ...}]
+    """
+    columns = []
+    for column in options.get("columns") or []:
+        key = column["key"]
+        name = column.get("layout_name") or column.get("name") or key
+        columns.append({"key": key, "name": str(name)})
+
+    return columns
+
+
+# fields of the report besides item_* relations, which the custom fields evaluation reads
+CUSTOM_FIELDS_DATA_KEYS = (
+    "custom_fields_object",
+    "custom_fields_to_calculate",
+    "expression_iterations_count",
+    "report_currency",
+    "report_date",
+    "pl_first_date",
+    "cost_method",
+    "pricing_policy",
+    "portfolio_mode",
+    "account_mode",
+)
+
+# (report data, full items of the batch), sets custom_fields.<user_code> of the items
+CustomFieldsCalculator = Callable[[dict, list[dict]], None]
+
+
+def get_report_relations(serializer, instance) -> dict:
+    """
+    Serialized item_* relations of the report, the helper dicts of the flattening are built from them,
+    with the report fields the custom fields evaluation needs
+    """
+    return {
+        name: field.to_representation(field.get_attribute(instance))
+        for name, field in serializer.fields.items()
+        if name.startswith("item_") or name in CUSTOM_FIELDS_DATA_KEYS
+    }
+
+
+def iter_column_batches(
+    relations: dict,
+    items: Iterable[dict],
+    keys: list[str],
+    options: dict | None = None,
+    batch_size: int | None = None,
+    calculate_custom_fields: CustomFieldsCalculator | None = None,
+) -> Iterator[dict[str, list]]:
+    """
+    Flattens the items in batches and projects every batch to the columns,
+    yields {key: [values]}. Custom fields are evaluated per batch, table and
+    group filters of the layout are applied to each batch, they do not depend
+    on other rows.
+    """
+    full_items = BackendReportHelperService().iter_full_items(relations, items)
+
+    calculate_batch = None
+    if calculate_custom_fields:
+
+        def calculate_batch(batch):
+            calculate_custom_fields(relations, batch)
+
+    return iter_full_item_batches(full_items, keys, options, batch_size, calculate_batch)
+
+
+def iter_chunked_full_items(
+    chunks: Iterable[tuple[dict, Iterable[dict]]],
+    calculate_custom_fields: CustomFieldsCalculator | None = None,
+) -> Iterator[dict]:
+    """
+    Flattens items of a report read by chunks, every chunk comes with its own item_* relations
+    """
+    helper_service = BackendReportHelperService()
+    for relations, items in chunks:
+        full_items = helper_service.iter_full_items(relations, items)
+        if calculate_custom_fields:
+            full_items = list(full_items)
+            calculate_custom_fields(relations, full_items)
+
+        yield from full_items
+
+
+def iter_full_item_batches(
+    full_items: Iterator[dict],
+    keys: list[str],
+    options: dict | None = None,
+    batch_size: int | None = None,
+    calculate_batch: Callable[[list[dict]], None] | None = None,
+) -> Iterator[dict[str, list]]:
+    batch_size = batch_size or settings.REPORT_EXPORT_BATCH_SIZE
+    helper_service = BackendReportHelperService()
+
+    def batches():
+        while batch := list(islice(full_items, batch_size)):
+            if calculate_batch:
+                calculate_batch(batch)
+            if options and "filter_settings" in options:
+                batch = helper_service.filter(batch, options)
+            if options:
+                batch = helper_service.filter_by_groups_filters(batch, options)
+
+            if batch:
+                yield {key: [item.get(key) for item in batch] for key in keys}
+
+    return batches()
+
+
+class ReportExportWriter(ABC):
+    """
+    Writes column batches into the binary output as they come
+    """
+
+    extension = ""
+    content_type = ""
+
+    def __init__(self, output: IO[bytes], columns: list[dict]):
+        self.output = output
+        self.columns = columns
+        self.keys = [column["key"] for column in columns]
+        self.rows_count = 0
+
+    def get_rows(self, batch: dict[str, list]) -> Iterator[tuple]:
+        return zip(*(batch[key] for key in self.keys), strict=True)
+
+    @abstractmethod
+    def write_batch(self, batch: dict[str, list]):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class CsvExportWriter(ReportExportWriter):
+    extension = "csv"
+    content_type = "text/csv"
+
+    def __init__(self, output, columns):
+        super().__init__(output, columns)
+        self.stream = io.TextIOWrapper(output, encoding="utf-8", newline="", write_through=True)
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow([column["name"] for column in columns])
+
+    def write_batch(self, batch):
+        rows = list(self.get_rows(batch))
+        self.writer.writerows(rows)
+        self.rows_count += len(rows)
+
+    def close(self):
+        # the output stays open for the caller
+        self.stream.flush()
+        self.stream.detach()
+
+
+class XlsxExportWriter(ReportExportWriter):
+    """
+    Write-only workbook, rows are not kept in memory after they are appended
+    """
+
+    extension = "xlsx"
+    content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def __init__(self, output, columns):
+        super().__init__(output, columns)
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Report")
+        self.sheet.append([column["name"] for column in columns])
+
+    @staticmethod
+    def get_cell_value(value):
+        if value is None or isinstance(value, bool | int | float | Decimal | date | datetime):
+            return value
+        if isinstance(value, list | dict):
+            return json.dumps(value, default=str)
+
+        return ILLEGAL_CHARACTERS_RE.sub("", str(value))
+
+    def write_batch(self, batch):
+        for row in self.get_rows(batch):
+            self.sheet.append([self.get_cell_value(value) for value in row])
+            self.rows_count += 1
+
+    def close(self):
+        self.workbook.save(self.output)
+
+
+class ParquetExportWriter(ReportExportWriter):
+    """
+    Every batch is written as a row group, the schema is taken from the first batch.
+    Parquet columns are named by the column keys, names of the layout may repeat.
+    """
+
+    extension = "parquet"
+    content_type = "application/vnd.apache.parquet"
+
+    def __init__(self, output, columns):
+        super().__init__(output, columns)
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.schema = None
+        self.writer = None
+
+    def get_array(self, values, value_type=None):
+        pa = self.pa
+
+        if value_type is None:
+            try:
+                array = pa.array(values)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                array = None
+
+            if array is None or pa.types.is_null(array.type):
+                return self.get_array(values, pa.string())
+            return array
+
+        if pa.types.is_string(value_type):
+            values = [None if value is None else str(value) for value in values]
+
+        try:
+            return pa.array(values, type=value_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # value of another type than in the first batch, e.g. "Invalid expression" in a number column
+            return pa.array([self.get_scalar(value, value_type) for value in values], type=value_type)
+
+    def get_scalar(self, value, value_type):
+        try:
+            return self.pa.scalar(value, type=value_type).as_py()
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError):
+            return None
+
+    def write_batch(self, batch):
+        if self.schema is None:
+            arrays = [self.get_array(batch[key]) for key in self.keys]
+            self.schema = self.pa.schema(
+                [self.pa.field(key, array.type) for key, array in zip(self.keys, arrays, strict=True)]
+            )
+            self.writer = self.pq.ParquetWriter(self.output, self.schema)
+        else:
+            arrays = [self.get_array(batch[field.name], field.type) for field in self.schema]
+
+        table = self.pa.Table.from_arrays(arrays, schema=self.schema)
+        self.writer.write_table(table, row_group_size=table.num_rows)
+        self.rows_count += table.num_rows
+
+    def close(self):
+        if self.writer is None:
+            # empty report, file with the columns only
+            self.schema = self.pa.schema([self.pa.field(key, self.pa.string()) for key in self.keys])
+            self.writer = self.pq.ParquetWriter(self.output, self.schema)
+
+        self.writer.close()
+
+
+EXPORT_WRITERS = {
+    CsvExportWriter.extension: CsvExportWriter,
+    XlsxExportWriter.extension: XlsxExportWriter,
+    ParquetExportWriter.extension: ParquetExportWriter,
+}
+
+
+def get_export_writer_class(export_format: str) -> type[ReportExportWriter]:
+    try:
+        return EXPORT_WRITERS[export_format]
+    except KeyError as e:
+        raise FinmarsBaseException(
+            error_key="invalid_export_format",
+            message=f"export_format must be one of {', '.join(EXPORT_WRITERS)}",
+            status_code=400,
+        ) from e
+
+
+class ReportExport:
+    """
+    Streams report items through the flattening into a writer of the export format.
+
+    relations are serialized item_* lists of the report, items are the report items
+    (any iterable, they are consumed once), columns and filters come from the layout
+    (frontend_request_options).
+    """
+
+    def __init__(
+        self,
+        relations: dict,
+        items: Iterable[dict],
+        options: dict,
+        export_format: str,
+        calculate_custom_fields: CustomFieldsCalculator | None = None,
+    ):
+        self.calculate_custom_fields = calculate_custom_fields
+        self.writer_class = get_export_writer_class(export_format)
+        self.columns = get_export_columns(options)
+        if not self.columns:
+            raise FinmarsBaseException(
+                error_key="invalid_export_columns",
+                message="frontend_request_options.columns are required for the export",
+                status_code=400,
+            )
+
+        self.batches = self.get_batches(relations, items, [column["key"] for column in self.columns], options)
+
+    def get_batches(self, relations, items, keys, options):
+        return iter_column_batches(
+            relations, items, keys, options, calculate_custom_fields=self.calculate_custom_fields
+        )
+
+    def write(self, output: IO[bytes]) -> int:
+        writer = self.writer_class(output, self.columns)
+        for batch in self.batches:
+            writer.write_batch(batch)
+        writer.close()
+
+        _l.debug("ReportExport: %s rows written as %s", writer.rows_count, self.writer_class.extension)
+
+        return writer.rows_count
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """
+        Encoded output by batches, used to stream csv without a file
+        """
+        buffer = ExportBuffer()
+        writer = self.writer_class(buffer, self.columns)
+        for batch in self.batches:
+            writer.write_batch(batch)
+            yield buffer.take()
+
+        writer.close()
+        yield buffer.take()
+
+    def get_response(self, filename: str):
+        filename = f"{filename}.{self.writer_class.extension}"
+
+        if self.writer_class is CsvExportWriter:
+            response = StreamingHttpResponse(self.iter_chunks(), content_type=CsvExportWriter.content_type)
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return response
+
+        # zip and parquet footers are written at the end, the file has to be seekable
+        file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)  # noqa: SIM115
+        self.write(file)
+        file.seek(0)
+
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=filename,
+            content_type=self.writer_class.content_type,
+        )
+
+    def save(self, storage, path: str) -> str:
+        """
+        Writes the export into the storage, returns the saved path
+        """
+        path = f"{path}.{self.writer_class.extension}"
+
+        with TemporaryFile() as file:
+            self.write(file)
+            file.seek(0)
+            return storage.save(path, File(file))
+
+
+class ChunkedReportExport(ReportExport):
+    """
+    Export of a report read by chunks, items are (relations, items) pairs of every chunk
+    """
+
+    def get_batches(self, relations, items, keys, options):
+        return iter_full_item_batches(iter_chunked_full_items(items, self.calculate_custom_fields), keys, options)
+
+
+class ExportBuffer(io.RawIOBase):
+    """
+    Collects written bytes until they are taken by the response
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def get_report_export(
+    serializer, instance, serialize_item: Callable[[dict], dict], export_format: str | None
+) -> ReportExport:
+    """
+    Export of the built report instance, items are serialized lazily by serialize_item,
+    custom fields are evaluated by serializer.calculate_custom_fields
+    """
+    return ReportExport(
+        relations=get_report_relations(serializer, instance),
+        items=(serialize_item(item) for item in instance.items),
+        options=instance.frontend_request_options or {},
+        export_format=export_format or CsvExportWriter.extension,
+        calculate_custom_fields=serializer.calculate_custom_fields,
+    )
+
+
+def get_chunked_report_export(
+    serializer,
+    instance,
+    chunks: Iterable[list[dict]],
+    serialize_item: Callable[[dict], dict],
+    export_format: str | None,
+) -> ChunkedReportExport:
+    """
+    Export of a report built by chunks (e.g. TransactionReportBuilderSql.iter_item_chunks),
+    item_* relations of the instance are serialized again for every chunk
+    """
+
+    def serialized_chunks():
+        for items in chunks:
+            yield get_report_relations(serializer, instance), [serialize_item(item) for item in items]
+
+    return ChunkedReportExport(
+        relations=None,
+        items=serialized_chunks(),
+        options=instance.frontend_request_options or {},
+        export_format=export_format or CsvExportWriter.extension,
+        calculate_custom_fields=serializer.calculate_custom_fields,
+    )
@@ -1,14 +1,13 @@
 import logging
 import time
 
-from celery import group
-
 from poms.accounts.models import Account
 from poms.celery_tasks.models import CeleryTask
 from poms.iam.utils import get_allowed_queryset
 from poms.portfolios.models import Portfolio
 from poms.reports.common import Report
 from poms.reports.sql_builders.balance import build
+from poms.reports.sql_builders.executor import ReportShardExecutor
 from poms.users.models import EcosystemDefault
 
 _l = logging.getLogger("poms.reports")
@@ -124,31 +123,8 @@ class BalanceReportLightBuilderSql:
 
             tasks.append(task)
 
-        _l.debug("Going to run %s tasks", len(tasks))
-
-        # Run the group of tasks
-        job = group(
-            build.s(
-                task_id=task.id,
-                context={
-                    "realm_code": self.instance.master_user.realm_code,
-                    "space_code": self.instance.master_user.space_code,
-                },
-            )
-            for task in tasks
-        )
-
-        group_result = job.apply_async()
-        # Wait for all tasks to finish and get their results
-        group_result.join()
-
-        # Retrieve results
-        all_dicts = []
-        # TODO probably we can do some optimization here
-        for result in group_result.results:
-            # Each result is an AsyncResult instance.
-            # You can get the result of the task with its .result property.
-            all_dicts.extend(result.result)
+        executor = ReportShardExecutor(lambda task_id: build(task_id=task_id), celery_task=build)
+        all_dicts = executor.run(self.instance, tasks)
 
         for task in tasks:
             # refresh the task instance to get the latest status from the database
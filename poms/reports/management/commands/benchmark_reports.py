@@ -0,0 +1,101 @@
+import json
+from dataclasses import replace
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from poms.common.db import set_search_path
+from poms.reports.benchmarks import runner
+from poms.reports.benchmarks.synthetic import SCALES, SyntheticSpace
+from poms.users.models import MasterUser, Member
+
+CASES = [*runner.CASES, *runner.PREPARED_CASES]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate seeded synthetic data in a local space, run report builders and simple import at several scales "
+        "and compare wall time, query count and peak memory with the baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--space-code", required=True, help="Workspace code (DB schema)")
+        parser.add_argument("--member", default="finmars_bot", help="Username of the member building the reports")
+        parser.add_argument("--scale", action="append", choices=list(SCALES), help="Scales to run, small by default")
+        parser.add_argument("--case", action="append", choices=CASES, help="Cases to run, all by default")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--transactions", type=int, help="Override number of transactions of the scales")
+        parser.add_argument("--reuse", action="store_true", help="Reuse synthetic data generated by a previous run")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic data after the run")
+        parser.add_argument("--baseline", default=str(runner.BASELINE_PATH), help="Baseline JSON file")
+        parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression, 0.2 is 20%%")
+        parser.add_argument("--output", help="Write the results to a JSON file")
+        parser.add_argument("--force", action="store_true", help="Run on a non local server")
+
+    def handle(self, *args, **options):
+        if settings.SERVER_TYPE != "local" and not options["force"]:
+            raise CommandError("Benchmarks write synthetic data into the space, run them on a local server")
+
+        space_code = options["space_code"]
+        set_search_path(space_code)
+
+        master_user = MasterUser.objects.filter(space_code=space_code).first()
+        if not master_user:
+            raise CommandError(f"No master user for space {space_code}")
+        member = Member.objects.filter(master_user=master_user, username=options["member"]).first()
+        if not member:
+            raise CommandError(f"No member {options['member']} in space {space_code}")
+
+        cases = options["case"] or CASES
+        results = {}
+        for scale_name in options["scale"] or ["small"]:
+            scale = SCALES[scale_name]
+            if options["transactions"]:
+                scale = replace(scale, transactions=options["transactions"])
+
+            space = SyntheticSpace(master_user, member, scale, seed=options["seed"])
+            if options["reuse"] and space.exists():
+                space.load()
+            else:
+                self.stdout.write(f"Generating {scale} ...")
+                space.create()
+
+            results.update(runner.run_benchmarks(space, cases))
+
+            if options["cleanup"]:
+                space.delete()
+
+        baseline_path = Path(options["baseline"])
+        baseline = runner.load_baseline(baseline_path)
+        self.write_results(results, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+        if options["save_baseline"]:
+            runner.save_baseline(baseline_path, results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}"))
+            return
+
+        regressions = runner.compare_with_baseline(results, baseline, options["tolerance"])
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(str(regression)))
+        if regressions:
+            raise CommandError(f"{len(regressions)} metrics regressed over {options['tolerance']:.0%}")
+
+        self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def write_results(self, results, baseline):
+        self.stdout.write(
+            f"{'case':<28}{'items':>10}{'wall, s':>12}{'baseline':>12}{'queries':>10}{'baseline':>10}{'peak, MB':>12}"
+        )
+        for key, result in results.items():
+            expected = baseline.get(key, {})
+            self.stdout.write(
+                f"{key:<28}{result['items']:>10}{result['wall_time']:>12.3f}{expected.get('wall_time', '-'):>12}"
+                f"{result['query_count']:>10}{expected.get('query_count', '-'):>10}"
+                f"{result['peak_memory'] / 1024 / 1024:>12.1f}"
+            )
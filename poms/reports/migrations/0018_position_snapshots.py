@@ -0,0 +1,53 @@
+# Generated by Django 4.2.22 on 2026-10-19 02:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_ecosystemdefault_license_key'),
+        ('strategies', '0012_strategy1_platform_version_and_more'),
+        ('accounts', '0016_accounttype_actual_at_accounttype_attributes_extra_and_more'),
+        ('portfolios', '0040_portfoliobundle_platform_version_and_more'),
+        ('instruments', '0040_instrumenttype_actual_at_and_more'),
+        ('reports', '0017_alter_balancereportinstance_unique_key_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionSnapshotState',
+            fields=[
+                ('portfolio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='position_snapshot_state', serialize=False, to='portfolios.portfolio', verbose_name='portfolio')),
+                ('dirty_from', models.DateField(null=True, verbose_name='dirty from')),
+                ('version', models.IntegerField(default=0, verbose_name='version')),
+                ('refreshed_at', models.DateTimeField(null=True, verbose_name='refreshed at')),
+            ],
+            options={
+                'verbose_name': 'position snapshot state',
+                'verbose_name_plural': 'position snapshot states',
+            },
+        ),
+        migrations.CreateModel(
+            name='PositionSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('position_size', models.FloatField(default=0.0, verbose_name='position size')),
+                ('principal', models.FloatField(default=0.0, help_text='Sum of principal_with_sign of the position transactions, in settlement currency', verbose_name='principal')),
+                ('account', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.account', verbose_name='account')),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='instruments.instrument', verbose_name='instrument')),
+                ('master_user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='users.masteruser', verbose_name='master user')),
+                ('portfolio', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='portfolios.portfolio', verbose_name='portfolio')),
+                ('strategy1', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='strategies.strategy1', verbose_name='strategy1')),
+                ('strategy2', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='strategies.strategy2', verbose_name='strategy2')),
+                ('strategy3', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='strategies.strategy3', verbose_name='strategy3')),
+            ],
+            options={
+                'verbose_name': 'position snapshot',
+                'verbose_name_plural': 'position snapshots',
+                'indexes': [models.Index(fields=['portfolio', 'date'], name='reports_possnap_portfolio_date')],
+            },
+        ),
+    ]
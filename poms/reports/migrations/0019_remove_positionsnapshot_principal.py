@@ -0,0 +1,17 @@
+# Generated by Django 4.2.22 on 2026-10-19 09:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0018_position_snapshots'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='positionsnapshot',
+            name='principal',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.22 on 2026-10-19 11:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0019_remove_positionsnapshot_principal'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='PositionSnapshot',
+        ),
+        migrations.DeleteModel(
+            name='PositionSnapshotState',
+        ),
+    ]
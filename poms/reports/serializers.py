@@ -14,6 +14,7 @@ from rest_framework.exceptions import ValidationError
 
 from poms.accounts.fields import AccountField
 from poms.accounts.serializers import AccountViewSerializer
+from poms.common import profiling
 from poms.common.fields import ExpressionField
 from poms.common.models import EXPRESSION_FIELD_LENGTH
 from poms.common.serializers import (
@@ -558,6 +559,82 @@ class ReportSerializer(ReportSerializerWithLogs):
 
         return None
 
+    def _get_instruments_dict(self, data):
+        """
+        Instruments with the instrument_type object, the serialized relations are not changed
+        """
+        instrument_types = self._get_item_dict(data, "item_instrument_types")
+
+        result = {}
+        for instrument in data["item_instruments"]:
+            instrument_type = instrument.get("instrument_type")
+            if not isinstance(instrument_type, dict) and instrument_type in instrument_types:
+                instrument = {**instrument, "instrument_type": instrument_types[instrument_type]}  # noqa: PLW2901
+            result[instrument["id"]] = instrument
+
+        return result
+
+    def calculate_custom_fields(self, data, full_items):
+        """
+        Evaluates custom_fields_to_calculate of the report into the full items as custom_fields.<user_code>,
+        data is the serialized report, items are not read from it. Used by the report and by the exports.
+        """
+        custom_fields = data.get("custom_fields_object", [])
+        custom_fields_to_calculate = data.get("custom_fields_to_calculate", [])
+        if not (custom_fields_to_calculate and custom_fields):
+            return
+
+        instruments = self._get_instruments_dict(data)
+        item_dicts = {
+            "portfolio": self._get_item_dict(data, "item_portfolios"),
+            "account": self._get_item_dict(data, "item_accounts"),
+            "strategy1": self._get_item_dict(data, "item_strategies1"),
+            "strategy2": self._get_item_dict(data, "item_strategies2"),
+            "strategy3": self._get_item_dict(data, "item_strategies3"),
+            "instrument": instruments,
+            "currency": self._get_item_dict(data, "item_currencies"),
+            "pricing_currency": self._get_item_dict(data, "item_currencies"),
+            "exposure_currency": self._get_item_dict(data, "item_currencies"),
+            "allocation": instruments,
+            "mismatch_portfolio": self._get_item_dict(data, "item_portfolios"),
+            "mismatch_account": self._get_item_dict(data, "item_accounts"),
+        }
+
+        calc_st = time.perf_counter()
+        for item in full_items:
+            item_st = time.perf_counter()
+            names = self._extract_names(item, data)
+
+            for name, item_dict in item_dicts.items():
+                self._set_object(names, name, item_dict)
+
+            names = formula.value_prepare(names)
+            custom_fields_names = {}
+
+            for _ in range(data["expression_iterations_count"]):
+                for cf in custom_fields:
+                    if cf["name"] in custom_fields_to_calculate:
+                        expr = cf.get("expr")
+                        value = self.evaluate_expression(expr, names, context=self.context) if expr else None
+                        if cf["user_code"] not in custom_fields_names:
+                            custom_fields_names[cf["user_code"]] = value
+
+            # Processing custom fields
+            for key, value in custom_fields_names.items():
+                for cf in custom_fields:
+                    if cf["user_code"] == key:
+                        value = self.process_custom_field(cf, value)  # noqa: PLW2901
+
+                        item[f"custom_fields.{cf['user_code']}"] = value
+
+            _l.debug("Processed item in: %s seconds", time.perf_counter() - item_st)
+
+        _l.info(
+            "Custom field calculation completed in: %s seconds",
+            time.perf_counter() - calc_st,
+        )
+
+    @profiling.tracked("serialization")
     def to_representation(self, instance):
         start_time = time.perf_counter()
         _l.info("Entering to_representation for instance ID: %s", instance.id)
@@ -574,8 +651,6 @@ class ReportSerializer(ReportSerializerWithLogs):
             time.perf_counter() - start_time,
         )
 
-        dict_st = time.perf_counter()
-
         # Join instrument_type to each instrument
         for instrument in data["item_instruments"]:
             instrument_type_id = instrument.get("instrument_type")  # Assuming this is the reference field
@@ -584,72 +659,7 @@ class ReportSerializer(ReportSerializerWithLogs):
                 if instrument_type["id"] == instrument_type_id:
                     instrument["instrument_type"] = instrument_type
 
-        # _l.info(type(data['item_instruments'][0]))
-
-        item_dicts = {
-            "portfolio": self._get_item_dict(data, "item_portfolios"),
-            "account": self._get_item_dict(data, "item_accounts"),
-            "strategy1": self._get_item_dict(data, "item_strategies1"),
-            "strategy2": self._get_item_dict(data, "item_strategies2"),
-            "strategy3": self._get_item_dict(data, "item_strategies3"),
-            "instrument": self._get_item_dict(data, "item_instruments"),
-            "currency": self._get_item_dict(data, "item_currencies"),
-            "pricing_currency": self._get_item_dict(data, "item_currencies"),
-            "exposure_currency": self._get_item_dict(data, "item_currencies"),
-            "allocation": self._get_item_dict(data, "item_instruments"),
-            "mismatch_portfolio": self._get_item_dict(data, "item_portfolios"),
-            "mismatch_account": self._get_item_dict(data, "item_accounts"),
-        }
-        _l.info("Item dictionaries created: %s seconds", time.perf_counter() - dict_st)
-
-        custom_fields = data.get("custom_fields_object", [])
-        custom_fields_to_calculate = data.get("custom_fields_to_calculate", [])
-
-        # index = 0
-        if custom_fields_to_calculate and custom_fields:
-            calc_st = time.perf_counter()
-            for item in full_items:
-                item_st = time.perf_counter()
-                names = self._extract_names(item, data)
-
-                for name, item_dict in item_dicts.items():
-                    self._set_object(names, name, item_dict)
-
-                # if index == 0:
-                #     _l.info('names %s' % names)
-
-                # index = index + 1
-
-                names = formula.value_prepare(names)
-                custom_fields_names = {}
-
-                for _ in range(data["expression_iterations_count"]):
-                    for cf in custom_fields:
-                        if cf["name"] in custom_fields_to_calculate:
-                            expr = cf.get("expr")
-                            value = self.evaluate_expression(expr, names, context=self.context) if expr else None
-                            if cf["user_code"] not in custom_fields_names:
-                                custom_fields_names[cf["user_code"]] = value
-
-                # Processing custom fields
-                cfv = []  # noqa: F841
-                for key, value in custom_fields_names.items():
-                    for cf in custom_fields:
-                        if cf["user_code"] == key:
-                            value = self.process_custom_field(cf, value)  # noqa: PLW2901
-
-                            item[f"custom_fields.{cf['user_code']}"] = value
-                            # cfv.append(
-                            #     {"custom_field": cf["id"], "user_code": cf["user_code"], "value": value}
-                            # )
-                # item["custom_fields"] = cfv
-
-                _l.debug("Processed item in: %s seconds", time.perf_counter() - item_st)
-
-            _l.info(
-                "Custom field calculation completed in: %s seconds",
-                time.perf_counter() - calc_st,
-            )
+        self.calculate_custom_fields(data, full_items)
 
         data["serialization_time"] = time.perf_counter() - start_time
         _l.info(
@@ -1090,7 +1100,133 @@ class TransactionReportSerializer(ReportSerializerWithLogs):
     def get_items(self, obj):
         return [serialize_transaction_report_item(item) for item in obj.items]
 
-    def to_representation(self, instance):  # noqa: PLR0912, PLR0915
+    def calculate_custom_fields(self, data, full_items):  # noqa: PLR0912, PLR0915
+        """
+        Evaluates custom_fields_to_calculate of the report into the full items as custom_fields.<user_code>,
+        data is the serialized report, items are not read from it. Used by the report and by the exports.
+        """
+        custom_fields = data["custom_fields_object"]
+        if not (len(data["custom_fields_to_calculate"]) and custom_fields and full_items):
+            return
+
+        item_transaction_classes = {o["id"]: o for o in data["item_transaction_classes"]}
+        item_complex_transactions = {o["id"]: o for o in data["item_complex_transactions"]}
+        item_instruments = {o["id"]: o for o in data["item_instruments"]}
+        item_currencies = {o["id"]: o for o in data["item_currencies"]}
+        item_portfolios = {o["id"]: o for o in data["item_portfolios"]}
+        item_accounts = {o["id"]: o for o in data["item_accounts"]}
+        item_strategies1 = {o["id"]: o for o in data["item_strategies1"]}
+        item_strategies2 = {o["id"]: o for o in data["item_strategies2"]}
+        item_strategies3 = {o["id"]: o for o in data["item_strategies3"]}
+        item_responsibles = {o["id"]: o for o in data["item_responsibles"]}
+        item_counterparties = {o["id"]: o for o in data["item_counterparties"]}
+
+        def _set_object(names, pk_attr, objs):
+            pk = names[pk_attr]
+            if pk is not None:
+                with contextlib.suppress(KeyError):
+                    names[f"{pk_attr}_object"] = objs[pk]
+                    # names[pk_attr] = objs[pk]
+
+        for item in full_items:
+            names = {}
+
+            for key, value in item.items():
+                names[key] = value
+
+            _set_object(names, "complex_transaction", item_complex_transactions)
+            _set_object(names, "transaction_class", item_transaction_classes)
+            _set_object(names, "instrument", item_instruments)
+            _set_object(names, "transaction_currency", item_currencies)
+            _set_object(names, "settlement_currency", item_currencies)
+            _set_object(names, "portfolio", item_portfolios)
+            _set_object(names, "account_cash", item_accounts)
+            _set_object(names, "account_position", item_accounts)
+            _set_object(names, "account_interim", item_accounts)
+            _set_object(names, "strategy1_position", item_strategies1)
+            _set_object(names, "strategy1_cash", item_strategies1)
+            _set_object(names, "strategy2_position", item_strategies2)
+            _set_object(names, "strategy2_cash", item_strategies2)
+            _set_object(names, "strategy3_position", item_strategies3)
+            _set_object(names, "strategy3_cash", item_strategies3)
+            _set_object(names, "responsible", item_responsibles)
+            _set_object(names, "counterparty", item_counterparties)
+            _set_object(names, "linked_instrument", item_instruments)
+            _set_object(names, "allocation_balance", item_instruments)
+            _set_object(names, "allocation_pl", item_instruments)
+
+            names = formula.value_prepare(names)
+            custom_fields_names = {}
+
+            for i in range(data["expression_iterations_count"]):  # noqa: B007
+                for cf in custom_fields:
+                    if cf["name"] in data["custom_fields_to_calculate"]:
+                        expr = cf["expr"]
+
+                        if expr:
+                            try:
+                                value = formula.safe_eval(expr, names=names, context=self.context)
+                            except formula.InvalidExpression:
+                                value = gettext_lazy("Invalid expression")
+                        else:
+                            value = None
+
+                        if (
+                            cf["user_code"] not in custom_fields_names
+                            or custom_fields_names[cf["user_code"]] is None
+                            or custom_fields_names[cf["user_code"]] == gettext_lazy("Invalid expression")
+                        ):
+                            custom_fields_names[cf["user_code"]] = value
+
+                names["custom_fields"] = custom_fields_names
+
+            for key, value in custom_fields_names.items():
+                for cf in custom_fields:
+                    if cf["user_code"] == key:
+                        expr = cf["expr"]
+
+                        if cf["value_type"] == 10:
+                            if expr:
+                                try:
+                                    value = formula.safe_eval(  # noqa: PLW2901
+                                        "str(item)",
+                                        names={"item": value},
+                                        context=self.context,
+                                    )
+                                except formula.InvalidExpression:
+                                    value = gettext_lazy("Invalid expression")  # noqa: PLW2901
+                            else:
+                                value = None  # noqa: PLW2901
+
+                        elif cf["value_type"] == 20:
+                            if expr:
+                                try:
+                                    value = formula.safe_eval(  # noqa: PLW2901
+                                        "float(item)",
+                                        names={"item": value},
+                                        context=self.context,
+                                    )
+                                except formula.InvalidExpression:
+                                    value = gettext_lazy("Invalid expression")  # noqa: PLW2901
+                            else:
+                                value = None  # noqa: PLW2901
+                        elif cf["value_type"] == 40:
+                            if expr:
+                                try:
+                                    value = formula.safe_eval(  # noqa: PLW2901
+                                        "parse_date(item, '%d/%m/%Y')",
+                                        names={"item": value},
+                                        context=self.context,
+                                    )
+                                except formula.InvalidExpression:
+                                    value = gettext_lazy("Invalid expression")  # noqa: PLW2901
+                            else:
+                                value = None  # noqa: PLW2901
+
+                        item[f"custom_fields.{cf['user_code']}"] = value
+
+    @profiling.tracked("serialization")
+    def to_representation(self, instance):
         to_representation_st = time.perf_counter()
         instance.is_report = True
         data = super().to_representation(instance)
@@ -1105,127 +1241,8 @@ class TransactionReportSerializer(ReportSerializerWithLogs):
         helper_service = BackendReportHelperService()
 
         full_items = helper_service.convert_report_items_to_full_items(data)
-        custom_fields = data["custom_fields_object"]
-
-        # _l.debug('custom_fields_to_calculate %s' % data["custom_fields_to_calculate"])
-        # _l.debug('custom_fields %s' % data["custom_fields_object"])
-
-        if len(data["custom_fields_to_calculate"]) and (custom_fields and full_items):
-            item_transaction_classes = {o["id"]: o for o in data["item_transaction_classes"]}
-            item_complex_transactions = {o["id"]: o for o in data["item_complex_transactions"]}
-            item_instruments = {o["id"]: o for o in data["item_instruments"]}
-            item_currencies = {o["id"]: o for o in data["item_currencies"]}
-            item_portfolios = {o["id"]: o for o in data["item_portfolios"]}
-            item_accounts = {o["id"]: o for o in data["item_accounts"]}
-            item_strategies1 = {o["id"]: o for o in data["item_strategies1"]}
-            item_strategies2 = {o["id"]: o for o in data["item_strategies2"]}
-            item_strategies3 = {o["id"]: o for o in data["item_strategies3"]}
-            item_responsibles = {o["id"]: o for o in data["item_responsibles"]}
-            item_counterparties = {o["id"]: o for o in data["item_counterparties"]}
-
-            def _set_object(names, pk_attr, objs):
-                pk = names[pk_attr]
-                if pk is not None:
-                    with contextlib.suppress(KeyError):
-                        names[f"{pk_attr}_object"] = objs[pk]
-                        # names[pk_attr] = objs[pk]
-
-            for item in full_items:
-                names = {}
-
-                for key, value in item.items():
-                    names[key] = value
-
-                _set_object(names, "complex_transaction", item_complex_transactions)
-                _set_object(names, "transaction_class", item_transaction_classes)
-                _set_object(names, "instrument", item_instruments)
-                _set_object(names, "transaction_currency", item_currencies)
-                _set_object(names, "settlement_currency", item_currencies)
-                _set_object(names, "portfolio", item_portfolios)
-                _set_object(names, "account_cash", item_accounts)
-                _set_object(names, "account_position", item_accounts)
-                _set_object(names, "account_interim", item_accounts)
-                _set_object(names, "strategy1_position", item_strategies1)
-                _set_object(names, "strategy1_cash", item_strategies1)
-                _set_object(names, "strategy2_position", item_strategies2)
-                _set_object(names, "strategy2_cash", item_strategies2)
-                _set_object(names, "strategy3_position", item_strategies3)
-                _set_object(names, "strategy3_cash", item_strategies3)
-                _set_object(names, "responsible", item_responsibles)
-                _set_object(names, "counterparty", item_counterparties)
-                _set_object(names, "linked_instrument", item_instruments)
-                _set_object(names, "allocation_balance", item_instruments)
-                _set_object(names, "allocation_pl", item_instruments)
-
-                names = formula.value_prepare(names)
-                custom_fields_names = {}
-
-                for i in range(data["expression_iterations_count"]):  # noqa: B007
-                    for cf in custom_fields:
-                        if cf["name"] in data["custom_fields_to_calculate"]:
-                            expr = cf["expr"]
 
-                            if expr:
-                                try:
-                                    value = formula.safe_eval(expr, names=names, context=self.context)
-                                except formula.InvalidExpression:
-                                    value = gettext_lazy("Invalid expression")
-                            else:
-                                value = None
-
-                            if (
-                                cf["user_code"] not in custom_fields_names
-                                or custom_fields_names[cf["user_code"]] is None
-                                or custom_fields_names[cf["user_code"]] == gettext_lazy("Invalid expression")
-                            ):
-                                custom_fields_names[cf["user_code"]] = value
-
-                    names["custom_fields"] = custom_fields_names
-
-                for key, value in custom_fields_names.items():
-                    for cf in custom_fields:
-                        if cf["user_code"] == key:
-                            expr = cf["expr"]
-
-                            if cf["value_type"] == 10:
-                                if expr:
-                                    try:
-                                        value = formula.safe_eval(  # noqa: PLW2901
-                                            "str(item)",
-                                            names={"item": value},
-                                            context=self.context,
-                                        )
-                                    except formula.InvalidExpression:
-                                        value = gettext_lazy("Invalid expression")  # noqa: PLW2901
-                                else:
-                                    value = None  # noqa: PLW2901
-
-                            elif cf["value_type"] == 20:
-                                if expr:
-                                    try:
-                                        value = formula.safe_eval(  # noqa: PLW2901
-                                            "float(item)",
-                                            names={"item": value},
-                                            context=self.context,
-                                        )
-                                    except formula.InvalidExpression:
-                                        value = gettext_lazy("Invalid expression")  # noqa: PLW2901
-                                else:
-                                    value = None  # noqa: PLW2901
-                            elif cf["value_type"] == 40:
-                                if expr:
-                                    try:
-                                        value = formula.safe_eval(  # noqa: PLW2901
-                                            "parse_date(item, '%d/%m/%Y')",
-                                            names={"item": value},
-                                            context=self.context,
-                                        )
-                                    except formula.InvalidExpression:
-                                        value = gettext_lazy("Invalid expression")  # noqa: PLW2901
-                                else:
-                                    value = None  # noqa: PLW2901
-
-                            item[f"custom_fields.{cf['user_code']}"] = value
+        self.calculate_custom_fields(data, full_items)
 
         data["items"] = full_items
         data["serialization_time"] = float(f"{time.perf_counter() - to_representation_st:3.3f}")
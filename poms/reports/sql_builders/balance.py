@@ -3,7 +3,6 @@ import os
 import time
 from datetime import timedelta
 
-from celery import group
 from django.conf import settings
 from django.db import connection
 
@@ -24,6 +23,7 @@ from poms.instruments.models import (
 from poms.portfolios.models import Portfolio
 from poms.reports.common import Report
 from poms.reports.models import BalanceReportCustomField, ReportInstanceModel
+from poms.reports.sql_builders.executor import ReportShardExecutor
 from poms.reports.sql_builders.helpers import (
     dictfetchall,
     get_balance_query,
@@ -38,6 +38,7 @@ from poms.reports.sql_builders.helpers import (
     get_transaction_filter_sql_string,
     get_where_expression_for_position_consolidation,
 )
+from poms.reports.sql_builders.prepared import QueryParams, execute
 from poms.reports.sql_builders.pl import PLReportBuilderSql
 from poms.strategies.models import Strategy1, Strategy2, Strategy3
 from poms.users.models import EcosystemDefault
@@ -135,15 +136,16 @@ class BalanceReportBuilderSql:
 
             with connection.cursor() as cursor:
                 st = time.perf_counter()
+                params = QueryParams()
 
                 ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=celery_task.master_user.pk)
 
                 pl_query = PLReportBuilderSql.get_source_query(cost_method=instance.cost_method.id)
 
-                transaction_filter_sql_string = get_transaction_filter_sql_string(instance)
+                transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
                 transaction_date_filter_for_initial_position_sql_string = (
                     get_transaction_date_filter_for_initial_position_sql_string(
-                        instance.report_date,
+                        params.date("report_date", instance.report_date),
                         has_where=bool(len(transaction_filter_sql_string)),
                     )
                 )
@@ -161,7 +163,7 @@ class BalanceReportBuilderSql:
                 )
                 pl_left_join_consolidation = get_pl_left_join_consolidation(instance)
                 fx_trades_and_fx_variations_filter_sql_string = (
-                    get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance)
+                    get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance, params)
                 )
 
                 self.bday_yesterday_of_report_date = get_last_business_day(
@@ -169,11 +171,11 @@ class BalanceReportBuilderSql:
                 )
 
                 pl_query = pl_query.format(
-                    report_date=instance.report_date,
-                    master_user_id=celery_task.master_user.id,
-                    default_currency_id=ecosystem_defaults.currency_id,
-                    report_currency_id=instance.report_currency.id,
-                    pricing_policy_id=instance.pricing_policy.id,
+                    report_date=params.date("report_date", instance.report_date),
+                    master_user_id=params.integer("master_user_id", celery_task.master_user.id),
+                    default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+                    report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+                    pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
                     report_fx_rate=report_fx_rate,
                     transaction_filter_sql_string=transaction_filter_sql_string,
                     transaction_date_filter_for_initial_position_sql_string=transaction_date_filter_for_initial_position_sql_string,
@@ -184,7 +186,7 @@ class BalanceReportBuilderSql:
                     tt_in1_consolidation_columns=tt_in1_consolidation_columns,
                     transactions_all_with_multipliers_where_expression=transactions_all_with_multipliers_where_expression,
                     filter_query_for_balance_in_multipliers_table="",
-                    bday_yesterday_of_report_date=self.bday_yesterday_of_report_date,
+                    bday_yesterday_of_report_date=params.date("bday_yesterday_of_report_date", self.bday_yesterday_of_report_date),
                 )
                 # filter_query_for_balance_in_multipliers_table=' where multiplier = 1')
                 # TODO ask for right where expression
@@ -205,11 +207,11 @@ class BalanceReportBuilderSql:
                 _l.debug("consolidated_cash_as_position_columns %s", consolidated_cash_as_position_columns)
 
                 query = query.format(
-                    report_date=instance.report_date,
-                    master_user_id=celery_task.master_user.id,
-                    default_currency_id=ecosystem_defaults.currency_id,
-                    report_currency_id=instance.report_currency.id,
-                    pricing_policy_id=instance.pricing_policy.id,
+                    report_date=params.date("report_date", instance.report_date),
+                    master_user_id=params.integer("master_user_id", celery_task.master_user.id),
+                    default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+                    report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+                    pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
                     consolidated_cash_columns=consolidated_cash_columns,
                     consolidated_position_columns=consolidated_position_columns,
                     consolidated_cash_as_position_columns=consolidated_cash_as_position_columns,
@@ -219,7 +221,7 @@ class BalanceReportBuilderSql:
                     pl_query=pl_query,
                     pl_left_join_consolidation=pl_left_join_consolidation,
                     fx_trades_and_fx_variations_filter_sql_string=fx_trades_and_fx_variations_filter_sql_string,
-                    bday_yesterday_of_report_date=self.bday_yesterday_of_report_date,
+                    bday_yesterday_of_report_date=params.date("bday_yesterday_of_report_date", self.bday_yesterday_of_report_date),
                 )
 
                 if settings.DEBUG:
@@ -232,7 +234,7 @@ class BalanceReportBuilderSql:
                     ) as the_file:
                         the_file.write(query)
 
-                cursor.execute(query)
+                execute(cursor, query, params)
 
                 _l.debug(
                     "Balance report query execute done: %s",
@@ -687,31 +689,8 @@ class BalanceReportBuilderSql:
 
             tasks.append(task)
 
-        _l.debug("Going to run %s tasks", len(tasks))
-
-        # Run the group of tasks
-        job = group(
-            build.s(
-                task_id=task.id,
-                context={
-                    "realm_code": self.instance.master_user.realm_code,
-                    "space_code": self.instance.master_user.space_code,
-                },
-            )
-            for task in tasks
-        )
-
-        group_result = job.apply_async()
-        # Wait for all tasks to finish and get their results
-        group_result.join()
-
-        # Retrieve results
-        all_dicts = []
-        # TODO probably we can do some optimization here
-        for result in group_result.results:
-            # Each result is an AsyncResult instance.
-            # You can get the result of the task with its .result property.
-            all_dicts.extend(result.result)
+        executor = ReportShardExecutor(self.build_sync, celery_task=build)
+        all_dicts = executor.run(self.instance, tasks)
 
         for task in tasks:
             # refresh the task instance to get the latest status from the database
@@ -1031,15 +1010,16 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
 
         with connection.cursor() as cursor:
             st = time.perf_counter()
+            params = QueryParams()
 
             ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=celery_task.master_user.pk)
 
             pl_query = PLReportBuilderSql.get_source_query(cost_method=instance.cost_method.id)
 
-            transaction_filter_sql_string = get_transaction_filter_sql_string(instance)
+            transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
             transaction_date_filter_for_initial_position_sql_string = (
                 get_transaction_date_filter_for_initial_position_sql_string(
-                    instance.report_date,
+                    params.date("report_date", instance.report_date),
                     has_where=bool(len(transaction_filter_sql_string)),
                 )
             )
@@ -1057,7 +1037,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
             )
             pl_left_join_consolidation = get_pl_left_join_consolidation(instance)
             fx_trades_and_fx_variations_filter_sql_string = (
-                get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance)
+                get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance, params)
             )
 
             self.bday_yesterday_of_report_date = get_last_business_day(
@@ -1065,11 +1045,11 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
             )
 
             pl_query = pl_query.format(
-                report_date=instance.report_date,
-                master_user_id=celery_task.master_user.id,
-                default_currency_id=ecosystem_defaults.currency_id,
-                report_currency_id=instance.report_currency.id,
-                pricing_policy_id=instance.pricing_policy.id,
+                report_date=params.date("report_date", instance.report_date),
+                master_user_id=params.integer("master_user_id", celery_task.master_user.id),
+                default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+                report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+                pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
                 report_fx_rate=report_fx_rate,
                 transaction_filter_sql_string=transaction_filter_sql_string,
                 transaction_date_filter_for_initial_position_sql_string=transaction_date_filter_for_initial_position_sql_string,
@@ -1080,7 +1060,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                 tt_in1_consolidation_columns=tt_in1_consolidation_columns,
                 transactions_all_with_multipliers_where_expression=transactions_all_with_multipliers_where_expression,
                 filter_query_for_balance_in_multipliers_table="",
-                bday_yesterday_of_report_date=self.bday_yesterday_of_report_date,
+                bday_yesterday_of_report_date=params.date("bday_yesterday_of_report_date", self.bday_yesterday_of_report_date),
             )
             # filter_query_for_balance_in_multipliers_table=' where multiplier = 1')
             # TODO ask for right where expression
@@ -1287,8 +1267,8 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                
                         -- добавить остальные поля
                         from unioned_transactions_for_balance -- USE TOTAL VIEW HERE
-                        where accounting_date <= '{report_date}' /* REPORTING DATE */
-                          and '{report_date}' < cash_date
+                        where accounting_date <= {report_date} /* REPORTING DATE */
+                          and {report_date} < cash_date
                         
                         -- case 2
                         union all
@@ -1331,8 +1311,8 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        where cash_date  <= '{report_date}'  /* REPORTING DATE */
-                          and '{report_date}' < accounting_Date
+                        where cash_date  <= {report_date}  /* REPORTING DATE */
+                          and {report_date} < accounting_Date
                     
                         union all
                         
@@ -1374,11 +1354,11 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        --where not (accounting_date <= '{report_date}' /* REPORTING DATE */
-                        --  and '{report_date}' < cash_date)
-                        where not ( (accounting_date <= '{report_date}' 
-                          and '{report_date}' < cash_date) 
-                          or (cash_date  <= '{report_date}' and '{report_date}' < accounting_date)) 
+                        --where not (accounting_date <= {report_date} /* REPORTING DATE */
+                        --  and {report_date} < cash_date)
+                        where not ( (accounting_date <= {report_date} 
+                          and {report_date} < cash_date) 
+                          or (cash_date  <= {report_date} and {report_date} < accounting_date)) 
                             
                     ),
                     
@@ -1572,7 +1552,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                              from currencies_currencyhistory
                              where
                                 currency_id = settlement_currency_id and
-                                date = '{report_date}' and
+                                date = {report_date} and
                                 pricing_policy_id = {pricing_policy_id}
                             )
                             end as fx_rate,
@@ -1764,7 +1744,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                          from currencies_currencyhistory
                                          where
                                             currency_id = {report_currency_id} and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as report_fx_rate,
@@ -1777,7 +1757,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                          from currencies_currencyhistory
                                          where
                                             currency_id = settlement_currency_id and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as stl_fx_rate
@@ -1788,7 +1768,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                            (-1) as instrument_id,
                                           SUM(cash_consideration) as position_size
                                         from filtered_transactions
-                                        where min_date <= '{report_date}' and master_user_id = {master_user_id}
+                                        where min_date <= {report_date} and master_user_id = {master_user_id}
                                         group by
                                           {consolidated_cash_columns}
                                           settlement_currency_id, instrument_id
@@ -2284,7 +2264,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_principal_price,
                                 
@@ -2293,7 +2273,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_accrued_price,
                                 
@@ -2302,7 +2282,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_principal_price,
                                 
@@ -2311,7 +2291,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_accrued_price,
                                 
@@ -2323,7 +2303,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.co_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                        end as ec1_fx_rate,
@@ -2336,7 +2316,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.counter_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                     end as ec2_fx_rate,
@@ -2347,7 +2327,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = {report_currency_id}
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -2361,7 +2341,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.pricing_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as pch_fx_rate,
@@ -2374,7 +2354,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.accrued_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as ach_fx_rate,
@@ -2384,7 +2364,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as principal_price,
                                 
@@ -2393,7 +2373,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{bday_yesterday_of_report_date}' and
+                                    date = {bday_yesterday_of_report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as yesterday_principal_price,
                                 
@@ -2402,7 +2382,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as factor,
                                 
@@ -2411,7 +2391,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as ytm,
                                 
@@ -2420,7 +2400,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id} )
                                 as accrued_price,
                                 
@@ -2429,7 +2409,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as long_delta,
                                 
@@ -2438,7 +2418,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as short_delta
                                 
@@ -2448,7 +2428,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                                   instrument_id,
                                   SUM(position_size_with_sign) as position_size
                                 from filtered_transactions 
-                                where min_date <= '{report_date}' 
+                                where min_date <= {report_date} 
                                 and master_user_id = {master_user_id}
                                 and transaction_class_id in (1,2,14)
                                 group by
@@ -2587,11 +2567,11 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
             # )
 
             query = query.format(
-                report_date=instance.report_date,
-                master_user_id=celery_task.master_user.id,
-                default_currency_id=ecosystem_defaults.currency_id,
-                report_currency_id=instance.report_currency.id,
-                pricing_policy_id=instance.pricing_policy.id,
+                report_date=params.date("report_date", instance.report_date),
+                master_user_id=params.integer("master_user_id", celery_task.master_user.id),
+                default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+                report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+                pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
                 consolidated_cash_columns=consolidated_cash_columns,
                 consolidated_position_columns=consolidated_position_columns,
                 consolidated_cash_as_position_columns=consolidated_cash_as_position_columns,
@@ -2601,7 +2581,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                 pl_query=pl_query,
                 pl_left_join_consolidation=pl_left_join_consolidation,
                 fx_trades_and_fx_variations_filter_sql_string=fx_trades_and_fx_variations_filter_sql_string,
-                bday_yesterday_of_report_date=self.bday_yesterday_of_report_date,
+                bday_yesterday_of_report_date=params.date("bday_yesterday_of_report_date", self.bday_yesterday_of_report_date),
             )
 
             if settings.DEBUG:
@@ -2614,7 +2594,7 @@ def build(self, task_id, *args, **kwargs):  # noqa: PLR0912, PLR0915
                 ) as the_file:
                     the_file.write(query)
 
-            cursor.execute(query)
+            execute(cursor, query, params)
 
             _l.debug(
                 "Balance report query execute done: %s",
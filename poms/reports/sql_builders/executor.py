@@ -0,0 +1,147 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import group
+from django.conf import settings
+from django.db import connection
+
+from poms.common.db import get_current_schema, set_search_path
+from poms.transactions.models import Transaction
+
+_l = logging.getLogger("poms.reports")
+
+
+def get_report_size(instance) -> int:
+    """
+    Number of transactions the report has to process, used to pick where shards are run
+    """
+    transactions = Transaction.objects.filter(
+        master_user=instance.master_user,
+        is_deleted=False,
+        is_canceled=False,
+        accounting_date__lte=instance.report_date,
+    )
+    portfolios_ids = [portfolio.id for portfolio in instance.portfolios]
+    if portfolios_ids:
+        transactions = transactions.filter(portfolio_id__in=portfolios_ids)
+
+    return transactions.count()
+
+
+class ReportShardExecutor:
+    """
+    Runs report shards (CeleryTask rows with report options) and merges their items.
+
+    Shards are built inside the calling process by `max_workers` threads, every thread
+    has its own DB connection switched to the schema of the caller, so no queueing and
+    result polling through the broker and the result backend is needed.
+    Reports with more than `max_transactions` transactions are sent to celery workers
+    as before, to keep the memory of the calling process bounded.
+    """
+
+    def __init__(self, build_shard, celery_task, max_workers=None, max_transactions=None):
+        """
+        build_shard(task_id) builds one shard in the current thread and returns its items,
+        celery_task is the task that builds a shard on the workers
+        """
+        self.build_shard = build_shard
+        self.celery_task = celery_task
+        self.max_workers = max_workers or settings.REPORT_SHARD_WORKERS
+        self.max_transactions = (
+            max_transactions if max_transactions is not None else settings.REPORT_SHARD_MAX_TRANSACTIONS
+        )
+        self.timings = {}
+
+    def run(self, instance, tasks) -> list:
+        st = time.perf_counter()
+
+        if self.is_oversized(instance):
+            items = self.run_celery(instance, tasks)
+        else:
+            items = self.run_in_process([task.id for task in tasks])
+
+        _l.debug(
+            "ReportShardExecutor: %s shards done: %s, shard timings %s",
+            len(tasks),
+            f"{time.perf_counter() - st:3.3f}",
+            self.timings,
+        )
+
+        return items
+
+    def is_oversized(self, instance) -> bool:
+        return get_report_size(instance) > self.max_transactions
+
+    def _build(self, task_id):
+        st = time.perf_counter()
+        items = self.build_shard(task_id)
+        self.timings[task_id] = float(f"{time.perf_counter() - st:3.3f}")
+        return items or []
+
+    def run_in_process(self, task_ids) -> list:
+        """
+        Builds shards on the thread pool, items are merged in the order of task_ids
+        """
+        workers = min(self.max_workers, len(task_ids))
+
+        # shard rows created inside a transaction are not visible for other connections
+        if workers <= 1 or connection.in_atomic_block:
+            return [item for task_id in task_ids for item in self._build(task_id)]
+
+        schema_name = get_current_schema()
+        pending = queue.SimpleQueue()
+        for index, task_id in enumerate(task_ids):
+            pending.put((index, task_id))
+
+        results = [None] * len(task_ids)
+        failed = threading.Event()
+
+        def worker():
+            # dedicated connection of the thread, it is reused for all shards of the thread
+            try:
+                set_search_path(schema_name)
+
+                while not failed.is_set():
+                    try:
+                        index, task_id = pending.get_nowait()
+                    except queue.Empty:
+                        return
+
+                    try:
+                        results[index] = self._build(task_id)
+                    except Exception:
+                        failed.set()
+                        raise
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report_shard") as executor:
+            futures = [executor.submit(worker) for _ in range(workers)]
+
+        for future in futures:
+            future.result()
+
+        return [item for items in results for item in items]
+
+    def run_celery(self, instance, tasks) -> list:
+        _l.debug("ReportShardExecutor: going to run %s tasks in celery", len(tasks))
+
+        job = group(
+            self.celery_task.s(
+                task_id=task.id,
+                context={
+                    "realm_code": instance.master_user.realm_code,
+                    "space_code": instance.master_user.space_code,
+                },
+            )
+            for task in tasks
+        )
+
+        group_result = job.apply_async()
+        # Wait for all tasks to finish and get their results
+        group_result.join()
+
+        return [item for result in group_result.results for item in result.result]
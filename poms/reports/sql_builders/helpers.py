@@ -16,57 +16,41 @@ def get_transaction_date_filter_for_initial_position_sql_string(date, has_where)
     else:
         result_string = "where "
 
-    result_string = f"{result_string}((transaction_class_id IN (14,15) and min_date = '{date}') or (transaction_class_id NOT IN (14,15)))"
+    result_string = f"{result_string}((transaction_class_id IN (14,15) and min_date = {date}) or (transaction_class_id NOT IN (14,15)))"
 
     return result_string
 
 
-def get_transaction_filter_sql_string(instance):
-    result_string = ""
-
-    filter_sql_list = []
-
-    portfolios_ids = []
-    accounts_ids = []
-    strategies1_ids = []
-    strategies2_ids = []
-    strategies3_ids = []
-
-    if len(instance.portfolios):
-        for portfolio in instance.portfolios:
-            portfolios_ids.append(str(portfolio.id))
-
-        filter_sql_list.append("portfolio_id in (" + ", ".join(portfolios_ids) + ")")
+FILTER_RELATIONS = (
+    ("portfolios", "portfolio_id", "portfolios_ids"),
+    ("accounts", "account_position_id", "accounts_ids"),
+    ("strategies1", "strategy1_position_id", "strategies1_ids"),
+    ("strategies2", "strategy2_position_id", "strategies2_ids"),
+    ("strategies3", "strategy3_position_id", "strategies3_ids"),
+)
 
-    if len(instance.accounts):
-        for account in instance.accounts:
-            accounts_ids.append(str(account.id))
 
-        filter_sql_list.append("account_position_id in (" + ", ".join(accounts_ids) + ")")
-
-    if len(instance.strategies1):
-        for strategy in instance.strategies1:
-            strategies1_ids.append(str(strategy.id))
-
-        filter_sql_list.append("strategy1_position_id in (" + ", ".join(strategies1_ids) + ")")
+def get_filter_sql_list(instance, params, prefix=""):
+    """
+    Filters by the report portfolios, accounts and strategies, ids are bound as arrays
+    """
+    filter_sql_list = []
 
-    if len(instance.strategies2):
-        for strategy in instance.strategies2:
-            strategies2_ids.append(str(strategy.id))
+    for attr, column, param_name in FILTER_RELATIONS:
+        objects = getattr(instance, attr)
+        if len(objects):
+            filter_sql_list.append(f"{prefix}{column} = any({params.ids(param_name, objects)})")
 
-        filter_sql_list.append("strategy2_position_id in (" + ", ".join(strategies2_ids) + ")")
+    return filter_sql_list
 
-    if len(instance.strategies3):
-        for strategy in instance.strategies3:
-            strategies3_ids.append(str(strategy.id))
 
-        filter_sql_list.append("strategy3_position_id in (" + ", ".join(strategies3_ids) + ")")
+def get_transaction_filter_sql_string(instance, params):
+    filter_sql_list = get_filter_sql_list(instance, params)
 
     if filter_sql_list:
-        result_string = result_string + "where "
-        result_string = result_string + " and ".join(filter_sql_list)
+        return "where " + " and ".join(filter_sql_list)
 
-    return result_string
+    return ""
 
 
 def get_report_fx_rate(instance, date):
@@ -87,52 +71,13 @@ def get_report_fx_rate(instance, date):
     return report_fx_rate
 
 
-def get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance):
-    result_string = ""
-
-    filter_sql_list = []
-
-    portfolios_ids = []
-    accounts_ids = []
-    strategies1_ids = []
-    strategies2_ids = []
-    strategies3_ids = []
-
-    if len(instance.portfolios):
-        for portfolio in instance.portfolios:
-            portfolios_ids.append(str(portfolio.id))
-
-        filter_sql_list.append("portfolio_id in (" + ", ".join(portfolios_ids) + ")")
-
-    if len(instance.accounts):
-        for account in instance.accounts:
-            accounts_ids.append(str(account.id))
-
-        filter_sql_list.append("account_position_id in (" + ", ".join(accounts_ids) + ")")
-
-    if len(instance.strategies1):
-        for strategy in instance.strategies1:
-            strategies1_ids.append(str(strategy.id))
-
-        filter_sql_list.append("strategy1_position_id in (" + ", ".join(strategies1_ids) + ")")
-
-    if len(instance.strategies2):
-        for strategy in instance.strategies2:
-            strategies2_ids.append(str(strategy.id))
-
-        filter_sql_list.append("strategy2_position_id in (" + ", ".join(strategies2_ids) + ")")
-
-    if len(instance.strategies3):
-        for strategy in instance.strategies3:
-            strategies3_ids.append(str(strategy.id))
-
-        filter_sql_list.append("strategy3_position_id in (" + ", ".join(strategies3_ids) + ")")
+def get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance, params):
+    filter_sql_list = get_filter_sql_list(instance, params)
 
     if filter_sql_list:
-        result_string = result_string + " and "
-        result_string = result_string + " and ".join(filter_sql_list)
+        return " and " + " and ".join(filter_sql_list)
 
-    return result_string
+    return ""
 
 
 def get_where_expression_for_position_consolidation(instance, prefix, prefix_second, use_allocation=True):
@@ -281,94 +226,30 @@ def get_cash_as_position_consolidation_for_select(instance):
     return resultString
 
 
-def get_transaction_report_filter_sql_string(instance):
-    result_string = ""
-
-    filter_sql_list = []
-
-    portfolios_ids = []
-    accounts_ids = []
-    strategies1_ids = []
-    strategies2_ids = []
-    strategies3_ids = []
-
-    if len(instance.portfolios):
-        for portfolio in instance.portfolios:
-            portfolios_ids.append(str(portfolio.id))
-
-        filter_sql_list.append("t.portfolio_id in (" + ", ".join(portfolios_ids) + ")")
-
-    if len(instance.accounts):
-        for account in instance.accounts:
-            accounts_ids.append(str(account.id))
-
-        filter_sql_list.append("t.account_position_id in (" + ", ".join(accounts_ids) + ")")
-
-    if len(instance.strategies1):
-        for strategy in instance.strategies1:
-            strategies1_ids.append(str(strategy.id))
-
-        filter_sql_list.append("t.strategy1_position_id in (" + ", ".join(strategies1_ids) + ")")
-
-    if len(instance.strategies2):
-        for strategy in instance.strategies2:
-            strategies2_ids.append(str(strategy.id))
-
-        filter_sql_list.append("t.strategy2_position_id in (" + ", ".join(strategies2_ids) + ")")
-
-    if len(instance.strategies3):
-        for strategy in instance.strategies3:
-            strategies3_ids.append(str(strategy.id))
-
-        filter_sql_list.append("t.strategy3_position_id in (" + ", ".join(strategies3_ids) + ")")
+def get_transaction_report_filter_sql_string(instance, params):
+    filter_sql_list = get_filter_sql_list(instance, params, prefix="t.")
 
     if filter_sql_list:
-        result_string = result_string + "and "
-        result_string = result_string + " and ".join(filter_sql_list)
+        return "and " + " and ".join(filter_sql_list)
 
-    return result_string
+    return ""
 
 
-def get_transaction_report_date_filter_sql_string(instance):
-    result_string = ""
+def get_transaction_report_date_filter_sql_string(instance, params):
+    begin_date = params.date("begin_date", instance.begin_date)
+    end_date = params.date("end_date", instance.end_date)
 
     if (
         "user_" in instance.date_field or instance.date_field == "date"
     ):  # for complex transaction.user_date_N fields (note tc.)
-        result_string = (
-            "((t.transaction_class_id IN (14,15) AND tc."
-            + instance.date_field
-            + " = '"
-            + str(instance.end_date)
-            + "') OR (t.transaction_class_id NOT IN (14,15) AND tc."
-            + instance.date_field
-            + " >= '"
-            + str(instance.begin_date)
-            + "' AND tc."
-            + instance.date_field
-            + "<= '"
-            + str(instance.end_date)
-            + "'))"
-        )
-
+        date_column = f"tc.{instance.date_field}"
     else:  # for base transaction fields (note t.)
-        result_string = (
-            "((t.transaction_class_id IN (14,15) AND t."
-            + instance.date_field
-            + " = '"
-            + str(instance.end_date)
-            + "') OR (t.transaction_class_id NOT IN (14,15) AND t."
-            + instance.date_field
-            + " >= '"
-            + str(instance.begin_date)
-            + "' AND t."
-            + instance.date_field
-            + " <= '"
-            + str(instance.end_date)
-            + "'))"
-        )
+        date_column = f"t.{instance.date_field}"
 
-    return result_string
+    return (
+        f"((t.transaction_class_id IN (14,15) AND {date_column} = {end_date}) "
+        f"OR (t.transaction_class_id NOT IN (14,15) AND {date_column} >= {begin_date} AND {date_column} <= {end_date}))"
+    )
 
 
 def get_balance_query_with_pl():
@@ -571,8 +452,8 @@ def get_balance_query_with_pl():
                                
                         -- добавить остальные поля
                         from unioned_transactions_for_balance -- USE TOTAL VIEW HERE
-                        where accounting_date <= '{report_date}' /* REPORTING DATE */
-                          and '{report_date}' < cash_date
+                        where accounting_date <= {report_date} /* REPORTING DATE */
+                          and {report_date} < cash_date
                         
                         -- case 2
                         union all
@@ -615,8 +496,8 @@ def get_balance_query_with_pl():
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        where cash_date  <= '{report_date}'  /* REPORTING DATE */
-                          and '{report_date}' < accounting_Date
+                        where cash_date  <= {report_date}  /* REPORTING DATE */
+                          and {report_date} < accounting_Date
                     
                         union all
                         
@@ -658,11 +539,11 @@ def get_balance_query_with_pl():
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        --where not (accounting_date <= '{report_date}' /* REPORTING DATE */
-                        --  and '{report_date}' < cash_date)
-                        where not ( (accounting_date <= '{report_date}' 
-                          and '{report_date}' < cash_date) 
-                          or (cash_date  <= '{report_date}' and '{report_date}' < accounting_date)) 
+                        --where not (accounting_date <= {report_date} /* REPORTING DATE */
+                        --  and {report_date} < cash_date)
+                        where not ( (accounting_date <= {report_date} 
+                          and {report_date} < cash_date) 
+                          or (cash_date  <= {report_date} and {report_date} < accounting_date)) 
                             
                     ),
                     
@@ -856,7 +737,7 @@ def get_balance_query_with_pl():
                              from currencies_currencyhistory
                              where
                                 currency_id = settlement_currency_id and
-                                date = '{report_date}' and
+                                date = {report_date} and
                                 pricing_policy_id = {pricing_policy_id}
                             )
                             end as fx_rate,
@@ -1048,7 +929,7 @@ def get_balance_query_with_pl():
                                          from currencies_currencyhistory
                                          where
                                             currency_id = {report_currency_id} and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as report_fx_rate,
@@ -1061,7 +942,7 @@ def get_balance_query_with_pl():
                                          from currencies_currencyhistory
                                          where
                                             currency_id = settlement_currency_id and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as stl_fx_rate
@@ -1072,7 +953,7 @@ def get_balance_query_with_pl():
                                            (-1) as instrument_id,
                                           SUM(cash_consideration) as position_size
                                         from filtered_transactions
-                                        where min_date <= '{report_date}' and master_user_id = {master_user_id}
+                                        where min_date <= {report_date} and master_user_id = {master_user_id}
                                         group by
                                           {consolidated_cash_columns}
                                           settlement_currency_id, instrument_id
@@ -1568,7 +1449,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_principal_price,
                                 
@@ -1577,7 +1458,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_accrued_price,
                                 
@@ -1586,7 +1467,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_principal_price,
                                 
@@ -1595,7 +1476,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_accrued_price,
                                 
@@ -1607,7 +1488,7 @@ def get_balance_query_with_pl():
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.co_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                        end as ec1_fx_rate,
@@ -1620,7 +1501,7 @@ def get_balance_query_with_pl():
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.counter_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                     end as ec2_fx_rate,
@@ -1631,7 +1512,7 @@ def get_balance_query_with_pl():
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = {report_currency_id}
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -1645,7 +1526,7 @@ def get_balance_query_with_pl():
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.pricing_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as pch_fx_rate,
@@ -1658,7 +1539,7 @@ def get_balance_query_with_pl():
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.accrued_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as ach_fx_rate,
@@ -1668,7 +1549,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as principal_price,
                                 
@@ -1677,7 +1558,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{bday_yesterday_of_report_date}' and
+                                    date = {bday_yesterday_of_report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as yesterday_principal_price,
                                 
@@ -1686,7 +1567,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as factor,
                                 
@@ -1695,7 +1576,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as ytm,
                                 
@@ -1704,7 +1585,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id} )
                                 as accrued_price,
                                 
@@ -1713,7 +1594,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as long_delta,
                                 
@@ -1722,7 +1603,7 @@ def get_balance_query_with_pl():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as short_delta
                                 
@@ -1732,7 +1613,7 @@ def get_balance_query_with_pl():
                                   instrument_id,
                                   SUM(position_size_with_sign) as position_size
                                 from filtered_transactions 
-                                where min_date <= '{report_date}' 
+                                where min_date <= {report_date} 
                                 and master_user_id = {master_user_id}
                                 and transaction_class_id in (1,2,14)
                                 group by
@@ -2062,8 +1943,8 @@ def get_balance_query():
                                
                         -- добавить остальные поля
                         from unioned_transactions_for_balance -- USE TOTAL VIEW HERE
-                        where accounting_date <= '{report_date}' /* REPORTING DATE */
-                          and '{report_date}' < cash_date
+                        where accounting_date <= {report_date} /* REPORTING DATE */
+                          and {report_date} < cash_date
                         
                         -- case 2
                         union all
@@ -2106,8 +1987,8 @@ def get_balance_query():
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        where cash_date  <= '{report_date}'  /* REPORTING DATE */
-                          and '{report_date}' < accounting_Date
+                        where cash_date  <= {report_date}  /* REPORTING DATE */
+                          and {report_date} < accounting_Date
                     
                         union all
                         
@@ -2149,11 +2030,11 @@ def get_balance_query():
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        --where not (accounting_date <= '{report_date}' /* REPORTING DATE */
-                        --  and '{report_date}' < cash_date)
-                        where not ( (accounting_date <= '{report_date}' 
-                          and '{report_date}' < cash_date) 
-                          or (cash_date  <= '{report_date}' and '{report_date}' < accounting_date)) 
+                        --where not (accounting_date <= {report_date} /* REPORTING DATE */
+                        --  and {report_date} < cash_date)
+                        where not ( (accounting_date <= {report_date} 
+                          and {report_date} < cash_date) 
+                          or (cash_date  <= {report_date} and {report_date} < accounting_date)) 
                             
                     ),
                     
@@ -2347,7 +2228,7 @@ def get_balance_query():
                              from currencies_currencyhistory
                              where
                                 currency_id = settlement_currency_id and
-                                date = '{report_date}' and
+                                date = {report_date} and
                                 pricing_policy_id = {pricing_policy_id}
                             )
                             end as fx_rate,
@@ -2539,7 +2420,7 @@ def get_balance_query():
                                          from currencies_currencyhistory
                                          where
                                             currency_id = {report_currency_id} and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as report_fx_rate,
@@ -2552,7 +2433,7 @@ def get_balance_query():
                                          from currencies_currencyhistory
                                          where
                                             currency_id = settlement_currency_id and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as stl_fx_rate
@@ -2563,7 +2444,7 @@ def get_balance_query():
                                            (-1) as instrument_id,
                                           SUM(cash_consideration) as position_size
                                         from filtered_transactions
-                                        where min_date <= '{report_date}' and master_user_id = {master_user_id}
+                                        where min_date <= {report_date} and master_user_id = {master_user_id}
                                         group by
                                           {consolidated_cash_columns}
                                           settlement_currency_id, instrument_id
@@ -3051,7 +2932,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_principal_price,
                                 
@@ -3060,7 +2941,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_accrued_price,
                                 
@@ -3069,7 +2950,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_principal_price,
                                 
@@ -3078,7 +2959,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_accrued_price,
                                 
@@ -3090,7 +2971,7 @@ def get_balance_query():
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.co_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                        end as ec1_fx_rate,
@@ -3103,7 +2984,7 @@ def get_balance_query():
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.counter_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                     end as ec2_fx_rate,
@@ -3114,7 +2995,7 @@ def get_balance_query():
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = {report_currency_id}
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -3128,7 +3009,7 @@ def get_balance_query():
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.pricing_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as pch_fx_rate,
@@ -3141,7 +3022,7 @@ def get_balance_query():
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.accrued_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as ach_fx_rate,
@@ -3151,7 +3032,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as principal_price,
                                 
@@ -3160,7 +3041,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{bday_yesterday_of_report_date}' and
+                                    date = {bday_yesterday_of_report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as yesterday_principal_price,
                                 
@@ -3169,7 +3050,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as factor,
                                 
@@ -3178,7 +3059,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as ytm,
                                 
@@ -3187,7 +3068,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id} )
                                 as accrued_price,
                                 
@@ -3196,7 +3077,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as long_delta,
                                 
@@ -3205,7 +3086,7 @@ def get_balance_query():
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as short_delta
                                 
@@ -3215,7 +3096,7 @@ def get_balance_query():
                                   instrument_id,
                                   SUM(position_size_with_sign) as position_size
                                 from filtered_transactions 
-                                where min_date <= '{report_date}' 
+                                where min_date <= {report_date} 
                                 and master_user_id = {master_user_id}
                                 and transaction_class_id in (1,2,14)
                                 group by
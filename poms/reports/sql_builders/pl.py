@@ -3,7 +3,6 @@ import os
 import time
 from datetime import date, timedelta
 
-from celery import group
 from django.conf import settings
 from django.db import connection
 
@@ -23,6 +22,7 @@ from poms.instruments.models import CostMethod, Country, Instrument, InstrumentT
 from poms.portfolios.models import Portfolio
 from poms.reports.common import Report
 from poms.reports.models import PLReportCustomField, ReportInstanceModel
+from poms.reports.sql_builders.executor import ReportShardExecutor
 from poms.reports.sql_builders.helpers import (
     dictfetchall,
     get_fx_trades_and_fx_variations_transaction_filter_sql_string,
@@ -32,6 +32,7 @@ from poms.reports.sql_builders.helpers import (
     get_transaction_filter_sql_string,
     get_where_expression_for_position_consolidation,
 )
+from poms.reports.sql_builders.prepared import QueryParams, execute
 from poms.strategies.models import Strategy1, Strategy2, Strategy3
 from poms.transactions.models import Transaction
 from poms.users.models import EcosystemDefault
@@ -256,7 +257,7 @@ class PLReportBuilderSql:
                    reference_fx_rate,
                    transaction_ytm,
                    
-                   ('{report_date}'::date - accounting_date::date) as day_delta,
+                   ({report_date}::date - accounting_date::date) as day_delta,
                    
                    case
                      when abs(rolling_position_size) <= min_closed
@@ -363,7 +364,7 @@ class PLReportBuilderSql:
            reference_fx_rate,
            transaction_ytm,
            
-           ('{report_date}'::date - accounting_date::date) as day_delta,
+           ({report_date}::date - accounting_date::date) as day_delta,
   
            mult_coef_ln,
            
@@ -443,7 +444,7 @@ class PLReportBuilderSql:
            reference_fx_rate,
            transaction_ytm,
            
-           ('{report_date}'::date - accounting_date::date) as day_delta, 
+           ({report_date}::date - accounting_date::date) as day_delta, 
 
            0 as mult_coef, 
            1 as multiplier
@@ -530,8 +531,8 @@ class PLReportBuilderSql:
                          ttype
                          from pl_transactions_with_ttype_filtered 
                          where 
-                            master_user_id='{master_user_id}'::int and 
-                            accounting_date <= '{report_date}') as tt
+                            master_user_id={master_user_id}::int and 
+                            accounting_date <= {report_date}) as tt
                              left join
                            (select 
                                     instrument_id, 
@@ -539,8 +540,8 @@ class PLReportBuilderSql:
                                     coalesce(abs(sum(position_size_with_sign)), 0) as sell_positions_total_size
                             from pl_transactions_with_ttype_filtered 
                             where 
-                                master_user_id = '{master_user_id}' and 
-                                accounting_date <= '{report_date}' and 
+                                master_user_id = {master_user_id} and 
+                                accounting_date <= {report_date} and 
                                 position_size_with_sign < 0
                             group by 
                                 {consolidation_columns} 
@@ -553,8 +554,8 @@ class PLReportBuilderSql:
                                 coalesce(abs(sum(position_size_with_sign)), 0) as buy_positions_total_size
                             from pl_transactions_with_ttype_filtered 
                             where 
-                                master_user_id= '{master_user_id}' and 
-                                accounting_date <= '{report_date}' and 
+                                master_user_id= {master_user_id} and 
+                                accounting_date <= {report_date} and 
                                 position_size_with_sign > 0
                             group by 
                                 {consolidation_columns} 
@@ -581,7 +582,7 @@ class PLReportBuilderSql:
                                (select fx_rate
                                  from currencies_currencyhistory cch
                                  where cch.currency_id = settlement_currency_id
-                                   and cch.date = '{report_date}'
+                                   and cch.date = {report_date}
                                    and cch.pricing_policy_id = {pricing_policy_id}
                                     /* and pricing policy= */
                                  ) as stl_fx_rate,
@@ -758,7 +759,7 @@ class PLReportBuilderSql:
                             limit 1)
                   end as rep_hist_fx,
                    
-                   ('{report_date}'::date - accounting_date::date) as day_delta,
+                   ({report_date}::date - accounting_date::date) as day_delta,
                 
                    (principal_with_sign * reference_fx_rate) as principal_with_sign_invested,
                    (carry_with_sign * reference_fx_rate) as carry_with_sign_invested,
@@ -1396,7 +1397,7 @@ class PLReportBuilderSql:
                             from instruments_pricehistory
                             where 
                                 instrument_id=i.id and 
-                                date = '{report_date}' and
+                                date = {report_date} and
                                 pricing_policy_id = {pricing_policy_id})
                             as instrument_principal_price,
                             
@@ -1405,7 +1406,7 @@ class PLReportBuilderSql:
                             from instruments_pricehistory
                             where 
                                 instrument_id=i.id and 
-                                date = '{report_date}' and
+                                date = {report_date} and
                                 pricing_policy_id = {pricing_policy_id})
                             as instrument_factor,
                             
@@ -1417,7 +1418,7 @@ class PLReportBuilderSql:
                              from currencies_currencyhistory
                              where
                                 currency_id = i.pricing_currency_id and
-                                date = '{report_date}' and
+                                date = {report_date} and
                                 pricing_policy_id = {pricing_policy_id}
                             )
                             end as pch_fx_rate,
@@ -1516,7 +1517,7 @@ class PLReportBuilderSql:
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = {report_currency_id}
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -1578,7 +1579,7 @@ class PLReportBuilderSql:
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = tut.settlement_currency_id
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -1592,7 +1593,7 @@ class PLReportBuilderSql:
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = tut.transaction_currency_id
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -1604,7 +1605,7 @@ class PLReportBuilderSql:
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = {report_currency_id}
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -1661,7 +1662,7 @@ class PLReportBuilderSql:
                                     
                                 from 
                                     transactions_unioned_table tut
-                                where accounting_date <= '{report_date}'
+                                where accounting_date <= {report_date}
                                 group by 
                                     {consolidation_columns} instrument_id, transaction_currency_id, settlement_currency_id
                             ) as tt_without_fx_rates
@@ -1678,7 +1679,7 @@ class PLReportBuilderSql:
                                     currencies_currencyhistory as c_ch
                                 where 
                                     
-                                    date = '{report_date}' and 
+                                    date = {report_date} and 
                                     c_ch.pricing_policy_id = {pricing_policy_id}
                             ) as trnch
                             on 
@@ -1695,7 +1696,7 @@ class PLReportBuilderSql:
                                 from 
                                     currencies_currencyhistory 
                                 where 
-                                    date = '{report_date}'
+                                    date = {report_date}
                             ) as stlch
                             on 
                                 settlement_currency_id = stlch.currency_id */
@@ -1710,7 +1711,7 @@ class PLReportBuilderSql:
                                 from 
                                     instruments_accrualcalculationschedule ias
                                 where 
-                                    accrual_start_date <= '{report_date}' and 
+                                    accrual_start_date <= {report_date} and 
                                     ias.instrument_id = ii.id 
                                 order by 
                                     accrual_start_date 
@@ -1723,7 +1724,7 @@ class PLReportBuilderSql:
                                    else
                                        (select fx_rate
                                         from currencies_currencyhistory c_ch
-                                        where date = '{report_date}'
+                                        where date = {report_date}
                                           and c_ch.currency_id = pricing_currency_id
                                           and c_ch.pricing_policy_id = {pricing_policy_id}
                                         limit 1)
@@ -1737,7 +1738,7 @@ class PLReportBuilderSql:
                                    else
                                        (select fx_rate
                                         from currencies_currencyhistory c_ch
-                                        where date = '{report_date}'
+                                        where date = {report_date}
                                           and c_ch.currency_id = accrued_currency_id
                                           and c_ch.pricing_policy_id = {pricing_policy_id}
                                         limit 1)
@@ -1749,7 +1750,7 @@ class PLReportBuilderSql:
                                 from
                                     instruments_pricehistory iph
                                 where
-                                    date = '{report_date}'
+                                    date = {report_date}
                                     and iph.instrument_id=ii.id
                                     and iph.pricing_policy_id = {pricing_policy_id}
                                    ) as ytm,
@@ -1760,7 +1761,7 @@ class PLReportBuilderSql:
                                 from
                                     instruments_pricehistory iph
                                 where
-                                    date = '{report_date}'
+                                    date = {report_date}
                                     and iph.instrument_id=ii.id
                                     and iph.pricing_policy_id = {pricing_policy_id}
                                    ) as modified_duration,
@@ -1771,7 +1772,7 @@ class PLReportBuilderSql:
                                 from
                                     instruments_pricehistory iph
                                 where
-                                    date = '{report_date}'
+                                    date = {report_date}
                                     and iph.instrument_id=ii.id
                                     and iph.pricing_policy_id = {pricing_policy_id}
                                    ) as cur_price,
@@ -1781,7 +1782,7 @@ class PLReportBuilderSql:
                                 from
                                     instruments_pricehistory iph
                                 where
-                                    date = '{bday_yesterday_of_report_date}'
+                                    date = {bday_yesterday_of_report_date}
                                     and iph.instrument_id=ii.id
                                     and iph.pricing_policy_id = {pricing_policy_id}
                                    ) as yesterday_price,   
@@ -1792,7 +1793,7 @@ class PLReportBuilderSql:
                                 from
                                     instruments_pricehistory iph
                                 where
-                                    date = '{report_date}'
+                                    date = {report_date}
                                     and iph.instrument_id=ii.id
                                     and iph.pricing_policy_id = {pricing_policy_id}
                                    ) as cur_factor,
@@ -1801,7 +1802,7 @@ class PLReportBuilderSql:
                                 from
                                     instruments_pricehistory iph
                                 where
-                                    date = '{report_date}'
+                                    date = {report_date}
                                     and iph.instrument_id=ii.id
                                     and iph.pricing_policy_id = {pricing_policy_id}
                                    ) as cur_ytm,
@@ -1811,7 +1812,7 @@ class PLReportBuilderSql:
                                 from
                                     instruments_pricehistory iph
                                 where
-                                    date = '{report_date}'
+                                    date = {report_date}
                                     and iph.instrument_id=ii.id
                                     and iph.pricing_policy_id = {pricing_policy_id}
                                    ) as cur_accr_price
@@ -2153,7 +2154,7 @@ class PLReportBuilderSql:
                                    else
                                        (select fx_rate
                                         from currencies_currencyhistory c_ch
-                                        where date = '{report_date}'
+                                        where date = {report_date}
                                           and c_ch.currency_id = svfx.settlement_currency_id
                                           and c_ch.pricing_policy_id = {pricing_policy_id}
                                         limit 1)
@@ -2190,14 +2191,14 @@ class PLReportBuilderSql:
                                    else
                                        (select fx_rate
                                         from currencies_currencyhistory c_ch
-                                        where date = '{report_date}'
+                                        where date = {report_date}
                                           and c_ch.currency_id = {report_currency_id} 
                                           and c_ch.pricing_policy_id = {pricing_policy_id}
                                         limit 1)
                                 end as rep_cur_fx
                             from pl_cash_fx_variations_transactions_with_ttype svfx
                             where svfx.transaction_class_id in (8, 9, 12, 13)
-                              and accounting_date <= '{report_date}'
+                              and accounting_date <= {report_date}
                               and master_user_id = {master_user_id}
                               {fx_trades_and_fx_variations_filter_sql_string}
                           /*put filters here*/
@@ -2518,7 +2519,7 @@ class PLReportBuilderSql:
                         else
                            (select  fx_rate
                         from currencies_currencyhistory c_ch
-                        where date = '{report_date}'
+                        where date = {report_date}
                           and c_ch.currency_id = sft.settlement_currency_id 
                           and c_ch.pricing_policy_id = {pricing_policy_id}
                           limit 1)
@@ -2529,14 +2530,14 @@ class PLReportBuilderSql:
                            else
                                (select  fx_rate
                                 from currencies_currencyhistory c_ch
-                                where date = '{report_date}' and 
+                                where date = {report_date} and 
                                  c_ch.currency_id = {report_currency_id} and
                                  c_ch.pricing_policy_id = {pricing_policy_id}
                                  limit 1)
                         end as rep_cur_fx
                     from pl_cash_fx_trades_transactions_with_ttype sft where 
                               transaction_class_id in (1001,1002)
-                              and accounting_date <= '{report_date}'
+                              and accounting_date <= {report_date}
                               and master_user_id = {master_user_id}
                               {fx_trades_and_fx_variations_filter_sql_string}
                         ) as trades_w_fxrate
@@ -2853,7 +2854,7 @@ class PLReportBuilderSql:
                         else
                            (select  fx_rate
                         from currencies_currencyhistory c_ch
-                        where date = '{report_date}'
+                        where date = {report_date}
                           and c_ch.currency_id = sft.settlement_currency_id 
                           and c_ch.pricing_policy_id = {pricing_policy_id}
                           limit 1)
@@ -2864,14 +2865,14 @@ class PLReportBuilderSql:
                            else
                                (select  fx_rate
                                 from currencies_currencyhistory c_ch
-                                where date = '{report_date}' and 
+                                where date = {report_date} and 
                                  c_ch.currency_id = {report_currency_id} and
                                  c_ch.pricing_policy_id = {pricing_policy_id}
                                  limit 1)
                         end as rep_cur_fx
                     from pl_cash_transaction_pl_transactions_with_ttype sft where 
                               transaction_class_id in (5)
-                              and accounting_date <= '{report_date}'
+                              and accounting_date <= {report_date}
                               and master_user_id = {master_user_id}
                               {fx_trades_and_fx_variations_filter_sql_string}
                         ) as transaction_pl_w_fxrate
@@ -3173,13 +3174,13 @@ class PLReportBuilderSql:
                     (select principal_price
                      from instruments_pricehistory iph
                      where iph.instrument_id = linked_instrument_id
-                       and iph.date = '{report_date}'
+                       and iph.date = {report_date}
                        and iph.pricing_policy_id = {pricing_policy_id}
                      ) as cur_price,
                     (select accrued_price
                      from instruments_pricehistory iph
                      where iph.instrument_id = linked_instrument_id
-                       and iph.date = '{report_date}'
+                       and iph.date = {report_date}
                        and iph.pricing_policy_id = {pricing_policy_id}
                      ) as cur_accrued,
     
@@ -3190,7 +3191,7 @@ class PLReportBuilderSql:
                     (select fx_rate
                      from currencies_currencyhistory cch
                      where cch.currency_id = ii.pricing_currency_id
-                       and cch.date = '{report_date}'
+                       and cch.date = {report_date}
                        and cch.pricing_policy_id = {pricing_policy_id}
                     )
                     end                           as pricing_fx,
@@ -3201,7 +3202,7 @@ class PLReportBuilderSql:
                     (select fx_rate
                      from currencies_currencyhistory cch
                      where cch.currency_id = ii.accrued_currency_id
-                       and cch.date = '{report_date}'
+                       and cch.date = {report_date}
                        and cch.pricing_policy_id = {pricing_policy_id}
                     )
                         end                          as accrued_fx,
@@ -3212,7 +3213,7 @@ class PLReportBuilderSql:
                     (select fx_rate
                      from currencies_currencyhistory cch
                      where cch.currency_id = {report_currency_id} 
-                       and cch.date = '{report_date}'
+                       and cch.date = {report_date}
                        and cch.pricing_policy_id = {pricing_policy_id}
                     )
                     end                           as reporting_fx
@@ -3248,22 +3249,20 @@ class PLReportBuilderSql:
         return query
 
     @staticmethod
-    def get_query_for_first_date(instance):
+    def get_query_for_first_date(instance, params):
         ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=instance.master_user.pk)
 
         report_fx_rate = get_report_fx_rate(instance, instance.pl_first_date)
 
         _l.debug("report_fx_rate %s" % report_fx_rate)
 
-        transaction_filter_sql_string = get_transaction_filter_sql_string(instance)
+        transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
         transaction_date_filter_for_initial_position_sql_string = (
             get_transaction_date_filter_for_initial_position_sql_string(
-                instance.report_date, has_where=bool(len(transaction_filter_sql_string))
+                params.date("report_date", instance.report_date), has_where=bool(len(transaction_filter_sql_string))
             )
         )
-        fx_trades_and_fx_variations_filter_sql_string = get_fx_trades_and_fx_variations_transaction_filter_sql_string(
-            instance
-        )
+        fx_trades_and_fx_variations_filter_sql_string = get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance, params)
         transactions_all_with_multipliers_where_expression = get_where_expression_for_position_consolidation(
             instance, prefix="tt_w_m.", prefix_second="t_o."
         )
@@ -3274,11 +3273,11 @@ class PLReportBuilderSql:
         query = PLReportBuilderSql.get_source_query(cost_method=instance.cost_method.id)
 
         query = query.format(
-            report_date=instance.pl_first_date,
-            master_user_id=instance.master_user.id,
-            default_currency_id=ecosystem_defaults.currency_id,
-            report_currency_id=instance.report_currency.id,
-            pricing_policy_id=instance.pricing_policy.id,
+            report_date=params.date("pl_first_date", instance.pl_first_date),
+            master_user_id=params.integer("master_user_id", instance.master_user.id),
+            default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+            report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+            pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
             report_fx_rate=report_fx_rate,
             transaction_filter_sql_string=transaction_filter_sql_string,
             transaction_date_filter_for_initial_position_sql_string=transaction_date_filter_for_initial_position_sql_string,
@@ -3288,27 +3287,25 @@ class PLReportBuilderSql:
             tt_in1_consolidation_columns=tt_in1_consolidation_columns,
             transactions_all_with_multipliers_where_expression=transactions_all_with_multipliers_where_expression,
             filter_query_for_balance_in_multipliers_table="",
-            bday_yesterday_of_report_date=instance.bday_yesterday_of_report_date,
+            bday_yesterday_of_report_date=params.date("bday_yesterday_of_report_date", instance.bday_yesterday_of_report_date),
         )
 
         return query
 
     @staticmethod
-    def get_query_for_second_date(instance):
+    def get_query_for_second_date(instance, params):
         report_fx_rate = get_report_fx_rate(instance, instance.report_date)
         ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=instance.master_user.pk)
 
         _l.debug("report_fx_rate %s" % report_fx_rate)
 
-        transaction_filter_sql_string = get_transaction_filter_sql_string(instance)
+        transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
         transaction_date_filter_for_initial_position_sql_string = (
             get_transaction_date_filter_for_initial_position_sql_string(
-                instance.report_date, has_where=bool(len(transaction_filter_sql_string))
+                params.date("report_date", instance.report_date), has_where=bool(len(transaction_filter_sql_string))
             )
         )
-        fx_trades_and_fx_variations_filter_sql_string = get_fx_trades_and_fx_variations_transaction_filter_sql_string(
-            instance
-        )
+        fx_trades_and_fx_variations_filter_sql_string = get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance, params)
         transactions_all_with_multipliers_where_expression = get_where_expression_for_position_consolidation(
             instance, prefix="tt_w_m.", prefix_second="t_o."
         )
@@ -3320,11 +3317,11 @@ class PLReportBuilderSql:
         query = PLReportBuilderSql.get_source_query(cost_method=instance.cost_method.id)
 
         query = query.format(
-            report_date=instance.report_date,
-            master_user_id=instance.master_user.id,
-            default_currency_id=ecosystem_defaults.currency_id,
-            report_currency_id=instance.report_currency.id,
-            pricing_policy_id=instance.pricing_policy.id,
+            report_date=params.date("report_date", instance.report_date),
+            master_user_id=params.integer("master_user_id", instance.master_user.id),
+            default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+            report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+            pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
             report_fx_rate=report_fx_rate,
             transaction_filter_sql_string=transaction_filter_sql_string,
             transaction_date_filter_for_initial_position_sql_string=transaction_date_filter_for_initial_position_sql_string,
@@ -3334,7 +3331,7 @@ class PLReportBuilderSql:
             tt_in1_consolidation_columns=tt_in1_consolidation_columns,
             transactions_all_with_multipliers_where_expression=transactions_all_with_multipliers_where_expression,
             filter_query_for_balance_in_multipliers_table="",
-            bday_yesterday_of_report_date=instance.bday_yesterday_of_report_date,
+            bday_yesterday_of_report_date=params.date("bday_yesterday_of_report_date", instance.bday_yesterday_of_report_date),
         )
 
         return query
@@ -3351,8 +3348,9 @@ class PLReportBuilderSql:
             instance = ReportInstanceModel(**report_settings, master_user=celery_task.master_user)
 
             with connection.cursor() as cursor:
-                query_1 = PLReportBuilderSql.get_query_for_first_date(instance)
-                query_2 = PLReportBuilderSql.get_query_for_second_date(instance)
+                params = QueryParams()
+                query_1 = PLReportBuilderSql.get_query_for_first_date(instance, params)
+                query_2 = PLReportBuilderSql.get_query_for_second_date(instance, params)
 
                 ecosystem_defaults = EcosystemDefault.objects.get(master_user=celery_task.master_user)
 
@@ -3707,7 +3705,7 @@ class PLReportBuilderSql:
                     ) as the_file:
                         the_file.write(query)
 
-                cursor.execute(query)
+                execute(cursor, query, params)
 
                 _l.debug(
                     "PL report query execute done: %s",
@@ -4495,30 +4493,8 @@ class PLReportBuilderSql:
 
             tasks.append(task)
 
-        _l.debug("Going to run %s tasks" % len(tasks))
-
-        # Run the group of tasks
-        job = group(
-            self.build.s(
-                task_id=task.id,
-                context={
-                    "realm_code": self.instance.master_user.realm_code,
-                    "space_code": self.instance.master_user.space_code,
-                },
-            )
-            for task in tasks
-        )
-
-        group_result = job.apply_async()
-        # Wait for all tasks to finish and get their results
-        group_result.join()
-
-        # Retrieve results
-        all_dicts = []
-        for result in group_result.results:
-            # Each result is an AsyncResult instance.
-            # You can get the result of the task with its .result property.
-            all_dicts.extend(result.result)
+        executor = ReportShardExecutor(self.build_sync, celery_task=self.build)
+        all_dicts = executor.run(self.instance, tasks)
 
         for task in tasks:
             # refresh the task instance to get the latest status from the database
@@ -0,0 +1,287 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db import connection
+
+from poms.reports.common import ReportItem
+from poms.reports.sql_builders.helpers import dictfetchall
+
+_l = logging.getLogger("poms.reports")
+
+# transaction views the cash of the Balance Report is computed from
+CASH_TRANSACTIONS_VIEWS = (
+    "pl_transactions_with_ttype",
+    "pl_cash_fx_trades_transactions_with_ttype",
+    "pl_cash_fx_variations_transactions_with_ttype",
+    "pl_cash_transaction_pl_transactions_with_ttype",
+)
+
+
+class PositionsBuilderSql:
+    """
+    Lightweight positions engine.
+
+    Computes signed quantity per (portfolio, account, strategy1-3, instrument)
+    with a single aggregate over pl_transactions_with_ttype, without prices, FX,
+    PL and exposure. Position rules are the same as in BalanceReportBuilderSql:
+    a transaction is counted from its accounting date, Initial Position (class 14)
+    only at its own date.
+
+    Use it when only position_size is needed (reconciliation, events generation),
+    BalanceReportBuilderSql is an order of magnitude slower for that.
+
+    With include_cash=True cash per (portfolio, currency) is added as currency items,
+    with the cash rules of BalanceReportBuilderSql.
+    """
+
+    def __init__(
+        self,
+        master_user,
+        portfolios=None,
+        accounts=None,
+        instruments=None,
+        include_cash=False,
+    ):
+        self.master_user = master_user
+        self.portfolios_ids = self._get_ids(portfolios)
+        self.accounts_ids = self._get_ids(accounts)
+        self.instruments_ids = self._get_ids(instruments)
+        self.include_cash = include_cash
+
+    @staticmethod
+    def _get_ids(objects):
+        if not objects:
+            return []
+
+        return [obj if isinstance(obj, int) else obj.id for obj in objects]
+
+    @staticmethod
+    def to_date(value):
+        if isinstance(value, datetime):
+            return value.date()
+
+        if isinstance(value, date):
+            return value
+
+        return datetime.strptime(value, "%Y-%m-%d").date()
+
+    def get_filter_sql_string(self):
+        result = []
+
+        if self.portfolios_ids:
+            result.append("and t.portfolio_id = any(%(portfolios_ids)s)")
+
+        if self.accounts_ids:
+            result.append("and t.account_position_id = any(%(accounts_ids)s)")
+
+        if self.instruments_ids:
+            result.append("and t.instrument_id = any(%(instruments_ids)s)")
+
+        return "\n".join(result)
+
+    def get_query(self):
+        # language=PostgreSQL
+        query = """
+            with report_dates as (
+                select unnest(%(dates)s::date[]) as report_date
+            )
+
+            select
+                d.report_date,
+
+                t.portfolio_id,
+                t.account_position_id,
+                t.strategy1_position_id,
+                t.strategy2_position_id,
+                t.strategy3_position_id,
+                t.instrument_id,
+
+                i.user_code,
+
+                sum(t.position_size_with_sign) as position_size
+
+            from report_dates as d
+            join pl_transactions_with_ttype as t
+                on t.accounting_date <= d.report_date
+                and (
+                    t.transaction_class_id in (1, 2)
+                    or (t.transaction_class_id = 14 and t.min_date = d.report_date)
+                )
+            join instruments_instrument as i
+                on i.id = t.instrument_id
+
+            where t.master_user_id = %(master_user_id)s
+            {filter_sql_string}
+
+            group by
+                d.report_date,
+                t.portfolio_id,
+                t.account_position_id,
+                t.strategy1_position_id,
+                t.strategy2_position_id,
+                t.strategy3_position_id,
+                t.instrument_id,
+                i.user_code
+
+            having sum(t.position_size_with_sign) != 0
+
+            order by
+                d.report_date,
+                t.portfolio_id,
+                t.instrument_id
+        """
+
+        return query.format(filter_sql_string=self.get_filter_sql_string())
+
+    def get_cash_query(self):
+        transactions_sql = "\n\n                union all\n\n".join(
+            f"""
+                select
+                    master_user_id,
+                    portfolio_id,
+                    account_position_id,
+                    instrument_id,
+                    settlement_currency_id,
+                    transaction_class_id,
+                    accounting_date,
+                    cash_date,
+                    case
+                        when cash_date < accounting_date
+                        then cash_date
+                        else accounting_date
+                    end as min_date,
+                    cash_consideration
+                from {view}"""
+            for view in CASH_TRANSACTIONS_VIEWS
+        )
+
+        # language=PostgreSQL
+        query = """
+            with report_dates as (
+                select unnest(%(dates)s::date[]) as report_date
+            ),
+
+            cash_transactions as (
+                {transactions_sql}
+            ),
+
+            cash as (
+                select
+                    d.report_date,
+                    t.portfolio_id,
+                    t.settlement_currency_id,
+                    -- paid before the accounting date, as on the interim account in the Balance Report
+                    case
+                        when t.cash_date <= d.report_date and d.report_date < t.accounting_date
+                        then -t.cash_consideration
+                        else t.cash_consideration
+                    end as position_size
+
+                from report_dates as d
+                join cash_transactions as t
+                    on t.min_date <= d.report_date
+                    and (t.transaction_class_id not in (14, 15) or t.min_date = d.report_date)
+
+                where t.master_user_id = %(master_user_id)s
+                {filter_sql_string}
+            )
+
+            select
+                cash.report_date,
+                cash.portfolio_id,
+                cash.settlement_currency_id as currency_id,
+                c.user_code,
+                sum(cash.position_size) as position_size
+
+            from cash
+            join currencies_currency as c
+                on c.id = cash.settlement_currency_id
+
+            group by
+                cash.report_date,
+                cash.portfolio_id,
+                cash.settlement_currency_id,
+                c.user_code
+
+            having sum(cash.position_size) != 0
+
+            order by
+                cash.report_date,
+                cash.portfolio_id,
+                cash.settlement_currency_id
+        """
+
+        return query.format(transactions_sql=transactions_sql, filter_sql_string=self.get_filter_sql_string())
+
+    def build_for_dates(self, dates) -> dict[date, list[dict]]:
+        """
+        Returns positions for each requested date, computed in one query
+
+        :param dates: list of dates or 'YYYY-MM-DD' strings
+        :return: {date: [position item, ...]}, dates without positions map to []
+        """
+        st = time.perf_counter()
+
+        dates = sorted({self.to_date(d) for d in dates})
+        result = {d: [] for d in dates}
+        if not dates:
+            return result
+
+        params = {
+            "dates": dates,
+            "master_user_id": self.master_user.id,
+            "portfolios_ids": self.portfolios_ids,
+            "accounts_ids": self.accounts_ids,
+            "instruments_ids": self.instruments_ids,
+        }
+
+        with connection.cursor() as cursor:
+            cursor.execute(self.get_query(), params)
+            rows = dictfetchall(cursor)
+
+            cash_rows = []
+            if self.include_cash:
+                cursor.execute(self.get_cash_query(), params)
+                cash_rows = dictfetchall(cursor)
+
+        for row in rows:
+            report_date = row.pop("report_date")
+            row["item_type"] = ReportItem.TYPE_INSTRUMENT
+            result[report_date].append(row)
+
+        for row in cash_rows:
+            report_date = row.pop("report_date")
+            row["item_type"] = ReportItem.TYPE_CURRENCY
+            result[report_date].append(row)
+
+        _l.debug(
+            f"PositionsBuilderSql.build_for_dates: {len(dates)} dates, {len(rows)} positions, {len(cash_rows)} cash "
+            f"done: {time.perf_counter() - st:3.3f}"
+        )
+
+        return result
+
+    def build(self, report_date) -> list[dict]:
+        """
+        Returns positions at report_date, items have the same keys as instrument items
+        of the Balance Report: portfolio_id, account_position_id, strategy1_position_id,
+        strategy2_position_id, strategy3_position_id, instrument_id, user_code, position_size.
+        Cash items have portfolio_id, currency_id, user_code of the currency and position_size.
+        """
+        report_date = self.to_date(report_date)
+        return self.build_for_dates([report_date])[report_date]
+
+    @staticmethod
+    def group_by_portfolio(items) -> dict[int, dict[str, float]]:
+        """
+        Sums positions over accounts and strategies
+
+        :return: {portfolio_id: {instrument or currency user_code: position_size}}
+        """
+        result = defaultdict(lambda: defaultdict(float))
+        for item in items:
+            result[item["portfolio_id"]][item["user_code"]] += item["position_size"]
+
+        return {portfolio_id: dict(positions) for portfolio_id, positions in result.items()}
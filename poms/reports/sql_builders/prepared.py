@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import connection
+
+from poms.common.db import get_current_schema
+
+_l = logging.getLogger("poms.reports")
+
+PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s")
+STATEMENT_PREFIX = "finmars_report_"
+
+
+class QueryParams:
+    """
+    Values bound to a report query.
+
+    Builders put placeholders returned by date(), integer(), ids() etc. into
+    the SQL templates instead of the values, so the query text depends only on
+    the report settings (cost method, consolidation, filters used), not on
+    the dates and ids, and PostgreSQL can reuse its plan.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.types = {}
+
+    def add(self, name, value, sql_type) -> str:
+        if name in self.values and (self.values[name] != value or self.types[name] != sql_type):
+            raise ValueError(f"query param {name} is already bound to another value")
+
+        self.values[name] = value
+        self.types[name] = sql_type
+        return f"%({name})s"
+
+    @staticmethod
+    def to_date(value) -> date:
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, str):
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        return value
+
+    def date(self, name, value) -> str:
+        return self.add(name, self.to_date(value), "date")
+
+    def dates(self, name, values) -> str:
+        """
+        Binds the dates as date[], use it with unnest(...)
+        """
+        return self.add(name, [self.to_date(value) for value in values], "date[]")
+
+    def integer(self, name, value) -> str:
+        return self.add(name, None if value is None else int(value), "integer")
+
+    def numeric(self, name, value) -> str:
+        return self.add(name, float(value), "numeric")
+
+    def ids(self, name, objects) -> str:
+        """
+        Binds ids of the objects as integer[], use it with = any(...)
+        """
+        return self.add(name, [obj if isinstance(obj, int) else obj.id for obj in objects], "integer[]")
+
+    @staticmethod
+    def get_literal(value) -> str:
+        if value is None:
+            return "NULL"
+        if isinstance(value, date):
+            return f"'{value.isoformat()}'::date"
+        if isinstance(value, list | tuple) and value and isinstance(value[0], date):
+            return f"ARRAY[{', '.join(repr(item.isoformat()) for item in value)}]::date[]"
+        if isinstance(value, list | tuple):
+            return f"ARRAY[{', '.join(str(int(item)) for item in value)}]::integer[]"
+        if isinstance(value, int | float):
+            return repr(value)
+
+        raise TypeError(f"unsupported query param {value!r}")
+
+    def render_literal(self, sql) -> str:
+        """
+        The query with values inlined, as string formatted queries were executed
+        """
+        return PLACEHOLDER_RE.sub(lambda match: self.get_literal(self.values[match.group(1)]), sql)
+
+    def to_positional(self, sql) -> tuple[str, list[str]]:
+        """
+        Converts named placeholders to $1, $2 ... of PREPARE, returns the query and param names in order
+        """
+        names = []
+
+        def replace(match):
+            name = match.group(1)
+            if name not in names:
+                names.append(name)
+            return f"${names.index(name) + 1}"
+
+        return PLACEHOLDER_RE.sub(replace, sql), names
+
+
+class PreparedStatements:
+    """
+    Prepared statements of one DB connection, least recently used are deallocated
+    """
+
+    def __init__(self, raw_connection, size):
+        self.raw_connection = raw_connection
+        self.size = size
+        self.statements = OrderedDict()
+
+    @staticmethod
+    def get():
+        statements = getattr(connection, "_finmars_prepared_statements", None)
+        if statements is None or statements.raw_connection is not connection.connection:
+            # new connection has no prepared statements
+            statements = PreparedStatements(connection.connection, settings.REPORT_SQL_PREPARED_STATEMENTS_SIZE)
+            connection._finmars_prepared_statements = statements
+
+        return statements
+
+    def prepare(self, cursor, sql, params: QueryParams) -> tuple[str, list[str]]:
+        positional_sql, names = params.to_positional(sql)
+        types = [params.types[name] for name in names]
+
+        # search_path is part of the key, tables of another schema need another plan
+        key = hashlib.md5(
+            "\n".join([get_current_schema(), ",".join(types), positional_sql]).encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+
+        if key in self.statements:
+            self.statements.move_to_end(key)
+            return self.statements[key], names
+
+        name = f"{STATEMENT_PREFIX}{key}"
+        types_sql = f" ({', '.join(types)})" if types else ""
+        cursor.execute(f"PREPARE {name}{types_sql} AS {positional_sql}")
+        self.statements[key] = name
+
+        while len(self.statements) > self.size:
+            _, evicted_name = self.statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {evicted_name}")
+
+        return name, names
+
+
+def execute(cursor, sql, params: QueryParams):
+    """
+    Executes the report query as a prepared statement of the connection,
+    or with client side binding if REPORT_SQL_PREPARED_STATEMENTS is off (e.g. behind pgbouncer)
+    """
+    if not settings.REPORT_SQL_PREPARED_STATEMENTS:
+        cursor.execute(sql, params.values)
+        return
+
+    # cursor has to be opened to know the connection
+    name, names = PreparedStatements.get().prepare(cursor, sql, params)
+    if names:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(names))})", [params.values[n] for n in names])
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+
+def execute_literal(cursor, sql, params: QueryParams):
+    """
+    Executes the query with inlined values, used to check results of the prepared execution
+    """
+    cursor.execute(params.render_literal(sql))
@@ -8,9 +8,11 @@ from poms.reports.sql_builders.helpers import (
     dictfetchall,
     get_cash_as_position_consolidation_for_select,
     get_cash_consolidation_for_select,
+    get_fx_trades_and_fx_variations_transaction_filter_sql_string,
     get_position_consolidation_for_select,
     get_transaction_filter_sql_string,
 )
+from poms.reports.sql_builders.prepared import QueryParams, execute
 from poms.users.models import EcosystemDefault
 
 _l = logging.getLogger("poms.reports")
@@ -464,7 +466,8 @@ def execute_nav_sql(date, instance, cursor, ecosystem_defaults):
     consolidated_position_columns = get_position_consolidation_for_select(instance)
     consolidated_cash_as_position_columns = get_cash_as_position_consolidation_for_select(instance)
 
-    transaction_filter_sql_string = get_transaction_filter_sql_string(instance)
+    params = QueryParams()
+    transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
 
     query = query.format(
         report_date=date,
@@ -478,7 +481,7 @@ def execute_nav_sql(date, instance, cursor, ecosystem_defaults):
         transaction_filter_sql_string=transaction_filter_sql_string,
     )
 
-    cursor.execute(query)
+    execute(cursor, query, params)
 
     query_str = str(cursor.query, "utf-8")
 
@@ -651,7 +654,8 @@ def execute_transaction_prices_sql(date, instance, cursor, ecosystem_defaults):
     consolidated_position_columns = get_position_consolidation_for_select(instance)
     consolidated_cash_as_position_columns = get_cash_as_position_consolidation_for_select(instance)
 
-    transaction_filter_sql_string = get_transaction_filter_sql_string(instance)
+    params = QueryParams()
+    transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
 
     query = query.format(
         report_date=date,
@@ -669,7 +673,7 @@ def execute_transaction_prices_sql(date, instance, cursor, ecosystem_defaults):
         with open("/tmp/price_check_query_raw.txt", "w") as the_file:
             the_file.write(query)
 
-    cursor.execute(query)
+    execute(cursor, query, params)
 
     query_str = str(cursor.query, "utf-8")
 
@@ -682,84 +686,474 @@ def execute_transaction_prices_sql(date, instance, cursor, ecosystem_defaults):
     return result
 
 
-class PriceHistoryCheckerSql:
-    def __init__(self, instance=None):
-        # _l.debug('PriceHistoryCheckerSql init')
+def get_report_dates_sql(params, dates=None, date_from=None, date_to=None):
+    """
+    Report dates of a multi-date check, the dates list or every day of the range
+    """
+    if dates is not None:
+        return f"select unnest({params.dates('report_dates', dates)}) as report_date"
 
-        self.instance = instance
+    return (
+        f"select generate_series({params.date('date_from', date_from)}::date, "
+        f"{params.date('date_to', date_to)}::date, interval '1 day')::date as report_date"
+    )
 
-        self.ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=self.instance.master_user.pk)
 
-    def process(self):  # noqa: PLR0912
-        st = time.perf_counter()
+def execute_nav_sql_for_dates(instance, cursor, ecosystem_defaults, dates=None, date_from=None, date_to=None):
+    """
+    Missing prices and fx rates of positions held on the dates, all dates are checked in one query.
 
-        with connection.cursor() as cursor:
-            self.instance.items = []
+    Positions are kept as intervals between the dates they change,
+    so transactions are read once and not once per date.
+    Items are the same as of execute_nav_sql(), with report_date added.
+    """
+    # language=PostgreSQL
+    query = """
+        with report_dates as (
+        
+            {report_dates_sql}
+        
+        ),
+        
+        position_transactions as (
+        
+            select * from (
+                select
+                    instrument_id,
+                    portfolio_id,
+                    account_position_id,
+                    strategy1_position_id,
+                    strategy2_position_id,
+                    strategy3_position_id,
+                    allocation_pl_id,
+                    
+                    position_size_with_sign,
+                    
+                    case
+                        when cash_date < accounting_date
+                        then cash_date
+                        else accounting_date
+                    end
+                    as min_date
+                
+                from pl_transactions_with_ttype
+                where master_user_id = {master_user_id}
+                
+                union all
+                
+                select
+                    instrument_id,
+                    portfolio_id,
+                    account_position_id,
+                    strategy1_position_id,
+                    strategy2_position_id,
+                    strategy3_position_id,
+                    allocation_pl_id,
+                    
+                    position_size_with_sign,
+                    
+                    case
+                        when cash_date < accounting_date
+                        then cash_date
+                        else accounting_date
+                    end
+                    as min_date
+                
+                from pl_cash_fx_variations_transactions_with_ttype
+                where master_user_id = {master_user_id}
+                
+                -- cash fx trades do not change positions
+            ) as t
+            {transaction_filter_sql_string}
+        
+        ),
+        
+        position_intervals as (
+        
+            select * from (
+                select
+                    {consolidated_position_columns}
+                    instrument_id,
+                    
+                    (min_date) as date_from,
+                    lead(min_date) over w as date_to,
+                    
+                    sum(sum(position_size_with_sign)) over w as position_size
+                
+                from position_transactions
+                where min_date is not null
+                group by
+                    {consolidated_position_columns}
+                    instrument_id,
+                    min_date
+                window w as (partition by {consolidated_position_columns} instrument_id order by min_date)
+            ) as changes
+            where position_size != 0
+        
+        ),
+        
+        nav_positions as (
+        
+            select
+                d.report_date,
+                p.instrument_id,
+                p.position_size,
+                
+                i.name,
+                i.user_code,
+                i.pricing_currency_id,
+                i.accrued_currency_id
+            
+            from position_intervals p
+            join report_dates d
+                on p.date_from <= d.report_date
+                and (p.date_to is null or d.report_date < p.date_to)
+            join instruments_instrument i
+                on p.instrument_id = i.id
+            where not i.is_deleted and i.is_active = true and i.is_enabled = true
+        
+        ),
+        
+        nav_currencies as (
+        
+            select report_date, (pricing_currency_id) as currency_id from nav_positions
+            union
+            select report_date, (accrued_currency_id) as currency_id from nav_positions
+        
+        )
+        
+        select 
+            report_date,
+            (instrument_id) as id,
+            name,
+            user_code,
+            position_size,
+            ('missing_principal_pricing_history') as type
+        from nav_positions p
+        where not exists (
+            select 1
+            from instruments_pricehistory ph
+            where
+                ph.instrument_id = p.instrument_id and
+                ph.date = p.report_date and
+                ph.pricing_policy_id = {pricing_policy_id} and
+                (ph.principal_price is not null or ph.accrued_price is not null)
+        )
+        
+        UNION
+        
+        select 
+            report_date,
+            currency_id,
+            (currency_id::VARCHAR(255)) as name,
+            (currency_id::VARCHAR(255)) as user_code,
+            (0) as position_size,
+            ('missing_instrument_currency_fx_rate') as type
+        from nav_currencies c
+        where 
+            currency_id is distinct from {default_currency_id}
+            and not exists (
+                select 1
+                from currencies_currencyhistory ch
+                where
+                    ch.currency_id = c.currency_id and
+                    ch.date = c.report_date and
+                    ch.pricing_policy_id = {pricing_policy_id} and
+                    ch.fx_rate is not null
+            )
+        
+        UNION
+        
+        select 
+            d.report_date,
+            ch1.id,
+            ch1.name,
+            ch1.user_code,
+            (0) as position_size,
+            ('missing_report_currency_fx_rate') as type
+        from report_dates d
+        join currencies_currency ch1
+            on ch1.id = {report_currency_id}
+        where 
+            not exists (
+                select 1
+                from currencies_currencyhistory ch2
+                where 
+                    ch2.date = d.report_date and 
+                    ch2.pricing_policy_id = {pricing_policy_id} and 
+                    ch2.currency_id = ch1.id
+            )
+            and
+              ch1.master_user_id = {master_user_id}
+            and {report_currency_id} != {default_currency_id}
+        
+        order by report_date
+    """
 
-            # pl first date
+    consolidated_position_columns = get_position_consolidation_for_select(instance)
 
-            if self.instance.pl_first_date:
-                positions = execute_nav_sql(
-                    self.instance.pl_first_date,
-                    self.instance,
-                    cursor,
-                    self.ecosystem_defaults,
-                )
+    params = QueryParams()
+    report_dates_sql = get_report_dates_sql(params, dates=dates, date_from=date_from, date_to=date_to)
+    transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
+
+    query = query.format(
+        report_dates_sql=report_dates_sql,
+        master_user_id=params.integer("master_user_id", instance.master_user.id),
+        default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+        report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+        pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
+        consolidated_position_columns=consolidated_position_columns,
+        transaction_filter_sql_string=transaction_filter_sql_string,
+    )
 
-                for item in positions:
-                    if item["user_code"] != "-" and item["name"] != "-":
-                        item["position_size"] = round(item["position_size"], settings.ROUND_NDIGITS)
+    execute(cursor, query, params)
 
-                        if item["type"] == "missing_principal_pricing_history":
-                            if item["position_size"]:
-                                self.instance.items.append(item)
-                        else:
-                            self.instance.items.append(item)
+    return dictfetchall(cursor)
 
-                # self.instance.items = self.instance.items + positions
 
-                transactions = execute_transaction_prices_sql(
-                    self.instance.pl_first_date,
-                    self.instance,
-                    cursor,
-                    self.ecosystem_defaults,
+def execute_transaction_prices_sql_for_dates(
+    instance, cursor, ecosystem_defaults, dates=None, date_from=None, date_to=None
+):
+    """
+    Missing transaction fx rates for the dates, all dates are checked in one query.
+    Items are the same as of execute_transaction_prices_sql(),
+    settlement currency items of every date have the date in accounting_date.
+    """
+    # language=PostgreSQL
+    query = """
+            with 
+            report_dates as (
+            
+                {report_dates_sql}
+            
+            ),
+            
+            transactions_hist as (
+            
+                select 
+                
+                   accounting_date,
+                   transaction_class_id,
+                   
+                   transaction_currency_id,
+                   settlement_currency_id,
+                   
+                   (ct.name) as transaction_currency_name,
+                   (ct.user_code) as transaction_currency_user_code,
+                   
+                   min_date,
+                   
+                   case
+                       when
+                           transaction_currency_id = {default_currency_id}
+                           then 1
+                       else
+                           (select fx_rate
+                            from currencies_currencyhistory c_ch
+                            where c_ch.date = accounting_date and
+                               c_ch.currency_id = transaction_currency_id and
+                               c_ch.pricing_policy_id = {pricing_policy_id}
+                            limit 1)
+                   end as trn_hist_fx,
+    
+                   case
+                       when {report_currency_id} = {default_currency_id}
+                           then 1
+                       else
+                           (select fx_rate
+                            from currencies_currencyhistory c_ch
+                            where c_ch.date = accounting_date and 
+                                c_ch.currency_id = {report_currency_id} and
+                                c_ch.pricing_policy_id = {pricing_policy_id}
+                            limit 1)
+                  end as rep_hist_fx
+                
+                from (
+                    select 
+                        *,
+                        case 
+                            when cash_date < accounting_date
+                            then cash_date
+                            else accounting_date
+                        end
+                        as min_date
+                    from pl_transactions_with_ttype
+                    where master_user_id = {master_user_id}
+                    {transaction_filter_sql_string}
+                ) as t
+                left join currencies_currency ct on transaction_currency_id = ct.id
+                where min_date <= (select max(report_date) from report_dates)
+                
+            ),
+            
+            settlement_currencies as (
+            
+                select
+                    settlement_currency_id,
+                    transaction_currency_name,
+                    transaction_currency_user_code,
+                    min(min_date) as min_date
+                from transactions_hist
+                group by
+                    settlement_currency_id,
+                    transaction_currency_name,
+                    transaction_currency_user_code
+            
+            )
+            
+            -- optional start
+            select DISTINCT
+                ('fixed_calc') as type,
+                accounting_date,
+                transaction_currency_id,
+                
+                transaction_currency_name,
+                transaction_currency_user_code
+                
+            from transactions_hist
+            where trn_hist_fx ISNULL and not transaction_class_id in (8,9,12,13)
+            
+            UNION 
+            
+            select DISTINCT
+                ('rep_fixed_calc') as type,
+                accounting_date,
+                ({report_currency_id}) as report_currency_id,
+                
+                transaction_currency_name,
+                transaction_currency_user_code
+            from transactions_hist
+            where rep_hist_fx ISNULL and not transaction_class_id in (8,9,12,13)
+            
+            -- optional end
+            
+            -- required start
+            
+            UNION 
+            
+            select DISTINCT
+                ('stl_cur_fx') as type,
+                d.report_date,
+                settlement_currency_id,
+                
+                transaction_currency_name,
+                transaction_currency_user_code
+            from settlement_currencies s
+            join report_dates d on s.min_date <= d.report_date
+            where 
+                settlement_currency_id is distinct from {default_currency_id}
+                and not exists (
+                    select 1
+                    from currencies_currencyhistory c_ch
+                    where c_ch.date = d.report_date
+                      and c_ch.currency_id = s.settlement_currency_id
+                      and c_ch.pricing_policy_id = {pricing_policy_id}
+                      and c_ch.fx_rate is not null
                 )
+            
+            UNION 
+            
+            select DISTINCT
+                ('fx_var') as type,
+                accounting_date,
+                transaction_currency_id,
+                transaction_currency_name,
+                transaction_currency_user_code
+            from transactions_hist
+            where trn_hist_fx ISNULL and transaction_class_id in (8,9,12,13)
+            
+            UNION 
+            
+            select DISTINCT
+                ('rep_fx_var') as type,
+                accounting_date,
+                ({report_currency_id}) as report_currency_id,
+                transaction_currency_name,
+                transaction_currency_user_code
+            from transactions_hist
+            where rep_hist_fx ISNULL and transaction_class_id in (8,9,12,13)
+            
+            -- required end
+            
+            order by accounting_date
+    """
 
-                # _l.debug('transactions %s ' % len(transactions))
+    params = QueryParams()
+    report_dates_sql = get_report_dates_sql(params, dates=dates, date_from=date_from, date_to=date_to)
+    transaction_filter_sql_string = get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance, params)
 
-                self.instance.items = self.instance.items + transactions
+    query = query.format(
+        report_dates_sql=report_dates_sql,
+        master_user_id=params.integer("master_user_id", instance.master_user.id),
+        default_currency_id=params.integer("default_currency_id", ecosystem_defaults.currency_id),
+        report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+        pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
+        transaction_filter_sql_string=transaction_filter_sql_string,
+    )
 
-            # report date
+    execute(cursor, query, params)
 
-            positions = execute_nav_sql(
-                self.instance.report_date,
-                self.instance,
-                cursor,
-                self.ecosystem_defaults,
-            )
+    return dictfetchall(cursor)
 
-            for item in positions:
-                if item["user_code"] != "-" and item["name"] != "-":
-                    item["position_size"] = round(item["position_size"], settings.ROUND_NDIGITS)
 
-                    if item["type"] == "missing_principal_pricing_history":
-                        if item["position_size"]:
-                            self.instance.items.append(item)
-                    else:
-                        self.instance.items.append(item)
+class PriceHistoryCheckerSql:
+    def __init__(self, instance=None):
+        # _l.debug('PriceHistoryCheckerSql init')
 
-            # self.instance.items = self.instance.items + positions
+        self.instance = instance
 
-            transactions = execute_transaction_prices_sql(
-                self.instance.report_date,
-                self.instance,
-                cursor,
-                self.ecosystem_defaults,
-            )
+        self.ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=self.instance.master_user.pk)
+
+    def get_items(self, cursor, dates=None, date_from=None, date_to=None):
+        """
+        Missing prices and fx rates for the dates (or every day of the range), one query per check
+        """
+        items = []
+
+        positions = execute_nav_sql_for_dates(
+            self.instance,
+            cursor,
+            self.ecosystem_defaults,
+            dates=dates,
+            date_from=date_from,
+            date_to=date_to,
+        )
+
+        for item in positions:
+            if item["user_code"] != "-" and item["name"] != "-":
+                item["position_size"] = round(item["position_size"], settings.ROUND_NDIGITS)
+
+                if item["type"] == "missing_principal_pricing_history":
+                    if item["position_size"]:
+                        items.append(item)
+                else:
+                    items.append(item)
+
+        transactions = execute_transaction_prices_sql_for_dates(
+            self.instance,
+            cursor,
+            self.ecosystem_defaults,
+            dates=dates,
+            date_from=date_from,
+            date_to=date_to,
+        )
 
-            # _l.debug('transactions %s ' % len(transactions))
+        # _l.debug('transactions %s ' % len(transactions))
+
+        return items + transactions
+
+    def process(self):
+        st = time.perf_counter()
+
+        with connection.cursor() as cursor:
+            # pl first date and report date are checked together,
+            # items of the report date come last and win in deduplication
+
+            dates = [self.instance.report_date]
+            if self.instance.pl_first_date:
+                dates.insert(0, self.instance.pl_first_date)
 
-            self.instance.items = self.instance.items + transactions
+            self.instance.items = self.get_items(cursor, dates=dates)
 
             unique_items_dict = {}
             unique_items = []
@@ -21,6 +21,7 @@ from poms.reports.sql_builders.helpers import (
     get_transaction_date_filter_for_initial_position_sql_string,
     get_transaction_filter_sql_string,
 )
+from poms.reports.sql_builders.prepared import QueryParams, execute
 from poms.users.models import EcosystemDefault
 
 _l = logging.getLogger("poms.reports")
@@ -83,11 +84,12 @@ class PureBalanceReportBuilderSql:
 
             with connection.cursor() as cursor:
                 st = time.perf_counter()
+                params = QueryParams()
 
-                transaction_filter_sql_string = get_transaction_filter_sql_string(instance)
+                transaction_filter_sql_string = get_transaction_filter_sql_string(instance, params)
                 transaction_date_filter_for_initial_position_sql_string = (
                     get_transaction_date_filter_for_initial_position_sql_string(
-                        instance.report_date,
+                        params.date("report_date", instance.report_date),
                         has_where=bool(len(transaction_filter_sql_string)),
                     )
                 )
@@ -96,7 +98,7 @@ class PureBalanceReportBuilderSql:
                     instance, prefix="balance_q."
                 )
                 fx_trades_and_fx_variations_filter_sql_string = (
-                    get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance)
+                    get_fx_trades_and_fx_variations_transaction_filter_sql_string(instance, params)
                 )
 
                 self.bday_yesterday_of_report_date = get_last_business_day(
@@ -305,8 +307,8 @@ class PureBalanceReportBuilderSql:
                                
                         -- добавить остальные поля
                         from unioned_transactions_for_balance -- USE TOTAL VIEW HERE
-                        where accounting_date <= '{report_date}' /* REPORTING DATE */
-                          and '{report_date}' < cash_date
+                        where accounting_date <= {report_date} /* REPORTING DATE */
+                          and {report_date} < cash_date
                         
                         -- case 2
                         union all
@@ -349,8 +351,8 @@ class PureBalanceReportBuilderSql:
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        where cash_date  <= '{report_date}'  /* REPORTING DATE */
-                          and '{report_date}' < accounting_Date
+                        where cash_date  <= {report_date}  /* REPORTING DATE */
+                          and {report_date} < accounting_Date
                     
                         union all
                         
@@ -392,11 +394,11 @@ class PureBalanceReportBuilderSql:
                                allocation_pl_id
                                
                         from unioned_transactions_for_balance
-                        --where not (accounting_date <= '{report_date}' /* REPORTING DATE */
-                        --  and '{report_date}' < cash_date)
-                        where not ( (accounting_date <= '{report_date}' 
-                          and '{report_date}' < cash_date) 
-                          or (cash_date  <= '{report_date}' and '{report_date}' < accounting_date)) 
+                        --where not (accounting_date <= {report_date} /* REPORTING DATE */
+                        --  and {report_date} < cash_date)
+                        where not ( (accounting_date <= {report_date} 
+                          and {report_date} < cash_date) 
+                          or (cash_date  <= {report_date} and {report_date} < accounting_date)) 
                             
                     ),
                     
@@ -457,7 +459,7 @@ class PureBalanceReportBuilderSql:
                              from currencies_currencyhistory
                              where
                                 currency_id = settlement_currency_id and
-                                date = '{report_date}' and
+                                date = {report_date} and
                                 pricing_policy_id = {pricing_policy_id}
                             )
                             end as fx_rate,
@@ -518,7 +520,7 @@ class PureBalanceReportBuilderSql:
                                          from currencies_currencyhistory
                                          where
                                             currency_id = {report_currency_id} and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as report_fx_rate,
@@ -531,7 +533,7 @@ class PureBalanceReportBuilderSql:
                                          from currencies_currencyhistory
                                          where
                                             currency_id = settlement_currency_id and
-                                            date = '{report_date}' and
+                                            date = {report_date} and
                                             pricing_policy_id = {pricing_policy_id}
                                         )
                                             end as stl_fx_rate
@@ -542,7 +544,7 @@ class PureBalanceReportBuilderSql:
                                            (-1) as instrument_id,
                                           SUM(cash_consideration) as position_size
                                         from filtered_transactions
-                                        where min_date <= '{report_date}' and master_user_id = {master_user_id}
+                                        where min_date <= {report_date} and master_user_id = {master_user_id}
                                         group by
                                           {consolidated_cash_columns}
                                           settlement_currency_id, instrument_id
@@ -713,7 +715,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_principal_price,
                                 
@@ -722,7 +724,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=lui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as lui_accrued_price,
                                 
@@ -731,7 +733,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_principal_price,
                                 
@@ -740,7 +742,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=sui.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as sui_accrued_price,
                                 
@@ -752,7 +754,7 @@ class PureBalanceReportBuilderSql:
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.co_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                        end as ec1_fx_rate,
@@ -765,7 +767,7 @@ class PureBalanceReportBuilderSql:
                                              from currencies_currencyhistory
                                              where
                                                      currency_id = i.counter_directional_exposure_currency_id and
-                                                     date = '{report_date}' and
+                                                     date = {report_date} and
                                                      pricing_policy_id = {pricing_policy_id}
                                             )
                                     end as ec2_fx_rate,
@@ -776,7 +778,7 @@ class PureBalanceReportBuilderSql:
                                        else
                                            (select fx_rate
                                             from currencies_currencyhistory c_ch
-                                            where date = '{report_date}'
+                                            where date = {report_date}
                                               and c_ch.currency_id = {report_currency_id}
                                               and c_ch.pricing_policy_id = {pricing_policy_id}
                                             limit 1)
@@ -790,7 +792,7 @@ class PureBalanceReportBuilderSql:
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.pricing_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as pch_fx_rate,
@@ -803,7 +805,7 @@ class PureBalanceReportBuilderSql:
                                  from currencies_currencyhistory
                                  where
                                     currency_id = i.accrued_currency_id and
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id}
                                 )
                                 end as ach_fx_rate,
@@ -813,7 +815,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as principal_price,
                                 
@@ -822,7 +824,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{bday_yesterday_of_report_date}' and
+                                    date = {bday_yesterday_of_report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as yesterday_principal_price,
                                 
@@ -831,7 +833,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as factor,
                                 
@@ -840,7 +842,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as ytm,
                                 
@@ -849,7 +851,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id} )
                                 as accrued_price,
                                 
@@ -858,7 +860,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as long_delta,
                                 
@@ -867,7 +869,7 @@ class PureBalanceReportBuilderSql:
                                 from instruments_pricehistory
                                 where 
                                     instrument_id=i.id and 
-                                    date = '{report_date}' and
+                                    date = {report_date} and
                                     pricing_policy_id = {pricing_policy_id})
                                 as short_delta
                                 
@@ -877,7 +879,7 @@ class PureBalanceReportBuilderSql:
                                   instrument_id,
                                   SUM(position_size_with_sign) as position_size
                                 from filtered_transactions 
-                                where min_date <= '{report_date}' 
+                                where min_date <= {report_date} 
                                 and master_user_id = {master_user_id}
                                 and transaction_class_id in (1,2,14)
                                 group by
@@ -907,11 +909,11 @@ class PureBalanceReportBuilderSql:
                 _l.debug("consolidated_cash_as_position_columns %s", consolidated_cash_as_position_columns)
 
                 query = query.format(
-                    report_date=instance.report_date,
-                    master_user_id=celery_task.master_user.id,
-                    default_currency_id=self.ecosystem_defaults.currency_id,
-                    report_currency_id=instance.report_currency.id,
-                    pricing_policy_id=instance.pricing_policy.id,
+                    report_date=params.date("report_date", instance.report_date),
+                    master_user_id=params.integer("master_user_id", celery_task.master_user.id),
+                    default_currency_id=params.integer("default_currency_id", self.ecosystem_defaults.currency_id),
+                    report_currency_id=params.integer("report_currency_id", instance.report_currency.id),
+                    pricing_policy_id=params.integer("pricing_policy_id", instance.pricing_policy.id),
                     consolidated_cash_columns=consolidated_cash_columns,
                     consolidated_position_columns=consolidated_position_columns,
                     consolidated_cash_as_position_columns=consolidated_cash_as_position_columns,
@@ -919,10 +921,10 @@ class PureBalanceReportBuilderSql:
                     transaction_filter_sql_string=transaction_filter_sql_string,
                     transaction_date_filter_for_initial_position_sql_string=transaction_date_filter_for_initial_position_sql_string,
                     fx_trades_and_fx_variations_filter_sql_string=fx_trades_and_fx_variations_filter_sql_string,
-                    bday_yesterday_of_report_date=self.bday_yesterday_of_report_date,
+                    bday_yesterday_of_report_date=params.date("bday_yesterday_of_report_date", self.bday_yesterday_of_report_date),
                 )
 
-                cursor.execute(query)
+                execute(cursor, query, params)
 
                 _l.debug(
                     "Balance report query execute done: %s",
@@ -1,8 +1,10 @@
 import logging
 import time
 import traceback
+from collections.abc import Iterator
 from datetime import timedelta
 
+from django.conf import settings
 from django.db import connection
 
 from poms.accounts.models import Account, AccountType
@@ -24,6 +26,7 @@ from poms.reports.sql_builders.helpers import (
     get_transaction_report_date_filter_sql_string,
     get_transaction_report_filter_sql_string,
 )
+from poms.reports.sql_builders.prepared import QueryParams, execute
 from poms.strategies.models import Strategy1, Strategy2, Strategy3
 from poms.transactions.models import (
     ComplexTransaction,
@@ -34,6 +37,14 @@ from poms.users.models import EcosystemDefault
 
 _l = logging.getLogger("poms.reports")
 
+ITEM_TYPE_INSTRUMENT = 1
+ITEM_TYPE_CURRENCY = 2
+ITEM_TYPE_FX_VARIATIONS = 3
+ITEM_TYPE_FX_TRADES = 4
+ITEM_TYPE_TRANSACTION_PL = 5
+ITEM_TYPE_MISMATCH = 6
+ITEM_TYPE_EXPOSURE_COPY = 7
+
 
 class TransactionReportBuilderSql:
     def __init__(self, instance=None):
@@ -102,18 +113,13 @@ class TransactionReportBuilderSql:
 
         relation_prefetch_st = time.perf_counter()
 
-        if self.instance.depth_level != "complex_transaction":
-            self.add_data_items()
-        else:
-            # TODO Figure Out
-            self.instance.item_instrument_types = []
-            self.instance.item_account_types = []
+        self.add_chunk_data_items()
 
         self.instance.relation_prefetch_time = float(f"{time.perf_counter() - relation_prefetch_st:3.3f}")
 
         return self.instance
 
-    def add_user_filters(self):  # noqa: PLR0912, PLR0915
+    def add_user_filters(self, params):  # noqa: PLR0912, PLR0915
         if not self.instance.filters:
             return ""
 
@@ -125,7 +131,7 @@ class TransactionReportBuilderSql:
 
         result = ""
         try:
-            for filter in self.instance.filters:
+            for index, filter in enumerate(self.instance.filters):
                 if filter["options"]["enabled"] and filter["options"]["filter_values"]:
                     if filter["key"] in [
                         "portfolio.user_code",
@@ -139,17 +145,15 @@ class TransactionReportBuilderSql:
 
                         for portfolio in portfolios:
                             portfolio_ids.extend(
-                                str(portfolio["id"])
+                                portfolio["id"]
                                 for value in filter["options"]["filter_values"]
                                 if value == portfolio[field_key]
                             )
                         _l.debug(f"portfolio_ids {portfolio_ids}")
 
                         if portfolio_ids:
-                            res = "'" + "','".join(portfolio_ids)
-                            res = f"{res}'"
-
-                            result = f"{result}and t.portfolio_id IN ({res})"
+                            res = params.ids(f"user_filter_{index}_portfolios_ids", portfolio_ids)
+                            result = f"{result}and t.portfolio_id = any({res})"
 
                     if filter["key"] in {
                         "instrument.user_code",
@@ -163,22 +167,21 @@ class TransactionReportBuilderSql:
 
                         for instrument in instruments:
                             instrument_ids.extend(
-                                str(instrument["id"])
+                                instrument["id"]
                                 for value in filter["options"]["filter_values"]
                                 if value == instrument[field_key]
                             )
 
                         if instrument_ids:
-                            res = "'" + "','".join(instrument_ids)
-                            res = f"{res}'"
-                            result = f"{result}and t.instrument_id IN ({res})"
+                            res = params.ids(f"user_filter_{index}_instruments_ids", instrument_ids)
+                            result = f"{result}and t.instrument_id = any({res})"
 
                     if filter["key"] in ["entry_item_user_code"]:
                         instrument_ids = []
 
                         for instrument in instruments:
                             instrument_ids.extend(
-                                str(instrument["id"])
+                                instrument["id"]
                                 for value in filter["options"]["filter_values"]
                                 if value == instrument["user_code"]
                             )
@@ -187,16 +190,14 @@ class TransactionReportBuilderSql:
                         instrument_expression = ""
 
                         if instrument_ids:
-                            res = "'" + "','".join(instrument_ids)
-                            res = f"{res}'"
-
-                            instrument_expression = f"t.instrument_id IN ({res})"
+                            res = params.ids(f"user_filter_{index}_instruments_ids", instrument_ids)
+                            instrument_expression = f"t.instrument_id = any({res})"
 
                         currencies_ids = []
 
                         for currency in currencies:
                             currencies_ids.extend(
-                                str(currency["id"])
+                                currency["id"]
                                 for value in filter["options"]["filter_values"]
                                 if value == currency["user_code"]
                             )
@@ -206,14 +207,9 @@ class TransactionReportBuilderSql:
                         transaction_currency_expression = ""
 
                         if currencies_ids:
-                            res = "'" + "','".join(currencies_ids)
-                            res = f"{res}'"
-
-                            settlement_currency_expression = f"t.settlement_currency_id IN ({res})"
-                            res = "'" + "','".join(currencies_ids)
-                            res = f"{res}'"
-
-                            transaction_currency_expression = f"t.transaction_currency_id IN ({res})"
+                            res = params.ids(f"user_filter_{index}_currencies_ids", currencies_ids)
+                            settlement_currency_expression = f"t.settlement_currency_id = any({res})"
+                            transaction_currency_expression = f"t.transaction_currency_id = any({res})"
                         # _l.debug('result %s' % result)
 
                         if instrument_expression and (
@@ -238,944 +234,975 @@ class TransactionReportBuilderSql:
 
         return result
 
-    def build_complex_transaction_level_items(self):
-        _l.debug("build_complex_transaction_level_items")
+    def get_complex_transaction_level_query(self, params: QueryParams) -> str:
+        _l.debug("get_complex_transaction_level_query")
+
+        filter_sql_string = get_transaction_report_filter_sql_string(self.instance, params)
+        date_filter_sql_string = get_transaction_report_date_filter_sql_string(self.instance, params)
+
+        query = """
+                SELECT
+                  -- transaction fields
+                  -- t.*,-- exclude transaction fields, only complex transaction fields left
+                  -- complex transaction fields
+                  
+                  (null) as transaction_item_name,
+                  (null) as transaction_item_short_name,
+                  (null) as transaction_item_user_code,
+                  
+                  tc.id as complex_transaction_id,
+                  tc.status_id as complex_transaction_status,
+                  tc.code as complex_transaction_code,
+                  tc.text as complex_transaction_text,
+                  tc.date as complex_transaction_date,
+                  tc.transaction_unique_code as transaction_unique_code,
+                  tc.is_locked as is_locked,
+                  tc.is_canceled as is_canceled,
+                  -- complex transaction user fields
+                  tc.user_text_1 as complex_transaction_user_text_1,
+                  tc.user_text_2 as complex_transaction_user_text_2,
+                  tc.user_text_3 as complex_transaction_user_text_3,
+                  tc.user_text_4 as complex_transaction_user_text_4,
+                  tc.user_text_5 as complex_transaction_user_text_5,
+                  tc.user_text_6 as complex_transaction_user_text_6,
+                  tc.user_text_7 as complex_transaction_user_text_7,
+                  tc.user_text_8 as complex_transaction_user_text_8,
+                  tc.user_text_9 as complex_transaction_user_text_9,
+                  tc.user_text_10 as complex_transaction_user_text_10,
+                  tc.user_text_11 as complex_transaction_user_text_11,
+                  tc.user_text_12 as complex_transaction_user_text_12,
+                  tc.user_text_13 as complex_transaction_user_text_13,
+                  tc.user_text_14 as complex_transaction_user_text_14,
+                  tc.user_text_15 as complex_transaction_user_text_15,
+                  tc.user_text_16 as complex_transaction_user_text_16,
+                  tc.user_text_17 as complex_transaction_user_text_17,
+                  tc.user_text_18 as complex_transaction_user_text_18,
+                  tc.user_text_19 as complex_transaction_user_text_19,
+                  tc.user_text_20 as complex_transaction_user_text_20,
+                  
+                  tc.user_number_1 as complex_transaction_user_number_1,
+                  tc.user_number_2 as complex_transaction_user_number_2,
+                  tc.user_number_3 as complex_transaction_user_number_3,
+                  tc.user_number_4 as complex_transaction_user_number_4,
+                  tc.user_number_5 as complex_transaction_user_number_5,
+                  tc.user_number_6 as complex_transaction_user_number_6,
+                  tc.user_number_7 as complex_transaction_user_number_7,
+                  tc.user_number_8 as complex_transaction_user_number_8,
+                  tc.user_number_9 as complex_transaction_user_number_9,
+                  tc.user_number_10 as complex_transaction_user_number_10,
+                  tc.user_number_11 as complex_transaction_user_number_11,
+                  tc.user_number_12 as complex_transaction_user_number_12,
+                  tc.user_number_13 as complex_transaction_user_number_13,
+                  tc.user_number_14 as complex_transaction_user_number_14,
+                  tc.user_number_15 as complex_transaction_user_number_15,
+                  tc.user_number_16 as complex_transaction_user_number_16,
+                  tc.user_number_17 as complex_transaction_user_number_17,
+                  tc.user_number_18 as complex_transaction_user_number_18,
+                  tc.user_number_19 as complex_transaction_user_number_19,
+                  tc.user_number_20 as complex_transaction_user_number_20,
+                  
+                  tc.user_date_1 as complex_transaction_user_date_1,
+                  tc.user_date_2 as complex_transaction_user_date_2,
+                  tc.user_date_3 as complex_transaction_user_date_3,
+                  tc.user_date_4 as complex_transaction_user_date_4,
+                  tc.user_date_5 as complex_transaction_user_date_5,
+                  
+                  -- complex transaction transaction type fields
+                  tt.id as transaction_type_id,
+                  tt.user_code as transaction_type_user_code,
+                  tt.name as transaction_type_name,
+                  tt.short_name as transaction_type_short_name,
+                  -- complex transaction transaction type group fields
+                  --tt2.name as transaction_type_group_name,-- ?? 
+                  
+                  cts.name as complex_transaction_status_name
+                  
+                FROM transactions_transaction as t
+                INNER JOIN transactions_complextransaction tc on t.complex_transaction_id = tc.id
+                INNER JOIN transactions_transactiontype tt on tc.transaction_type_id = tt.id
+                --INNER JOIN transactions_transactiontypegroup tt2 on tt.group_id = tt2.id--
+                INNER JOIN transactions_complextransactionstatus cts on tc.status_id = cts.id
+                WHERE {date_filter_sql_string} AND t.master_user_id = {master_user_id} AND NOT tc.is_deleted AND NOT tc.is_canceled AND tc.status_id = any({statuses}) {filter_sql_string}
+                
+                
+            """
+
+        # statuses = ['1', '3']
+        statuses = [1]  # FN-1327
+
+        _l.debug("complex_transaction_statuses_filter %s", self.instance.complex_transaction_statuses_filter)
+
+        if self.instance.complex_transaction_statuses_filter:
+            pieces = self.instance.complex_transaction_statuses_filter.split(",")
+
+            if len(pieces):
+                statuses = []
+                if "booked" in pieces:
+                    statuses.append(1)
+                if "ignored" in pieces:
+                    statuses.append(3)
+
+        query = query.format(
+            master_user_id=params.integer("master_user_id", self.instance.master_user.id),
+            default_instrument_id=params.integer("default_instrument_id", self.ecosystem_defaults.instrument_id),
+            statuses=params.ids("statuses", statuses),
+            filter_sql_string=filter_sql_string,
+            date_filter_sql_string=date_filter_sql_string,
+        )
 
-        with connection.cursor() as cursor:
-            filter_sql_string = get_transaction_report_filter_sql_string(self.instance)
-            date_filter_sql_string = get_transaction_report_date_filter_sql_string(self.instance)
-
-            query = """
-                    SELECT
-                      -- transaction fields
-                      -- t.*,-- exclude transaction fields, only complex transaction fields left
-                      -- complex transaction fields
-                      
-                      (null) as transaction_item_name,
-                      (null) as transaction_item_short_name,
-                      (null) as transaction_item_user_code,
-                      
-                      tc.id as complex_transaction_id,
-                      tc.status_id as complex_transaction_status,
-                      tc.code as complex_transaction_code,
-                      tc.text as complex_transaction_text,
-                      tc.date as complex_transaction_date,
-                      tc.transaction_unique_code as transaction_unique_code,
-                      tc.is_locked as is_locked,
-                      tc.is_canceled as is_canceled,
-                      -- complex transaction user fields
-                      tc.user_text_1 as complex_transaction_user_text_1,
-                      tc.user_text_2 as complex_transaction_user_text_2,
-                      tc.user_text_3 as complex_transaction_user_text_3,
-                      tc.user_text_4 as complex_transaction_user_text_4,
-                      tc.user_text_5 as complex_transaction_user_text_5,
-                      tc.user_text_6 as complex_transaction_user_text_6,
-                      tc.user_text_7 as complex_transaction_user_text_7,
-                      tc.user_text_8 as complex_transaction_user_text_8,
-                      tc.user_text_9 as complex_transaction_user_text_9,
-                      tc.user_text_10 as complex_transaction_user_text_10,
-                      tc.user_text_11 as complex_transaction_user_text_11,
-                      tc.user_text_12 as complex_transaction_user_text_12,
-                      tc.user_text_13 as complex_transaction_user_text_13,
-                      tc.user_text_14 as complex_transaction_user_text_14,
-                      tc.user_text_15 as complex_transaction_user_text_15,
-                      tc.user_text_16 as complex_transaction_user_text_16,
-                      tc.user_text_17 as complex_transaction_user_text_17,
-                      tc.user_text_18 as complex_transaction_user_text_18,
-                      tc.user_text_19 as complex_transaction_user_text_19,
-                      tc.user_text_20 as complex_transaction_user_text_20,
-                      
-                      tc.user_number_1 as complex_transaction_user_number_1,
-                      tc.user_number_2 as complex_transaction_user_number_2,
-                      tc.user_number_3 as complex_transaction_user_number_3,
-                      tc.user_number_4 as complex_transaction_user_number_4,
-                      tc.user_number_5 as complex_transaction_user_number_5,
-                      tc.user_number_6 as complex_transaction_user_number_6,
-                      tc.user_number_7 as complex_transaction_user_number_7,
-                      tc.user_number_8 as complex_transaction_user_number_8,
-                      tc.user_number_9 as complex_transaction_user_number_9,
-                      tc.user_number_10 as complex_transaction_user_number_10,
-                      tc.user_number_11 as complex_transaction_user_number_11,
-                      tc.user_number_12 as complex_transaction_user_number_12,
-                      tc.user_number_13 as complex_transaction_user_number_13,
-                      tc.user_number_14 as complex_transaction_user_number_14,
-                      tc.user_number_15 as complex_transaction_user_number_15,
-                      tc.user_number_16 as complex_transaction_user_number_16,
-                      tc.user_number_17 as complex_transaction_user_number_17,
-                      tc.user_number_18 as complex_transaction_user_number_18,
-                      tc.user_number_19 as complex_transaction_user_number_19,
-                      tc.user_number_20 as complex_transaction_user_number_20,
-                      
-                      tc.user_date_1 as complex_transaction_user_date_1,
-                      tc.user_date_2 as complex_transaction_user_date_2,
-                      tc.user_date_3 as complex_transaction_user_date_3,
-                      tc.user_date_4 as complex_transaction_user_date_4,
-                      tc.user_date_5 as complex_transaction_user_date_5,
-                      
-                      -- complex transaction transaction type fields
-                      tt.id as transaction_type_id,
-                      tt.user_code as transaction_type_user_code,
-                      tt.name as transaction_type_name,
-                      tt.short_name as transaction_type_short_name,
-                      -- complex transaction transaction type group fields
-                      --tt2.name as transaction_type_group_name,-- ?? 
-                      
-                      cts.name as complex_transaction_status_name
-                      
-                    FROM transactions_transaction as t
-                    INNER JOIN transactions_complextransaction tc on t.complex_transaction_id = tc.id
-                    INNER JOIN transactions_transactiontype tt on tc.transaction_type_id = tt.id
-                    --INNER JOIN transactions_transactiontypegroup tt2 on tt.group_id = tt2.id--
-                    INNER JOIN transactions_complextransactionstatus cts on tc.status_id = cts.id
-                    WHERE {date_filter_sql_string} AND t.master_user_id = {master_user_id} AND NOT tc.is_deleted AND NOT tc.is_canceled AND tc.status_id IN {statuses} {filter_sql_string}
-                    
-                    
-                """
-
-            # statuses = ['1', '3']
-            statuses = ["1"]  # FN-1327
-
-            _l.debug("complex_transaction_statuses_filter %s", self.instance.complex_transaction_statuses_filter)
-
-            if self.instance.complex_transaction_statuses_filter:
-                pieces = self.instance.complex_transaction_statuses_filter.split(",")
-
-                if len(pieces):
-                    statuses = []
-                    if "booked" in pieces:
-                        statuses.append("1")
-                    if "ignored" in pieces:
-                        statuses.append("3")
-
-            statuses_str = (",").join(statuses)
-            statuses_str = "(" + statuses_str + ")"
-
-            query = query.format(
-                begin_date=self.instance.begin_date,
-                end_date=self.instance.end_date,
-                master_user_id=self.instance.master_user.id,
-                default_instrument_id=self.ecosystem_defaults.instrument_id,
-                statuses=statuses_str,
-                filter_sql_string=filter_sql_string,
-                date_filter_sql_string=date_filter_sql_string,
-            )
+        return query
+
+    def get_complex_transaction_level_items(self, result_item: dict) -> list[dict]:
+        result_item["id"] = result_item["complex_transaction_id"]
+        result_item["code"] = result_item["complex_transaction_code"]
+        result_item["entry_account"] = None
+        result_item["entry_strategy"] = None
+        result_item["entry_item_name"] = None  # Should be filled later
+        result_item["entry_item_short_name"] = None  # Should be filled later
+        result_item["entry_item_user_code"] = None  # Should be filled later
+        result_item["entry_item_public_name"] = None  # Should be filled later
+        result_item["entry_currency"] = None
+        result_item["entry_instrument"] = None
+        result_item["entry_amount"] = None
+        result_item["entry_item_type"] = None
+        result_item["entry_item_type_name"] = None
+
+        return [result_item]
+
+    def get_base_transaction_level_query(self, params: QueryParams) -> str:
+        _l.debug("get_base_transaction_level_query")
+
+        filter_sql_string = get_transaction_report_filter_sql_string(self.instance, params)
+        date_filter_sql_string = get_transaction_report_date_filter_sql_string(self.instance, params)
+
+        user_filters = self.add_user_filters(params)
+
+        query = """
+                SELECT
+                  -- transaction fields
+                  t.*,
+                  
+                  case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
+                     then t.notes
+                     else
+                       i.name
+                  end as transaction_item_name,
+                  
+                  case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
+                     then t.notes
+                     else
+                       i.user_code
+                  end as transaction_item_user_code,
+                  
+                  case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
+                     then t.notes
+                     else
+                       i.short_name
+                  end as transaction_item_short_name,
+                  -- complex transaction fields
+                  tc.status_id as complex_transaction_status,
+                  tc.id as complex_transaction_id,
+                  tc.code as complex_transaction_code,
+                  tc.text as complex_transaction_text,
+                  tc.date as complex_transaction_date,
+                  tc.transaction_unique_code as transaction_unique_code,
+                  tc.is_locked as is_locked,
+                  tc.is_canceled as is_canceled,
+                  -- complex transaction user fields
+                  tc.user_text_1 as complex_transaction_user_text_1,
+                  tc.user_text_2 as complex_transaction_user_text_2,
+                  tc.user_text_3 as complex_transaction_user_text_3,
+                  tc.user_text_4 as complex_transaction_user_text_4,
+                  tc.user_text_5 as complex_transaction_user_text_5,
+                  tc.user_text_6 as complex_transaction_user_text_6,
+                  tc.user_text_7 as complex_transaction_user_text_7,
+                  tc.user_text_8 as complex_transaction_user_text_8,
+                  tc.user_text_9 as complex_transaction_user_text_9,
+                  tc.user_text_10 as complex_transaction_user_text_10,
+                  tc.user_text_11 as complex_transaction_user_text_11,
+                  tc.user_text_12 as complex_transaction_user_text_12,
+                  tc.user_text_13 as complex_transaction_user_text_13,
+                  tc.user_text_14 as complex_transaction_user_text_14,
+                  tc.user_text_15 as complex_transaction_user_text_15,
+                  tc.user_text_16 as complex_transaction_user_text_16,
+                  tc.user_text_17 as complex_transaction_user_text_17,
+                  tc.user_text_18 as complex_transaction_user_text_18,
+                  tc.user_text_19 as complex_transaction_user_text_19,
+                  tc.user_text_20 as complex_transaction_user_text_20,
+                  
+                  tc.user_number_1 as complex_transaction_user_number_1,
+                  tc.user_number_2 as complex_transaction_user_number_2,
+                  tc.user_number_3 as complex_transaction_user_number_3,
+                  tc.user_number_4 as complex_transaction_user_number_4,
+                  tc.user_number_5 as complex_transaction_user_number_5,
+                  tc.user_number_6 as complex_transaction_user_number_6,
+                  tc.user_number_7 as complex_transaction_user_number_7,
+                  tc.user_number_8 as complex_transaction_user_number_8,
+                  tc.user_number_9 as complex_transaction_user_number_9,
+                  tc.user_number_10 as complex_transaction_user_number_10,
+                  tc.user_number_11 as complex_transaction_user_number_11,
+                  tc.user_number_12 as complex_transaction_user_number_12,
+                  tc.user_number_13 as complex_transaction_user_number_13,
+                  tc.user_number_14 as complex_transaction_user_number_14,
+                  tc.user_number_15 as complex_transaction_user_number_15,
+                  tc.user_number_16 as complex_transaction_user_number_16,
+                  tc.user_number_17 as complex_transaction_user_number_17,
+                  tc.user_number_18 as complex_transaction_user_number_18,
+                  tc.user_number_19 as complex_transaction_user_number_19,
+                  tc.user_number_20 as complex_transaction_user_number_20,
+                  
+                  tc.user_date_1 as complex_transaction_user_date_1,
+                  tc.user_date_2 as complex_transaction_user_date_2,
+                  tc.user_date_3 as complex_transaction_user_date_3,
+                  tc.user_date_4 as complex_transaction_user_date_4,
+                  tc.user_date_5 as complex_transaction_user_date_5,
+                  
+                  -- complex transaction transaction type fields
+                  tt.id as transaction_type_id,
+                  tt.user_code as transaction_type_user_code,
+                  tt.name as transaction_type_name,
+                  tt.short_name as transaction_type_short_name,
+                  -- complex transaction transaction type group fields
+                  --tt2.name as transaction_type_group_name, --?
+                  
+                  cts.name as complex_transaction_status_name
+                FROM transactions_transaction as t
+                INNER JOIN transactions_complextransaction tc on t.complex_transaction_id = tc.id
+                INNER JOIN transactions_transactiontype tt on tc.transaction_type_id = tt.id
+                --INNER JOIN transactions_transactiontypegroup tt2 on tt.group_id = tt2.id--
+                INNER JOIN instruments_instrument i on t.instrument_id = i.id
+                INNER JOIN transactions_complextransactionstatus cts on tc.status_id = cts.id
+                WHERE {date_filter_sql_string} AND t.master_user_id = {master_user_id} AND NOT t.is_deleted AND NOT t.is_canceled AND tc.status_id = any({statuses}) {filter_sql_string}
+                {user_filters}
+                
+            """
+
+        # statuses = ['1', '3']
+        statuses = [1]  # FN-1327
+
+        _l.debug("complex_transaction_statuses_filter %s", self.instance.complex_transaction_statuses_filter)
+
+        if self.instance.complex_transaction_statuses_filter:
+            pieces = self.instance.complex_transaction_statuses_filter.split(",")
+
+            if len(pieces):
+                statuses = []
+                if "booked" in pieces:
+                    statuses.append(1)
+                if "ignored" in pieces:
+                    statuses.append(3)
+
+        query = query.format(
+            master_user_id=params.integer("master_user_id", self.instance.master_user.id),
+            default_instrument_id=params.integer("default_instrument_id", self.ecosystem_defaults.instrument_id),
+            statuses=params.ids("statuses", statuses),
+            filter_sql_string=filter_sql_string,
+            date_filter_sql_string=date_filter_sql_string,
+            user_filters=user_filters,
+        )
 
-            # cursor.execute(query, [self.instance.begin_date, self.instance.end_date, self.instance.master_user.id, statuses, filter_sql_string]) # noqa: E501
-            cursor.execute(query)
+        return query
 
-            result = dictfetchall(cursor)
+    def get_base_transaction_level_items(self, result_item: dict) -> list[dict]:
+        result_item["entry_account"] = None
+        result_item["entry_strategy"] = None
+        result_item["entry_item_name"] = None  # Should be filled later
+        result_item["entry_item_short_name"] = None  # Should be filled later
+        result_item["entry_item_user_code"] = None  # Should be filled later
+        result_item["entry_item_public_name"] = None  # Should be filled later
+        result_item["entry_currency"] = None
+        result_item["entry_instrument"] = None
+        result_item["entry_amount"] = None
+        result_item["entry_item_type"] = None
+        result_item["entry_item_type_name"] = None
 
-            for result_item in result:
-                result_item["id"] = result_item["complex_transaction_id"]
-                result_item["code"] = result_item["complex_transaction_code"]
-                result_item["entry_account"] = None
-                result_item["entry_strategy"] = None
-                result_item["entry_item_name"] = None  # Should be filled later
-                result_item["entry_item_short_name"] = None  # Should be filled later
-                result_item["entry_item_user_code"] = None  # Should be filled later
-                result_item["entry_item_public_name"] = None  # Should be filled later
-                result_item["entry_currency"] = None
-                result_item["entry_instrument"] = None
-                result_item["entry_amount"] = None
-                result_item["entry_item_type"] = None
-                result_item["entry_item_type_name"] = None
+        return [result_item]
 
-            self.instance.items = result
+    def get_entry_level_query(self, params: QueryParams) -> str:
+        _l.debug("get_entry_level_query")
 
-    def build_base_transaction_level_items(self):
-        _l.debug("build_base_transaction_level_items")
+        filter_sql_string = get_transaction_report_filter_sql_string(self.instance, params)
+        date_filter_sql_string = get_transaction_report_date_filter_sql_string(self.instance, params)
+        user_filters = self.add_user_filters(params)
 
-        with connection.cursor() as cursor:
-            filter_sql_string = get_transaction_report_filter_sql_string(self.instance)
-            date_filter_sql_string = get_transaction_report_date_filter_sql_string(self.instance)
-
-            user_filters = self.add_user_filters()
-
-            query = """
-                    SELECT
-                      -- transaction fields
-                      t.*,
-                      
-                      case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
-                         then t.notes
-                         else
-                           i.name
-                      end as transaction_item_name,
-                      
-                      case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
-                         then t.notes
-                         else
-                           i.user_code
-                      end as transaction_item_user_code,
-                      
-                      case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
-                         then t.notes
-                         else
-                           i.short_name
-                      end as transaction_item_short_name,
-                      -- complex transaction fields
-                      tc.status_id as complex_transaction_status,
-                      tc.id as complex_transaction_id,
-                      tc.code as complex_transaction_code,
-                      tc.text as complex_transaction_text,
-                      tc.date as complex_transaction_date,
-                      tc.transaction_unique_code as transaction_unique_code,
-                      tc.is_locked as is_locked,
-                      tc.is_canceled as is_canceled,
-                      -- complex transaction user fields
-                      tc.user_text_1 as complex_transaction_user_text_1,
-                      tc.user_text_2 as complex_transaction_user_text_2,
-                      tc.user_text_3 as complex_transaction_user_text_3,
-                      tc.user_text_4 as complex_transaction_user_text_4,
-                      tc.user_text_5 as complex_transaction_user_text_5,
-                      tc.user_text_6 as complex_transaction_user_text_6,
-                      tc.user_text_7 as complex_transaction_user_text_7,
-                      tc.user_text_8 as complex_transaction_user_text_8,
-                      tc.user_text_9 as complex_transaction_user_text_9,
-                      tc.user_text_10 as complex_transaction_user_text_10,
-                      tc.user_text_11 as complex_transaction_user_text_11,
-                      tc.user_text_12 as complex_transaction_user_text_12,
-                      tc.user_text_13 as complex_transaction_user_text_13,
-                      tc.user_text_14 as complex_transaction_user_text_14,
-                      tc.user_text_15 as complex_transaction_user_text_15,
-                      tc.user_text_16 as complex_transaction_user_text_16,
-                      tc.user_text_17 as complex_transaction_user_text_17,
-                      tc.user_text_18 as complex_transaction_user_text_18,
-                      tc.user_text_19 as complex_transaction_user_text_19,
-                      tc.user_text_20 as complex_transaction_user_text_20,
-                      
-                      tc.user_number_1 as complex_transaction_user_number_1,
-                      tc.user_number_2 as complex_transaction_user_number_2,
-                      tc.user_number_3 as complex_transaction_user_number_3,
-                      tc.user_number_4 as complex_transaction_user_number_4,
-                      tc.user_number_5 as complex_transaction_user_number_5,
-                      tc.user_number_6 as complex_transaction_user_number_6,
-                      tc.user_number_7 as complex_transaction_user_number_7,
-                      tc.user_number_8 as complex_transaction_user_number_8,
-                      tc.user_number_9 as complex_transaction_user_number_9,
-                      tc.user_number_10 as complex_transaction_user_number_10,
-                      tc.user_number_11 as complex_transaction_user_number_11,
-                      tc.user_number_12 as complex_transaction_user_number_12,
-                      tc.user_number_13 as complex_transaction_user_number_13,
-                      tc.user_number_14 as complex_transaction_user_number_14,
-                      tc.user_number_15 as complex_transaction_user_number_15,
-                      tc.user_number_16 as complex_transaction_user_number_16,
-                      tc.user_number_17 as complex_transaction_user_number_17,
-                      tc.user_number_18 as complex_transaction_user_number_18,
-                      tc.user_number_19 as complex_transaction_user_number_19,
-                      tc.user_number_20 as complex_transaction_user_number_20,
-                      
-                      tc.user_date_1 as complex_transaction_user_date_1,
-                      tc.user_date_2 as complex_transaction_user_date_2,
-                      tc.user_date_3 as complex_transaction_user_date_3,
-                      tc.user_date_4 as complex_transaction_user_date_4,
-                      tc.user_date_5 as complex_transaction_user_date_5,
-                      
-                      -- complex transaction transaction type fields
-                      tt.id as transaction_type_id,
-                      tt.user_code as transaction_type_user_code,
-                      tt.name as transaction_type_name,
-                      tt.short_name as transaction_type_short_name,
-                      -- complex transaction transaction type group fields
-                      --tt2.name as transaction_type_group_name, --?
-                      
-                      cts.name as complex_transaction_status_name
-                    FROM transactions_transaction as t
-                    INNER JOIN transactions_complextransaction tc on t.complex_transaction_id = tc.id
-                    INNER JOIN transactions_transactiontype tt on tc.transaction_type_id = tt.id
-                    --INNER JOIN transactions_transactiontypegroup tt2 on tt.group_id = tt2.id--
-                    INNER JOIN instruments_instrument i on t.instrument_id = i.id
-                    INNER JOIN transactions_complextransactionstatus cts on tc.status_id = cts.id
-                    WHERE {date_filter_sql_string} AND t.master_user_id = {master_user_id} AND NOT t.is_deleted AND NOT t.is_canceled AND tc.status_id IN {statuses} {filter_sql_string}
-                    {user_filters}
+        query = """
+                SELECT
                     
-                """
-
-            # statuses = ['1', '3']
-            statuses = ["1"]  # FN-1327
-
-            _l.debug("complex_transaction_statuses_filter %s", self.instance.complex_transaction_statuses_filter)
-
-            if self.instance.complex_transaction_statuses_filter:
-                pieces = self.instance.complex_transaction_statuses_filter.split(",")
-
-                if len(pieces):
-                    statuses = []
-                    if "booked" in pieces:
-                        statuses.append("1")
-                    if "ignored" in pieces:
-                        statuses.append("3")
-
-            statuses_str = (",").join(statuses)
-            statuses_str = "(" + statuses_str + ")"
-
-            query = query.format(
-                begin_date=self.instance.begin_date,
-                end_date=self.instance.end_date,
-                master_user_id=self.instance.master_user.id,
-                default_instrument_id=self.ecosystem_defaults.instrument_id,
-                statuses=statuses_str,
-                filter_sql_string=filter_sql_string,
-                date_filter_sql_string=date_filter_sql_string,
-                user_filters=user_filters,
+                  
+                
+                  -- transaction fields
+                  t.*,
+                  
+                  case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
+                     then t.notes
+                     else
+                       i.name
+                  end as transaction_item_name,
+                  
+                  case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
+                     then t.notes
+                     else
+                       i.user_code
+                  end as transaction_item_user_code,
+                  
+                  case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
+                     then t.notes
+                     else
+                       i.short_name
+                  end as transaction_item_short_name,
+                  
+                  -- complex transaction fields
+                  tc.id as complex_transaction_id,
+                  tc.status_id as complex_transaction_status,
+                  tc.code as complex_transaction_code,
+                  tc.text as complex_transaction_text,
+                  tc.date as complex_transaction_date,
+                  tc.transaction_unique_code as transaction_unique_code,
+                  tc.is_locked as is_locked,
+                  tc.is_canceled as is_canceled,
+                  -- complex transaction user fields
+                  tc.user_text_1 as complex_transaction_user_text_1,
+                  tc.user_text_2 as complex_transaction_user_text_2,
+                  tc.user_text_3 as complex_transaction_user_text_3,
+                  tc.user_text_4 as complex_transaction_user_text_4,
+                  tc.user_text_5 as complex_transaction_user_text_5,
+                  tc.user_text_6 as complex_transaction_user_text_6,
+                  tc.user_text_7 as complex_transaction_user_text_7,
+                  tc.user_text_8 as complex_transaction_user_text_8,
+                  tc.user_text_9 as complex_transaction_user_text_9,
+                  tc.user_text_10 as complex_transaction_user_text_10,
+                  tc.user_text_11 as complex_transaction_user_text_11,
+                  tc.user_text_12 as complex_transaction_user_text_12,
+                  tc.user_text_13 as complex_transaction_user_text_13,
+                  tc.user_text_14 as complex_transaction_user_text_14,
+                  tc.user_text_15 as complex_transaction_user_text_15,
+                  tc.user_text_16 as complex_transaction_user_text_16,
+                  tc.user_text_17 as complex_transaction_user_text_17,
+                  tc.user_text_18 as complex_transaction_user_text_18,
+                  tc.user_text_19 as complex_transaction_user_text_19,
+                  tc.user_text_20 as complex_transaction_user_text_20,
+                  
+                  tc.user_number_1 as complex_transaction_user_number_1,
+                  tc.user_number_2 as complex_transaction_user_number_2,
+                  tc.user_number_3 as complex_transaction_user_number_3,
+                  tc.user_number_4 as complex_transaction_user_number_4,
+                  tc.user_number_5 as complex_transaction_user_number_5,
+                  tc.user_number_6 as complex_transaction_user_number_6,
+                  tc.user_number_7 as complex_transaction_user_number_7,
+                  tc.user_number_8 as complex_transaction_user_number_8,
+                  tc.user_number_9 as complex_transaction_user_number_9,
+                  tc.user_number_10 as complex_transaction_user_number_10,
+                  tc.user_number_11 as complex_transaction_user_number_11,
+                  tc.user_number_12 as complex_transaction_user_number_12,
+                  tc.user_number_13 as complex_transaction_user_number_13,
+                  tc.user_number_14 as complex_transaction_user_number_14,
+                  tc.user_number_15 as complex_transaction_user_number_15,
+                  tc.user_number_16 as complex_transaction_user_number_16,
+                  tc.user_number_17 as complex_transaction_user_number_17,
+                  tc.user_number_18 as complex_transaction_user_number_18,
+                  tc.user_number_19 as complex_transaction_user_number_19,
+                  tc.user_number_20 as complex_transaction_user_number_20,
+                  
+                  tc.user_date_1 as complex_transaction_user_date_1,
+                  tc.user_date_2 as complex_transaction_user_date_2,
+                  tc.user_date_3 as complex_transaction_user_date_3,
+                  tc.user_date_4 as complex_transaction_user_date_4,
+                  tc.user_date_5 as complex_transaction_user_date_5,
+                  
+                  -- complex transaction transaction type fields
+                  tt.id as transaction_type_id,
+                  tt.user_code as transaction_type_user_code,
+                  tt.name as transaction_type_name,
+                  tt.short_name as transaction_type_short_name,
+                  -- complex transaction transaction type group fields
+                  --tt2.name as transaction_type_group_name, --?
+                  
+                  cts.name as complex_transaction_status_name
+                FROM transactions_transaction as t
+                INNER JOIN transactions_complextransaction tc on t.complex_transaction_id = tc.id
+                INNER JOIN transactions_transactiontype tt on tc.transaction_type_id = tt.id
+                INNER JOIN instruments_instrument i on t.instrument_id = i.id
+                --INNER JOIN transactions_transactiontypegroup tt2 on tt.group_id = tt2.id--
+                INNER JOIN transactions_complextransactionstatus cts on tc.status_id = cts.id
+                WHERE {date_filter_sql_string} AND t.master_user_id = {master_user_id} AND NOT t.is_deleted AND NOT t.is_canceled AND tc.status_id = any({statuses}) {filter_sql_string}
+                {user_filters}
+                
+                
+            """
+
+        # statuses = ['1', '3']
+        statuses = [1]  # FN-1327
+
+        _l.debug("complex_transaction_statuses_filter %s", self.instance.complex_transaction_statuses_filter)
+
+        if self.instance.complex_transaction_statuses_filter:
+            pieces = self.instance.complex_transaction_statuses_filter.split(",")
+
+            if len(pieces):
+                statuses = []
+                if "booked" in pieces:
+                    statuses.append(1)
+                if "ignored" in pieces:
+                    statuses.append(3)
+
+        query = query.format(
+            default_instrument_id=params.integer("default_instrument_id", self.ecosystem_defaults.instrument_id),
+            master_user_id=params.integer("master_user_id", self.instance.master_user.id),
+            statuses=params.ids("statuses", statuses),
+            filter_sql_string=filter_sql_string,
+            date_filter_sql_string=date_filter_sql_string,
+            user_filters=user_filters,
+        )
+
+        return query
+
+    def get_entry_level_items(self, raw_item: dict) -> list[dict]:  # noqa: PLR0912, PLR0915
+        results = []
+
+        result_item = raw_item.copy()
+
+        result_item["entry_account"] = None
+        result_item["entry_strategy"] = None
+        result_item["entry_item_name"] = None  # Should be filled later
+        result_item["entry_item_short_name"] = None  # Should be filled later
+        result_item["entry_item_user_code"] = None  # Should be filled later
+        result_item["entry_item_public_name"] = None  # Should be filled later
+        result_item["entry_currency"] = None
+        result_item["entry_instrument"] = None
+        result_item["entry_amount"] = None
+        result_item["entry_item_type"] = None
+        result_item["entry_item_type_name"] = None
+
+        if (
+            result_item["transaction_class_id"] == TransactionClass.CASH_INFLOW
+            or result_item["transaction_class_id"] == TransactionClass.CASH_OUTFLOW
+            or result_item["transaction_class_id"] == TransactionClass.DISTRIBUTION
+            or result_item["transaction_class_id"] == TransactionClass.INJECTION
+        ):
+            if (
+                self.instance.end_date < result_item["accounting_date"]
+                and self.instance.end_date < result_item["cash_date"]
+            ) or (
+                self.instance.end_date > result_item["accounting_date"]
+                and self.instance.end_date > result_item["cash_date"]
+            ):
+                result_item["entry_account"] = result_item["account_cash_id"]
+                result_item["entry_strategy"] = result_item["strategy1_cash_id"]
+                result_item["entry_currency"] = result_item["settlement_currency_id"]
+                result_item["entry_amount"] = result_item["cash_consideration"]
+                result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
+                result_item["entry_item_type_name"] = "Currency"
+
+                results.append(result_item)
+
+            elif result_item["accounting_date"] < result_item["cash_date"]:
+                result_item["entry_account"] = result_item["account_interim_id"]
+                result_item["entry_strategy"] = result_item["strategy1_cash_id"]
+                result_item["entry_currency"] = result_item["settlement_currency_id"]
+                result_item["entry_amount"] = result_item["cash_consideration"]
+                result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
+                result_item["entry_item_type_name"] = "Currency"
+
+                results.append(result_item)
+
+            else:
+                result_item["entry_account"] = result_item["account_cash_id"]
+                result_item["entry_strategy"] = result_item["strategy1_cash_id"]
+                result_item["entry_currency"] = result_item["settlement_currency_id"]
+                result_item["entry_amount"] = result_item["cash_consideration"]
+                result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
+                result_item["entry_item_type_name"] = "Currency"
+
+                results.append(result_item)
+
+        # szhitenev: PLAT-172 / REQ-283
+        # probably we need cash date instead of accounting_date?
+        elif (
+            result_item["transaction_class_id"] == TransactionClass.INITIAL_POSITION
+            and self.instance.end_date == result_item["accounting_date"]
+        ):
+            entry1 = result_item.copy()
+            entry2 = result_item.copy()
+
+            if result_item["account_position_id"]:
+                entry1["id"] = str(result_item["id"]) + "_1"
+
+                entry1["entry_account"] = result_item["account_position_id"]
+                entry1["entry_strategy"] = result_item["strategy1_position_id"]
+                entry1["entry_instrument"] = result_item["instrument_id"]
+                entry1["entry_amount"] = result_item["position_size_with_sign"]
+                entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                entry1["entry_item_type_name"] = "Instrument"
+
+                results.append(entry1)
+
+            if result_item["account_cash_id"]:
+                entry2["id"] = str(result_item["id"]) + "_2"
+
+                entry2["entry_account"] = result_item["account_cash_id"]
+                entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                entry2["entry_currency"] = result_item["settlement_currency_id"]
+                entry2["entry_amount"] = result_item["cash_consideration"]
+                entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                entry2["entry_item_type_name"] = "Currency"
+
+                results.append(entry2)
+
+        # szhitenev: PLAT-172 / REQ-283
+        # probably we need cash date instead of accounting_date?
+        elif (
+            (
+                result_item["transaction_class_id"] == TransactionClass.INITIAL_CASH
+                and self.instance.end_date == result_item["accounting_date"]
             )
+            or result_item["transaction_class_id"] == TransactionClass.INSTRUMENT_PL
+            or result_item["transaction_class_id"] == TransactionClass.TRANSACTION_PL
+        ):
+            result_item["entry_account"] = result_item["account_cash_id"]
+            result_item["entry_strategy"] = result_item["strategy1_cash_id"]
+            result_item["entry_currency"] = result_item["settlement_currency_id"]
+            result_item["entry_amount"] = result_item["cash_consideration"]
+            result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
+            result_item["entry_item_type_name"] = "Currency"
+
+            results.append(result_item)
+
+        elif (
+            result_item["transaction_class_id"] == TransactionClass.BUY
+            or result_item["transaction_class_id"] == TransactionClass.SELL
+        ):
+            entry1 = result_item.copy()
+            entry2 = result_item.copy()
+
+            if (
+                self.instance.end_date < result_item["accounting_date"]
+                and self.instance.end_date < result_item["cash_date"]
+            ) or (
+                self.instance.end_date > result_item["accounting_date"]
+                and self.instance.end_date > result_item["cash_date"]
+            ):
+                if result_item["account_position_id"]:
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry1["entry_instrument"] = result_item["instrument_id"]
+                    entry1["entry_amount"] = result_item["position_size_with_sign"]
+                    entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry1["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_cash_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+            elif result_item["accounting_date"] < result_item["cash_date"]:
+                if result_item["account_position_id"]:
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry1["entry_instrument"] = result_item["instrument_id"]
+                    entry1["entry_amount"] = result_item["position_size_with_sign"]
+                    entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry1["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_interim_id"]  # IMPORTANT
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+            else:
+                if result_item["account_position_id"]:
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_interim_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry1["entry_instrument"] = result_item["instrument_id"]
+                    entry1["entry_amount"] = result_item["cash_consideration"] * -1  # IMPORTANT
+                    entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry1["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_cash_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+        elif result_item["transaction_class_id"] == TransactionClass.FX_TRADE:
+            entry1 = result_item.copy()
+            entry2 = result_item.copy()
+
+            if (
+                self.instance.end_date < result_item["accounting_date"]
+                and self.instance.end_date < result_item["cash_date"]
+            ) or (
+                self.instance.end_date > result_item["accounting_date"]
+                and self.instance.end_date > result_item["cash_date"]
+            ):
+                if result_item["account_position_id"]:
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry1["entry_currency"] = result_item["transaction_currency_id"]
+                    entry1["entry_amount"] = result_item["position_size_with_sign"]
+                    entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry1["entry_item_type_name"] = "Currency"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_cash_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+            elif result_item["accounting_date"] < result_item["cash_date"]:
+                if result_item["account_position_id"]:
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry1["entry_currency"] = result_item["transaction_currency_id"]
+                    entry1["entry_amount"] = result_item["position_size_with_sign"]
+                    entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry1["entry_item_type_name"] = "Currency"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_interim_id"]  # IMPORTANT
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+            else:
+                if result_item["account_position_id"]:
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_interim_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry1["entry_currency"] = result_item["transaction_currency_id"]
+                    entry1["entry_amount"] = result_item["cash_consideration"] * -1  # IMPORTANT
+                    entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry1["entry_item_type_name"] = "Currency"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_cash_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+        elif result_item["transaction_class_id"] == TransactionClass.FX_TRANSFER:
+            entry1 = result_item.copy()
+            entry2 = result_item.copy()
+
+            if (
+                self.instance.end_date < result_item["accounting_date"]
+                and self.instance.end_date < result_item["cash_date"]
+            ) or (
+                self.instance.end_date > result_item["accounting_date"]
+                and self.instance.end_date > result_item["cash_date"]
+            ):
+                if result_item["account_position_id"]:  # from
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry1["entry_currency"] = result_item["settlement_currency_id"]
+                    entry1["entry_amount"] = result_item["cash_consideration"] * -1  # Important see FN-1077
+                    entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry1["entry_item_type_name"] = "Currency"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:  # to
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_cash_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+            elif result_item["accounting_date"] < result_item["cash_date"]:
+                if result_item["account_position_id"]:  # from
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry1["entry_currency"] = result_item["settlement_currency_id"]
+                    entry1["entry_amount"] = result_item["cash_consideration"] * -1  # Important see FN-1077
+                    entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry1["entry_item_type_name"] = "Currency"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:  # to
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_interim_id"]  # IMPORTANT
+                    entry2["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+            else:
+                if result_item["account_position_id"]:  # from
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_interim_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry1["entry_currency"] = result_item["settlement_currency_id"]
+                    entry1["entry_amount"] = result_item["cash_consideration"] * -1  # Important see FN-1077
+                    entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry1["entry_item_type_name"] = "Currency"
+
+                    results.append(entry1)
+
+                if result_item["account_cash_id"]:  # to
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_cash_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"]
+                    entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
+                    entry2["entry_item_type_name"] = "Currency"
+
+                    results.append(entry2)
+
+        elif result_item["transaction_class_id"] == TransactionClass.TRANSFER:
+            entry1 = result_item.copy()
+            entry2 = result_item.copy()
+
+            if (
+                self.instance.end_date < result_item["accounting_date"]
+                and self.instance.end_date < result_item["cash_date"]
+            ) or (
+                self.instance.end_date > result_item["accounting_date"]
+                and self.instance.end_date > result_item["cash_date"]
+            ):
+                if result_item["account_position_id"]:  # to
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_position_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["position_size_with_sign"]
+                    entry2["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry2["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry2)
+
+                if result_item["account_cash_id"]:  # from
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry1["entry_instrument"] = result_item["instrument_id"]
+                    entry1["entry_amount"] = (
+                        result_item["position_size_with_sign"] * -1
+                    )  # Important see FN-1077
+                    entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry1["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry1)
+
+            elif result_item["accounting_date"] < result_item["cash_date"]:
+                if result_item["account_position_id"]:  # to
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_position_id"]  # Important
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["position_size_with_sign"]
+                    entry2["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry2["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry2)
+
+                if result_item["account_cash_id"]:  # from
+                    entry1["id"] = str(result_item["id"]) + "_2"
+
+                    entry1["entry_account"] = result_item["account_interim_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry1["entry_instrument"] = result_item["instrument_id"]
+                    entry1["entry_amount"] = (
+                        result_item["position_size_with_sign"] * -1
+                    )  # Important see FN-1077
+                    entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry1["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry1)
+
+            else:
+                if result_item["account_position_id"]:  # to
+                    entry2["id"] = str(result_item["id"]) + "_2"
+
+                    entry2["entry_account"] = result_item["account_interim_id"]
+                    entry2["entry_strategy"] = result_item["strategy1_cash_id"]
+                    entry2["entry_currency"] = result_item["settlement_currency_id"]
+                    entry2["entry_amount"] = result_item["cash_consideration"] * -1
+                    entry2["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry2["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry2)
+
+                if result_item["account_cash_id"]:  # from
+                    entry1["id"] = str(result_item["id"]) + "_1"
+
+                    entry1["entry_account"] = result_item["account_position_id"]
+                    entry1["entry_strategy"] = result_item["strategy1_position_id"]
+                    entry1["entry_instrument"] = result_item["instrument_id"]
+                    entry1["entry_amount"] = (
+                        result_item["position_size_with_sign"] * -1
+                    )  # Important see FN-1077
+                    entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
+                    entry1["entry_item_type_name"] = "Instrument"
+
+                    results.append(entry1)
 
-            # cursor.execute(query, [self.instance.begin_date, self.instance.end_date, self.instance.master_user.id, statuses, filter_sql_string]) # noqa: E501
-            cursor.execute(query)
+        else:
+            results.append(result_item)
 
-            result = dictfetchall(cursor)
+        return results
 
-            for result_item in result:
-                result_item["entry_account"] = None
-                result_item["entry_strategy"] = None
-                result_item["entry_item_name"] = None  # Should be filled later
-                result_item["entry_item_short_name"] = None  # Should be filled later
-                result_item["entry_item_user_code"] = None  # Should be filled later
-                result_item["entry_item_public_name"] = None  # Should be filled later
-                result_item["entry_currency"] = None
-                result_item["entry_instrument"] = None
-                result_item["entry_amount"] = None
-                result_item["entry_item_type"] = None
-                result_item["entry_item_type_name"] = None
+    def get_items_query(self, params: QueryParams) -> str | None:
+        if self.instance.depth_level == "complex_transaction":
+            return self.get_complex_transaction_level_query(params)
 
-            self.instance.items = result
+        if self.instance.depth_level == "base_transaction":
+            return self.get_base_transaction_level_query(params)
 
-    def build_entry_level_items(self):  # noqa: PLR0912, PLR0915
-        _l.debug("build_entry_level_items")
+        if self.instance.depth_level == "entry":
+            return self.get_entry_level_query(params)
 
-        with connection.cursor() as cursor:
-            filter_sql_string = get_transaction_report_filter_sql_string(self.instance)
-            date_filter_sql_string = get_transaction_report_date_filter_sql_string(self.instance)
-            user_filters = self.add_user_filters()
-
-            query = """
-                    SELECT
-                        
-                      
-                    
-                      -- transaction fields
-                      t.*,
-                      
-                      case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
-                         then t.notes
-                         else
-                           i.name
-                      end as transaction_item_name,
-                      
-                      case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
-                         then t.notes
-                         else
-                           i.user_code
-                      end as transaction_item_user_code,
-                      
-                      case when (t.instrument_id = null OR t.instrument_id = {default_instrument_id})
-                         then t.notes
-                         else
-                           i.short_name
-                      end as transaction_item_short_name,
-                      
-                      -- complex transaction fields
-                      tc.id as complex_transaction_id,
-                      tc.status_id as complex_transaction_status,
-                      tc.code as complex_transaction_code,
-                      tc.text as complex_transaction_text,
-                      tc.date as complex_transaction_date,
-                      tc.transaction_unique_code as transaction_unique_code,
-                      tc.is_locked as is_locked,
-                      tc.is_canceled as is_canceled,
-                      -- complex transaction user fields
-                      tc.user_text_1 as complex_transaction_user_text_1,
-                      tc.user_text_2 as complex_transaction_user_text_2,
-                      tc.user_text_3 as complex_transaction_user_text_3,
-                      tc.user_text_4 as complex_transaction_user_text_4,
-                      tc.user_text_5 as complex_transaction_user_text_5,
-                      tc.user_text_6 as complex_transaction_user_text_6,
-                      tc.user_text_7 as complex_transaction_user_text_7,
-                      tc.user_text_8 as complex_transaction_user_text_8,
-                      tc.user_text_9 as complex_transaction_user_text_9,
-                      tc.user_text_10 as complex_transaction_user_text_10,
-                      tc.user_text_11 as complex_transaction_user_text_11,
-                      tc.user_text_12 as complex_transaction_user_text_12,
-                      tc.user_text_13 as complex_transaction_user_text_13,
-                      tc.user_text_14 as complex_transaction_user_text_14,
-                      tc.user_text_15 as complex_transaction_user_text_15,
-                      tc.user_text_16 as complex_transaction_user_text_16,
-                      tc.user_text_17 as complex_transaction_user_text_17,
-                      tc.user_text_18 as complex_transaction_user_text_18,
-                      tc.user_text_19 as complex_transaction_user_text_19,
-                      tc.user_text_20 as complex_transaction_user_text_20,
-                      
-                      tc.user_number_1 as complex_transaction_user_number_1,
-                      tc.user_number_2 as complex_transaction_user_number_2,
-                      tc.user_number_3 as complex_transaction_user_number_3,
-                      tc.user_number_4 as complex_transaction_user_number_4,
-                      tc.user_number_5 as complex_transaction_user_number_5,
-                      tc.user_number_6 as complex_transaction_user_number_6,
-                      tc.user_number_7 as complex_transaction_user_number_7,
-                      tc.user_number_8 as complex_transaction_user_number_8,
-                      tc.user_number_9 as complex_transaction_user_number_9,
-                      tc.user_number_10 as complex_transaction_user_number_10,
-                      tc.user_number_11 as complex_transaction_user_number_11,
-                      tc.user_number_12 as complex_transaction_user_number_12,
-                      tc.user_number_13 as complex_transaction_user_number_13,
-                      tc.user_number_14 as complex_transaction_user_number_14,
-                      tc.user_number_15 as complex_transaction_user_number_15,
-                      tc.user_number_16 as complex_transaction_user_number_16,
-                      tc.user_number_17 as complex_transaction_user_number_17,
-                      tc.user_number_18 as complex_transaction_user_number_18,
-                      tc.user_number_19 as complex_transaction_user_number_19,
-                      tc.user_number_20 as complex_transaction_user_number_20,
-                      
-                      tc.user_date_1 as complex_transaction_user_date_1,
-                      tc.user_date_2 as complex_transaction_user_date_2,
-                      tc.user_date_3 as complex_transaction_user_date_3,
-                      tc.user_date_4 as complex_transaction_user_date_4,
-                      tc.user_date_5 as complex_transaction_user_date_5,
-                      
-                      -- complex transaction transaction type fields
-                      tt.id as transaction_type_id,
-                      tt.user_code as transaction_type_user_code,
-                      tt.name as transaction_type_name,
-                      tt.short_name as transaction_type_short_name,
-                      -- complex transaction transaction type group fields
-                      --tt2.name as transaction_type_group_name, --?
-                      
-                      cts.name as complex_transaction_status_name
-                    FROM transactions_transaction as t
-                    INNER JOIN transactions_complextransaction tc on t.complex_transaction_id = tc.id
-                    INNER JOIN transactions_transactiontype tt on tc.transaction_type_id = tt.id
-                    INNER JOIN instruments_instrument i on t.instrument_id = i.id
-                    --INNER JOIN transactions_transactiontypegroup tt2 on tt.group_id = tt2.id--
-                    INNER JOIN transactions_complextransactionstatus cts on tc.status_id = cts.id
-                    WHERE {date_filter_sql_string} AND t.master_user_id = {master_user_id} AND NOT t.is_deleted AND NOT t.is_canceled AND tc.status_id IN {statuses} {filter_sql_string}
-                    {user_filters}
-                    
-                    
-                """
-
-            # statuses = ['1', '3']
-            statuses = ["1"]  # FN-1327
-
-            _l.debug("complex_transaction_statuses_filter %s", self.instance.complex_transaction_statuses_filter)
-
-            if self.instance.complex_transaction_statuses_filter:
-                pieces = self.instance.complex_transaction_statuses_filter.split(",")
-
-                if len(pieces):
-                    statuses = []
-                    if "booked" in pieces:
-                        statuses.append("1")
-                    if "ignored" in pieces:
-                        statuses.append("3")
-
-            statuses_str = (",").join(statuses)
-            statuses_str = "(" + statuses_str + ")"
-
-            query = query.format(
-                begin_date=self.instance.begin_date,
-                end_date=self.instance.end_date,
-                default_instrument_id=self.ecosystem_defaults.instrument_id,
-                master_user_id=self.instance.master_user.id,
-                statuses=statuses_str,
-                filter_sql_string=filter_sql_string,
-                date_filter_sql_string=date_filter_sql_string,
-                user_filters=user_filters,
-            )
+        return None
 
-            # cursor.execute(query, [self.instance.begin_date, self.instance.end_date, self.instance.master_user.id, statuses, filter_sql_string]) # noqa: E501
-            cursor.execute(query)
-
-            raw_results = dictfetchall(cursor)
-            results = []
-
-            ITEM_TYPE_INSTRUMENT = 1
-            ITEM_TYPE_CURRENCY = 2
-            ITEM_TYPE_FX_VARIATIONS = 3
-            ITEM_TYPE_FX_TRADES = 4
-            ITEM_TYPE_TRANSACTION_PL = 5
-            ITEM_TYPE_MISMATCH = 6
-            ITEM_TYPE_EXPOSURE_COPY = 7
-
-            _l.debug("transaction_report.raw_results.count %s", len(raw_results))
-
-            for raw_item in raw_results:
-                result_item = raw_item.copy()
-
-                result_item["entry_account"] = None
-                result_item["entry_strategy"] = None
-                result_item["entry_item_name"] = None  # Should be filled later
-                result_item["entry_item_short_name"] = None  # Should be filled later
-                result_item["entry_item_user_code"] = None  # Should be filled later
-                result_item["entry_item_public_name"] = None  # Should be filled later
-                result_item["entry_currency"] = None
-                result_item["entry_instrument"] = None
-                result_item["entry_amount"] = None
-                result_item["entry_item_type"] = None
-                result_item["entry_item_type_name"] = None
-
-                if (
-                    result_item["transaction_class_id"] == TransactionClass.CASH_INFLOW
-                    or result_item["transaction_class_id"] == TransactionClass.CASH_OUTFLOW
-                    or result_item["transaction_class_id"] == TransactionClass.DISTRIBUTION
-                    or result_item["transaction_class_id"] == TransactionClass.INJECTION
-                ):
-                    if (
-                        self.instance.end_date < result_item["accounting_date"]
-                        and self.instance.end_date < result_item["cash_date"]
-                    ) or (
-                        self.instance.end_date > result_item["accounting_date"]
-                        and self.instance.end_date > result_item["cash_date"]
-                    ):
-                        result_item["entry_account"] = result_item["account_cash_id"]
-                        result_item["entry_strategy"] = result_item["strategy1_cash_id"]
-                        result_item["entry_currency"] = result_item["settlement_currency_id"]
-                        result_item["entry_amount"] = result_item["cash_consideration"]
-                        result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
-                        result_item["entry_item_type_name"] = "Currency"
-
-                        results.append(result_item)
-
-                    elif result_item["accounting_date"] < result_item["cash_date"]:
-                        result_item["entry_account"] = result_item["account_interim_id"]
-                        result_item["entry_strategy"] = result_item["strategy1_cash_id"]
-                        result_item["entry_currency"] = result_item["settlement_currency_id"]
-                        result_item["entry_amount"] = result_item["cash_consideration"]
-                        result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
-                        result_item["entry_item_type_name"] = "Currency"
-
-                        results.append(result_item)
-
-                    else:
-                        result_item["entry_account"] = result_item["account_cash_id"]
-                        result_item["entry_strategy"] = result_item["strategy1_cash_id"]
-                        result_item["entry_currency"] = result_item["settlement_currency_id"]
-                        result_item["entry_amount"] = result_item["cash_consideration"]
-                        result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
-                        result_item["entry_item_type_name"] = "Currency"
-
-                        results.append(result_item)
-
-                # szhitenev: PLAT-172 / REQ-283
-                # probably we need cash date instead of accounting_date?
-                elif (
-                    result_item["transaction_class_id"] == TransactionClass.INITIAL_POSITION
-                    and self.instance.end_date == result_item["accounting_date"]
-                ):
-                    if result_item["account_position_id"]:
-                        entry1["id"] = str(result_item["id"]) + "_1"
-
-                        entry1["entry_account"] = result_item["account_position_id"]
-                        entry1["entry_strategy"] = result_item["strategy1_position_id"]
-                        entry1["entry_instrument"] = result_item["instrument_id"]
-                        entry1["entry_amount"] = result_item["position_size_with_sign"]
-                        entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                        entry1["entry_item_type_name"] = "Instrument"
-
-                        results.append(entry1)
-
-                    if result_item["account_cash_id"]:
-                        entry2["id"] = str(result_item["id"]) + "_2"
-
-                        entry2["entry_account"] = result_item["account_cash_id"]
-                        entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                        entry2["entry_currency"] = result_item["settlement_currency_id"]
-                        entry2["entry_amount"] = result_item["cash_consideration"]
-                        entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                        entry2["entry_item_type_name"] = "Currency"
-
-                        results.append(entry2)
-
-                # szhitenev: PLAT-172 / REQ-283
-                # probably we need cash date instead of accounting_date?
-                elif (
-                    (
-                        result_item["transaction_class_id"] == TransactionClass.INITIAL_CASH
-                        and self.instance.end_date == result_item["accounting_date"]
-                    )
-                    or result_item["transaction_class_id"] == TransactionClass.INSTRUMENT_PL
-                    or result_item["transaction_class_id"] == TransactionClass.TRANSACTION_PL
-                ):
-                    result_item["entry_account"] = result_item["account_cash_id"]
-                    result_item["entry_strategy"] = result_item["strategy1_cash_id"]
-                    result_item["entry_currency"] = result_item["settlement_currency_id"]
-                    result_item["entry_amount"] = result_item["cash_consideration"]
-                    result_item["entry_item_type"] = ITEM_TYPE_CURRENCY
-                    result_item["entry_item_type_name"] = "Currency"
-
-                    results.append(result_item)
-
-                elif (
-                    result_item["transaction_class_id"] == TransactionClass.BUY
-                    or result_item["transaction_class_id"] == TransactionClass.SELL
-                ):
-                    entry1 = result_item.copy()
-                    entry2 = result_item.copy()
-
-                    if (
-                        self.instance.end_date < result_item["accounting_date"]
-                        and self.instance.end_date < result_item["cash_date"]
-                    ) or (
-                        self.instance.end_date > result_item["accounting_date"]
-                        and self.instance.end_date > result_item["cash_date"]
-                    ):
-                        if result_item["account_position_id"]:
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry1["entry_instrument"] = result_item["instrument_id"]
-                            entry1["entry_amount"] = result_item["position_size_with_sign"]
-                            entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry1["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_cash_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                    elif result_item["accounting_date"] < result_item["cash_date"]:
-                        if result_item["account_position_id"]:
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry1["entry_instrument"] = result_item["instrument_id"]
-                            entry1["entry_amount"] = result_item["position_size_with_sign"]
-                            entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry1["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_interim_id"]  # IMPORTANT
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                    else:
-                        if result_item["account_position_id"]:
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_interim_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry1["entry_instrument"] = result_item["instrument_id"]
-                            entry1["entry_amount"] = result_item["cash_consideration"] * -1  # IMPORTANT
-                            entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry1["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_cash_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                elif result_item["transaction_class_id"] == TransactionClass.FX_TRADE:
-                    entry1 = result_item.copy()
-                    entry2 = result_item.copy()
-
-                    if (
-                        self.instance.end_date < result_item["accounting_date"]
-                        and self.instance.end_date < result_item["cash_date"]
-                    ) or (
-                        self.instance.end_date > result_item["accounting_date"]
-                        and self.instance.end_date > result_item["cash_date"]
-                    ):
-                        if result_item["account_position_id"]:
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry1["entry_currency"] = result_item["transaction_currency_id"]
-                            entry1["entry_amount"] = result_item["position_size_with_sign"]
-                            entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry1["entry_item_type_name"] = "Currency"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_cash_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                    elif result_item["accounting_date"] < result_item["cash_date"]:
-                        if result_item["account_position_id"]:
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry1["entry_currency"] = result_item["transaction_currency_id"]
-                            entry1["entry_amount"] = result_item["position_size_with_sign"]
-                            entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry1["entry_item_type_name"] = "Currency"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_interim_id"]  # IMPORTANT
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                    else:
-                        if result_item["account_position_id"]:
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_interim_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry1["entry_currency"] = result_item["transaction_currency_id"]
-                            entry1["entry_amount"] = result_item["cash_consideration"] * -1  # IMPORTANT
-                            entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry1["entry_item_type_name"] = "Currency"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_cash_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                elif result_item["transaction_class_id"] == TransactionClass.FX_TRANSFER:
-                    entry1 = result_item.copy()
-                    entry2 = result_item.copy()
-
-                    if (
-                        self.instance.end_date < result_item["accounting_date"]
-                        and self.instance.end_date < result_item["cash_date"]
-                    ) or (
-                        self.instance.end_date > result_item["accounting_date"]
-                        and self.instance.end_date > result_item["cash_date"]
-                    ):
-                        if result_item["account_position_id"]:  # from
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry1["entry_currency"] = result_item["settlement_currency_id"]
-                            entry1["entry_amount"] = result_item["cash_consideration"] * -1  # Important see FN-1077
-                            entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry1["entry_item_type_name"] = "Currency"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:  # to
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_cash_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                    elif result_item["accounting_date"] < result_item["cash_date"]:
-                        if result_item["account_position_id"]:  # from
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry1["entry_currency"] = result_item["settlement_currency_id"]
-                            entry1["entry_amount"] = result_item["cash_consideration"] * -1  # Important see FN-1077
-                            entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry1["entry_item_type_name"] = "Currency"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:  # to
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_interim_id"]  # IMPORTANT
-                            entry2["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                    else:
-                        if result_item["account_position_id"]:  # from
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_interim_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry1["entry_currency"] = result_item["settlement_currency_id"]
-                            entry1["entry_amount"] = result_item["cash_consideration"] * -1  # Important see FN-1077
-                            entry1["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry1["entry_item_type_name"] = "Currency"
-
-                            results.append(entry1)
-
-                        if result_item["account_cash_id"]:  # to
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_cash_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"]
-                            entry2["entry_item_type"] = ITEM_TYPE_CURRENCY
-                            entry2["entry_item_type_name"] = "Currency"
-
-                            results.append(entry2)
-
-                elif result_item["transaction_class_id"] == TransactionClass.TRANSFER:
-                    entry1 = result_item.copy()
-                    entry2 = result_item.copy()
-
-                    if (
-                        self.instance.end_date < result_item["accounting_date"]
-                        and self.instance.end_date < result_item["cash_date"]
-                    ) or (
-                        self.instance.end_date > result_item["accounting_date"]
-                        and self.instance.end_date > result_item["cash_date"]
-                    ):
-                        if result_item["account_position_id"]:  # to
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_position_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["position_size_with_sign"]
-                            entry2["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry2["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry2)
-
-                        if result_item["account_cash_id"]:  # from
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry1["entry_instrument"] = result_item["instrument_id"]
-                            entry1["entry_amount"] = (
-                                result_item["position_size_with_sign"] * -1
-                            )  # Important see FN-1077
-                            entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry1["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry1)
-
-                    elif result_item["accounting_date"] < result_item["cash_date"]:
-                        if result_item["account_position_id"]:  # to
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_position_id"]  # Important
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["position_size_with_sign"]
-                            entry2["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry2["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry2)
-
-                        if result_item["account_cash_id"]:  # from
-                            entry1["id"] = str(result_item["id"]) + "_2"
-
-                            entry1["entry_account"] = result_item["account_interim_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry1["entry_instrument"] = result_item["instrument_id"]
-                            entry1["entry_amount"] = (
-                                result_item["position_size_with_sign"] * -1
-                            )  # Important see FN-1077
-                            entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry1["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry1)
-
-                    else:
-                        if result_item["account_position_id"]:  # to
-                            entry2["id"] = str(result_item["id"]) + "_2"
-
-                            entry2["entry_account"] = result_item["account_interim_id"]
-                            entry2["entry_strategy"] = result_item["strategy1_cash_id"]
-                            entry2["entry_currency"] = result_item["settlement_currency_id"]
-                            entry2["entry_amount"] = result_item["cash_consideration"] * -1
-                            entry2["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry2["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry2)
-
-                        if result_item["account_cash_id"]:  # from
-                            entry1["id"] = str(result_item["id"]) + "_1"
-
-                            entry1["entry_account"] = result_item["account_position_id"]
-                            entry1["entry_strategy"] = result_item["strategy1_position_id"]
-                            entry1["entry_instrument"] = result_item["instrument_id"]
-                            entry1["entry_amount"] = (
-                                result_item["position_size_with_sign"] * -1
-                            )  # Important see FN-1077
-                            entry1["entry_item_type"] = ITEM_TYPE_INSTRUMENT
-                            entry1["entry_item_type_name"] = "Instrument"
-
-                            results.append(entry1)
-
-                else:
-                    results.append(result_item)
-
-            # test_results = []
-            #
-            # for i in range(1, 100):
-            #
-            #     test_results = test_results + results
-
-            # self.instance.items = test_results # only test purpose
-            self.instance.items = results
+    def get_row_items(self, row: dict) -> list[dict]:
+        if self.instance.depth_level == "complex_transaction":
+            return self.get_complex_transaction_level_items(row)
+
+        if self.instance.depth_level == "base_transaction":
+            return self.get_base_transaction_level_items(row)
+
+        return self.get_entry_level_items(row)
 
     def build_items(self):
         _l.debug("TransactionReportBuilderSql.build_items: depth_level %s", self.instance.depth_level)
 
-        if self.instance.depth_level == "complex_transaction":
-            self.build_complex_transaction_level_items()
+        params = QueryParams()
+        query = self.get_items_query(params)
+        if query is None:
+            return
 
-        if self.instance.depth_level == "base_transaction":
-            self.build_base_transaction_level_items()
+        with connection.cursor() as cursor:
+            execute(cursor, query, params)
 
-        if self.instance.depth_level == "entry":
-            self.build_entry_level_items()
+            rows = dictfetchall(cursor)
+
+        _l.debug("transaction_report.raw_results.count %s", len(rows))
+
+        self.instance.items = [item for row in rows for item in self.get_row_items(row)]
+
+    def iter_item_chunks(self, chunk_size: int | None = None) -> Iterator[list[dict]]:
+        """
+        Streaming mode of build_transaction, items are yielded by chunks of at most chunk_size rows.
+
+        Rows are read through a named server-side cursor outside of a transaction, only one chunk is held in memory.
+        Items of a chunk are the same as in the buffered mode, item_* relations of the instance
+        are loaded for the current chunk before it is yielded.
+        """
+        chunk_size = chunk_size or settings.REPORT_STREAM_CHUNK_SIZE
+
+        params = QueryParams()
+        query = self.get_items_query(params)
+        if query is None:
+            return
+
+        # server-side cursors can not DECLARE an EXECUTE of a prepared statement, values are bound by the client.
+        # In autocommit the cursor is declared WITH HOLD: its result is kept by the server when the DECLARE
+        # commits, so no transaction or snapshot stays open while a slow client reads the stream
+        with connection.chunked_cursor() as cursor:
+            cursor.cursor.itersize = chunk_size
+            cursor.execute(query, params.values)
+
+            columns = None
+            while rows := cursor.fetchmany(chunk_size):
+                if columns is None:
+                    columns = [col[0] for col in cursor.description]
+
+                self.instance.items = [
+                    item for row in rows for item in self.get_row_items(dict(zip(columns, row, strict=False)))
+                ]
+                self.add_chunk_data_items()
+
+                yield self.instance.items
+
+    def add_chunk_data_items(self):
+        """
+        item_* relations of the current items
+        """
+        if self.instance.depth_level != "complex_transaction":
+            self.add_data_items()
+        else:
+            # TODO Figure Out
+            self.instance.item_instrument_types = []
+            self.instance.item_account_types = []
 
     def add_data_items_instruments(self, ids):
         self.instance.item_instruments = (
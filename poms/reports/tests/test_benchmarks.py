@@ -0,0 +1,64 @@
+from django.test import SimpleTestCase
+
+from poms.reports.benchmarks.runner import compare_with_baseline
+from poms.reports.benchmarks.synthetic import END_DATE, Scale, SyntheticData
+from poms.transactions.models import TransactionClass
+
+SCALE = Scale("test", portfolios=3, instruments=10, currencies=2, transactions=200, days=30, import_rows=25)
+
+
+class SyntheticDataTest(SimpleTestCase):
+    def test__same_seed_gives_same_data(self):
+        data = SyntheticData(SCALE, seed=1)
+        same = SyntheticData(SCALE, seed=1)
+        other = SyntheticData(SCALE, seed=2)
+
+        self.assertEqual(data.prices, same.prices)
+        self.assertEqual(list(data.iter_transactions()), list(same.iter_transactions()))
+        # rows do not depend on what was generated before
+        self.assertEqual(list(data.iter_transactions()), list(same.iter_transactions()))
+        self.assertNotEqual(list(data.iter_transactions()), list(other.iter_transactions()))
+
+    def test__transactions(self):
+        data = SyntheticData(SCALE)
+        transactions = list(data.iter_transactions())
+
+        self.assertEqual(len(transactions), SCALE.transactions)
+        self.assertEqual(data.dates[-1], END_DATE)
+        self.assertEqual(len(data.dates), SCALE.days)
+        # every portfolio starts with a deposit
+        self.assertEqual(
+            [row[:4] for row in transactions[: SCALE.portfolios]],
+            [(index, None, TransactionClass.CASH_INFLOW, 0) for index in range(SCALE.portfolios)],
+        )
+
+        for _, instrument, transaction_class_id, day, size, cash in transactions[SCALE.portfolios :]:
+            if instrument is None:
+                self.assertIn(transaction_class_id, (TransactionClass.CASH_INFLOW, TransactionClass.CASH_OUTFLOW))
+                continue
+
+            self.assertEqual(transaction_class_id, TransactionClass.BUY if size > 0 else TransactionClass.SELL)
+            self.assertAlmostEqual(cash, -size * data.prices[instrument][day], places=1)
+
+    def test__import_rows_follow_the_data(self):
+        rows = list(SyntheticData(SCALE).iter_import_rows([f"i{index}" for index in range(SCALE.instruments)]))
+
+        self.assertGreaterEqual(len(rows), SCALE.import_rows)
+        self.assertTrue(all(row["Date"] > str(END_DATE) for row in rows))
+
+
+class CompareWithBaselineTest(SimpleTestCase):
+    def test__regressions_over_tolerance(self):
+        baseline = {
+            "small:balance": {"wall_time": 1.0, "query_count": 10, "peak_memory": 1000},
+        }
+        results = {
+            "small:balance": {"wall_time": 1.1, "query_count": 15, "peak_memory": 1000},
+            "small:pl": {"wall_time": 100.0, "query_count": 100, "peak_memory": 100},
+        }
+
+        regressions = compare_with_baseline(results, baseline, tolerance=0.2)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual(regressions[0]["metric"], "query_count")
+        self.assertEqual(regressions[0]["change"], 0.5)
@@ -0,0 +1,187 @@
+import csv
+import io
+from unittest import mock
+
+import pyarrow.parquet
+from django.test import SimpleTestCase, override_settings
+from openpyxl import load_workbook
+
+from poms.common.exceptions import FinmarsBaseException
+from poms.reports.backend_reports_utils import BackendReportHelperService
+from poms.reports.exports import ChunkedReportExport, ReportExport, ReportExportWriter, iter_column_batches
+from poms.reports.serializers import BalanceReportSerializer
+
+RELATIONS = {
+    "item_currencies": [{"id": 1, "user_code": "USD", "name": "Dollar"}],
+    "item_portfolios": [{"id": 10, "user_code": "main", "name": "Main portfolio"}],
+    "item_instruments": [{"id": 100, "user_code": "AAPL", "name": "Apple"}],
+    "item_instrument_types": [],
+    "item_accounts": [],
+    "item_account_types": [],
+    "item_strategies1": [],
+    "item_strategies2": [],
+    "item_strategies3": [],
+}
+
+OPTIONS = {
+    "columns": [
+        {"key": "instrument.user_code", "layout_name": "Instrument"},
+        {"key": "portfolio.name", "name": "Portfolio"},
+        {"key": "position_size"},
+    ],
+}
+
+
+def get_items(count):
+    for index in range(count):
+        yield {
+            "id": index,
+            "item_type": 1,
+            "instrument": 100,
+            "portfolio": 10,
+            "currency": 1,
+            "position_size": float(index),
+            "market_value": 10.0 * index,
+        }
+
+
+@override_settings(REPORT_EXPORT_BATCH_SIZE=4)
+class ReportExportTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(BackendReportHelperService, "get_instrument_attribute_types", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_export(self, export_format, count=10, options=OPTIONS):
+        return ReportExport(RELATIONS, get_items(count), options, export_format)
+
+    def test__batches_are_projected_to_columns(self):
+        consumed = []
+
+        def items():
+            for item in get_items(10):
+                consumed.append(item["id"])
+                yield item
+
+        batches = iter_column_batches(RELATIONS, items(), ["instrument.user_code", "position_size"])
+        first = next(batches)
+
+        self.assertEqual(first, {"instrument.user_code": ["AAPL"] * 4, "position_size": [0.0, 1.0, 2.0, 3.0]})
+        # items are consumed by batches, not at once
+        self.assertEqual(consumed, [0, 1, 2, 3])
+        self.assertEqual([len(batch["position_size"]) for batch in batches], [4, 2])
+
+    def test__csv(self):
+        output = io.BytesIO()
+        self.assertEqual(self.get_export("csv").write(output), 10)
+
+        rows = list(csv.reader(io.StringIO(output.getvalue().decode())))
+        self.assertEqual(rows[0], ["Instrument", "Portfolio", "position_size"])
+        self.assertEqual(rows[1], ["AAPL", "Main portfolio", "0.0"])
+        self.assertEqual(len(rows), 11)
+
+    def test__chunked_export_is_the_same_as_buffered(self):
+        items = list(get_items(10))
+        chunks = [(RELATIONS, items[:3]), (RELATIONS, items[3:7]), (RELATIONS, items[7:])]
+        buffered, chunked = io.BytesIO(), io.BytesIO()
+
+        self.get_export("csv").write(buffered)
+        ChunkedReportExport(None, iter(chunks), OPTIONS, "csv").write(chunked)
+
+        self.assertEqual(chunked.getvalue(), buffered.getvalue())
+
+    def test__csv_response_is_streamed(self):
+        response = self.get_export("csv").get_response("balance_report")
+
+        chunks = list(response.streaming_content)
+
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(chunks[0].startswith(b"Instrument,Portfolio,position_size\r\n"))
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="balance_report.csv"')
+
+    def test__filters_of_the_layout(self):
+        options = {
+            **OPTIONS,
+            "filter_settings": [
+                {
+                    "key": "position_size",
+                    "value_type": 20,
+                    "filter_type": "greater",
+                    "value": [6],
+                }
+            ],
+        }
+        output = io.BytesIO()
+
+        self.assertEqual(self.get_export("csv", options=options).write(output), 3)
+
+    def test__xlsx(self):
+        output = io.BytesIO()
+        self.get_export("xlsx").write(output)
+
+        sheet = load_workbook(output, read_only=True).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ("Instrument", "Portfolio", "position_size"))
+        self.assertEqual(rows[10], ("AAPL", "Main portfolio", 9))
+        self.assertEqual(len(rows), 11)
+
+    def test__parquet_row_groups(self):
+        output = io.BytesIO()
+        self.get_export("parquet").write(output)
+
+        output.seek(0)
+        parquet_file = pyarrow.parquet.ParquetFile(output)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().column("position_size").to_pylist(), [float(i) for i in range(10)])
+
+    def test__custom_fields_are_calculated_by_batches(self):
+        relations = {
+            **RELATIONS,
+            "custom_fields_object": [
+                {"name": "Double", "user_code": "double", "expr": "position_size * 2", "value_type": 20},
+            ],
+            "custom_fields_to_calculate": "Double",
+            "expression_iterations_count": 1,
+            "report_currency": 1,
+            "report_date": "2024-01-31",
+            "pl_first_date": None,
+            "cost_method": 1,
+            "pricing_policy": 1,
+            "portfolio_mode": 1,
+            "account_mode": 1,
+        }
+        options = {
+            "columns": [{"key": "position_size"}, {"key": "custom_fields.double"}],
+            "filter_settings": [
+                {"key": "custom_fields.double", "value_type": 20, "filter_type": "greater", "value": [14]},
+            ],
+        }
+        serializer = BalanceReportSerializer(context={})
+        items = list(get_items(10))
+        buffered, chunked = io.BytesIO(), io.BytesIO()
+
+        with mock.patch.object(
+            serializer, "calculate_custom_fields", wraps=serializer.calculate_custom_fields
+        ) as calc:
+            ReportExport(relations, iter(items), options, "csv", serializer.calculate_custom_fields).write(buffered)
+        chunks = [(relations, items[:5]), (relations, items[5:])]
+        ChunkedReportExport(None, iter(chunks), options, "csv", serializer.calculate_custom_fields).write(chunked)
+
+        self.assertEqual(calc.call_count, 3)
+        rows = list(csv.reader(io.StringIO(buffered.getvalue().decode())))
+        self.assertEqual(rows[1:], [["8.0", "16.0"], ["9.0", "18.0"]])
+        self.assertEqual(chunked.getvalue(), buffered.getvalue())
+
+    def test__writer_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ReportExportWriter(io.BytesIO(), [])
+
+    def test__invalid_format(self):
+        with self.assertRaises(FinmarsBaseException) as context:
+            self.get_export("pdf")
+
+        self.assertEqual(context.exception.error_key, "invalid_export_format")
+
+    def test__columns_are_required(self):
+        with self.assertRaises(FinmarsBaseException):
+            self.get_export("csv", options={})
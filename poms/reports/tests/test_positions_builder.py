@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from django.conf import settings
+
+from poms.common.common_base_test import BIG, BUY_SELL, SMALL, BaseTestCase
+from poms.reports.common import ReportItem
+from poms.reports.sql_builders.positions import PositionsBuilderSql
+from poms.transactions.models import ComplexTransaction, Transaction, TransactionClass
+
+
+class PositionsBuilderSqlTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.other_portfolio = self.db_data.portfolios[SMALL]
+        self.instrument = self.db_data.instruments["Apple"]
+        self.day = self.yesterday()
+
+    def create_trade(self, portfolio, position_size, day, transaction_class_id=TransactionClass.BUY):
+        complex_transaction = ComplexTransaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            date=day,
+            transaction_type=self.db_data.transaction_types[BUY_SELL],
+        )
+        account = portfolio.accounts.first()
+        return Transaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            complex_transaction=complex_transaction,
+            transaction_class=self.db_data.transaction_classes[transaction_class_id],
+            portfolio=portfolio,
+            instrument=self.instrument,
+            account_position=account,
+            account_cash=account,
+            account_interim=account,
+            transaction_date=day,
+            accounting_date=day,
+            cash_date=day,
+            position_size_with_sign=position_size,
+            cash_consideration=-position_size,
+            settlement_currency=self.usd,
+            transaction_currency=self.usd,
+            strategy1_position=self.db_data.strategies[1],
+            strategy1_cash=self.db_data.strategies[1],
+            strategy2_position=self.db_data.strategies[2],
+            strategy2_cash=self.db_data.strategies[2],
+            strategy3_position=self.db_data.strategies[3],
+            strategy3_cash=self.db_data.strategies[3],
+        )
+
+    def test__build_single_date(self):
+        self.create_trade(self.portfolio, 100, self.day)
+        self.create_trade(self.portfolio, -30, self.day)
+        self.create_trade(self.other_portfolio, 50, self.day)
+
+        builder = PositionsBuilderSql(master_user=self.master_user, portfolios=[self.portfolio])
+        items = builder.build(self.day)
+
+        self.assertEqual(len(items), 1)
+        item = items[0]
+        self.assertEqual(item["portfolio_id"], self.portfolio.id)
+        self.assertEqual(item["instrument_id"], self.instrument.id)
+        self.assertEqual(item["user_code"], self.instrument.user_code)
+        self.assertEqual(item["position_size"], 70)
+
+    def test__build_for_dates(self):
+        first_day = self.day - timedelta(days=2)
+        self.create_trade(self.portfolio, 100, first_day)
+        self.create_trade(self.portfolio, -100, self.day)
+
+        builder = PositionsBuilderSql(master_user=self.master_user, portfolios=[self.portfolio])
+        before = first_day - timedelta(days=1)
+        between = first_day + timedelta(days=1)
+        positions = builder.build_for_dates([before, first_day, between, self.day])
+
+        self.assertEqual(positions[before], [])
+        self.assertEqual(positions[first_day][0]["position_size"], 100)
+        self.assertEqual(positions[between][0]["position_size"], 100)
+        self.assertEqual(positions[self.day], [])  # closed position is not returned
+
+    def test__build_with_cash(self):
+        self.create_trade(self.portfolio, 100, self.day)
+        self.create_trade(self.portfolio, -30, self.day)
+
+        builder = PositionsBuilderSql(master_user=self.master_user, portfolios=[self.portfolio], include_cash=True)
+        items = builder.build(self.day)
+
+        self.assertEqual(
+            PositionsBuilderSql.group_by_portfolio(items),
+            {self.portfolio.id: {self.instrument.user_code: 70, self.usd.user_code: -70}},
+        )
+        cash = next(item for item in items if item["item_type"] == ReportItem.TYPE_CURRENCY)
+        self.assertEqual(cash["currency_id"], self.usd.id)
+
+        builder = PositionsBuilderSql(master_user=self.master_user, portfolios=[self.portfolio])
+        self.assertEqual(len(builder.build(self.day)), 1)
+
+    def test__group_by_portfolio(self):
+        items = [
+            {"portfolio_id": 1, "user_code": "a", "position_size": 1},
+            {"portfolio_id": 1, "user_code": "a", "position_size": 2},
+            {"portfolio_id": 2, "user_code": "a", "position_size": 5},
+        ]
+
+        self.assertEqual(
+            PositionsBuilderSql.group_by_portfolio(items),
+            {1: {"a": 3}, 2: {"a": 5}},
+        )
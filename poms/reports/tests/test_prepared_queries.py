@@ -0,0 +1,347 @@
+import contextlib
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+
+from poms.common.common_base_test import BIG, BUY_SELL, BaseTestCase
+from poms.instruments.models import PriceHistory
+from poms.reports.common import Report, TransactionReport
+from poms.reports.sql_builders import balance, pl, pure_balance, transaction
+from poms.reports.sql_builders.balance import BalanceReportBuilderSql
+from poms.reports.sql_builders.helpers import (
+    get_transaction_filter_sql_string,
+    get_transaction_report_date_filter_sql_string,
+)
+from poms.reports.sql_builders.pl import PLReportBuilderSql
+from poms.reports.sql_builders.prepared import (
+    STATEMENT_PREFIX,
+    PreparedStatements,
+    QueryParams,
+    execute,
+    execute_literal,
+)
+from poms.reports.sql_builders.pure_balance import PureBalanceReportBuilderSql
+from poms.reports.sql_builders.transaction import TransactionReportBuilderSql
+from poms.transactions.models import ComplexTransaction, Transaction, TransactionClass
+
+QUERY = "select * from t where date <= %(report_date)s and id = any(%(ids)s) and date > %(report_date)s - 1"
+
+
+def get_instance(**kwargs):
+    options = {
+        "portfolios": [],
+        "accounts": [],
+        "strategies1": [],
+        "strategies2": [],
+        "strategies3": [],
+    }
+    options.update(kwargs)
+    return SimpleNamespace(**options)
+
+
+class QueryParamsTest(SimpleTestCase):
+    def setUp(self):
+        self.params = QueryParams()
+        self.params.date("report_date", "2024-01-31")
+        self.params.ids("ids", [SimpleNamespace(id=3), 5])
+
+    def test__values_and_types(self):
+        self.assertEqual(self.params.values, {"report_date": date(2024, 1, 31), "ids": [3, 5]})
+        self.assertEqual(self.params.types, {"report_date": "date", "ids": "integer[]"})
+        self.assertEqual(self.params.date("report_date", datetime(2024, 1, 31, 10)), "%(report_date)s")
+
+    def test__rebind_to_another_value_raises(self):
+        with self.assertRaises(ValueError):
+            self.params.date("report_date", date(2024, 2, 1))
+
+    def test__to_positional(self):
+        sql, names = self.params.to_positional(QUERY)
+
+        self.assertEqual(sql, "select * from t where date <= $1 and id = any($2) and date > $1 - 1")
+        self.assertEqual(names, ["report_date", "ids"])
+
+    def test__render_literal(self):
+        self.assertEqual(
+            self.params.render_literal(QUERY),
+            "select * from t where date <= '2024-01-31'::date and id = any(ARRAY[3, 5]::integer[]) "
+            "and date > '2024-01-31'::date - 1",
+        )
+
+    def test__dates(self):
+        params = QueryParams()
+
+        self.assertEqual(params.dates("report_dates", ["2024-01-31", date(2024, 2, 29)]), "%(report_dates)s")
+        self.assertEqual(params.values["report_dates"], [date(2024, 1, 31), date(2024, 2, 29)])
+        self.assertEqual(params.types["report_dates"], "date[]")
+        self.assertEqual(
+            params.render_literal("select unnest(%(report_dates)s)"),
+            "select unnest(ARRAY['2024-01-31', '2024-02-29']::date[])",
+        )
+
+    def test__transaction_filters_are_bound(self):
+        params = QueryParams()
+        instance = get_instance(portfolios=[SimpleNamespace(id=1)], strategies2=[SimpleNamespace(id=7)])
+
+        self.assertEqual(
+            get_transaction_filter_sql_string(instance, params),
+            "where portfolio_id = any(%(portfolios_ids)s) and strategy2_position_id = any(%(strategies2_ids)s)",
+        )
+        self.assertEqual(params.values, {"portfolios_ids": [1], "strategies2_ids": [7]})
+        self.assertEqual(get_transaction_filter_sql_string(get_instance(), QueryParams()), "")
+
+    def test__transaction_report_date_filter_is_bound(self):
+        params = QueryParams()
+        instance = get_instance(begin_date=date(2024, 1, 1), end_date=date(2024, 1, 31), date_field="accounting_date")
+
+        sql = get_transaction_report_date_filter_sql_string(instance, params)
+
+        self.assertNotIn("2024", sql)
+        self.assertIn("t.accounting_date >= %(begin_date)s", sql)
+        self.assertEqual(params.values, {"begin_date": date(2024, 1, 1), "end_date": date(2024, 1, 31)})
+
+
+class PreparedStatementsTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            "poms.reports.sql_builders.prepared.get_current_schema",
+            return_value="space00000",
+        )
+        self.get_current_schema = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.cursor = mock.Mock()
+        self.statements = PreparedStatements(raw_connection=None, size=2)
+
+    def get_params(self, report_date):
+        params = QueryParams()
+        params.date("report_date", report_date)
+        params.ids("ids", [1, 2])
+        return params
+
+    def get_executed(self):
+        return [call.args[0] for call in self.cursor.execute.call_args_list]
+
+    def test__statement_is_prepared_once(self):
+        name, names = self.statements.prepare(self.cursor, QUERY, self.get_params(date(2024, 1, 1)))
+        same_name, _ = self.statements.prepare(self.cursor, QUERY, self.get_params(date(2024, 2, 1)))
+
+        self.assertEqual(name, same_name)
+        self.assertTrue(name.startswith(STATEMENT_PREFIX))
+        self.assertEqual(names, ["report_date", "ids"])
+        self.assertEqual(
+            self.get_executed(),
+            [
+                f"PREPARE {name} (date, integer[]) AS select * from t where date <= $1 "
+                f"and id = any($2) and date > $1 - 1"
+            ],
+        )
+
+    def test__schema_is_part_of_the_key(self):
+        params = self.get_params(date(2024, 1, 1))
+        name, _ = self.statements.prepare(self.cursor, QUERY, params)
+
+        self.get_current_schema.return_value = "space00001"
+        other_name, _ = self.statements.prepare(self.cursor, QUERY, params)
+
+        self.assertNotEqual(name, other_name)
+
+    def test__least_recently_used_is_deallocated(self):
+        params = self.get_params(date(2024, 1, 1))
+        first, _ = self.statements.prepare(self.cursor, QUERY, params)
+        second, _ = self.statements.prepare(self.cursor, f"{QUERY} and 2 = 2", params)
+        self.statements.prepare(self.cursor, QUERY, params)
+        self.statements.prepare(self.cursor, f"{QUERY} and 3 = 3", params)
+
+        self.assertEqual(self.get_executed()[-1], f"DEALLOCATE {second}")
+        self.assertEqual(list(self.statements.statements.values())[0], first)
+
+    def test__execute(self):
+        params = self.get_params(date(2024, 1, 1))
+
+        with mock.patch.object(PreparedStatements, "get", return_value=self.statements):
+            execute(self.cursor, QUERY, params)
+
+        name = list(self.statements.statements.values())[0]
+        self.cursor.execute.assert_called_with(f"EXECUTE {name} (%s, %s)", [date(2024, 1, 1), [1, 2]])
+
+    @override_settings(REPORT_SQL_PREPARED_STATEMENTS=False)
+    def test__execute_without_prepared_statements(self):
+        params = self.get_params(date(2024, 1, 1))
+
+        execute(self.cursor, QUERY, params)
+
+        self.cursor.execute.assert_called_once_with(QUERY, params.values)
+
+
+class PreparedQueriesDbTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+
+    def test__prepared_and_literal_results_are_equal(self):
+        query = (
+            "select %(report_date)s + i as date, i = any(%(ids)s) as selected "
+            "from generate_series(0, 3) as i where i <= %(limit)s order by i"
+        )
+
+        prepared_counts = []
+        for report_date in (date(2024, 1, 1), date(2024, 2, 1)):
+            params = QueryParams()
+            params.date("report_date", report_date)
+            params.ids("ids", [1, 3])
+            params.integer("limit", 2)
+
+            with connection.cursor() as cursor:
+                execute(cursor, query, params)
+                prepared = cursor.fetchall()
+                execute_literal(cursor, query, params)
+                literal = cursor.fetchall()
+
+            self.assertEqual(prepared, literal)
+            self.assertEqual(len(prepared), 3)
+            prepared_counts.append(len(PreparedStatements.get().statements))
+
+        # the second date reuses the statement
+        self.assertEqual(prepared_counts[0], prepared_counts[1])
+
+
+@contextlib.contextmanager
+def literal_queries():
+    """
+    Report builders execute queries with inlined values, as the string formatted builders did
+    """
+    with contextlib.ExitStack() as stack:
+        for module in (balance, pl, pure_balance, transaction):
+            stack.enter_context(mock.patch.object(module, "execute", execute_literal))
+        yield
+
+
+def normalize(items) -> list:
+    return sorted((sorted(item.items()) for item in items), key=repr)
+
+
+class PreparedBuildersRegressionTest(BaseTestCase):
+    """
+    Every builder returns the same items with prepared and literal queries on the same data
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.instrument = self.db_data.instruments["Apple"]
+        self.pricing_policy = self.create_pricing_policy()
+        self.report_date = self.yesterday()
+        self.pl_first_date = self.report_date - timedelta(days=20)
+
+        self.db_data.cash_in_transaction(self.portfolio, amount=10000, day=self.report_date - timedelta(days=30))
+        self.create_trade(100, 50, self.report_date - timedelta(days=25))
+        self.create_trade(-40, 60, self.report_date - timedelta(days=10))
+        self.create_trade(10, 55, self.report_date - timedelta(days=2))
+
+        for days, price in ((30, 45), (20, 50), (10, 60), (1, 58)):
+            PriceHistory.objects.create(
+                instrument=self.instrument,
+                pricing_policy=self.pricing_policy,
+                date=self.report_date - timedelta(days=days),
+                principal_price=price,
+            )
+
+    def create_trade(self, position_size, price, day):
+        complex_transaction = ComplexTransaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            date=day,
+            transaction_type=self.db_data.transaction_types[BUY_SELL],
+        )
+        account = self.portfolio.accounts.first()
+        transaction_class = TransactionClass.BUY if position_size > 0 else TransactionClass.SELL
+        Transaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            complex_transaction=complex_transaction,
+            transaction_class=self.db_data.transaction_classes[transaction_class],
+            portfolio=self.portfolio,
+            instrument=self.instrument,
+            account_position=account,
+            account_cash=account,
+            account_interim=account,
+            transaction_date=day,
+            accounting_date=day,
+            cash_date=day,
+            position_size_with_sign=position_size,
+            principal_with_sign=-position_size * price,
+            cash_consideration=-position_size * price,
+            trade_price=price,
+            factor=1,
+            reference_fx_rate=1,
+            settlement_currency=self.usd,
+            transaction_currency=self.usd,
+            strategy1_position=self.db_data.strategies[1],
+            strategy1_cash=self.db_data.strategies[1],
+            strategy2_position=self.db_data.strategies[2],
+            strategy2_cash=self.db_data.strategies[2],
+            strategy3_position=self.db_data.strategies[3],
+            strategy3_cash=self.db_data.strategies[3],
+        )
+
+    def get_report(self, **kwargs):
+        return Report(
+            master_user=self.master_user,
+            member=self.member,
+            report_date=self.report_date,
+            pricing_policy=self.pricing_policy,
+            report_currency=self.usd,
+            portfolios=[self.portfolio],
+            only_numbers=True,
+            **kwargs,
+        )
+
+    def assert_same_items(self, build):
+        with override_settings(REPORT_SQL_PREPARED_STATEMENTS=True):
+            prepared_items = build()
+        with literal_queries():
+            literal_items = build()
+
+        self.assertTrue(prepared_items)
+        self.assertEqual(normalize(prepared_items), normalize(literal_items))
+
+    def test__balance(self):
+        self.assert_same_items(lambda: BalanceReportBuilderSql(self.get_report()).build_balance_sync().items)
+
+    def test__pure_balance(self):
+        self.assert_same_items(lambda: PureBalanceReportBuilderSql(self.get_report()).build_balance_sync().items)
+
+    def test__pl(self):
+        self.assert_same_items(
+            lambda: PLReportBuilderSql(self.get_report(report_type=Report.TYPE_PL, pl_first_date=self.pl_first_date))
+            .build_pl_sync()
+            .items
+        )
+
+    def test__transaction(self):
+        for depth_level in ("entry", "base_transaction", "complex_transaction"):
+            with self.subTest(depth_level=depth_level):
+                self.assert_same_items(
+                    lambda depth_level=depth_level: TransactionReportBuilderSql(
+                        TransactionReport(
+                            master_user=self.master_user,
+                            member=self.member,
+                            begin_date=self.pl_first_date,
+                            end_date=self.report_date,
+                            portfolios=[self.portfolio],
+                            date_field="accounting_date",
+                            depth_level=depth_level,
+                        )
+                    )
+                    .build_transaction()
+                    .items
+                )
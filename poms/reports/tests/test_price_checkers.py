@@ -0,0 +1,236 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase
+
+from poms.common.common_base_test import BIG, BUY_SELL, BaseTestCase
+from poms.currencies.models import CurrencyHistory
+from poms.instruments.models import PriceHistory
+from poms.reports.common import Report
+from poms.reports.sql_builders import price_checkers
+from poms.reports.sql_builders.price_checkers import (
+    PriceHistoryCheckerSql,
+    execute_nav_sql,
+    execute_nav_sql_for_dates,
+    execute_transaction_prices_sql,
+    execute_transaction_prices_sql_for_dates,
+)
+from poms.transactions.models import ComplexTransaction, Transaction, TransactionClass
+
+
+def get_instance(**kwargs):
+    options = {
+        "master_user": SimpleNamespace(id=1, pk=1),
+        "report_currency": SimpleNamespace(id=2),
+        "pricing_policy": SimpleNamespace(id=3),
+        "portfolio_mode": 1,
+        "account_mode": 1,
+        "strategy1_mode": 1,
+        "strategy2_mode": 1,
+        "strategy3_mode": 1,
+        "allocation_mode": 1,
+        "portfolios": [],
+        "accounts": [],
+        "strategies1": [],
+        "strategies2": [],
+        "strategies3": [],
+        "report_date": date(2024, 1, 31),
+        "pl_first_date": None,
+    }
+    options.update(kwargs)
+    return SimpleNamespace(**options)
+
+
+class ExecuteForDatesTest(SimpleTestCase):
+    def setUp(self):
+        self.instance = get_instance(portfolios=[SimpleNamespace(id=7)])
+        self.ecosystem_defaults = SimpleNamespace(currency_id=4)
+
+    def run_query(self, function, **kwargs):
+        with (
+            mock.patch.object(price_checkers, "execute") as execute,
+            mock.patch.object(price_checkers, "dictfetchall", return_value=[]),
+        ):
+            function(self.instance, mock.Mock(), self.ecosystem_defaults, **kwargs)
+
+        execute.assert_called_once()
+        _, query, params = execute.call_args.args
+        return query, params.values
+
+    def test__dates_are_checked_in_one_query(self):
+        dates = [date(2023, 12, 31), date(2024, 1, 31)]
+
+        for function in (execute_nav_sql_for_dates, execute_transaction_prices_sql_for_dates):
+            with self.subTest(function=function.__name__):
+                query, values = self.run_query(function, dates=dates)
+
+                self.assertIn("unnest(%(report_dates)s)", query)
+                self.assertEqual(values["report_dates"], dates)
+                self.assertEqual(values["portfolios_ids"], [7])
+                self.assertEqual(values["pricing_policy_id"], 3)
+
+    def test__date_range_is_generated(self):
+        query, values = self.run_query(
+            execute_nav_sql_for_dates,
+            date_from=date(2024, 1, 1),
+            date_to="2024-01-31",
+        )
+
+        self.assertIn("generate_series(%(date_from)s::date, %(date_to)s::date, interval '1 day')", query)
+        self.assertEqual(values["date_from"], date(2024, 1, 1))
+        self.assertEqual(values["date_to"], date(2024, 1, 31))
+
+
+class PriceHistoryCheckerSqlTest(SimpleTestCase):
+    def test__pl_first_date_and_report_date_in_one_check(self):
+        instance = get_instance(pl_first_date=date(2023, 12, 31))
+        missing_price = "missing_principal_pricing_history"
+        positions = [
+            {"id": 5, "name": "Bond", "user_code": "bond", "position_size": 10.0, "type": missing_price},
+            {"id": 5, "name": "Bond", "user_code": "bond", "position_size": 0.0000001, "type": missing_price},
+            {"id": 6, "name": "-", "user_code": "-", "position_size": 1.0, "type": missing_price},
+        ]
+        transactions = [
+            {"type": "stl_cur_fx", "accounting_date": date(2024, 1, 31), "transaction_currency_user_code": "EUR"},
+        ]
+
+        with (
+            mock.patch.object(price_checkers.EcosystemDefault.cache, "get_cache"),
+            mock.patch.object(price_checkers, "connection"),
+            mock.patch.object(price_checkers, "execute_nav_sql_for_dates", return_value=positions) as nav_sql,
+            mock.patch.object(
+                price_checkers, "execute_transaction_prices_sql_for_dates", return_value=transactions
+            ) as transaction_sql,
+        ):
+            instance = PriceHistoryCheckerSql(instance=instance).process()
+
+        nav_sql.assert_called_once()
+        transaction_sql.assert_called_once()
+        self.assertEqual(nav_sql.call_args.kwargs["dates"], [date(2023, 12, 31), date(2024, 1, 31)])
+        self.assertEqual(instance.items, [positions[0], transactions[0]])
+
+
+def normalize(items) -> set:
+    return {tuple(sorted((key, value) for key, value in item.items() if key != "report_date")) for item in items}
+
+
+class PriceHistoryCheckerDbTest(BaseTestCase):
+    """
+    Checking many dates in one query finds the same items as checking every date on its own
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.instrument = self.db_data.instruments["Apple"]
+        self.pricing_policy = self.create_pricing_policy()
+        self.report_date = self.yesterday()
+        self.pl_first_date = self.report_date - timedelta(days=20)
+
+        self.db_data.cash_in_transaction(self.portfolio, amount=10000, day=self.report_date - timedelta(days=30))
+        # settled in EUR, which has an fx rate on the pl first date only
+        self.create_trade(100, self.report_date - timedelta(days=25), currency=self.eur)
+        # in the interim account on the pl first date: booked before it, settled after it
+        self.create_trade(
+            -40,
+            self.pl_first_date - timedelta(days=2),
+            cash_date=self.report_date - timedelta(days=1),
+        )
+        # paid before the pl first date, booked after it
+        self.create_trade(
+            10,
+            self.report_date - timedelta(days=3),
+            cash_date=self.pl_first_date - timedelta(days=1),
+        )
+
+        PriceHistory.objects.create(
+            instrument=self.instrument,
+            pricing_policy=self.pricing_policy,
+            date=self.pl_first_date,
+            principal_price=50,
+        )
+        CurrencyHistory.objects.create(
+            currency=self.eur,
+            pricing_policy=self.pricing_policy,
+            date=self.pl_first_date,
+            fx_rate=1.1,
+        )
+
+    def create_trade(self, position_size, day, cash_date=None, currency=None):
+        currency = currency or self.usd
+        complex_transaction = ComplexTransaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            date=day,
+            transaction_type=self.db_data.transaction_types[BUY_SELL],
+        )
+        account = self.portfolio.accounts.first()
+        transaction_class = TransactionClass.BUY if position_size > 0 else TransactionClass.SELL
+        Transaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            complex_transaction=complex_transaction,
+            transaction_class=self.db_data.transaction_classes[transaction_class],
+            portfolio=self.portfolio,
+            instrument=self.instrument,
+            account_position=account,
+            account_cash=account,
+            account_interim=account,
+            transaction_date=day,
+            accounting_date=day,
+            cash_date=cash_date or day,
+            position_size_with_sign=position_size,
+            principal_with_sign=-position_size * 50,
+            cash_consideration=-position_size * 50,
+            trade_price=50,
+            factor=1,
+            reference_fx_rate=1,
+            settlement_currency=currency,
+            transaction_currency=currency,
+            strategy1_position=self.db_data.strategies[1],
+            strategy1_cash=self.db_data.strategies[1],
+            strategy2_position=self.db_data.strategies[2],
+            strategy2_cash=self.db_data.strategies[2],
+            strategy3_position=self.db_data.strategies[3],
+            strategy3_cash=self.db_data.strategies[3],
+        )
+
+    def test__dates_in_one_query_match_single_date_queries(self):
+        instance = Report(
+            master_user=self.master_user,
+            member=self.member,
+            report_date=self.report_date,
+            pl_first_date=self.pl_first_date,
+            pricing_policy=self.pricing_policy,
+            report_currency=self.eur,
+            portfolios=[self.portfolio],
+        )
+        checker = PriceHistoryCheckerSql(instance=instance)
+        dates = [self.pl_first_date, self.report_date]
+
+        with connection.cursor() as cursor:
+            items = checker.get_items(cursor, dates=dates)
+
+            expected = []
+            for day in dates:
+                for item in execute_nav_sql(day, instance, cursor, checker.ecosystem_defaults):
+                    if item["user_code"] != "-" and item["name"] != "-":
+                        item["position_size"] = round(item["position_size"], settings.ROUND_NDIGITS)
+
+                        if item["type"] != "missing_principal_pricing_history" or item["position_size"]:
+                            expected.append(item)
+
+                expected += execute_transaction_prices_sql(day, instance, cursor, checker.ecosystem_defaults)
+
+        self.assertEqual(normalize(items), normalize(expected))
+
+        types = {item["type"] for item in items}
+        self.assertIn("missing_principal_pricing_history", types)
+        self.assertIn("missing_report_currency_fx_rate", types)
+        self.assertIn("stl_cur_fx", types)
@@ -0,0 +1,77 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.reports.sql_builders.executor import ReportShardExecutor
+
+SHARD_TIME = 0.05
+
+
+class ReportShardExecutorTest(SimpleTestCase):
+    def setUp(self):
+        self.threads = set()
+        self.celery_task = mock.Mock()
+
+        for name, value in (("get_current_schema", "space00000"), ("set_search_path", None)):
+            patcher = mock.patch(f"poms.reports.sql_builders.executor.{name}", return_value=value)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def build_shard(self, task_id):
+        self.threads.add(threading.get_ident())
+        time.sleep(SHARD_TIME)
+        return [{"shard": task_id, "item": 1}, {"shard": task_id, "item": 2}]
+
+    def run_shards(self, max_workers, shards=8):
+        executor = ReportShardExecutor(self.build_shard, self.celery_task, max_workers=max_workers)
+        tasks = [SimpleNamespace(id=task_id) for task_id in range(shards)]
+
+        st = time.perf_counter()
+        with mock.patch.object(executor, "is_oversized", return_value=False):
+            items = executor.run(SimpleNamespace(), tasks)
+
+        return items, time.perf_counter() - st
+
+    def test__in_process_is_faster_than_serial(self):
+        serial_items, serial_time = self.run_shards(max_workers=1)
+        pooled_items, pooled_time = self.run_shards(max_workers=4)
+
+        self.assertEqual(pooled_items, serial_items)
+        self.assertGreaterEqual(serial_time, 8 * SHARD_TIME)
+        self.assertLess(pooled_time, serial_time / 2)
+
+    def test__items_are_merged_in_shard_order(self):
+        items, _ = self.run_shards(max_workers=3, shards=5)
+
+        self.assertEqual([item["shard"] for item in items], [0, 0, 1, 1, 2, 2, 3, 3, 4, 4])
+        self.assertEqual(len(self.threads), 3)
+        self.celery_task.s.assert_not_called()
+        self.set_search_path.assert_called_with("space00000")
+
+    def test__shard_error_is_raised(self):
+        def build_shard(task_id):
+            if task_id == 2:
+                raise ValueError("broken shard")
+            return [task_id]
+
+        executor = ReportShardExecutor(build_shard, self.celery_task, max_workers=2)
+
+        with self.assertRaises(ValueError):
+            executor.run_in_process(list(range(6)))
+
+    def test__oversized_report_is_sent_to_celery(self):
+        executor = ReportShardExecutor(self.build_shard, self.celery_task, max_transactions=10)
+        tasks = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+
+        with (
+            mock.patch("poms.reports.sql_builders.executor.get_report_size", return_value=11),
+            mock.patch.object(executor, "run_celery", return_value=["celery"]) as run_celery,
+        ):
+            items = executor.run(SimpleNamespace(), tasks)
+
+        self.assertEqual(items, ["celery"])
+        run_celery.assert_called_once()
+        self.assertEqual(self.threads, set())
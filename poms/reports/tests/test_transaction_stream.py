@@ -0,0 +1,216 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from poms.common.common_base_test import BIG, BUY_SELL, BaseTestCase
+from poms.reports.common import TransactionReport
+from poms.reports.sql_builders import transaction as transaction_builder
+from poms.reports.sql_builders.transaction import TransactionReportBuilderSql
+from poms.transactions.models import ComplexTransaction, Transaction, TransactionClass
+
+COLUMNS = [
+    "id",
+    "transaction_class_id",
+    "accounting_date",
+    "cash_date",
+    "instrument_id",
+    "settlement_currency_id",
+    "transaction_currency_id",
+    "account_position_id",
+    "account_cash_id",
+    "account_interim_id",
+    "strategy1_position_id",
+    "strategy1_cash_id",
+    "position_size_with_sign",
+    "cash_consideration",
+]
+
+
+def get_rows(count):
+    rows = []
+    for index in range(count):
+        transaction_class = TransactionClass.BUY if index % 3 else TransactionClass.CASH_INFLOW
+        rows.append(
+            (index, transaction_class, date(2024, 1, 10), date(2024, 1, 12), 100, 1, 1, 10, 11, 12, 5, 6, 2.0, -20.0)
+        )
+    return rows
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.description = [(column,) for column in COLUMNS]
+        self.cursor = SimpleNamespace(itersize=None)
+        self.fetched = []
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        self.fetched.append(len(rows))
+        return rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class TransactionReportStreamTest(SimpleTestCase):
+    def setUp(self):
+        self.builder = TransactionReportBuilderSql.__new__(TransactionReportBuilderSql)
+        self.builder.instance = SimpleNamespace(depth_level="entry", end_date=date(2024, 1, 31), items=[])
+
+        for patcher in (
+            mock.patch.object(TransactionReportBuilderSql, "get_items_query", return_value="SELECT"),
+            mock.patch.object(TransactionReportBuilderSql, "add_data_items"),
+            mock.patch.object(transaction_builder, "execute"),
+            mock.patch.object(transaction_builder, "connection"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build_buffered(self, rows):
+        transaction_builder.connection.cursor.return_value = FakeCursor(rows)
+        self.builder.build_items()
+        return self.builder.instance.items
+
+    def test__chunks_are_the_same_as_buffered_items(self):
+        rows = get_rows(10)
+        cursor = FakeCursor(rows)
+
+        transaction_builder.connection.chunked_cursor.return_value = cursor
+        chunks = list(self.builder.iter_item_chunks(chunk_size=4))
+
+        self.assertEqual(cursor.cursor.itersize, 4)
+        self.assertEqual(cursor.fetched, [4, 4, 2, 0])
+        self.assertEqual([item for chunk in chunks for item in chunk], self.build_buffered(rows))
+        # two entries per BUY row
+        self.assertEqual([len(chunk) for chunk in chunks], [6, 7, 3])
+
+    def test__relations_are_loaded_per_chunk(self):
+        cursor = FakeCursor(get_rows(5))
+
+        transaction_builder.connection.chunked_cursor.return_value = cursor
+        for _ in self.builder.iter_item_chunks(chunk_size=2):
+            pass
+
+        self.assertEqual(TransactionReportBuilderSql.add_data_items.call_count, 3)
+
+
+class EntryLevelItemsTest(SimpleTestCase):
+    def setUp(self):
+        self.builder = TransactionReportBuilderSql.__new__(TransactionReportBuilderSql)
+        self.builder.instance = SimpleNamespace(depth_level="entry", end_date=date(2024, 1, 31), items=[])
+
+    def get_row(self, index, transaction_class, position_size, cash_consideration):
+        day = date(2024, 1, 31)
+        values = (index, transaction_class, day, day, 100, 1, 1, 10, 11, 12, 5, 6, position_size, cash_consideration)
+        return dict(zip(COLUMNS, values, strict=True))
+
+    def test__initial_position_entries_are_copies_of_its_row(self):
+        trade_items = self.builder.get_entry_level_items(self.get_row(1, TransactionClass.BUY, 2.0, -20.0))
+        trade_snapshot = [item.copy() for item in trade_items]
+
+        items = self.builder.get_entry_level_items(self.get_row(2, TransactionClass.INITIAL_POSITION, 7.0, -70.0))
+
+        self.assertEqual([item["id"] for item in items], ["2_1", "2_2"])
+        self.assertEqual([item["entry_amount"] for item in items], [7.0, -70.0])
+        self.assertEqual([item["position_size_with_sign"] for item in items], [7.0, 7.0])
+        # items of the previous row are not changed
+        self.assertEqual(trade_items, trade_snapshot)
+
+
+class TransactionReportStreamDbTest(BaseTestCase):
+    """
+    Chunks read through the server-side cursor give the items of the single query
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.instrument = self.db_data.instruments["Apple"]
+        self.end_date = self.yesterday()
+        self.begin_date = self.end_date - timedelta(days=30)
+
+        self.db_data.cash_in_transaction(self.portfolio, amount=10000, day=self.end_date - timedelta(days=20))
+        self.create_trade(100, self.end_date - timedelta(days=15))
+        self.create_trade(-40, self.end_date - timedelta(days=10), cash_date=self.end_date + timedelta(days=2))
+        self.create_trade(10, self.end_date - timedelta(days=5))
+
+    def create_trade(self, position_size, day, cash_date=None):
+        complex_transaction = ComplexTransaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            date=day,
+            transaction_type=self.db_data.transaction_types[BUY_SELL],
+        )
+        account = self.portfolio.accounts.first()
+        transaction_class = TransactionClass.BUY if position_size > 0 else TransactionClass.SELL
+        Transaction.objects.using(settings.DB_DEFAULT).create(
+            master_user=self.master_user,
+            owner=self.member,
+            complex_transaction=complex_transaction,
+            transaction_class=self.db_data.transaction_classes[transaction_class],
+            portfolio=self.portfolio,
+            instrument=self.instrument,
+            account_position=account,
+            account_cash=account,
+            account_interim=account,
+            transaction_date=day,
+            accounting_date=day,
+            cash_date=cash_date or day,
+            position_size_with_sign=position_size,
+            principal_with_sign=-position_size * 50,
+            cash_consideration=-position_size * 50,
+            trade_price=50,
+            factor=1,
+            reference_fx_rate=1,
+            settlement_currency=self.usd,
+            transaction_currency=self.usd,
+            strategy1_position=self.db_data.strategies[1],
+            strategy1_cash=self.db_data.strategies[1],
+            strategy2_position=self.db_data.strategies[2],
+            strategy2_cash=self.db_data.strategies[2],
+            strategy3_position=self.db_data.strategies[3],
+            strategy3_cash=self.db_data.strategies[3],
+        )
+
+    def get_builder(self, depth_level):
+        return TransactionReportBuilderSql(
+            TransactionReport(
+                master_user=self.master_user,
+                member=self.member,
+                begin_date=self.begin_date,
+                end_date=self.end_date,
+                portfolios=[self.portfolio],
+                date_field="accounting_date",
+                depth_level=depth_level,
+            )
+        )
+
+    def test__chunks_are_the_same_as_buffered_items(self):
+        for depth_level in ("entry", "base_transaction", "complex_transaction"):
+            items = self.get_builder(depth_level).build_transaction().items
+            self.assertTrue(items)
+
+            for chunk_size in (1, 2, 100):
+                with self.subTest(depth_level=depth_level, chunk_size=chunk_size):
+                    chunks = list(self.get_builder(depth_level).iter_item_chunks(chunk_size=chunk_size))
+
+                    self.assertEqual(
+                        sorted((item for chunk in chunks for item in chunk), key=repr),
+                        sorted(items, key=repr),
+                    )
@@ -11,6 +11,7 @@ from rest_framework.response import Response
 from poms.common.filters import CharFilter, NoOpFilter
 from poms.common.utils import get_closest_bday_of_yesterday
 from poms.common.views import AbstractModelViewSet, AbstractViewSet
+from poms.reports.exports import get_chunked_report_export, get_report_export
 from poms.reports.light_builders.balance import BalanceReportLightBuilderSql
 from poms.reports.models import (
     BalanceReportCustomField,
@@ -42,6 +43,11 @@ from poms.reports.serializers import (
     TransactionReportCustomFieldSerializer,
     TransactionReportSerializer,
 )
+from poms.reports.serializers_helpers import (
+    serialize_balance_report_item,
+    serialize_pl_report_item,
+    serialize_transaction_report_item,
+)
 from poms.reports.sql_builders.balance import BalanceReportBuilderSql
 from poms.reports.sql_builders.pl import PLReportBuilderSql
 from poms.reports.sql_builders.price_checkers import PriceHistoryCheckerSql
@@ -1179,6 +1185,34 @@ class BackendBalanceReportViewSet(AbstractViewSet):
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="export",
+        serializer_class=BackendBalanceReportItemsSerializer,
+    )
+    def export(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = serializer.save()
+
+        instance.auth_time = self.auth_time
+
+        instance.portfolios = transform_to_allowed_portfolios(instance)
+        instance.accounts = transform_to_allowed_accounts(instance)
+
+        builder = BalanceReportBuilderSql(instance=instance)
+        instance = builder.build_balance()
+
+        export = get_report_export(
+            serializer,
+            instance,
+            serialize_balance_report_item,
+            request.data.get("export_format"),
+        )
+
+        return export.get_response(f"balance_report_{instance.report_date}")
+
 
 class BackendPLReportViewSet(AbstractViewSet):
     @action(
@@ -1263,6 +1297,36 @@ class BackendPLReportViewSet(AbstractViewSet):
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="export",
+        serializer_class=BackendPLReportItemsSerializer,
+    )
+    def export(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = serializer.save()
+
+        instance.auth_time = self.auth_time
+
+        instance.pl_first_date = get_pl_first_date(instance)
+
+        instance.portfolios = transform_to_allowed_portfolios(instance)
+        instance.accounts = transform_to_allowed_accounts(instance)
+
+        builder = PLReportBuilderSql(instance=instance)
+        instance = builder.build_report()
+
+        export = get_report_export(
+            serializer,
+            instance,
+            serialize_pl_report_item,
+            request.data.get("export_format"),
+        )
+
+        return export.get_response(f"pl_report_{instance.pl_first_date}_{instance.report_date}")
+
 
 class BackendTransactionReportViewSet(AbstractViewSet):
     @action(
@@ -1313,6 +1377,32 @@ class BackendTransactionReportViewSet(AbstractViewSet):
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="export",
+        serializer_class=BackendTransactionReportItemsSerializer,
+    )
+    def export(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = serializer.save()
+
+        instance.auth_time = self.auth_time
+
+        # rows are streamed from the database by chunks, the report is never held in memory as a whole
+        builder = TransactionReportBuilderSql(instance=instance)
+
+        export = get_chunked_report_export(
+            serializer,
+            instance,
+            builder.iter_item_chunks(),
+            serialize_transaction_report_item,
+            request.data.get("export_format"),
+        )
+
+        return export.get_response(f"transaction_report_{instance.begin_date}_{instance.end_date}")
+
 
 class BalanceReportInstanceFilterSet(FilterSet):
     id = NoOpFilter()
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import SystemMessage, SystemMessageAttachment, SystemMessageMember
+from .models import SystemMessage, SystemMessageAttachment, SystemMessageLastSeen, SystemMessageMember
 
 
 class SystemMessageAdmin(admin.ModelAdmin):
@@ -34,9 +34,19 @@ admin.site.register(SystemMessageAttachment, SystemMessageAttachmentAdmin)
 
 class SystemMessageMemberAdmin(admin.ModelAdmin):
     model = SystemMessageMember
-    list_display = ["id", "member", "system_message", "is_read", "is_pinned"]
+    list_display = ["id", "member", "system_message", "is_read", "is_pinned", "is_deleted"]
     search_fields = ["id"]
     raw_id_fields = ["member", "system_message"]
 
 
 admin.site.register(SystemMessageMember, SystemMessageMemberAdmin)
+
+
+class SystemMessageLastSeenAdmin(admin.ModelAdmin):
+    model = SystemMessageLastSeen
+    list_display = ["id", "member", "last_seen_id"]
+    search_fields = ["id"]
+    raw_id_fields = ["member"]
+
+
+admin.site.register(SystemMessageLastSeen, SystemMessageLastSeenAdmin)
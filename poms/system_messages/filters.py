@@ -9,13 +9,11 @@ class SystemMessageOnlyNewFilter(BaseFilterBackend):
             only_new = True
 
         if only_new:
-            member = request.user.member
-            return queryset.filter(members__member=member, members__is_read=False)
+            return queryset.unread_by(request.user.member)
 
         return queryset
 
 
 class OwnerBySystemMessageMember(BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
-        member = request.user.member
-        return queryset.filter(members__member=member)
+        return queryset.visible_to(request.user.member)
@@ -7,9 +7,7 @@ from django.conf import settings
 from poms.system_messages.models import (
     SystemMessage,
     SystemMessageAttachment,
-    SystemMessageMember,
 )
-from poms.users.models import Member
 
 _l = logging.getLogger("poms.system_messages")
 service_url = settings.NOTIFICATION_SERVICE_BASE_URL
@@ -91,15 +89,7 @@ def send_system_message(
             SystemMessageAttachment.objects.bulk_create(system_message_attachments)
             _l.info(f"Saved {len(system_message_attachments)} attachments ")
 
-        members = Member.objects.all()
-
-        system_message_members = [
-            SystemMessageMember(member=member, system_message=system_message) for member in members
-        ]
-        if system_message_members:
-            SystemMessageMember.objects.bulk_create(system_message_members)
-
-            _l.debug(f"Send message to {len(system_message_members)} members ")
+        # the message is broadcast, members get SystemMessageMember rows only when they read, pin or delete it
 
     except Exception as e:
         _l.info(f"Error send system message: exception {repr(e)} trace {traceback.format_exc()}")
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.22 on 2026-10-19 03:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# a member row per message and member becomes a sparse marker table:
+# the watermark of a member is set right before the first unread message,
+# read rows below it and unread rows after it are implied and deleted
+DELETE_DUPLICATES_SQL = """
+DELETE FROM system_messages_systemmessagemember a
+USING system_messages_systemmessagemember b
+WHERE a.member_id = b.member_id
+  AND a.system_message_id = b.system_message_id
+  AND a.id < b.id
+"""
+
+CREATE_WATERMARKS_SQL = """
+INSERT INTO system_messages_systemmessagelastseen (member_id, last_seen_id)
+SELECT m.id,
+       COALESCE(
+           (SELECT MIN(s.system_message_id) - 1
+              FROM system_messages_systemmessagemember s
+             WHERE s.member_id = m.id AND NOT s.is_read),
+           (SELECT MAX(id) FROM system_messages_systemmessage),
+           0
+       )
+FROM users_member m
+"""
+
+DELETE_IMPLIED_MARKERS_SQL = """
+DELETE FROM system_messages_systemmessagemember s
+USING system_messages_systemmessagelastseen w
+WHERE s.member_id = w.member_id
+  AND NOT s.is_pinned
+  AND (
+      (s.system_message_id <= w.last_seen_id AND s.is_read)
+      OR (s.system_message_id > w.last_seen_id AND NOT s.is_read)
+  )
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_ecosystemdefault_license_key'),
+        ('system_messages', '0003_alter_systemmessage_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemMessageLastSeen',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_seen_id', models.BigIntegerField(default=0, verbose_name='last seen system message id')),
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='system_messages_last_seen', to='users.member', verbose_name='member')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='systemmessagemember',
+            name='is_deleted',
+            field=models.BooleanField(default=False, verbose_name='is deleted'),
+        ),
+        migrations.RunSQL(DELETE_DUPLICATES_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_WATERMARKS_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(DELETE_IMPLIED_MARKERS_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='systemmessagemember',
+            constraint=models.UniqueConstraint(fields=('member', 'system_message'), name='system_message_member_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='systemmessage',
+            index=models.Index(fields=['section', '-id'], name='system_message_section_id'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Exists, ExpressionWrapper, Max, OuterRef, Q
 from django.utils.translation import gettext_lazy
 
 from poms.common.models import TimeStampedModel
@@ -6,6 +7,44 @@ from poms.file_reports.models import FileReport
 from poms.users.models import Member
 
 
+class SystemMessageQuerySet(models.QuerySet):
+    """
+    Messages are broadcast to every member of the space. A member has read every message up to
+    the watermark (SystemMessageLastSeen) and the messages with an is_read marker after it,
+    pinned and deleted messages are marked in SystemMessageMember rows of the member.
+    Deleted messages count as read, so they don't hold the watermark back.
+    """
+
+    def visible_to(self, member):
+        return self.exclude(Exists(member_states(member).filter(is_deleted=True)))
+
+    def unread_by(self, member):
+        last_seen_id = SystemMessageLastSeen.get_last_seen_id(member)
+        return self.filter(id__gt=last_seen_id).exclude(
+            Exists(member_states(member).filter(Q(is_read=True) | Q(is_deleted=True)))
+        )
+
+    def pinned_by(self, member):
+        return self.filter(Exists(member_states(member).filter(is_pinned=True)))
+
+    def not_pinned_by(self, member):
+        return self.exclude(Exists(member_states(member).filter(is_pinned=True)))
+
+    def with_member_state(self, member):
+        last_seen_id = SystemMessageLastSeen.get_last_seen_id(member)
+        return self.annotate(
+            member_is_read=ExpressionWrapper(
+                Q(id__lte=last_seen_id) | Exists(member_states(member).filter(is_read=True)),
+                output_field=models.BooleanField(),
+            ),
+            member_is_pinned=Exists(member_states(member).filter(is_pinned=True)),
+        )
+
+
+def member_states(member):
+    return SystemMessageMember.objects.filter(system_message=OuterRef("pk"), member=member)
+
+
 class SystemMessage(TimeStampedModel):
     SECTION_GENERAL = 0
     SECTION_EVENTS = 1
@@ -106,8 +145,13 @@ class SystemMessage(TimeStampedModel):
         on_delete=models.SET_NULL,
     )
 
+    objects = SystemMessageQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["section", "-id"], name="system_message_section_id"),
+        ]
 
     def __str__(self):
         pieces = []
@@ -159,6 +203,11 @@ class SystemMessageAttachment(models.Model):
 
 
 class SystemMessageMember(models.Model):
+    """
+    Read, pinned or deleted marker of a message for a member, there is no row for the messages
+    the member has not touched
+    """
+
     system_message = models.ForeignKey(
         SystemMessage,
         verbose_name=gettext_lazy("system message"),
@@ -178,6 +227,101 @@ class SystemMessageMember(models.Model):
         default=False,
         verbose_name=gettext_lazy("is pinned"),
     )
+    is_deleted = models.BooleanField(
+        default=False,
+        verbose_name=gettext_lazy("is deleted"),
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["member", "system_message"], name="system_message_member_unique"),
+        ]
+
+    @classmethod
+    def mark(cls, member, system_messages_ids, **markers):
+        """
+        Sets the markers (is_read, is_pinned, is_deleted) of the messages for the member,
+        unknown ids and messages deleted by the member are skipped. Returns the marked ids.
+        """
+        system_messages_ids = list(
+            SystemMessage.objects.visible_to(member).filter(id__in=system_messages_ids).values_list("id", flat=True)
+        )
+        if not system_messages_ids:
+            return []
+
+        cls.objects.bulk_create(
+            [cls(member=member, system_message_id=message_id, **markers) for message_id in system_messages_ids],
+            update_conflicts=True,
+            unique_fields=["member", "system_message"],
+            update_fields=list(markers),
+        )
+
+        return system_messages_ids
+
+
+class SystemMessageLastSeen(models.Model):
+    """
+    Watermark of a member, all messages up to last_seen_id are read by the member
+    """
+
+    member = models.OneToOneField(
+        Member,
+        verbose_name=gettext_lazy("member"),
+        related_name="system_messages_last_seen",
+        on_delete=models.CASCADE,
+    )
+    last_seen_id = models.BigIntegerField(
+        default=0,
+        verbose_name=gettext_lazy("last seen system message id"),
+    )
+
+    @staticmethod
+    def get_max_message_id() -> int:
+        return SystemMessage.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+
+    @classmethod
+    def get_last_seen_id(cls, member) -> int:
+        """
+        Watermark of the member, a new member starts with all previous messages read
+        """
+        last_seen, _ = cls.objects.get_or_create(member=member, defaults={"last_seen_id": cls.get_max_message_id()})
+        return last_seen.last_seen_id
+
+    @classmethod
+    def mark_all_as_read(cls, member):
+        cls.objects.update_or_create(member=member, defaults={"last_seen_id": cls.get_max_message_id()})
+        cls.compact(member)
+
+    @classmethod
+    def advance(cls, member):
+        """
+        Moves the watermark of the member up to the first unread message, deleted ones are skipped
+        """
+        last_seen_id = cls.get_last_seen_id(member)
+        first_unread_id = (
+            SystemMessage.objects.filter(id__gt=last_seen_id)
+            .unread_by(member)
+            .order_by("id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        new_last_seen_id = cls.get_max_message_id() if first_unread_id is None else first_unread_id - 1
+        if new_last_seen_id > last_seen_id:
+            cls.objects.filter(member=member).update(last_seen_id=new_last_seen_id)
+            cls.compact(member)
+
+    @classmethod
+    def compact(cls, member):
+        """
+        Deletes the markers of the member which tell nothing, read ones below the watermark and empty ones
+        """
+        last_seen_id = cls.get_last_seen_id(member)
+        SystemMessageMember.objects.filter(
+            Q(system_message_id__lte=last_seen_id) | Q(is_read=False),
+            member=member,
+            is_pinned=False,
+            is_deleted=False,
+        ).delete()
 
 
 class SystemMessageComment(TimeStampedModel):
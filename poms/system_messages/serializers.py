@@ -69,20 +69,20 @@ class SystemMessageSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
-        member = get_member_from_context(self.context)
-
         result = super().to_representation(instance)
 
-        for member_message in instance.members.all():
-            if member_message.member_id == member.id:
-                result["is_read"] = member_message.is_read
-                result["is_pinned"] = member_message.is_pinned
+        if not hasattr(instance, "member_is_read"):
+            # single message, not from the list queryset
+            member = get_member_from_context(self.context)
+            if member is None:
+                result["is_read"] = True
+                result["is_pinned"] = False
+                return result
 
-        if "is_read" not in result:
-            result["is_read"] = True
+            instance = SystemMessage.objects.with_member_state(member).get(id=instance.id)
 
-        if "is_pinned" not in result:
-            result["is_pinned"] = False
+        result["is_read"] = instance.member_is_read
+        result["is_pinned"] = instance.member_is_pinned
 
         return result
 
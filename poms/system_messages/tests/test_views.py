@@ -1,5 +1,6 @@
 from poms.common.common_base_test import BaseTestCase
-from poms.system_messages.models import SystemMessage, SystemMessageMember
+from poms.system_messages.handlers import send_system_message
+from poms.system_messages.models import SystemMessage, SystemMessageLastSeen, SystemMessageMember
 
 REQUEST_PARAMS = {
     "page_size": 100,
@@ -93,3 +94,121 @@ class MemberViewSetTest(BaseTestCase):
 
         response_json = response.json()
         self.assertEqual(response_json["count"], 2)
+
+
+class MemberStateViewSetTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.realm_code = "realm00000"
+        self.space_code = "space00000"
+        self.url = f"/{self.realm_code}/{self.space_code}/api/v1/system-messages/message/"
+        # messages before the first access of the member are read
+        SystemMessageLastSeen.get_last_seen_id(self.member)
+
+    def create_system_message(self, title: str) -> SystemMessage:
+        send_system_message(master_user=self.master_user, title=title, type="error")
+        return SystemMessage.objects.latest("id")
+
+    def get_new_ids(self) -> list[int]:
+        response = self.client.get(path=self.url, data={"only_new": "true", "page_size": 100})
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(message["id"] for message in response.json()["results"])
+
+    def test__messages_are_not_fanned_out(self):
+        self.create_system_message("first")
+
+        self.assertEqual(SystemMessageMember.objects.count(), 0)
+
+    def test__mark_as_read_moves_watermark(self):
+        first = self.create_system_message("first")
+        second = self.create_system_message("second")
+        third = self.create_system_message("third")
+
+        self.assertEqual(self.get_new_ids(), [first.id, second.id, third.id])
+
+        response = self.client.post(path=f"{self.url}mark-as-read/", data={"ids": [second.id]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_new_ids(), [first.id, third.id])
+        self.assertEqual(SystemMessageMember.objects.filter(member=self.member, is_read=True).count(), 1)
+
+        response = self.client.post(path=f"{self.url}mark-as-read/", data={"ids": [first.id]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_new_ids(), [third.id])
+        self.assertTrue(second.id <= SystemMessageLastSeen.get_last_seen_id(self.member) < third.id)
+        self.assertEqual(SystemMessageMember.objects.filter(member=self.member).count(), 0)
+
+        response = self.client.get(path=f"{self.url}mark-all-as-read/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_new_ids(), [])
+
+    def test__pin_and_delete(self):
+        first = self.create_system_message("first")
+        second = self.create_system_message("second")
+
+        response = self.client.post(path=f"{self.url}pin/", data={"ids": [first.id]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.get(path=self.url, data={"page_size": 100})
+        results = response.json()["results"]
+        self.assertEqual([m["id"] for m in results], [first.id, second.id])
+        self.assertTrue(results[0]["is_pinned"])
+
+        response = self.client.post(path=f"{self.url}mark-as-deleted/", data={"ids": [second.id]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.get(path=self.url, data={"page_size": 100})
+        self.assertEqual([m["id"] for m in response.json()["results"]], [first.id])
+
+    def test__deleted_unread_message_does_not_hold_watermark(self):
+        first = self.create_system_message("first")
+        second = self.create_system_message("second")
+        third = self.create_system_message("third")
+
+        response = self.client.post(path=f"{self.url}mark-as-read/", data={"ids": [second.id]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.post(path=f"{self.url}mark-as-deleted/", data={"ids": [first.id]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(self.get_new_ids(), [third.id])
+        self.assertTrue(second.id <= SystemMessageLastSeen.get_last_seen_id(self.member) < third.id)
+        # only the deleted marker is left, the read marker is below the watermark
+        markers = SystemMessageMember.objects.filter(member=self.member)
+        self.assertEqual(list(markers.values_list("system_message_id", "is_deleted")), [(first.id, True)])
+
+        response = self.client.post(path=f"{self.url}mark-as-read/", data={"ids": [third.id]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(SystemMessageLastSeen.get_last_seen_id(self.member), third.id)
+        self.assertEqual(SystemMessageMember.objects.filter(member=self.member, is_read=True).count(), 0)
+
+    def test__unknown_ids_are_skipped(self):
+        first = self.create_system_message("first")
+
+        unknown_id = first.id + 1000
+
+        for action in ("pin", "unpin", "mark-as-deleted", "mark-as-read"):
+            response = self.client.post(path=f"{self.url}{action}/", data={"ids": [unknown_id]}, format="json")
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(SystemMessageMember.objects.count(), 0)
+        self.assertEqual(SystemMessageMember.mark(self.member, [first.id, unknown_id], is_pinned=True), [first.id])
+
+    def test__keyset_pages(self):
+        messages = [self.create_system_message(f"message {i}") for i in range(5)]
+        ids = [message.id for message in reversed(messages)]
+
+        response = self.client.get(path=self.url, data={"before": "", "page_size": 2})
+        self.assertEqual(response.status_code, 200, response.content)
+        page = response.json()
+        self.assertEqual([m["id"] for m in page["results"]], ids[:2])
+
+        response = self.client.get(path=self.url, data={"before": page["next_before"], "page_size": 2})
+        page = response.json()
+        self.assertEqual([m["id"] for m in page["results"]], ids[2:4])
+
+        response = self.client.get(path=self.url, data={"before": page["next_before"], "page_size": 2})
+        page = response.json()
+        self.assertEqual([m["id"] for m in page["results"]], ids[4:])
+        self.assertIsNone(page["next_before"])
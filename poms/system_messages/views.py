@@ -1,7 +1,8 @@
+from collections import defaultdict
 from logging import getLogger
 
 import django_filters
-from django.db.models import Q
+from django.db.models import Count, Q
 from django_filters.rest_framework import FilterSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -9,6 +10,7 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
 from poms.common.filters import CharFilter
+from poms.common.pagination import KeysetPagination
 from poms.common.views import AbstractModelViewSet
 from poms.system_messages.filters import (
     OwnerBySystemMessageMember,
@@ -30,7 +32,12 @@ from poms.system_messages.handlers import (
     forward_update_user_subscriptions_to_service,
     forward_user_subscribed_channels_to_service,
 )
-from poms.system_messages.models import SystemMessage, SystemMessageComment
+from poms.system_messages.models import (
+    SystemMessage,
+    SystemMessageComment,
+    SystemMessageLastSeen,
+    SystemMessageMember,
+)
 from poms.system_messages.serializers import (
     SystemMessageActionSerializer,
     SystemMessageSerializer,
@@ -52,7 +59,7 @@ class SystemMessageFilterSet(FilterSet):
 
 class SystemMessageViewSet(AbstractModelViewSet):
     queryset = SystemMessage.objects.select_related("master_user", "linked_event").prefetch_related(
-        "comments", "attachments", "members"
+        "comments", "attachments"
     )
     serializer_class = SystemMessageSerializer
 
@@ -64,7 +71,7 @@ class SystemMessageViewSet(AbstractModelViewSet):
     ]
     permission_classes = AbstractModelViewSet.permission_classes + []
     ordering_fields = [
-        "members__is_pinned",
+        "member_is_pinned",
         "created_at",
         "section",
         "type",
@@ -72,10 +79,18 @@ class SystemMessageViewSet(AbstractModelViewSet):
         "title",
     ]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        member = getattr(self.request.user, "member", None)
+        if member is None:
+            return queryset
+        return queryset.with_member_state(member)
+
     def list(self, request, *args, **kwargs):  # noqa: PLR0912
         if not hasattr(request.user, "master_user"):
             return Response([])
 
+        member = request.user.member
         queryset = self.filter_queryset(self.get_queryset())
 
         ordering = request.GET.get("ordering", None)
@@ -84,16 +99,13 @@ class SystemMessageViewSet(AbstractModelViewSet):
         action_status = request.GET.get("action_status", None)
         query = request.GET.get("query", None)
         page = request.GET.get("page", None)
-        only_new = request.GET.get("only_new", "")
+        before = request.GET.get("before", None)
         include_workflow = request.GET.get("include_workflow", "")
 
         if include_workflow != "true":
             queryset = queryset.exclude(title__icontains="Workflow")
 
-        if only_new == "true":
-            queryset = queryset.filter(members__is_read=False, members__member=request.user.member)
-
-        queryset = queryset.filter(members__is_pinned=False, members__member=request.user.member)
+        queryset = queryset.not_pinned_by(member)
 
         if msg_type:
             msg_type = msg_type.split(",")
@@ -110,17 +122,20 @@ class SystemMessageViewSet(AbstractModelViewSet):
         if query:
             queryset = queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
 
+        if before is not None:
+            # keyset pages by id, newest first, without count and offset
+            paginator = KeysetPagination()
+            results = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = self.get_serializer(results, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         if ordering:
-            queryset = queryset.order_by(ordering)
+            queryset = queryset.order_by(ordering.replace("members__is_pinned", "member_is_pinned"))
         else:
             queryset = queryset.order_by("-created_at")
 
         if page is None or page == "1":
-            pinned_queryset = self.get_queryset().filter(
-                members__is_pinned=True,
-                members__is_read=True,
-                members__member=request.user.member,
-            )
+            pinned_queryset = self.get_queryset().visible_to(member).pinned_by(member)
 
             if msg_type:
                 pinned_queryset = pinned_queryset.filter(type__in=msg_type)
@@ -131,14 +146,8 @@ class SystemMessageViewSet(AbstractModelViewSet):
             if query:
                 pinned_queryset = pinned_queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
 
-            if len(pinned_queryset):
-                _l.info(f"Inject {len(pinned_queryset)} pinned messages ")
+            if pinned_queryset.exists():
                 queryset = pinned_queryset.union(queryset, all=True)
-            else:
-                queryset = queryset.distinct()
-
-        else:
-            queryset = queryset.distinct()
 
         page = self.paginate_queryset(queryset)
 
@@ -149,68 +158,43 @@ class SystemMessageViewSet(AbstractModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-    def get_stats_for_section(
+    def get_counts(
         self,
-        section,
         only_new,
         query,
         created_before,
         created_after,
         action_status,
         member,
-    ):
-        section_mapping = {
-            0: "General",
-            1: "Events",
-            2: "Transactions",
-            3: "Instruments",
-            4: "Data",
-            5: "Prices",
-            6: "Report",
-            7: "Import",
-            8: "Activity Log",
-            9: "Schedules",
-            10: "Other",
-        }
-
-        def get_count(type, is_pinned=False):
-            queryset = SystemMessage.objects.filter(section=section, type=type)
-
-            if only_new and not is_pinned:
-                queryset = queryset.filter(
-                    members__is_read=False,
-                    members__is_pinned=False,
-                    members__member=member,
-                )
+    ) -> dict[tuple[int, int], int]:
+        """
+        Number of messages by (section, type), pinned messages are added to the messages of the filter
+        """
+        queryset = SystemMessage.objects.visible_to(member)
 
-            if is_pinned:
-                queryset = queryset.filter(members__is_pinned=True, members__member=member)
+        if query:
+            queryset = queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
 
-            if query:
-                queryset = queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+        if created_before:
+            queryset = queryset.filter(created_at__lte=created_before)
 
-            if created_before:
-                queryset = queryset.filter(created_at__lte=created_before)
+        if created_after:
+            queryset = queryset.filter(created_at__gte=created_after)
 
-            if created_after:
-                queryset = queryset.filter(created_at__gte=created_after)
+        if action_status:
+            queryset = queryset.filter(
+                action_status__in=action_status if isinstance(action_status, list) else [action_status]
+            )
 
-            if action_status:
-                queryset = queryset.filter(action_status__in=[action_status])
+        messages_queryset = queryset.unread_by(member).not_pinned_by(member) if only_new else queryset
+        pinned_queryset = queryset.pinned_by(member)
 
-            return queryset.count()
+        counts = defaultdict(int)
+        for counted_queryset in (messages_queryset, pinned_queryset):
+            for item in counted_queryset.order_by().values("section", "type").annotate(count=Count("id")):
+                counts[(item["section"], item["type"])] += item["count"]
 
-        stats = {
-            "id": section,
-            "name": section_mapping[section],
-            "errors": get_count(SystemMessage.TYPE_ERROR) + get_count(SystemMessage.TYPE_ERROR, is_pinned=True),
-            "warning": get_count(SystemMessage.TYPE_WARNING) + get_count(SystemMessage.TYPE_WARNING, is_pinned=True),
-            "information": get_count(SystemMessage.TYPE_INFORMATION)
-            + get_count(SystemMessage.TYPE_INFORMATION, is_pinned=True),
-            "success": get_count(SystemMessage.TYPE_SUCCESS) + get_count(SystemMessage.TYPE_SUCCESS, is_pinned=True),
-        }
-
-        return stats
+        return counts
 
     @action(detail=False, methods=["get"], url_path="stats")
     def stats(self, request, pk=None, realm_code=None, space_code=None):
@@ -228,111 +212,37 @@ class SystemMessageViewSet(AbstractModelViewSet):
         only_new = only_new == "true"
         member = request.user.member
 
+        counts = self.get_counts(only_new, query, created_before, created_after, action_status, member)
+
+        section_mapping = {
+            SystemMessage.SECTION_EVENTS: "Events",
+            SystemMessage.SECTION_TRANSACTIONS: "Transactions",
+            SystemMessage.SECTION_INSTRUMENTS: "Instruments",
+            SystemMessage.SECTION_DATA: "Data",
+            SystemMessage.SECTION_PRICES: "Prices",
+            SystemMessage.SECTION_REPORT: "Report",
+            SystemMessage.SECTION_IMPORT: "Import",
+            SystemMessage.SECTION_ACTIVITY_LOG: "Activity Log",
+            SystemMessage.SECTION_SCHEDULES: "Schedules",
+            SystemMessage.SECTION_OTHER: "Other",
+        }
+
         result = [
-            self.get_stats_for_section(
-                SystemMessage.SECTION_EVENTS,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_TRANSACTIONS,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_INSTRUMENTS,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_DATA,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_PRICES,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_REPORT,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_IMPORT,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_ACTIVITY_LOG,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_SCHEDULES,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
-            self.get_stats_for_section(
-                SystemMessage.SECTION_OTHER,
-                only_new,
-                query,
-                created_before,
-                created_after,
-                action_status,
-                member,
-            ),
+            {
+                "id": section,
+                "name": name,
+                "errors": counts[(section, SystemMessage.TYPE_ERROR)],
+                "warning": counts[(section, SystemMessage.TYPE_WARNING)],
+                "information": counts[(section, SystemMessage.TYPE_INFORMATION)],
+                "success": counts[(section, SystemMessage.TYPE_SUCCESS)],
+            }
+            for section, name in section_mapping.items()
         ]
         return Response(result)
 
     @action(detail=False, methods=["get"], url_path="mark-all-as-read")
     def mark_all_as_read(self, request, pk=None, realm_code=None, space_code=None):
-        member = request.user.member
-
-        messages = SystemMessage.objects.all()
-
-        for message in messages:
-            for member_message in message.members.all():
-                if member_message.member_id == member.id:
-                    member_message.is_read = True
-                    member_message.save()
+        SystemMessageLastSeen.mark_all_as_read(request.user.member)
 
         return Response({"status": "ok"})
 
@@ -345,33 +255,27 @@ class SystemMessageViewSet(AbstractModelViewSet):
     def mark_as_read(self, request, pk=None, realm_code=None, space_code=None):
         ids = request.data.get("ids")
         sections = request.data.get("sections")
+        member = request.user.member
 
-        queryset = SystemMessage.objects.all()
+        queryset = SystemMessage.objects.unread_by(member)
 
-        print(f"mark_as_read ids {ids}")
         if ids:
             if not isinstance(ids, list):
                 ids = [ids]
 
             queryset = queryset.filter(id__in=ids)
 
-        print(f"mark_as_read sections {sections}")
         if sections:
             if not isinstance(sections, list):
                 sections = [sections]
 
             queryset = queryset.filter(section__in=sections)
 
-        index = 0
-        for message in queryset:
-            for member_message in message.members.all():
-                if request.user.member.id == member_message.member_id:
-                    member_message.is_read = True
-                    member_message.save()
-
-                    index += 1
+        unread_ids = list(queryset.values_list("id", flat=True))
+        SystemMessageMember.mark(member, unread_ids, is_read=True)
+        SystemMessageLastSeen.advance(member)
 
-        print(f"marked as read {index}")
+        _l.debug(f"marked as read {len(unread_ids)}")
 
         return Response({"status": "ok"})
 
@@ -407,12 +311,7 @@ class SystemMessageViewSet(AbstractModelViewSet):
         if not isinstance(ids, list):
             ids = [ids]
 
-        messages = SystemMessage.objects.filter(id__in=ids)
-
-        for message in messages:
-            for member_message in message.members.all():
-                member_message.is_pinned = True
-                member_message.save()
+        SystemMessageMember.mark(request.user.member, ids, is_pinned=True)
 
         return Response({"status": "ok"})
 
@@ -428,12 +327,28 @@ class SystemMessageViewSet(AbstractModelViewSet):
         if not isinstance(ids, list):
             ids = [ids]
 
-        messages = SystemMessage.objects.filter(id__in=ids)
+        SystemMessageMember.mark(request.user.member, ids, is_pinned=False)
+        SystemMessageLastSeen.compact(request.user.member)
 
-        for message in messages:
-            for member_message in message.members.all():
-                member_message.is_pinned = False
-                member_message.save()
+        return Response({"status": "ok"})
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="mark-as-deleted",
+        serializer_class=SystemMessageActionSerializer,
+    )
+    def mark_as_deleted(self, request, pk=None, realm_code=None, space_code=None):
+        """
+        Hides the messages from the member, other members still see them
+        """
+        ids = request.data["ids"]
+
+        if not isinstance(ids, list):
+            ids = [ids]
+
+        SystemMessageMember.mark(request.user.member, ids, is_deleted=True)
+        SystemMessageLastSeen.advance(request.user.member)
 
         return Response({"status": "ok"})
 
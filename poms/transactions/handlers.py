@@ -9,7 +9,8 @@ from django.apps import apps
 
 # from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import DatabaseError, IntegrityError
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Min, Q
 from django.utils.translation import gettext_lazy
 from rest_framework.exceptions import ValidationError
 
@@ -19,6 +20,7 @@ from poms.common.utils import date_now, format_float, format_float_to_2
 from poms.counterparties.models import Counterparty, Responsible
 from poms.currencies.models import Currency
 from poms.expressions_engine import formula
+from poms.history import models as history
 from poms.instruments.models import (
     AccrualCalculationModel,
     AccrualCalculationSchedule,
@@ -45,6 +47,7 @@ from poms.transactions.models import (
     NotificationClass,
     RebookReactionChoice,
     Transaction,
+    TransactionClass,
     TransactionType,
     TransactionTypeInput,
 )
@@ -55,10 +58,64 @@ from poms.vault.models import VaultRecord
 _l = logging.getLogger("poms.transactions")
 
 
+# one-to-one children of TransactionTypeAction read by the booking
+ACTION_RELATIONS = (
+    "transactiontypeactioninstrument",
+    "transactiontypeactiontransaction",
+    "transactiontypeactioninstrumentfactorschedule",
+    "transactiontypeactioninstrumentmanualpricingformula",
+    "transactiontypeactioninstrumentaccrualcalculationschedules",
+    "transactiontypeactioninstrumenteventschedule",
+    "transactiontypeactioninstrumenteventscheduleaction",
+    "transactiontypeactionexecutecommand",
+)
+
+
 class UniqueCodeError(ValidationError):
     message = "Unique code already exists"
 
 
+def get_relation_by_user_code(model, master_user, user_code):
+    try:
+        if model._meta.get_field("master_user"):
+            return model.objects.get(master_user=master_user, user_code=user_code)
+
+    except Exception:
+        try:
+            return model.objects.get(user_code=user_code)
+        except Exception as e:
+            _l.debug(f"User code for default value is not found {e}")
+
+    return None
+
+
+class BookingDefaults:
+    """
+    Default relations of booked transactions
+    """
+
+    def __init__(self, master_user):
+        finmars_bot = Member.objects.get(username="finmars_bot")
+        self.ecosystem_default = EcosystemDefault.cache.get_cache(master_user_pk=master_user.pk)
+
+        # Probably need to fix it later
+        self.default_provider, _ = Provider.objects.get_or_create(
+            master_user=master_user, owner=finmars_bot, name="-", user_code="-"
+        )
+        self.default_provider_version, _ = ProviderVersion.objects.get_or_create(
+            master_user=master_user, owner=finmars_bot, name="-", user_code="-", provider=self.default_provider
+        )
+        self.default_source, _ = Source.objects.get_or_create(
+            master_user=master_user, owner=finmars_bot, name="-", user_code="-"
+        )
+        self.default_source_version, _ = SourceVersion.objects.get_or_create(
+            master_user=master_user, owner=finmars_bot, name="-", user_code="-", source=self.default_source
+        )
+        self.default_platform_version, _ = PlatformVersion.objects.get_or_create(
+            master_user=master_user, owner=finmars_bot, name="-", user_code="-"
+        )
+
+
 class TransactionTypeProcess:
     # if store is false, then operations must be rollback outside,
     # for example, in view...
@@ -112,6 +169,7 @@ class TransactionTypeProcess:
         clear_execution_log=True,
         record_execution_log=True,
         linked_import_task=None,
+        bulk=None,  # TransactionTypeBulkProcess the booking is a part of
     ):
         _l.info(
             f"TransactionTypeProcess transaction_type={transaction_type} "
@@ -120,25 +178,16 @@ class TransactionTypeProcess:
         )
 
         master_user = transaction_type.master_user
-        finmars_bot = Member.objects.get(username="finmars_bot")
-        self.ecosystem_default = EcosystemDefault.cache.get_cache(master_user_pk=master_user.pk)
+        self.bulk = bulk
+        self.bulk_inputs = []  # inputs created by the bulk process after all bookings
 
-        # Probably need to fix it later
-        self.default_provider, _ = Provider.objects.get_or_create(
-            master_user=master_user, owner=finmars_bot, name="-", user_code="-"
-        )
-        self.default_provider_version, _ = ProviderVersion.objects.get_or_create(
-            master_user=master_user, owner=finmars_bot, name="-", user_code="-", provider=self.default_provider
-        )
-        self.default_source, _ = Source.objects.get_or_create(
-            master_user=master_user, owner=finmars_bot, name="-", user_code="-"
-        )
-        self.default_source_version, _ = SourceVersion.objects.get_or_create(
-            master_user=master_user, owner=finmars_bot, name="-", user_code="-", source=self.default_source
-        )
-        self.default_platform_version, _ = PlatformVersion.objects.get_or_create(
-            master_user=master_user, owner=finmars_bot, name="-", user_code="-"
-        )
+        defaults = bulk.defaults if bulk else BookingDefaults(master_user)
+        self.ecosystem_default = defaults.ecosystem_default
+        self.default_provider = defaults.default_provider
+        self.default_provider_version = defaults.default_provider_version
+        self.default_source = defaults.default_source
+        self.default_source_version = defaults.default_source_version
+        self.default_platform_version = defaults.default_platform_version
 
         self.member = member
         self.transaction_type = transaction_type
@@ -193,7 +242,7 @@ class TransactionTypeProcess:
         self._id_seq = 0
         self._transaction_order_seq = 0
 
-        self.inputs = list(self.transaction_type.inputs.all())
+        self.inputs = list(bulk.inputs) if bulk else list(self.transaction_type.inputs.all())
         if values is None:
             # needs self.inputs to be defined, also checks complex_transaction inputs
             self._set_values()
@@ -234,6 +283,18 @@ class TransactionTypeProcess:
         self._transaction_order_seq += 1
         return self._transaction_order_seq
 
+    def get_actions(self):
+        if self.bulk:
+            return self.bulk.actions
+
+        return self.transaction_type.actions.order_by("order").all()
+
+    def get_relation(self, model, user_code):
+        if self.bulk:
+            return self.bulk.get_relation(model, user_code)
+
+        return get_relation_by_user_code(model, self.transaction_type.master_user, user_code)
+
     def execute_action_condition(self, action):
         if action is None:
             return False
@@ -1786,6 +1847,8 @@ class TransactionTypeProcess:
         return account_result and portfolio_result
 
     def book_create_transactions(self, actions, master_user, instrument_map):  # noqa: PLR0912, PLR0915
+        transactions_to_create = []
+
         for action in actions:
             try:
                 action_transaction = action.transactiontypeactiontransaction
@@ -2349,6 +2412,15 @@ class TransactionTypeProcess:
                 elif transaction_date_source == "null":
                     transaction.transaction_date = min(transaction.accounting_date, transaction.cash_date)
 
+                if self.bulk:
+                    # inserted together below, ytm_at_cost is calculated by the bulk process
+                    transaction.owner = self.member
+                    transactions_to_create.append(transaction)
+
+                    if bool(errors):
+                        self.transactions_errors.append(errors)
+                    continue
+
                 try:
                     transaction.owner = self.member
                     # transaction.transaction_date = min(transaction.accounting_date, transaction.cash_date)
@@ -2376,12 +2448,51 @@ class TransactionTypeProcess:
                     if bool(errors):
                         self.transactions_errors.append(errors)
 
+        if transactions_to_create:
+            self.bulk_create_transactions(transactions_to_create)
+
+    def bulk_create_transactions(self, transactions):
+        errors = {}
+
+        try:
+            for transaction in transactions:
+                transaction.prepare_save()
+
+            Transaction.objects.bulk_create(transactions)
+
+        except (ValueError, TypeError, IntegrityError) as error:
+            _l.debug(error)
+
+            self._add_err_msg(errors, "non_field_errors", str(error))
+        except DatabaseError:
+            self._add_err_msg(
+                errors,
+                "non_field_errors",
+                gettext_lazy("General DB error."),
+            )
+        else:
+            for transaction in transactions:
+                self.record_execution_progress(f"Create Transaction {transaction}")
+
+            self.transactions.extend(transactions)
+
+        if bool(errors):
+            self.transactions_errors.append(errors)
+
     def _save_inputs(self):
+        if self.bulk:
+            # bulk process books only new complex transactions
+            self.bulk_inputs = self._get_inputs_to_create()
+            return
+
         self.complex_transaction.inputs.all().delete()
 
+        ComplexTransactionInput.objects.bulk_create(self._get_inputs_to_create())
+
+    def _get_inputs_to_create(self):
         inputs_to_create = []
 
-        for ti in self.transaction_type.inputs.all():
+        for ti in self.inputs:
             val = self.values.get(ti.name, None)
 
             ci = ComplexTransactionInput()
@@ -2424,7 +2535,7 @@ class TransactionTypeProcess:
 
             inputs_to_create.append(ci)
 
-        ComplexTransactionInput.objects.bulk_create(inputs_to_create)
+        return inputs_to_create
 
     def execute_user_fields_expressions(self):
         ctrn = formula.value_prepare(self.complex_transaction)
@@ -2849,7 +2960,7 @@ class TransactionTypeProcess:
 
         instrument_map = {}
         event_schedules_map = {}
-        actions = self.transaction_type.actions.order_by("order").all()
+        actions = self.get_actions()
 
         """
         Creating instruments
@@ -3259,18 +3370,7 @@ class TransactionTypeProcess:
                 # _l.debug("_set_rel model %s " % model)
                 # _l.debug("_set_rel value %s " % user_code)
 
-                try:
-                    if model._meta.get_field("master_user"):
-                        value = model.objects.get(
-                            master_user=self.transaction_type.master_user,
-                            user_code=user_code,
-                        )
-
-                except Exception:
-                    try:
-                        value = model.objects.get(user_code=user_code)
-                    except Exception as e:
-                        _l.debug(f"User code for default value is not found {e}")
+                value = self.get_relation(model, user_code)
         else:
             from_input = getattr(source, f"{source_attr_name}_input")
 
@@ -3303,3 +3403,144 @@ class TransactionTypeProcess:
             msgs.append(msg)
             errors[key] = msgs
         return msgs
+
+
+class TransactionTypeBulkProcess:
+    """
+    Books many input sets of one transaction type.
+
+    Actions, inputs, default relations and relations referenced by user_code
+    are loaded once for all bookings. Transactions of a booking are inserted with
+    one bulk_create and inputs of all bookings with another one. ytm_at_cost and
+    first transaction dates of portfolios and instruments are calculated after
+    all bookings, instead of in Transaction.save() of every transaction.
+    """
+
+    YTM_UPDATE_BATCH_SIZE = 1000
+
+    def __init__(self, transaction_type, bookings, context=None, **kwargs):
+        """
+        bookings - kwargs of TransactionTypeProcess of every booking (default_values, values, source ...),
+        kwargs - TransactionTypeProcess kwargs shared by all bookings (member, execution_context ...)
+        """
+        self.transaction_type = transaction_type
+        self.bookings = list(bookings)
+        self.context = context if context is not None else {}
+        self.process_kwargs = kwargs
+
+        self.defaults = BookingDefaults(transaction_type.master_user)
+        self.inputs = list(transaction_type.inputs.select_related("content_type").all())
+        self.actions = list(transaction_type.actions.order_by("order").select_related(*ACTION_RELATIONS))
+        self.relations = {}
+
+    def get_relation(self, model, user_code):
+        key = (model, user_code)
+
+        if key not in self.relations:
+            self.relations[key] = get_relation_by_user_code(model, self.transaction_type.master_user, user_code)
+
+        return self.relations[key]
+
+    def process(self) -> list:
+        """
+        Returns TransactionTypeProcess of every booking, or the exception the booking failed with
+        """
+        process_st = time.perf_counter()
+
+        results = []
+        inputs_to_create = []
+
+        for booking in self.bookings:
+            kwargs = {**self.process_kwargs, **booking}
+
+            try:
+                # failed booking leaves nothing behind
+                with transaction.atomic():
+                    instance = TransactionTypeProcess(
+                        transaction_type=self.transaction_type,
+                        context=self.context,
+                        bulk=self,
+                        **kwargs,
+                    )
+                    instance.process()
+
+            except Exception as e:
+                _l.error(f"TransactionTypeBulkProcess.process booking error {repr(e)} {traceback.format_exc()}")
+                results.append(e)
+
+            else:
+                inputs_to_create.extend(instance.bulk_inputs)
+                results.append(instance)
+
+        ComplexTransactionInput.objects.bulk_create(inputs_to_create)
+
+        self.calculate_derived_fields([result for result in results if isinstance(result, TransactionTypeProcess)])
+
+        _l.debug(
+            "TransactionTypeBulkProcess: %s bookings done: %s",
+            len(self.bookings),
+            f"{time.perf_counter() - process_st:3.3f}",
+        )
+
+        return results
+
+    def calculate_derived_fields(self, processes):
+        ids = [trn.id for instance in processes for trn in instance.transactions]
+        if not ids:
+            return
+
+        # pending and procedure bookings delete their transactions
+        transactions = list(
+            Transaction.objects.filter(id__in=ids, is_deleted=False).select_related(
+                "instrument",
+                "instrument__master_user",
+            )
+        )
+
+        with_instrument = [trn for trn in transactions if trn.instrument_id]
+        for trn in with_instrument:
+            trn.ytm_at_cost = trn.calculate_ytm() or 0
+
+        Transaction.objects.bulk_update(with_instrument, ["ytm_at_cost"], batch_size=self.YTM_UPDATE_BATCH_SIZE)
+
+        self.update_first_transactions_dates(transactions)
+
+        # bulk_create and bulk_update send no post_save, history records are written here with the final ytm
+        history.post_bulk_create(Transaction, transactions)
+
+    @staticmethod
+    def update_first_transactions_dates(transactions):
+        """
+        Saves portfolios and instruments whose first transaction dates are changed by the transactions
+        """
+        portfolio_ids = {trn.portfolio_id for trn in transactions if trn.portfolio_id}
+        instrument_ids = {trn.instrument_id for trn in transactions if trn.instrument_id}
+
+        cash_flow = Q(transaction_class_id__in=[TransactionClass.CASH_INFLOW, TransactionClass.CASH_OUTFLOW])
+        portfolio_dates = {
+            row["portfolio_id"]: (row["first_transaction_date"], row["first_cash_flow_date"])
+            for row in Transaction.objects.filter(portfolio_id__in=portfolio_ids, is_deleted=False)
+            .values("portfolio_id")
+            .annotate(
+                first_transaction_date=Min("accounting_date"),
+                first_cash_flow_date=Min("accounting_date", filter=cash_flow),
+            )
+            .order_by()
+        }
+        instrument_dates = dict(
+            Transaction.objects.filter(instrument_id__in=instrument_ids, is_deleted=False)
+            .values("instrument_id")
+            .annotate(first_transaction_date=Min("accounting_date"))
+            .values_list("instrument_id", "first_transaction_date")
+            .order_by()
+        )
+
+        # save() calculates the dates again, as it does after Transaction.save()
+        for portfolio in Portfolio.objects.filter(id__in=portfolio_ids):
+            dates = (portfolio.first_transaction_date, portfolio.first_cash_flow_date)
+            if dates != portfolio_dates.get(portfolio.id, (None, None)):
+                portfolio.save()
+
+        for instrument in Instrument.objects.filter(id__in=instrument_ids):
+            if instrument.first_transaction_date != instrument_dates.get(instrument.id):
+                instrument.save()
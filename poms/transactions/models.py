@@ -3574,11 +3574,10 @@ class Transaction(ObjectStateModel, ProvenanceModel):
 
         return ytm
 
-    def save(self, *args, **kwargs):
-        _l.debug(f"Transaction.save: {self}")
-
-        kwargs.pop("calc_cash", None)
-
+    def prepare_save(self):
+        """
+        Sets dates and transaction_code as save() does, used before bulk_create
+        """
         if not self.accounting_date:
             self.accounting_date = date_now()
 
@@ -3592,6 +3591,13 @@ class Transaction(ObjectStateModel, ProvenanceModel):
             else:
                 self.transaction_code = self.complex_transaction.code + self.complex_transaction_order
 
+    def save(self, *args, **kwargs):
+        _l.debug(f"Transaction.save: {self}")
+
+        kwargs.pop("calc_cash", None)
+
+        self.prepare_save()
+
         try:
             self.ytm_at_cost = self.calculate_ytm()
         except Exception as error:
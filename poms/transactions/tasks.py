@@ -2,21 +2,29 @@ import logging
 import traceback
 
 from celery.utils.log import get_task_logger
+from django.db.models import Prefetch
+from django.utils import timezone
 
 from poms.celery_tasks import finmars_task
 from poms.celery_tasks.models import CeleryTask
+from poms.common import profiling
 from poms.expressions_engine import formula
 from poms.transactions.models import (
     ComplexTransaction,
+    ComplexTransactionInput,
     TransactionType,
     TransactionTypeInput,
 )
+from poms.transactions.utils import generate_user_fields
 
 _l = logging.getLogger("poms.transactions")
 
 
 celery_logger = get_task_logger(__name__)
 
+# complex transactions recalculated and written with one bulk_update
+USER_FIELDS_BATCH_SIZE = 500
+
 
 def get_transaction_access_type(
     group,
@@ -273,39 +281,53 @@ def recalculate_permissions_complex_transaction(self, instance, *args, **kwargs)
     # return instance
 
 
-def get_values(complex_transaction):
+def get_input_value(complex_transaction_input):
+    i = complex_transaction_input.transaction_type_input
+    if i.value_type in [
+        TransactionTypeInput.STRING,
+        TransactionTypeInput.SELECTOR,
+    ]:
+        return complex_transaction_input.value_string
+    elif i.value_type == TransactionTypeInput.NUMBER:
+        return complex_transaction_input.value_float
+    elif i.value_type == TransactionTypeInput.DATE:
+        return complex_transaction_input.value_date
+    elif i.value_type == TransactionTypeInput.RELATION:
+        return complex_transaction_input.value_relation
+    return None
+
+
+def get_inputs_values(complex_transaction_inputs) -> dict:
     values = {}
+    for ci in complex_transaction_inputs:
+        value = get_input_value(ci)
+        if value is not None:
+            values[ci.transaction_type_input.name] = value
+    return values
+
 
+def get_values(complex_transaction):
     # if complex transaction already exists
     if complex_transaction and complex_transaction.id is not None and complex_transaction.id > 0:
         # load previous values if need
-        ci_qs = complex_transaction.inputs.all().select_related(
-            "transaction_type_input", "transaction_type_input__content_type"
+        return get_inputs_values(
+            complex_transaction.inputs.all().select_related(
+                "transaction_type_input", "transaction_type_input__content_type"
+            )
         )
-        for ci in ci_qs:
-            i = ci.transaction_type_input
-            value = None
-            if i.value_type in [
-                TransactionTypeInput.STRING,
-                TransactionTypeInput.SELECTOR,
-            ]:
-                value = ci.value_string
-            elif i.value_type == TransactionTypeInput.NUMBER:
-                value = ci.value_float
-            elif i.value_type == TransactionTypeInput.DATE:
-                value = ci.value_date
-            elif i.value_type == TransactionTypeInput.RELATION:
-                value = ci.value_relation
-
-            if value is not None:
-                values[i.name] = value
 
-    return values
+    return {}
 
 
-def execute_user_fields_expressions(complex_transaction, values, context, target_key):
-    _l.debug("execute_user_fields_expressions")
+def get_user_fields(transaction_type, target_key=None) -> list[str]:
+    """
+    User fields of the transaction type which have an expression, only target_key if it is given
+    """
+    fields = [target_key] if target_key else generate_user_fields()
+    return [field_key for field_key in fields if getattr(transaction_type, field_key, None)]
 
+
+def execute_user_fields_expressions(complex_transaction, transaction_type, values, evaluator, fields):
     ctrn = formula.value_prepare(complex_transaction)
     trns = complex_transaction.transactions.all()
 
@@ -317,82 +339,45 @@ def execute_user_fields_expressions(complex_transaction, values, context, target
     for key, value in values.items():
         names[key] = value
 
-    fields = [
-        "user_text_1",
-        "user_text_2",
-        "user_text_3",
-        "user_text_4",
-        "user_text_5",
-        "user_text_6",
-        "user_text_7",
-        "user_text_8",
-        "user_text_9",
-        "user_text_10",
-        "user_text_11",
-        "user_text_12",
-        "user_text_13",
-        "user_text_14",
-        "user_text_15",
-        "user_text_16",
-        "user_text_17",
-        "user_text_18",
-        "user_text_19",
-        "user_text_20",
-        "user_text_21",
-        "user_text_22",
-        "user_text_23",
-        "user_text_24",
-        "user_text_25",
-        "user_text_26",
-        "user_text_27",
-        "user_text_28",
-        "user_text_29",
-        "user_text_30",
-        "user_number_1",
-        "user_number_2",
-        "user_number_3",
-        "user_number_4",
-        "user_number_5",
-        "user_number_6",
-        "user_number_7",
-        "user_number_8",
-        "user_number_9",
-        "user_number_10",
-        "user_number_11",
-        "user_number_12",
-        "user_number_13",
-        "user_number_14",
-        "user_number_15",
-        "user_number_16",
-        "user_number_17",
-        "user_number_18",
-        "user_number_19",
-        "user_number_20",
-        "user_date_1",
-        "user_date_2",
-        "user_date_3",
-        "user_date_4",
-        "user_date_5",
-    ]
-
     for field_key in fields:
-        if (target_key == field_key or not target_key) and getattr(complex_transaction.transaction_type, field_key):
-            try:
-                val = formula.safe_eval(
-                    getattr(complex_transaction.transaction_type, field_key),
-                    names=names,
-                    context=context,
-                )
+        try:
+            val = evaluator.eval(getattr(transaction_type, field_key), names=names)
+        except Exception as e:
+            _l.debug(f"User Field Expression Eval error {repr(e)}")
+            val = "<InvalidExpression>" if field_key.startswith("user_text_") else None
+
+        setattr(complex_transaction, field_key, val)
+
+
+def recalculate_user_fields_batch(complex_transactions_ids, transaction_type, fields, context) -> int:
+    """
+    Recalculates the fields of the complex transactions, their inputs and transactions are
+    prefetched for the whole batch, the changed columns only are written with bulk_update
+    """
+    complex_transactions = list(
+        ComplexTransaction.objects.filter(id__in=complex_transactions_ids).prefetch_related(
+            Prefetch(
+                "inputs",
+                queryset=ComplexTransactionInput.objects.select_related(
+                    "transaction_type_input", "transaction_type_input__content_type"
+                ),
+            ),
+            "transactions",
+        )
+    )
+
+    evaluator = formula.SimpleEval2(allow_assign=True, context=context)
+    modified_at = timezone.now()
 
-                setattr(complex_transaction, field_key, val)
+    with profiling.track("expressions"):
+        for complex_transaction in complex_transactions:
+            values = get_inputs_values(complex_transaction.inputs.all())
+            execute_user_fields_expressions(complex_transaction, transaction_type, values, evaluator, fields)
+            complex_transaction.modified_at = modified_at
 
-            except Exception as e:
-                _l.debug(f"User Field Expression Eval error {repr(e)}")
+    ComplexTransaction.objects.bulk_update(complex_transactions, [*fields, "modified_at"])
 
-                try:
-                    setattr(complex_transaction, field_key, "<InvalidExpression>")
-                except Exception:
-                    setattr(complex_transaction, field_key, None)
+    return len(complex_transactions)
 
 
 @finmars_task(name="transactions.recalculate_user_fields", bind=True)
@@ -407,56 +392,56 @@ def recalculate_user_fields(self, task_id, *args, **kwargs):
             master_user=task.master_user,
         )
 
-        complex_transactions = ComplexTransaction.objects.filter(transaction_type=transaction_type)
+        fields = get_user_fields(transaction_type, target_key=task.options_object["target_key"])
+
+        complex_transactions_ids = list(
+            ComplexTransaction.objects.filter(transaction_type=transaction_type)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        total = len(complex_transactions_ids)
 
         _l.info(
             f"recalculate_user_fields: pk={task.options_object['transaction_type_id']} "
-            f"complex_transactions len={len(complex_transactions)}"
+            f"complex_transactions len={total} fields={fields}"
         )
 
         task.update_progress(
             {
                 "current": 0,
-                "total": len(complex_transactions),
+                "total": total,
                 "percent": 0,
                 "description": "Going to recalculate user fields",
             }
         )
 
-        index = 0
+        current = 0
 
         context = {"master_user": task.master_user, "member": task.member}
-        for complex_transaction in complex_transactions:
-            values = get_values(complex_transaction)
-            execute_user_fields_expressions(
-                complex_transaction,
-                values,
-                context,
-                target_key=task.options_object["target_key"],
-            )
-            complex_transaction.save()
-
-            task.update_progress(
-                {
-                    "current": index,
-                    "total": len(complex_transactions),
-                    "percent": int(index / len(complex_transactions) * 100),
-                    "description": f"Calculating user fields for {complex_transaction}",
-                }
-            )
-
-            index = index + 1
+        if fields:
+            for start in range(0, total, USER_FIELDS_BATCH_SIZE):
+                batch_ids = complex_transactions_ids[start : start + USER_FIELDS_BATCH_SIZE]
+                current += recalculate_user_fields_batch(batch_ids, transaction_type, fields, context)
+
+                task.update_progress(
+                    {
+                        "current": current,
+                        "total": total,
+                        "percent": int(current / total * 100),
+                        "description": f"Calculating user fields, {current} of {total}",
+                    }
+                )
 
         task.update_progress(
             {
-                "current": len(complex_transactions),
-                "total": len(complex_transactions),
+                "current": total,
+                "total": total,
                 "percent": 100,
                 "description": "Finished recalculate user fields",
             }
         )
 
-        task.verbose_result = f"Recalculated {len(complex_transactions)} complex transactions"
+        task.verbose_result = f"Recalculated {current} complex transactions"
 
         task.status = CeleryTask.STATUS_DONE
         task.save()
@@ -0,0 +1,92 @@
+from datetime import date
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.currencies.models import Currency
+from poms.transactions import handlers
+from poms.transactions.handlers import TransactionTypeBulkProcess, TransactionTypeProcess
+from poms.transactions.models import ComplexTransaction, ComplexTransactionInput, Transaction, TransactionType
+
+
+def get_bulk_process(bookings=()):
+    bulk = TransactionTypeBulkProcess.__new__(TransactionTypeBulkProcess)
+    bulk.transaction_type = mock.Mock(spec=TransactionType)
+    bulk.bookings = list(bookings)
+    bulk.context = {}
+    bulk.process_kwargs = {"member": None}
+    bulk.relations = {}
+    return bulk
+
+
+class BulkRelationsTest(SimpleTestCase):
+    def test__relation_is_looked_up_once_per_batch(self):
+        bulk = get_bulk_process()
+        usd = Currency(id=1, user_code="USD")
+
+        with mock.patch.object(handlers, "get_relation_by_user_code", return_value=usd) as get_relation:
+            self.assertIs(bulk.get_relation(Currency, "USD"), usd)
+            self.assertIs(bulk.get_relation(Currency, "USD"), usd)
+
+        get_relation.assert_called_once()
+
+
+class BulkCreateTransactionsTest(SimpleTestCase):
+    def test__transactions_are_inserted_together_without_save(self):
+        instance = TransactionTypeProcess.__new__(TransactionTypeProcess)
+        instance.record_execution_log = False
+        instance.transactions = []
+        instance.transactions_errors = []
+
+        complex_transaction = ComplexTransaction(code=100)
+        transactions = [
+            Transaction(
+                complex_transaction=complex_transaction,
+                complex_transaction_order=order,
+                accounting_date=date(2024, 1, 31),
+                cash_date=date(2024, 1, 30),
+            )
+            for order in (1, 2)
+        ]
+
+        with (
+            mock.patch.object(Transaction.objects, "bulk_create") as bulk_create,
+            mock.patch.object(Transaction, "save") as save,
+        ):
+            instance.bulk_create_transactions(transactions)
+
+        bulk_create.assert_called_once_with(transactions)
+        save.assert_not_called()
+        self.assertEqual(instance.transactions, transactions)
+        self.assertEqual([trn.transaction_code for trn in transactions], [101, 102])
+        self.assertEqual(transactions[0].transaction_date, date(2024, 1, 30))
+        self.assertEqual(instance.transactions_errors, [])
+
+
+class BulkProcessTest(SimpleTestCase):
+    def test__failed_booking_does_not_stop_batch(self):
+        bulk = get_bulk_process([{"default_values": {"amount": 1}}, {"default_values": {"amount": -1}}])
+        created = []
+
+        def init(instance, transaction_type, context, bulk, default_values, member):
+            if default_values["amount"] < 0:
+                raise ValueError("negative amount")
+
+            instance.transactions = []
+            instance.bulk_inputs = [ComplexTransactionInput(value_float=default_values["amount"])]
+            created.append(instance)
+
+        with (
+            mock.patch.object(handlers.transaction, "atomic"),
+            mock.patch.object(TransactionTypeProcess, "__init__", init),
+            mock.patch.object(TransactionTypeProcess, "process") as process,
+            mock.patch.object(ComplexTransactionInput.objects, "bulk_create") as bulk_create_inputs,
+            mock.patch.object(TransactionTypeBulkProcess, "calculate_derived_fields") as calculate_derived_fields,
+        ):
+            results = bulk.process()
+
+        process.assert_called_once()
+        self.assertIs(results[0], created[0])
+        self.assertIsInstance(results[1], ValueError)
+        bulk_create_inputs.assert_called_once_with(created[0].bulk_inputs)
+        calculate_derived_fields.assert_called_once_with(created)
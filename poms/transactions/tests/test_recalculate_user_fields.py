@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from poms.expressions_engine import formula
+from poms.transactions.models import ComplexTransaction, TransactionType
+from poms.transactions.tasks import execute_user_fields_expressions, get_user_fields
+
+
+class GetUserFieldsTest(SimpleTestCase):
+    def setUp(self):
+        self.transaction_type = TransactionType(
+            user_text_1="'a'",
+            user_number_2="amount * 2",
+        )
+
+    def test__fields_with_expressions(self):
+        self.assertEqual(get_user_fields(self.transaction_type), ["user_text_1", "user_number_2"])
+
+    def test__target_key(self):
+        self.assertEqual(get_user_fields(self.transaction_type, "user_number_2"), ["user_number_2"])
+        self.assertEqual(get_user_fields(self.transaction_type, "user_number_1"), [])
+
+
+class ExecuteUserFieldsExpressionsTest(SimpleTestCase):
+    def test__only_given_fields_are_evaluated(self):
+        transaction_type = TransactionType(
+            user_text_1="'code_' + code",
+            user_number_1="amount * 2",
+            user_number_2="unknown * 2",
+            user_date_1="'2024-01-31'",
+        )
+        complex_transaction = ComplexTransaction(user_text_2="kept")
+        evaluator = formula.SimpleEval2(allow_assign=True, context={})
+
+        with (
+            mock.patch("poms.transactions.tasks.formula.value_prepare", return_value={}),
+            mock.patch.object(ComplexTransaction, "transactions"),
+        ):
+            execute_user_fields_expressions(
+                complex_transaction,
+                transaction_type,
+                {"code": "x", "amount": 1.5},
+                evaluator,
+                ["user_text_1", "user_number_1", "user_number_2"],
+            )
+
+        self.assertEqual(complex_transaction.user_text_1, "code_x")
+        self.assertEqual(complex_transaction.user_number_1, 3.0)
+        self.assertIsNone(complex_transaction.user_number_2)
+        self.assertEqual(complex_transaction.user_text_2, "kept")
+        self.assertIsNone(complex_transaction.user_date_1)
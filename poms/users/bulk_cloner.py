@@ -0,0 +1,473 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+
+from poms.common.exceptions import FinmarsBaseException
+
+_l = logging.getLogger("poms.users.cloner")
+
+PK_MAP_TABLE = "cloner_pk_map"
+AUTO_FIELD_TYPES = ("AutoField", "BigAutoField", "SmallAutoField")
+INTEGER_FIELD_TYPES = (
+    "IntegerField",
+    "BigIntegerField",
+    "SmallIntegerField",
+    "PositiveIntegerField",
+    "PositiveBigIntegerField",
+    "PositiveSmallIntegerField",
+)
+# unique codes are shifted by a multiple of it, so complex transaction codes stay
+# multiples of 100 and transaction codes stay complex transaction code + order
+UNIQUE_CODE_STEP = 100
+
+
+@dataclass
+class BulkCloneResult:
+    model: str
+    total: int = 0
+    cloned: int = 0
+    execution_time: float = 0.0
+
+    @property
+    def skipped(self) -> int:
+        return self.total - self.cloned
+
+
+class BulkModelCloner:
+    """
+    Set-based cloning of model rows inside the current schema.
+
+    Rows are copied with INSERT ... SELECT, new primary keys are allocated from the
+    table sequence and stored in the temporary table cloner_pk_map
+    (content_type_id, source_id) -> target_id, foreign keys are remapped by joining it.
+    Models must be cloned in dependency order, same as FullDataCloner does.
+    A row is skipped if any of its non-null foreign keys has no mapping, as the
+    per-object clone did. Unique integer codes are shifted past the largest code
+    in the table, callable defaults are evaluated for every row.
+    Each model is verified by comparing every source row with its clone.
+
+    Must be used inside a transaction, the mapping table is dropped on commit.
+    """
+
+    def __init__(self, now, verify=True):
+        self._now = now
+        self.verify = verify
+        self._batch_id = 0
+        self._pending_pk_map = []
+        self._is_ready = False
+
+    def setup(self):
+        if self._is_ready:
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {PK_MAP_TABLE} (
+                    content_type_id integer NOT NULL,
+                    source_id bigint NOT NULL,
+                    target_id bigint NOT NULL,
+                    batch_id integer NOT NULL,
+                    PRIMARY KEY (content_type_id, source_id)
+                ) ON COMMIT DROP
+                """
+            )
+            cursor.execute(f"CREATE INDEX ON {PK_MAP_TABLE} (batch_id, target_id)")
+
+        self._is_ready = True
+
+    @staticmethod
+    def can_clone(model, fields) -> bool:
+        """
+        Checks that the model can be cloned with SQL, otherwise per-object clone is used
+        """
+        opts = model._meta
+        if opts.proxy or opts.parents or opts.pk.get_internal_type() not in AUTO_FIELD_TYPES:
+            return False
+
+        for name in BulkModelCloner.get_fields(model, fields):
+            field = opts.get_field(name)
+
+            if field.one_to_many:
+                continue
+
+            if field.many_to_many:
+                if not field.remote_field.through._meta.auto_created:
+                    return False
+                continue
+
+            if not field.concrete:
+                return False
+
+            if field.is_relation and not field.target_field.primary_key:
+                return False
+
+            if BulkModelCloner.is_unique_value(field) and field.get_internal_type() not in INTEGER_FIELD_TYPES:
+                return False
+
+        return True
+
+    @staticmethod
+    def is_unique_value(field) -> bool:
+        """
+        Unique column that can not be copied as is, foreign keys are remapped anyway
+        """
+        return field.unique and not field.primary_key and not field.is_relation
+
+    def add_pk_map(self, content_type_id, source_pk, target_pk):
+        """
+        Registers pk of object cloned outside of this engine, so it can be used for FK remapping
+        """
+        self._pending_pk_map.append((content_type_id, source_pk, target_pk))
+
+    def flush_pk_map(self):
+        if not self._pending_pk_map:
+            return
+
+        self.setup()
+
+        content_type_ids, source_ids, target_ids = zip(*self._pending_pk_map, strict=True)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {PK_MAP_TABLE} (content_type_id, source_id, target_id, batch_id)
+                SELECT ct, s, t, 0 FROM unnest(%s::integer[], %s::bigint[], %s::bigint[]) AS m(ct, s, t)
+                ON CONFLICT (content_type_id, source_id) DO UPDATE SET target_id = EXCLUDED.target_id
+                """,
+                [list(content_type_ids), list(source_ids), list(target_ids)],
+            )
+
+        self._pending_pk_map = []
+
+    def get_target_pk(self, content_type_id, source_pk):
+        """
+        Returns pk of cloned object, raises KeyError if the object was not cloned
+        """
+        if not self._is_ready:
+            raise KeyError(source_pk)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT target_id FROM {PK_MAP_TABLE} WHERE content_type_id = %s AND source_id = %s",
+                [content_type_id, source_pk],
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            raise KeyError(source_pk)
+
+        return row[0]
+
+    @staticmethod
+    def get_fields(model, fields) -> list:
+        """
+        Adds required foreign keys that are not listed (e.g. owner), they are remapped
+        like listed ones, because NULL or default value can not be inserted there
+        """
+        listed = {model._meta.get_field(name).name for name in fields}
+        required = [
+            field.name
+            for field in model._meta.concrete_fields
+            if field.is_relation
+            and not field.primary_key
+            and not field.null
+            and not field.has_default()
+            and field.name not in listed
+        ]
+        return [*fields, *required]
+
+    @staticmethod
+    def _get_code_offset(table, pk_column, column, source_sql, source_params) -> int:
+        """
+        Returns a multiple of UNIQUE_CODE_STEP, source codes shifted by it are greater than any code in the table
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT
+                    (SELECT max({column}) FROM {table}),
+                    (SELECT min(s.{column}) FROM {table} s WHERE s.{pk_column} IN ({source_sql}))
+                """,
+                source_params,
+            )
+            max_code, min_code = cursor.fetchone()
+
+        if max_code is None or min_code is None:
+            return 0
+
+        return -(-(max_code - min_code + 1) // UNIQUE_CODE_STEP) * UNIQUE_CODE_STEP
+
+    def _get_defaults(self, opts, listed):
+        """
+        Returns columns and values of not listed fields, and fields with callable defaults,
+        which are evaluated for every row in clone() (unnest would flatten array values)
+        """
+        default_columns = []
+        default_params = []
+        row_default_fields = []
+        for field in opts.concrete_fields:
+            if field.primary_key or field.attname in listed:
+                continue
+
+            if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+                value = self._now
+            elif field.has_default() and callable(field.default) and field.get_internal_type() != "ArrayField":
+                row_default_fields.append(field)
+                continue
+            else:
+                value = field.get_default()
+
+            default_columns.append(connection.ops.quote_name(field.column))
+            default_params.append(field.get_db_prep_save(value, connection))
+
+        return default_columns, default_params, row_default_fields
+
+    def _get_select(self, model, queryset, fields, batch_id):
+        """
+        Builds FROM/WHERE part and select expressions of the INSERT ... SELECT for the model
+        """
+        opts = model._meta
+        table = connection.ops.quote_name(opts.db_table)
+        pk_column = connection.ops.quote_name(opts.pk.column)
+        source_sql, source_params = queryset.values("pk").query.sql_with_params()
+
+        listed = set()
+        columns = []
+        expressions = []
+        target_columns = []
+        joins = []
+        join_params = []
+        fk_conditions = []
+        allocation_conditions = []
+        m2m_fields = []
+
+        for index, name in enumerate(fields):
+            field = opts.get_field(name)
+
+            if field.one_to_many:
+                continue
+
+            if field.many_to_many:
+                m2m_fields.append(field)
+                continue
+
+            column = connection.ops.quote_name(field.column)
+            listed.add(field.attname)
+            columns.append(column)
+            target_columns.append(f"t.{column}")
+
+            if field.is_relation:
+                alias = f"r{index}"
+                content_type_id = ContentType.objects.get_for_model(field.related_model).pk
+                joins.append(
+                    f"LEFT JOIN {PK_MAP_TABLE} {alias} "
+                    f"ON {alias}.content_type_id = %s AND {alias}.source_id = s.{column}"
+                )
+                join_params.append(content_type_id)
+                expressions.append(f"{alias}.target_id")
+
+                condition = f"(s.{column} IS NULL OR {alias}.target_id IS NOT NULL)"
+                fk_conditions.append(condition)
+                if field.related_model is not model:
+                    allocation_conditions.append(condition)
+            elif self.is_unique_value(field):
+                offset = self._get_code_offset(table, pk_column, column, source_sql, source_params)
+                expressions.append(f"s.{column} + {int(offset)}")
+            else:
+                expressions.append(f"s.{column}")
+
+        default_columns, default_params, row_default_fields = self._get_defaults(opts, listed)
+
+        return {
+            "table": table,
+            "pk_column": pk_column,
+            "columns": columns,
+            "expressions": expressions,
+            "target_columns": target_columns,
+            "joins": "\n".join(joins),
+            "join_params": join_params,
+            "fk_conditions": " AND ".join(fk_conditions) or "TRUE",
+            "allocation_conditions": " AND ".join(allocation_conditions) or "TRUE",
+            "default_columns": default_columns,
+            "default_params": default_params,
+            "row_default_fields": row_default_fields,
+            "source_sql": source_sql,
+            "source_params": list(source_params),
+            "m2m_fields": m2m_fields,
+            "batch_id": batch_id,
+        }
+
+    def clone(self, model, queryset, fields) -> BulkCloneResult:
+        """
+        Clones all rows of the queryset, copying only listed fields,
+        other fields get their default values
+        """
+        st = time.perf_counter()
+
+        self.setup()
+        self.flush_pk_map()
+
+        self._batch_id += 1
+        batch_id = self._batch_id
+
+        content_type_id = ContentType.objects.get_for_model(model).pk
+        select = self._get_select(model, queryset, self.get_fields(model, fields), batch_id)
+        table = select["table"]
+        pk_column = select["pk_column"]
+
+        result = BulkCloneResult(model=model._meta.label)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM ({select['source_sql']}) q", select["source_params"])
+            result.total = cursor.fetchone()[0]
+
+            if not result.total:
+                return result
+
+            # allocate new primary keys
+            cursor.execute(
+                f"""
+                INSERT INTO {PK_MAP_TABLE} (content_type_id, source_id, target_id, batch_id)
+                SELECT %s, s.{pk_column}, nextval(pg_get_serial_sequence(%s, %s)), %s
+                FROM {table} s
+                {select["joins"]}
+                WHERE s.{pk_column} IN ({select["source_sql"]})
+                AND {select["allocation_conditions"]}
+                ON CONFLICT (content_type_id, source_id) DO NOTHING
+                """,
+                [
+                    content_type_id,
+                    model._meta.db_table,
+                    model._meta.pk.column,
+                    batch_id,
+                    *select["join_params"],
+                    *select["source_params"],
+                ],
+            )
+
+            row_default_fields = select["row_default_fields"]
+            insert_columns = ", ".join(
+                [
+                    pk_column,
+                    *select["columns"],
+                    *select["default_columns"],
+                    *(connection.ops.quote_name(field.column) for field in row_default_fields),
+                ]
+            )
+            select_expressions = ["m.target_id", *select["expressions"]]
+            rows_sql = f"""
+                SELECT {", ".join(f"{expression} AS c{i}" for i, expression in enumerate(select_expressions))},
+                    row_number() OVER (ORDER BY m.target_id) AS n
+                FROM {table} s
+                JOIN {PK_MAP_TABLE} m ON m.batch_id = %s AND m.source_id = s.{pk_column}
+                {select["joins"]}
+                WHERE {select["fk_conditions"]}
+            """
+            row_values = [f"q.c{i}" for i in range(len(select_expressions))]
+            row_values += ["%s"] * len(select["default_columns"])
+            params = [*select["default_params"], batch_id, *select["join_params"]]
+
+            # callable defaults get a value per row, joined by row number
+            row_defaults_sql = ""
+            if row_default_fields:
+                arrays = []
+                for i, field in enumerate(row_default_fields):
+                    arrays.append(f"%s::{field.db_type(connection)}[]")
+                    row_values.append(f"d.v{i}")
+                    params.append(
+                        [field.get_db_prep_save(field.get_default(), connection) for _ in range(result.total)]
+                    )
+                names = ", ".join(f"v{i}" for i in range(len(row_default_fields)))
+                row_defaults_sql = f"JOIN unnest({', '.join(arrays)}) WITH ORDINALITY AS d({names}, n) ON d.n = q.n"
+
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({insert_columns})
+                SELECT {", ".join(row_values)}
+                FROM ({rows_sql}) q
+                {row_defaults_sql}
+                """,
+                params,
+            )
+            result.cloned = cursor.rowcount
+
+            # forget keys of skipped rows
+            cursor.execute(
+                f"""
+                DELETE FROM {PK_MAP_TABLE} m
+                WHERE m.batch_id = %s
+                AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{pk_column} = m.target_id)
+                """,
+                [batch_id],
+            )
+
+            for field in select["m2m_fields"]:
+                self._clone_m2m(cursor, field, batch_id)
+
+        if self.verify:
+            self._verify(model, content_type_id, select)
+
+        result.execution_time = float(f"{time.perf_counter() - st:3.3f}")
+
+        return result
+
+    @staticmethod
+    def _clone_m2m(cursor, field, batch_id):
+        through = field.remote_field.through._meta
+        table = connection.ops.quote_name(through.db_table)
+        column = connection.ops.quote_name(field.m2m_column_name())
+        reverse_column = connection.ops.quote_name(field.m2m_reverse_name())
+        content_type_id = ContentType.objects.get_for_model(field.remote_field.model).pk
+
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({column}, {reverse_column})
+            SELECT m.target_id, r.target_id
+            FROM {table} x
+            JOIN {PK_MAP_TABLE} m ON m.batch_id = %s AND m.source_id = x.{column}
+            JOIN {PK_MAP_TABLE} r ON r.content_type_id = %s AND r.source_id = x.{reverse_column}
+            """,
+            [batch_id, content_type_id],
+        )
+
+    def _verify(self, model, content_type_id, select):
+        """
+        Compares every source row of the queryset with its clone: copied columns must be equal
+        and every row that has all its foreign keys mapped must be cloned
+        """
+        table = select["table"]
+        pk_column = select["pk_column"]
+        source_expressions = ", ".join(select["expressions"]) or "NULL"
+        target_expressions = ", ".join(select["target_columns"]) or "NULL"
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT
+                    count(*) FILTER (WHERE t.{pk_column} IS NULL),
+                    count(*) FILTER (
+                        WHERE t.{pk_column} IS NOT NULL
+                        AND ROW({source_expressions}) IS DISTINCT FROM ROW({target_expressions})
+                    )
+                FROM {table} s
+                {select["joins"]}
+                LEFT JOIN {PK_MAP_TABLE} m ON m.content_type_id = %s AND m.source_id = s.{pk_column}
+                LEFT JOIN {table} t ON t.{pk_column} = m.target_id
+                WHERE s.{pk_column} IN ({select["source_sql"]})
+                AND {select["fk_conditions"]}
+                """,
+                [*select["join_params"], content_type_id, *select["source_params"]],
+            )
+            missing, changed = cursor.fetchone()
+
+        if missing or changed:
+            raise FinmarsBaseException(
+                error_key="clone_verification_failed",
+                message=(
+                    f"Clone of {model._meta.label} is not consistent: {missing} source rows are not cloned, "
+                    f"{changed} cloned rows differ from their source"
+                ),
+            )
@@ -1,4 +1,5 @@
 import logging
+import time
 from collections import defaultdict
 
 import pytz
@@ -129,13 +130,22 @@ from poms.ui.models import (
     ListLayout,
     TransactionUserFieldModel,
 )
+from poms.users.bulk_cloner import BulkCloneResult, BulkModelCloner
 from poms.users.models import EcosystemDefault, Group, MasterUser, Member
 
 _l = logging.getLogger("poms.users.cloner")
 
 
 class FullDataCloner:
-    def __init__(self, source_master_user, name=None, copy_settings=None, current_user=None):
+    def __init__(
+        self,
+        source_master_user,
+        name=None,
+        copy_settings=None,
+        current_user=None,
+        progress_callback=None,
+        verify=True,
+    ):
         self._now = None
         self._source_master_user = source_master_user
         self._source_owner = None
@@ -155,6 +165,10 @@ class FullDataCloner:
         self._source_objects = defaultdict(dict)
         self._target_objects = defaultdict(dict)
 
+        self.progress_callback = progress_callback
+        self.verify = verify
+        self._bulk_cloner = None
+
     def get_default_copy_settings(self):
         return {"members": True}
 
@@ -176,6 +190,7 @@ class FullDataCloner:
 
         with timezone.override(src_tz):
             self._now = timezone.localtime(timezone.now())
+            self._bulk_cloner = BulkModelCloner(now=self._now, verify=self.verify)
             self._clone()
 
         return self._target_master_user
@@ -322,12 +337,6 @@ class FullDataCloner:
         for source in SharedConfigurationFile.objects.all():
             self._add_pk_map(source, source)
 
-        for source in InstrumentPricingSchemeType.objects.all():  # noqa: F821
-            self._add_pk_map(source, source)
-
-        for source in CurrencyPricingSchemeType.objects.all():  # noqa: F821
-            self._add_pk_map(source, source)
-
     # def _users_1(self):
     #     self._source_owner = self._source_master_user.members.filter(is_owner=True).order_by('join_date').first()
     #
@@ -427,6 +436,8 @@ class FullDataCloner:
 
             target_member.save()
 
+            self._add_pk_map(target_member, source_member)
+
         self._target_owner = self._target_master_user.members.filter(is_owner=True).order_by("join_date").first()
 
     # def _copy_current_member(self):
@@ -2094,10 +2105,32 @@ class FullDataCloner:
         if fields_prefetch_related:
             qs = qs.prefetch_related(*fields_prefetch_related)
 
-        # _l.debug('clone %s: count=%s', model._meta.model_name, qs.count())
-        _l.debug("clone %s: count=%s", model._meta.model_name, qs.count())
+        if not store and self._bulk_cloner and self._bulk_cloner.can_clone(model, fields):
+            result = self._bulk_cloner.clone(model, qs, fields)
+            self._report_progress(result)
+            return
+
+        st = time.perf_counter()
+        result = BulkCloneResult(model=model._meta.label, total=qs.count())
+        _l.debug("clone %s: count=%s", model._meta.model_name, result.total)
         for source in qs:
-            self._simple_clone(None, source, *fields, pk_map=pk_map, store=store)
+            if self._simple_clone(None, source, *fields, pk_map=pk_map, store=store):
+                result.cloned += 1
+
+        result.execution_time = float(f"{time.perf_counter() - st:3.3f}")
+        self._report_progress(result)
+
+    def _report_progress(self, result):
+        _l.info(
+            "clone %s: cloned=%s skipped=%s time=%s",
+            result.model,
+            result.cloned,
+            result.skipped,
+            result.execution_time,
+        )
+
+        if self.progress_callback:
+            self.progress_callback(result)
 
     def _simple_list_clone_2(self, model, master_user_path, *fields, pk_map=True, store=False):
         # _l.debug('clone2 %s ', model._meta.model_name)
@@ -2326,6 +2359,9 @@ class FullDataCloner:
         cobjects = self._pk_map[content_type.pk]
         cobjects[source.pk] = target.pk
 
+        if self._bulk_cloner:
+            self._bulk_cloner.add_pk_map(content_type.pk, source.pk, target.pk)
+
     def _get_related_from_pk_map(self, model, pk):
         if pk is None:
             return None
@@ -2335,4 +2371,9 @@ class FullDataCloner:
         # print(' _get_related_from_pk_map _pk_map %s' % content_type.pk)
 
         objects = self._pk_map[content_type.pk]
+        if pk not in objects and self._bulk_cloner:
+            # object was cloned with SQL, its pk is in the mapping table only
+            self._bulk_cloner.flush_pk_map()
+            objects[pk] = self._bulk_cloner.get_target_pk(content_type.pk, pk)
+
         return objects[pk]
@@ -4,6 +4,8 @@ import time
 from django.core.management.base import BaseCommand
 from django.db import connection
 
+from poms.common.db import set_search_path
+
 _l = logging.getLogger("provision")
 
 
@@ -57,11 +59,9 @@ class Command(BaseCommand):
         from poms_app import celery_app
 
         for schema in get_all_tenant_schemas():
-            with connection.cursor() as cursor:
-                cursor.execute(f"SET search_path TO {schema};")
+            set_search_path(schema)
 
             cancel_existing_tasks(celery_app)
             cancel_existing_procedures(celery_app)
 
-            with connection.cursor() as cursor:
-                cursor.execute("SET search_path TO public;")
+            set_search_path("public")
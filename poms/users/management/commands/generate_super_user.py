@@ -1,6 +1,8 @@
 from django.core.management import BaseCommand
 from django.db import connection
 
+from poms.common.db import set_search_path
+
 __author__ = "szhitenev"
 
 import os
@@ -37,8 +39,7 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.SUCCESS(f"Applying migrations to {schema}..."))
 
                     # Set the search path to the tenant's schema
-                    with connection.cursor() as cursor:
-                        cursor.execute(f"SET search_path TO {schema};")
+                    set_search_path(schema)
 
                     import logging
 
@@ -68,8 +69,7 @@ class Command(BaseCommand):
                         _l.info("Skip. Super user username and password are not provided.")
 
                     # Optionally, reset the search path to default after migrating
-                    with connection.cursor() as cursor:
-                        cursor.execute("SET search_path TO public;")
+                    set_search_path("public")
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error creating super user: {e}"))
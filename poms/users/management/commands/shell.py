@@ -1,5 +1,6 @@
 from django.core.management.commands.shell import Command as OriginalCommand
-from django.db import connection
+
+from poms.common.db import set_search_path
 
 
 class Command(OriginalCommand):
@@ -9,6 +10,5 @@ class Command(OriginalCommand):
 
     def handle(self, *args, **options):
         if options["space_code"]:
-            with connection.cursor() as cursor:
-                cursor.execute(f"SET search_path TO {options['space_code']};")
+            set_search_path(options["space_code"])
         super().handle(**options)
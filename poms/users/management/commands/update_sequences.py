@@ -3,6 +3,8 @@ from django.core.management.base import BaseCommand
 from django.db import connection
 from django.db.models import AutoField
 
+from poms.common.db import set_search_path
+
 
 def get_all_tenant_schemas():
     # List to hold tenant schemas
@@ -33,9 +35,9 @@ class Command(BaseCommand):
 
         for schema in get_all_tenant_schemas():
             self.stdout.write(f"Checking schema {schema}")
-            with connection.cursor() as cursor:
-                cursor.execute(f"SET search_path TO {schema};")
+            set_search_path(schema)
 
+            with connection.cursor() as cursor:
                 for model in models:
                     if not model._meta.managed:
                         continue
@@ -0,0 +1,158 @@
+import itertools
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from poms.accounts.models import Account, AccountType
+from poms.common.common_base_test import BUY_SELL, BaseTestCase
+from poms.common.exceptions import FinmarsBaseException
+from poms.transactions.models import ComplexTransaction
+from poms.users.bulk_cloner import BulkModelCloner
+from poms.users.models import MasterUser, Member
+
+ACCOUNT_TYPE_FIELDS = ("master_user", "user_code", "name", "short_name", "notes", "is_deleted")
+ACCOUNT_FIELDS = ("master_user", "user_code", "name", "short_name", "notes", "is_deleted", "type")
+COMPLEX_TRANSACTION_FIELDS = ("master_user", "transaction_type", "date", "code", "text")
+
+
+class BulkModelClonerTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.target_master_user = MasterUser.objects.create(
+            name="target",
+            space_code="space00001",
+            realm_code="realm00000",
+        )
+        self.target_member = Member.objects.create(
+            master_user=self.target_master_user,
+            username="target_member",
+            is_owner=True,
+        )
+        self.cloner = BulkModelCloner(now=timezone.now())
+        self.add_pk_map(self.master_user, self.target_master_user)
+        self.add_pk_map(self.member, self.target_member)
+
+    def add_pk_map(self, source, target):
+        content_type_id = ContentType.objects.get_for_model(source).pk
+        self.cloner.add_pk_map(content_type_id, source.pk, target.pk)
+
+    def test__can_clone(self):
+        self.assertTrue(BulkModelCloner.can_clone(AccountType, ACCOUNT_TYPE_FIELDS))
+        self.assertTrue(BulkModelCloner.can_clone(Account, ACCOUNT_FIELDS))
+
+    def test__get_fields_adds_required_relations(self):
+        fields = BulkModelCloner.get_fields(AccountType, ACCOUNT_TYPE_FIELDS)
+
+        self.assertEqual(fields[: len(ACCOUNT_TYPE_FIELDS)], list(ACCOUNT_TYPE_FIELDS))
+        self.assertIn("owner", fields)
+
+    def test__clone_remaps_foreign_keys(self):
+        sources = AccountType.objects.filter(master_user=self.master_user)
+        source_ids = list(sources.values_list("id", flat=True))
+
+        result = self.cloner.clone(AccountType, sources, ACCOUNT_TYPE_FIELDS)
+
+        self.assertEqual(result.total, len(source_ids))
+        self.assertEqual(result.cloned, len(source_ids))
+        self.assertEqual(result.skipped, 0)
+
+        clones = AccountType.objects.filter(master_user=self.target_master_user)
+        self.assertEqual(clones.count(), len(source_ids))
+        self.assertTrue(all(clone.owner_id == self.target_member.id for clone in clones))
+
+        content_type_id = ContentType.objects.get_for_model(AccountType).pk
+        target_id = self.cloner.get_target_pk(content_type_id, self.account_type.id)
+        clone = AccountType.objects.get(id=target_id)
+        self.assertEqual(clone.user_code, self.account_type.user_code)
+
+        accounts = Account.objects.filter(master_user=self.master_user)
+        result = self.cloner.clone(Account, accounts, ACCOUNT_FIELDS)
+
+        self.assertEqual(result.cloned, accounts.count())
+        account_clone = Account.objects.get(master_user=self.target_master_user, user_code=self.account.user_code)
+        self.assertEqual(account_clone.type_id, target_id)
+
+    def test__rows_without_mapping_are_skipped(self):
+        other_member = Member.objects.create(master_user=self.master_user, username="not_cloned")
+        AccountType.objects.create(
+            master_user=self.master_user,
+            owner=other_member,
+            user_code="skipped_type",
+            name="skipped_type",
+        )
+        sources = AccountType.objects.filter(master_user=self.master_user)
+
+        result = self.cloner.clone(AccountType, sources, ACCOUNT_TYPE_FIELDS)
+
+        self.assertEqual(result.skipped, 1)
+        self.assertFalse(
+            AccountType.objects.filter(master_user=self.target_master_user, user_code="skipped_type").exists()
+        )
+
+        content_type_id = ContentType.objects.get_for_model(AccountType).pk
+        skipped = AccountType.objects.get(master_user=self.master_user, user_code="skipped_type")
+        with self.assertRaises(KeyError):
+            self.cloner.get_target_pk(content_type_id, skipped.id)
+
+    def test__callable_default_is_evaluated_for_every_row(self):
+        AccountType.objects.create(master_user=self.master_user, owner=self.member, user_code="second", name="second")
+        sources = AccountType.objects.filter(master_user=self.master_user)
+        counter = itertools.count()
+
+        def public_name():
+            return f"public_{next(counter)}"
+
+        field = AccountType._meta.get_field("public_name")
+        with mock.patch.object(field, "default", public_name), mock.patch.object(field, "_get_default", public_name):
+            result = self.cloner.clone(AccountType, sources, ACCOUNT_TYPE_FIELDS)
+
+        public_names = list(
+            AccountType.objects.filter(master_user=self.target_master_user).values_list("public_name", flat=True)
+        )
+        self.assertEqual(len(public_names), result.cloned)
+        self.assertEqual(len(set(public_names)), len(public_names))
+        self.assertTrue(all(name.startswith("public_") for name in public_names))
+
+    def test__unique_codes_are_shifted(self):
+        transaction_type = self.db_data.transaction_types[BUY_SELL]
+        self.add_pk_map(transaction_type, transaction_type)
+        for text in ("first", "second"):
+            ComplexTransaction.objects.create(
+                master_user=self.master_user,
+                owner=self.member,
+                transaction_type=transaction_type,
+                date=self.yesterday(),
+                text=text,
+            )
+        sources = ComplexTransaction.objects.filter(master_user=self.master_user)
+        source_codes = dict(sources.values_list("text", "code"))
+        max_code = max(ComplexTransaction.objects.values_list("code", flat=True))
+
+        result = self.cloner.clone(ComplexTransaction, sources, COMPLEX_TRANSACTION_FIELDS)
+
+        self.assertEqual(result.cloned, len(source_codes))
+        clone_codes = dict(
+            ComplexTransaction.objects.filter(master_user=self.target_master_user).values_list("text", "code")
+        )
+        offsets = {clone_codes[text] - code for text, code in source_codes.items()}
+        self.assertEqual(len(offsets), 1)
+        offset = offsets.pop()
+        self.assertEqual(offset % 100, 0)
+        self.assertGreater(min(clone_codes.values()), max_code)
+
+    def test__verify_compares_rows_with_their_clones(self):
+        sources = AccountType.objects.filter(master_user=self.master_user)
+
+        with mock.patch.object(BulkModelCloner, "_verify", autospec=True) as verify:
+            self.cloner.clone(AccountType, sources, ACCOUNT_TYPE_FIELDS)
+
+        # the verification of the clone as it is passes
+        BulkModelCloner._verify(*verify.call_args.args)
+
+        AccountType.objects.filter(master_user=self.target_master_user).update(name="changed")
+        with self.assertRaises(FinmarsBaseException):
+            BulkModelCloner._verify(*verify.call_args.args)
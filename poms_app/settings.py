@@ -30,6 +30,7 @@ SECRET_KEY = ENV_STR("SECRET_KEY", "django_secret_key")
 
 # Need to encrypt everything related to storage
 ENCRYPTION_KEY = ENV_STR("ENCRYPTION_KEY", None)
+STORAGE_ENCRYPTION_CHUNK_SIZE = ENV_INT("STORAGE_ENCRYPTION_CHUNK_SIZE", 1024 * 1024)
 
 # azure, aws, or custom, only log purpose
 HOST_LOCATION = ENV_STR("HOST_LOCATION", "AWS")
@@ -48,6 +49,7 @@ JWT_SECRET_KEY = ENV_STR("JWT_SECRET_KEY", None)
 VERIFY_SSL = ENV_BOOL("VERIFY_SSL", True)
 ENABLE_DEV_DOCUMENTATION = ENV_BOOL("ENABLE_DEV_DOCUMENTATION", False)
 USE_FILESYSTEM_STORAGE = ENV_BOOL("USE_FILESYSTEM_STORAGE", False)
+EXPLORER_SYNC_WORKERS = ENV_INT("EXPLORER_SYNC_WORKERS", 8)
 MEDIA_ROOT = os.path.join(BASE_DIR, "finmars_data")
 DOCS_ROOT = os.path.join(BASE_DIR, "docs/build/html")
 DROP_VIEWS = ENV_BOOL("DROP_VIEWS", True)
@@ -161,6 +163,7 @@ MIDDLEWARE = [
 
     "poms.common.middleware.RealmAndSpaceMiddleware",  # do not delete, required for all requests
     "poms.common.middleware.SentryContextMiddleware",  # adds realm/space/domain to Sentry
+    "poms.common.middleware.ProfilingMiddleware",  # sampled query/latency profiles, off by default
 
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -724,6 +727,37 @@ FINMARS_DATABASE_RETRIES = ENV_INT("FINMARS_DATABASE_RETRIES", 2)
 FINMARS_DATABASE_TIMEOUT = ENV_INT("FINMARS_DATABASE_TIMEOUT", 30)
 FINMARS_DATABASE_SLEEP = ENV_INT("FINMARS_DATABASE_SLEEP", 1)
 
+WORKFLOW_DISPATCH_CONCURRENCY = ENV_INT("WORKFLOW_DISPATCH_CONCURRENCY", 8)
+WORKFLOW_DISPATCH_RETRIES = ENV_INT("WORKFLOW_DISPATCH_RETRIES", 3)
+WORKFLOW_DISPATCH_TIMEOUT = ENV_INT("WORKFLOW_DISPATCH_TIMEOUT", 30)
+
+# report shards run in the calling process, reports with more transactions are sent to celery
+REPORT_SHARD_WORKERS = ENV_INT("REPORT_SHARD_WORKERS", 4)
+REPORT_SHARD_MAX_TRANSACTIONS = ENV_INT("REPORT_SHARD_MAX_TRANSACTIONS", 500_000)
+
+# report queries are prepared per connection, turn off behind a transaction pooler
+REPORT_SQL_PREPARED_STATEMENTS = ENV_BOOL("REPORT_SQL_PREPARED_STATEMENTS", True)
+REPORT_SQL_PREPARED_STATEMENTS_SIZE = ENV_INT("REPORT_SQL_PREPARED_STATEMENTS_SIZE", 32)
+
+# rows flattened and written at once by report exports, one parquet row group per batch
+REPORT_EXPORT_BATCH_SIZE = ENV_INT("REPORT_EXPORT_BATCH_SIZE", 5000)
+
+# rows fetched at once from the server-side cursor of streamed transaction reports
+REPORT_STREAM_CHUNK_SIZE = ENV_INT("REPORT_STREAM_CHUNK_SIZE", 10000)
+
+# sampled query/latency profiles of requests and tasks, see poms.common.profiling
+PROFILING_ENABLED = ENV_BOOL("PROFILING_ENABLED", False)
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0.01"))
+PROFILING_SLOWEST_QUERIES = ENV_INT("PROFILING_SLOWEST_QUERIES", 5)
+PROFILING_DUPLICATE_THRESHOLD = ENV_INT("PROFILING_DUPLICATE_THRESHOLD", 10)
+PROFILING_RING_BUFFER_SIZE = ENV_INT("PROFILING_RING_BUFFER_SIZE", 100)
+
+# per-process cache of CacheModel instances over redis, validated by version counters, see poms.common.models
+CACHE_L1_MAX_SIZE = ENV_INT("CACHE_L1_MAX_SIZE", 1024)
+CACHE_L1_TIMEOUT = ENV_INT("CACHE_L1_TIMEOUT", 60)
+# seconds a version read from redis is trusted within a request or task, long tasks see saves of other processes
+CACHE_VERSION_TIMEOUT = float(os.environ.get("CACHE_VERSION_TIMEOUT", "1"))
+
 INSTRUMENT_EVENTS_REGULAR_MAX_INTERVALS = 1000
 
 try:
@@ -774,6 +808,8 @@ if USE_DEBUGGER:
     }
 
 ACCESS_POLICY_CACHE_TTL = ENV_INT("ACCESS_POLICY_CACHE_TTL", 300)  # 5 mins
+TENANT_SCHEMA_CACHE_TTL = ENV_INT("TENANT_SCHEMA_CACHE_TTL", 300)  # 5 mins
+STATS_COVERAGE_CACHE_TTL = ENV_INT("STATS_COVERAGE_CACHE_TTL", 300)  # 5 mins
 
 # ========================
 # = KEYCLOAK INTEGRATION =